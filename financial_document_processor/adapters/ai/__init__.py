@@ -1,9 +1,19 @@
-from typing import Dict, Optional, Type
+import logging
+from typing import Dict, List, Optional, Type
+
+import httpx
 
 from financial_document_processor.adapters.ai.ai_provider import AIProvider
 from financial_document_processor.adapters.ai.claude_provider import ClaudeProvider
 from financial_document_processor.adapters.ai.gemini_provider import GeminiProvider
+from financial_document_processor.adapters.ai.http_client import get_shared_http_client
+from financial_document_processor.adapters.ai.key_pool import ApiKey, KeyPoolAIProvider, parse_api_keys
 from financial_document_processor.adapters.ai.openai_provider import OpenAIProvider
+from financial_document_processor.adapters.ai.rate_limiter import get_rate_limiter
+from financial_document_processor.adapters.ai.replay import RecordingAIProvider, ReplayAIProvider, get_cassette
+from financial_document_processor.config import get_settings
+
+logger = logging.getLogger(__name__)
 
 
 # Factory para criar provedores de IA
@@ -12,15 +22,26 @@ def create_ai_provider(
         api_key: str,
         model: Optional[str] = None,
         organization_id: Optional[str] = None,
+        http_client: Optional[httpx.AsyncClient] = None,
 ) -> AIProvider:
     """
     Factory para criar instâncias de AIProvider baseado no nome.
 
+    Com AI_REPLAY_MODE=record, o provedor real é envolvido por um gravador que
+    salva as respostas na cassete; com AI_REPLAY_MODE=replay, as respostas
+    gravadas para o provedor e modelo são servidas sem chamadas de rede.
+
+    Se houver chaves adicionais configuradas para o provedor (OPENAI_API_KEYS,
+    ANTHROPIC_API_KEYS), é criado um provedor por chave, cada um com o limitador
+    da sua conta, e as chamadas são distribuídas entre eles por KeyPoolAIProvider.
+
     Args:
         provider_name: Nome do provedor ('openai', 'gemini', 'claude')
-        api_key: Chave de API do provedor
+        api_key: Chave de API do provedor (pode ser vazia se houver chaves no pool)
         model: Nome do modelo a ser usado (opcional)
         organization_id: ID da organização para OpenAI (opcional)
+        http_client: Cliente HTTP dos provedores (default: cliente compartilhado
+            configurado a partir de AISettings). O Gemini usa o transporte próprio do SDK.
 
     Returns:
         Instância de AIProvider
@@ -39,7 +60,80 @@ def create_ai_provider(
     if not provider_class:
         raise ValueError(f"Provedor não suportado: {provider_name}. Opções disponíveis: {list(providers.keys())}")
 
-    if provider_name.lower() == "openai":
-        return provider_class(api_key=api_key, model=model, organization_id=organization_id)
+    settings = get_settings().ai
+    replay_mode = settings.replay_mode.lower()
+
+    if replay_mode == "replay":
+        return ReplayAIProvider(
+            cassette=get_cassette(settings.replay_cassette_path),
+            provider_name=provider_name,
+            model=model,
+            prompt_style=provider_class.prompt_style,
+            latency_distribution=settings.replay_latency_distribution,
+            latency_scale=settings.replay_latency_scale,
+            error_rate=settings.replay_error_rate,
+            seed=settings.replay_seed
+        )
+
+    provider_name = provider_name.lower()
+    # O SDK do Gemini configura uma chave global (genai.configure), então não há pool para ele
+    pool_keys = {
+        "openai": settings.openai_api_keys,
+        "claude": settings.claude_api_keys,
+    }.get(provider_name, "")
+
+    primary_key = ApiKey(key=api_key, organization_id=organization_id)
+    keys: List[ApiKey] = [primary_key] if api_key else []
+    keys += [key for key in parse_api_keys(pool_keys) if all(key.key != existing.key for existing in keys)]
+
+    if provider_name != "gemini" and http_client is None:
+        http_client = get_shared_http_client(settings)
+
+    # Cotas configuradas valem só para o modelo principal do provedor; os demais modelos
+    # (cascata, roteamento) têm cotas próprias e usam a tabela por modelo
+    main_model, requests_per_minute, tokens_per_minute = {
+        "openai": (settings.openai_model, settings.openai_rate_limit_rpm, settings.openai_rate_limit_tpm),
+        "gemini": (settings.gemini_model, settings.gemini_rate_limit_rpm, settings.gemini_rate_limit_tpm),
+        "claude": (settings.claude_model, settings.claude_rate_limit_rpm, settings.claude_rate_limit_tpm),
+    }[provider_name]
+    if model not in (None, main_model):
+        requests_per_minute = tokens_per_minute = None
+
+    def build(key: ApiKey, account: Optional[str] = None) -> AIProvider:
+        rate_limiter = get_rate_limiter(
+            provider_name,
+            model,
+            requests_per_minute=requests_per_minute,
+            tokens_per_minute=tokens_per_minute,
+            account=account,
+        )
+
+        if provider_name == "gemini":
+            return provider_class(
+                api_key=key.key,
+                model=model,
+                rate_limiter=rate_limiter,
+                model_cache_size=settings.gemini_model_cache_size
+            )
+
+        if provider_name == "openai":
+            return provider_class(
+                api_key=key.key,
+                model=model,
+                organization_id=key.organization_id,
+                http_client=http_client,
+                rate_limiter=rate_limiter
+            )
+
+        return provider_class(api_key=key.key, model=model, http_client=http_client, rate_limiter=rate_limiter)
+
+    if len(keys) > 1:
+        logger.info(f"Pool de {len(keys)} chaves de API para {provider_name} ({model or 'modelo padrão'})")
+        provider = KeyPoolAIProvider([(key, build(key, account=key.account)) for key in keys])
     else:
-        return provider_class(api_key=api_key, model=model)
\ No newline at end of file
+        provider = build(keys[0] if keys else primary_key)
+
+    if replay_mode == "record":
+        return RecordingAIProvider(provider, get_cassette(settings.replay_cassette_path))
+
+    return provider
@@ -1,9 +1,58 @@
+import hashlib
+import json
+import logging
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional
 
 from pydantic import BaseModel
 
+from financial_document_processor.adapters.ai.pricing import ModelPrice
 from financial_document_processor.domain.transaction import Transaction
+from financial_document_processor.services.line_references import NumberedText
+from financial_document_processor.services.structured_output import (
+    CATEGORIZATION_ADAPTER,
+    EXTRACTED_TRANSACTION_ADAPTER,
+    LINE_REFERENCE_ADAPTER,
+    CategorizationResult,
+    categorization_schema,
+    extraction_schema,
+)
+from financial_document_processor.utils.json_stream import (
+    STITCH_WINDOW,
+    JSONArrayStreamParser,
+    repair_truncated_json,
+    stitch_continuation,
+)
+from financial_document_processor.utils.metrics import (
+    AI_API_CALLS,
+    AI_CACHED_TOKENS,
+    AI_CONTINUATIONS,
+    AI_COST,
+    AI_RESPONSE_PARSE,
+    AI_TOKEN_USAGE,
+    current_ai_usage_labels,
+    track_ai_usage,
+)
+from financial_document_processor.utils.tokenizer import TokenEstimate, get_tokenizer_service
+
+logger = logging.getLogger(__name__)
+
+EXTRACTION_SYSTEM_MESSAGE = (
+    "Você é um assistente especializado em extrair transações financeiras de documentos bancários. "
+    "Forneça apenas o JSON solicitado sem explicações adicionais."
+)
+
+CATEGORIZATION_SYSTEM_MESSAGE = (
+    "Você é um assistente especializado em categorizar transações financeiras. "
+    "Forneça apenas o JSON solicitado sem explicações adicionais."
+)
+
+CONTINUATION_PROMPT = (
+    "Sua resposta anterior foi cortada pelo limite de tokens. Continue exatamente do ponto "
+    "onde parou, sem repetir nada do que já foi escrito e sem qualquer texto adicional."
+)
 
 
 class AIRequest(BaseModel):
@@ -16,6 +65,42 @@ class AIRequest(BaseModel):
     system_message: Optional[str] = None
     stop_sequences: Optional[List[str]] = None
     model: Optional[str] = None
+    # Parte estática do prompt, enviada antes de `prompt` e marcada como cacheável no provedor
+    cacheable_prefix: Optional[str] = None
+    # JSON schema da resposta, aplicado com o recurso de saída estruturada de cada provedor
+    response_schema: Optional[Dict[str, Any]] = None
+    response_schema_name: str = "resposta"
+    # Resposta parcial a ser continuada, quando a anterior foi cortada em max_tokens
+    continuation_of: Optional[str] = None
+
+
+def request_fingerprint(provider: str, model: Optional[str], request: AIRequest) -> str:
+    """
+    Calcula o hash que identifica uma requisição: provedor, modelo, temperatura,
+    max_tokens, sequências de parada, schema da resposta, system message, prompt
+    completo e resposta parcial em continuação.
+
+    Args:
+        provider: Nome do provedor
+        model: Modelo da chamada
+        request: Parâmetros da requisição
+
+    Returns:
+        Hash SHA-256 hexadecimal
+    """
+    payload = json.dumps({
+        "provider": provider,
+        "model": model,
+        "temperature": request.temperature,
+        "max_tokens": request.max_tokens,
+        "stop": request.stop_sequences,
+        "system": request.system_message,
+        "prompt": (request.cacheable_prefix or "") + request.prompt,
+        "schema": request.response_schema,
+        "continuation": request.continuation_of,
+    }, ensure_ascii=False, sort_keys=True)
+
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
 
 class AIResponse(BaseModel):
@@ -26,6 +111,105 @@ class AIResponse(BaseModel):
     model: str
     tokens_used: int
     cost: float  # Custo estimado da chamada em USD
+    cached_tokens: int = 0  # Tokens de entrada servidos pelo cache de prompt do provedor
+    truncated: bool = False  # A resposta foi cortada por atingir max_tokens
+    input_tokens: int = 0  # Tokens de entrada, incluindo os servidos pelo cache
+    output_tokens: int = 0  # Tokens de saída
+
+
+class StreamOutcome(BaseModel):
+    """
+    Como terminou uma resposta em streaming, preenchido pelo provedor ao fim do stream.
+    """
+    truncated: bool = False  # A resposta foi cortada por atingir max_tokens
+
+
+class ExtractionStats(BaseModel):
+    """
+    Resultado da validação de uma resposta de extração.
+    """
+    found: bool = False  # A resposta continha o array de transações
+    invalid_items: int = 0  # Itens descartados por não passarem na validação
+
+    @property
+    def valid(self) -> bool:
+        return self.found and not self.invalid_items
+
+
+class UsageTracker:
+    """
+    Acumula tokens e custo das chamadas de IA feitas em um contexto, como o
+    processamento de um documento.
+    """
+
+    def __init__(self):
+        self.tokens = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cost = 0.0
+        self.calls = 0
+
+    def add(self, tokens: int, cost: float, input_tokens: int = 0, output_tokens: int = 0) -> None:
+        """
+        Soma o uso de uma chamada.
+
+        Args:
+            tokens: Tokens consumidos
+            cost: Custo em USD
+            input_tokens: Tokens de entrada
+            output_tokens: Tokens de saída
+        """
+        self.tokens += tokens
+        self.input_tokens += input_tokens
+        self.output_tokens += output_tokens
+        self.cost += cost
+        self.calls += 1
+
+    def merge(self, other: "UsageTracker") -> None:
+        """
+        Soma o uso acumulado em outro acumulador.
+
+        Args:
+            other: Acumulador a somar
+        """
+        self.tokens += other.tokens
+        self.input_tokens += other.input_tokens
+        self.output_tokens += other.output_tokens
+        self.cost += other.cost
+        self.calls += other.calls
+
+
+_current_usage: ContextVar[Optional[UsageTracker]] = ContextVar("ai_usage_tracker", default=None)
+
+
+@contextmanager
+def track_usage(tracker: Optional[UsageTracker] = None) -> Iterator[UsageTracker]:
+    """
+    Acumula o uso das chamadas de IA feitas dentro do bloco, inclusive em tarefas
+    criadas nele.
+
+    Args:
+        tracker: Acumulador a usar (default: um novo)
+
+    Yields:
+        UsageTracker do bloco
+    """
+    tracker = tracker or UsageTracker()
+    token = _current_usage.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _current_usage.reset(token)
+
+
+def get_usage_tracker() -> Optional[UsageTracker]:
+    """
+    Obtém o acumulador de uso do contexto atual.
+
+    Returns:
+        UsageTracker do bloco `track_usage` atual ou None
+    """
+    return _current_usage.get()
 
 
 class AIProvider(ABC):
@@ -33,9 +217,17 @@ class AIProvider(ABC):
     Interface abstrata para provedores de IA.
 
     Esta classe define o contrato que todos os provedores de IA devem implementar.
+    As operações de alto nível (extração e categorização) são implementadas aqui
+    sobre `generate_completion`; cada provedor define `prompt_style` e
+    `prompt_engineering` e implementa a chamada de baixo nível.
     """
 
-    @abstractmethod
+    # Estilo de template usado nas operações de alto nível ('openai', 'gemini', 'claude')
+    prompt_style: str = "openai"
+
+    # Número máximo de continuações pedidas quando uma resposta é cortada em max_tokens
+    max_continuations: int = 3
+
     async def extract_transactions(
             self,
             text_content: str,
@@ -57,9 +249,102 @@ class AIProvider(ABC):
         Returns:
             Lista de transações extraídas
         """
-        pass
+        return [
+            transaction
+            async for transaction in self.stream_transactions(
+                text_content=text_content,
+                document_type=document_type,
+                predefined_categories=predefined_categories,
+                document_id=document_id,
+                user_id=user_id
+            )
+        ]
 
-    @abstractmethod
+    @track_ai_usage("extraction")
+    async def stream_transactions(
+            self,
+            text_content: str,
+            document_type: str,
+            predefined_categories: Optional[List[str]] = None,
+            document_id: int = 0,
+            user_id: int = 0,
+            stats: Optional[ExtractionStats] = None,
+            line_references: bool = False,
+    ) -> AsyncIterator[Transaction]:
+        """
+        Extrai transações produzindo cada uma assim que o modelo termina de gerá-la.
+
+        A resposta é recebida em streaming e o array `transactions` é lido de forma
+        incremental, de modo que o processamento de uma transação pode começar
+        enquanto as seguintes ainda estão sendo geradas.
+
+        Com `line_references`, o texto é enviado com as linhas numeradas e o modelo
+        responde com registros compactos (linha, data, valor, tipo, método), sem
+        repetir as descrições, que são recortadas localmente das linhas indicadas.
+        Registros cuja linha não existe ou não contém o valor são descartados como
+        inválidos.
+
+        Args:
+            text_content: Texto extraído do documento
+            document_type: Tipo do documento (ex: bank_statement)
+            predefined_categories: Lista de categorias predefinidas, se disponível
+            document_id: ID do documento
+            user_id: ID do usuario
+            stats: Preenchido com o resultado da validação da resposta (opcional)
+            line_references: Usa a extração compacta por referência de linha
+
+        Yields:
+            Transações extraídas
+        """
+        numbered = NumberedText(text_content) if line_references else None
+
+        prompt = self.prompt_engineering.create_extraction_prompt_parts(
+            text_content=numbered.render() if numbered else text_content,
+            document_type=document_type,
+            predefined_categories=predefined_categories,
+            provider=self.prompt_style,
+            line_references=line_references
+        )
+
+        request = AIRequest(
+            prompt=prompt.suffix,
+            cacheable_prefix=prompt.prefix,
+            system_message=EXTRACTION_SYSTEM_MESSAGE,
+            temperature=0.0,  # Determinístico
+            response_schema=extraction_schema(self.prompt_style, line_references),
+            response_schema_name="extracao_transacoes",
+        )
+
+        parser = JSONArrayStreamParser("r" if line_references else "transactions")
+        invalid_items = 0
+
+        async for delta in self.stream_completion(request):
+            for item in parser.feed(delta):
+                try:
+                    if numbered is not None:
+                        fields = numbered.resolve(LINE_REFERENCE_ADAPTER.validate_python(item))
+                    else:
+                        fields = EXTRACTED_TRANSACTION_ADAPTER.validate_python(item).model_dump()
+                        fields["categories"] = self.prompt_engineering.decode_categories(
+                            fields["categories"], predefined_categories
+                        )
+                    yield Transaction(**fields, document_id=document_id, user_id=user_id)
+                except ValueError as e:
+                    # Inclui ValidationError e registros que não conferem com o texto
+                    invalid_items += 1
+                    logger.error(f"Erro ao converter item para Transaction: {str(e)}")
+
+        if not parser.found:
+            logger.error("Não foi possível encontrar JSON na resposta")
+
+        result = "ok" if parser.found and not invalid_items else "invalid"
+        AI_RESPONSE_PARSE.labels(provider=self.name, operation="extraction", result=result).inc()
+
+        if stats is not None:
+            stats.found = parser.found
+            stats.invalid_items = invalid_items
+
+    @track_ai_usage("categorization")
     async def categorize_transactions(
             self,
             transactions: List[Transaction],
@@ -75,7 +360,91 @@ class AIProvider(ABC):
         Returns:
             Mesma lista de transações com categorias atualizadas
         """
-        pass
+        if not transactions:
+            return transactions
+
+        if all(
+                len(transaction.categories) > 0 and not ("" in transaction.categories)
+                for transaction in transactions
+        ):
+            return transactions
+
+        MAX_BATCH_SIZE = 10
+        batches = [
+            transactions[i:i + MAX_BATCH_SIZE]
+            for i in range(0, len(transactions), MAX_BATCH_SIZE)
+        ]
+
+        categorized_transactions = []
+
+        for batch in batches:
+            prompt = self.prompt_engineering.create_categorization_prompt_parts(
+                transactions=batch,
+                predefined_categories=predefined_categories,
+                provider=self.prompt_style
+            )
+
+            request = AIRequest(
+                prompt=prompt.suffix,
+                cacheable_prefix=prompt.prefix,
+                system_message=CATEGORIZATION_SYSTEM_MESSAGE,
+                temperature=0.0,  # Determinístico
+                response_schema=categorization_schema(bool(predefined_categories), self.prompt_style),
+                response_schema_name="categorizacao_transacoes",
+            )
+
+            response = await self.generate_completion(request)
+
+            try:
+                result = self._parse_categorization(response.content)
+            except ValueError as e:
+                logger.error(f"Erro ao processar resposta de categorização: {str(e)}")
+                AI_RESPONSE_PARSE.labels(provider=self.name, operation="categorization", result="invalid").inc()
+                categorized_transactions.extend(batch)
+                continue
+
+            AI_RESPONSE_PARSE.labels(provider=self.name, operation="categorization", result="ok").inc()
+
+            # Resposta compacta: {"r": [{"i": índice, "c": categorias, "p": confiança}]}
+            for item in result.r:
+                if not 0 <= item.i < len(batch):
+                    continue
+
+                batch[item.i].categories = self.prompt_engineering.decode_categories(
+                    item.c, predefined_categories
+                )
+                batch[item.i].confidence_score = item.p
+
+            categorized_transactions.extend(batch)
+
+        return categorized_transactions
+
+    @staticmethod
+    def _parse_categorization(response_text: str) -> CategorizationResult:
+        """
+        Valida a resposta de categorização de um lote.
+
+        Args:
+            response_text: Conteúdo da resposta
+
+        Returns:
+            Resposta validada
+
+        Raises:
+            ValueError: Se a resposta não contiver JSON válido no formato esperado
+        """
+        # Provedores sem saída estruturada podem cercar o JSON com texto
+        json_start = response_text.find('{')
+        json_end = response_text.rfind('}') + 1
+
+        if json_start < 0 or json_end <= json_start:
+            raise ValueError("Não foi possível encontrar JSON na resposta de categorização")
+
+        try:
+            return CATEGORIZATION_ADAPTER.validate_json(response_text[json_start:json_end])
+        except ValueError:
+            # Resposta cortada: aproveita os itens completos
+            return CATEGORIZATION_ADAPTER.validate_json(repair_truncated_json(response_text[json_start:]))
 
     @abstractmethod
     async def generate_completion(self, request: AIRequest) -> AIResponse:
@@ -90,6 +459,23 @@ class AIProvider(ABC):
         """
         pass
 
+    async def stream_completion(self, request: AIRequest) -> AsyncIterator[str]:
+        """
+        Gera uma completion produzindo o texto em pedaços, à medida que o modelo responde.
+
+        A implementação padrão não faz streaming: entrega a resposta de
+        `generate_completion` em um único pedaço. Provedores com suporte a
+        streaming sobrescrevem este método.
+
+        Args:
+            request: Parâmetros da requisição
+
+        Yields:
+            Pedaços do texto da resposta
+        """
+        response = await self.generate_completion(request)
+        yield response.content
+
     @abstractmethod
     def get_cost_per_1k_tokens(self) -> float:
         """
@@ -100,6 +486,227 @@ class AIProvider(ABC):
         """
         pass
 
+    def get_model_price(self, model: Optional[str] = None) -> ModelPrice:
+        """
+        Retorna os preços de entrada e saída de um modelo do provedor.
+
+        Provedores sem tabela de preços usam o custo de `get_cost_per_1k_tokens`
+        para entrada e saída.
+
+        Args:
+            model: Nome do modelo (default: o modelo do provedor)
+
+        Returns:
+            Preços do modelo
+        """
+        cost = self.get_cost_per_1k_tokens()
+        return ModelPrice(input=cost, output=cost)
+
+    def calculate_cost(
+            self,
+            model: Optional[str],
+            input_tokens: int,
+            output_tokens: int,
+            cached_tokens: int = 0,
+            cache_write_tokens: int = 0
+    ) -> float:
+        """
+        Calcula o custo de uma chamada com os preços de entrada e saída do modelo.
+
+        Args:
+            model: Nome do modelo
+            input_tokens: Tokens de entrada, incluindo os lidos e os gravados no cache
+            output_tokens: Tokens de saída
+            cached_tokens: Tokens de entrada lidos do cache de prompt
+            cache_write_tokens: Tokens de entrada gravados no cache de prompt
+
+        Returns:
+            Custo em USD
+        """
+        return self.get_model_price(model).cost(input_tokens, output_tokens, cached_tokens, cache_write_tokens)
+
+    def _continuation_request(self, request: AIRequest, partial: str) -> AIRequest:
+        """
+        Monta a requisição que continua uma resposta cortada.
+
+        A continuação é um fragmento da resposta, não um documento completo:
+        por isso não usa o schema de saída estruturada.
+
+        Args:
+            request: Requisição original
+            partial: Resposta acumulada até o corte
+
+        Returns:
+            Requisição de continuação
+        """
+        return request.model_copy(update={"continuation_of": partial, "response_schema": None})
+
+    async def _complete_with_continuation(
+            self,
+            request: AIRequest,
+            generate: Callable[[AIRequest], Awaitable[AIResponse]]
+    ) -> AIResponse:
+        """
+        Gera uma completion pedindo continuações enquanto a resposta vier cortada.
+
+        Args:
+            request: Parâmetros da requisição
+            generate: Chamada única ao provedor
+
+        Returns:
+            Resposta com os pedaços costurados e o uso somado
+        """
+        response = await generate(request)
+        content = response.content
+        tokens_used, cost, cached_tokens = response.tokens_used, response.cost, response.cached_tokens
+        input_tokens, output_tokens = response.input_tokens, response.output_tokens
+
+        continuations = 0
+        while response.truncated and continuations < self.max_continuations:
+            continuations += 1
+            AI_CONTINUATIONS.labels(provider=self.name).inc()
+            logger.info(f"Resposta de {self.name} cortada em max_tokens, pedindo continuação {continuations}")
+
+            response = await generate(self._continuation_request(request, content))
+            content += stitch_continuation(content, response.content)
+            tokens_used += response.tokens_used
+            cost += response.cost
+            cached_tokens += response.cached_tokens
+            input_tokens += response.input_tokens
+            output_tokens += response.output_tokens
+
+        if response.truncated:
+            logger.warning(f"Resposta de {self.name} ainda cortada após {continuations} continuações")
+
+        return response.model_copy(update={
+            "content": content,
+            "tokens_used": tokens_used,
+            "cost": cost,
+            "cached_tokens": cached_tokens,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+        })
+
+    async def _stream_with_continuation(
+            self,
+            request: AIRequest,
+            stream: Callable[[AIRequest, StreamOutcome], AsyncIterator[str]]
+    ) -> AsyncIterator[str]:
+        """
+        Transmite uma completion e, se ela for cortada em max_tokens, transmite em
+        seguida as continuações, como se fossem uma única resposta.
+
+        O início de cada continuação é retido até `STITCH_WINDOW` caracteres para
+        remover o trecho eventualmente repetido da resposta anterior.
+
+        Args:
+            request: Parâmetros da requisição
+            stream: Streaming único no provedor, que preenche o `StreamOutcome`
+
+        Yields:
+            Pedaços do texto da resposta
+        """
+        parts = []
+        outcome = StreamOutcome()
+
+        async for delta in stream(request, outcome):
+            parts.append(delta)
+            yield delta
+
+        continuations = 0
+        while outcome.truncated and continuations < self.max_continuations:
+            continuations += 1
+            AI_CONTINUATIONS.labels(provider=self.name).inc()
+            logger.info(f"Resposta de {self.name} cortada em max_tokens, pedindo continuação {continuations}")
+
+            previous = "".join(parts)
+            outcome = StreamOutcome()
+            head = ""
+            stitched = False
+
+            async for delta in stream(self._continuation_request(request, previous), outcome):
+                if stitched:
+                    parts.append(delta)
+                    yield delta
+                    continue
+
+                head += delta
+                if len(head) >= STITCH_WINDOW:
+                    stitched = True
+                    head = stitch_continuation(previous, head)
+                    if head:
+                        parts.append(head)
+                        yield head
+
+            if not stitched:
+                head = stitch_continuation(previous, head)
+                if head:
+                    parts.append(head)
+                    yield head
+
+        if outcome.truncated:
+            logger.warning(f"Resposta de {self.name} ainda cortada após {continuations} continuações")
+
+    def estimate_request(self, request: AIRequest) -> TokenEstimate:
+        """
+        Estima tokens de entrada, max_tokens e custo de uma requisição antes da chamada.
+
+        Args:
+            request: Parâmetros da requisição
+
+        Returns:
+            Estimativa calculada com o tokenizador e os preços do provedor e modelo
+        """
+        model = request.model or getattr(self, "model", None)
+        price = self.get_model_price(model)
+
+        return get_tokenizer_service().estimate(
+            prompt=(request.system_message or "") + (request.cacheable_prefix or "") + request.prompt,
+            provider=self.name.lower(),
+            model=model,
+            cost_per_1k_tokens=price.input,
+            max_tokens=request.max_tokens,
+            output_cost_per_1k_tokens=price.output,
+        )
+
+    def record_usage(
+            self,
+            model: str,
+            tokens: int,
+            cost: float,
+            cached_tokens: int = 0,
+            input_tokens: int = 0,
+            output_tokens: int = 0
+    ) -> None:
+        """
+        Registra o uso de uma chamada: chamadas, tokens por tipo e custo nas
+        métricas, com a operação e o tipo de documento do contexto, e no
+        acumulador do contexto atual, se houver.
+
+        Args:
+            model: Modelo da chamada
+            tokens: Tokens consumidos
+            cost: Custo da chamada em USD
+            cached_tokens: Tokens de entrada lidos do cache
+            input_tokens: Tokens de entrada, incluindo os lidos do cache
+            output_tokens: Tokens de saída
+        """
+        labels = current_ai_usage_labels()
+
+        AI_API_CALLS.labels(provider=self.name, operation=labels["operation"]).inc()
+        AI_COST.labels(provider=self.name, **labels).inc(cost)
+
+        for token_type, count in (("input", input_tokens), ("output", output_tokens), ("cached", cached_tokens)):
+            if count:
+                AI_TOKEN_USAGE.labels(provider=self.name, token_type=token_type, **labels).inc(count)
+
+        if cached_tokens:
+            AI_CACHED_TOKENS.labels(provider=self.name, model=model).inc(cached_tokens)
+
+        tracker = _current_usage.get()
+        if tracker is not None:
+            tracker.add(tokens, cost, input_tokens, output_tokens)
+
     @property
     @abstractmethod
     def name(self) -> str:
@@ -110,3 +717,50 @@ class AIProvider(ABC):
             String com o nome do provedor
         """
         pass
+
+
+class AIProviderWrapper(AIProvider):
+    """
+    Base para provedores que envolvem outro provedor e interceptam `generate_completion`
+    e `stream_completion`.
+
+    Nome, custo, estilo de prompt e demais atributos (modelo, cliente, limitador)
+    são delegados ao provedor envolvido; as operações de alto nível da classe
+    base passam pelo `generate_completion` do wrapper.
+    """
+
+    def __init__(self, provider: AIProvider):
+        """
+        Inicializa o wrapper.
+
+        Args:
+            provider: Provedor de IA envolvido
+        """
+        self.provider = provider
+
+    def __getattr__(self, name: str):
+        # Chamado apenas para atributos não definidos no wrapper
+        if name == "provider":
+            raise AttributeError(name)
+        return getattr(self.provider, name)
+
+    @property
+    def prompt_style(self) -> str:
+        return self.provider.prompt_style
+
+    @property
+    def name(self) -> str:
+        return self.provider.name
+
+    def get_cost_per_1k_tokens(self) -> float:
+        return self.provider.get_cost_per_1k_tokens()
+
+    def get_model_price(self, model: Optional[str] = None) -> ModelPrice:
+        return self.provider.get_model_price(model)
+
+    async def generate_completion(self, request: AIRequest) -> AIResponse:
+        return await self.provider.generate_completion(request)
+
+    async def stream_completion(self, request: AIRequest) -> AsyncIterator[str]:
+        async for delta in self.provider.stream_completion(request):
+            yield delta
@@ -0,0 +1,461 @@
+import asyncio
+import itertools
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import httpx
+from pydantic import BaseModel
+
+from financial_document_processor.adapters.ai.ai_provider import AIProvider, AIProviderWrapper, AIRequest, AIResponse
+from financial_document_processor.adapters.ai.claude_provider import ClaudeProvider
+from financial_document_processor.adapters.ai.openai_provider import OpenAIProvider
+from financial_document_processor.utils.metrics import AI_BATCH_DURATION, AI_BATCH_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# Desconto das APIs de lote sobre o preço das chamadas em tempo real
+BATCH_DISCOUNT = 0.5
+
+
+class BatchResult(BaseModel):
+    """
+    Resultado de uma requisição dentro de um lote.
+    """
+    custom_id: str
+    response: Optional[AIResponse] = None
+    error: Optional[str] = None
+
+
+class BatchClient(ABC):
+    """
+    Interface para as APIs de processamento em lote dos provedores.
+
+    As requisições são montadas com os mesmos parâmetros da chamada em tempo
+    real do provedor (mensagens, schema da resposta, max_tokens).
+    """
+
+    def __init__(self, provider: AIProvider, api_key: str, base_url: str, http_client: httpx.AsyncClient):
+        """
+        Inicializa o cliente.
+
+        Args:
+            provider: Provedor usado para montar as requisições e calcular o custo
+            api_key: Chave de API do provedor
+            base_url: URL base da API
+            http_client: Cliente HTTP
+        """
+        self.provider = provider
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.http_client = http_client
+
+    @abstractmethod
+    async def submit(self, requests: Dict[str, AIRequest]) -> str:
+        """
+        Envia um lote de requisições.
+
+        Args:
+            requests: Requisições por identificador (custom_id)
+
+        Returns:
+            ID do lote no provedor
+        """
+        pass
+
+    @abstractmethod
+    async def fetch(self, batch_id: str, requests: Dict[str, AIRequest]) -> Optional[List[BatchResult]]:
+        """
+        Consulta um lote e, se ele terminou, obtém os resultados.
+
+        Args:
+            batch_id: ID do lote no provedor
+            requests: Requisições enviadas no lote, por identificador (custom_id)
+
+        Returns:
+            Resultados do lote, ou None se ainda está em processamento
+
+        Raises:
+            RuntimeError: Se o lote falhou, expirou ou foi cancelado
+        """
+        pass
+
+    def _cost(
+            self, model: str, input_tokens: int, output_tokens: int, cached_tokens: int = 0, cache_write_tokens: int = 0
+    ) -> float:
+        cost = self.provider.calculate_cost(model, input_tokens, output_tokens, cached_tokens, cache_write_tokens)
+        return cost * BATCH_DISCOUNT
+
+    def _model(self, requests: Dict[str, AIRequest], custom_id: str) -> str:
+        """
+        Modelo enviado na requisição, usado no preço como na chamada em tempo real.
+
+        O modelo devolvido no resultado é o snapshot datado (ex.: gpt-4o-mini-2024-07-18),
+        que não está na tabela de preços.
+        """
+        request = requests.get(custom_id)
+        return (request.model if request else None) or self.provider.model
+
+    @staticmethod
+    def _read_jsonl(text: str) -> List[dict]:
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+class OpenAIBatchClient(BatchClient):
+    """
+    Cliente da Batch API da OpenAI (arquivo JSONL de chat completions).
+    """
+
+    # Estados finais de um lote sem resultados
+    _FAILED_STATUSES = ("failed", "expired", "cancelling", "cancelled")
+
+    def __init__(
+            self,
+            provider: OpenAIProvider,
+            api_key: str,
+            http_client: httpx.AsyncClient,
+            base_url: str = "https://api.openai.com/v1",
+            organization_id: Optional[str] = None
+    ):
+        super().__init__(provider, api_key, base_url, http_client)
+        self.headers = {"Authorization": f"Bearer {api_key}"}
+        if organization_id:
+            self.headers["OpenAI-Organization"] = organization_id
+
+    async def submit(self, requests: Dict[str, AIRequest]) -> str:
+        lines = [
+            json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": self._body(request),
+            }, ensure_ascii=False)
+            for custom_id, request in requests.items()
+        ]
+
+        upload = await self.http_client.post(
+            f"{self.base_url}/files",
+            headers=self.headers,
+            data={"purpose": "batch"},
+            files={"file": ("batch.jsonl", "\n".join(lines).encode("utf-8"), "application/jsonl")},
+        )
+        upload.raise_for_status()
+
+        response = await self.http_client.post(
+            f"{self.base_url}/batches",
+            headers=self.headers,
+            json={
+                "input_file_id": upload.json()["id"],
+                "endpoint": "/v1/chat/completions",
+                "completion_window": "24h",
+            },
+        )
+        response.raise_for_status()
+        return response.json()["id"]
+
+    async def fetch(self, batch_id: str, requests: Dict[str, AIRequest]) -> Optional[List[BatchResult]]:
+        response = await self.http_client.get(f"{self.base_url}/batches/{batch_id}", headers=self.headers)
+        response.raise_for_status()
+        batch = response.json()
+
+        if batch["status"] in self._FAILED_STATUSES:
+            raise RuntimeError(f"Lote {batch_id} terminou com status {batch['status']}")
+        if batch["status"] != "completed":
+            return None
+
+        results = []
+        # Requisições com erro ficam no arquivo de erros, separado do arquivo de saída
+        for file_id in (batch.get("output_file_id"), batch.get("error_file_id")):
+            if not file_id:
+                continue
+
+            content = await self.http_client.get(f"{self.base_url}/files/{file_id}/content", headers=self.headers)
+            content.raise_for_status()
+            results.extend(self._result(line, requests) for line in self._read_jsonl(content.text))
+
+        return results
+
+    def _body(self, request: AIRequest) -> dict:
+        """Corpo da chat completion, igual ao da chamada em tempo real."""
+        body = {
+            "model": request.model or self.provider.model,
+            "messages": self.provider._build_messages(request),
+            "temperature": request.temperature,
+            "max_tokens": self.provider.estimate_request(request).max_tokens,
+            **self.provider._response_format_params(request),
+        }
+        if request.stop_sequences:
+            body["stop"] = request.stop_sequences
+        return body
+
+    def _result(self, line: dict, requests: Dict[str, AIRequest]) -> BatchResult:
+        response = line.get("response") or {}
+        if line.get("error") or response.get("status_code") != 200:
+            error = line.get("error") or (response.get("body") or {}).get("error")
+            return BatchResult(custom_id=line["custom_id"], error=str(error))
+
+        body = response["body"]
+        usage = body["usage"]
+        cached_tokens = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+        model = self._model(requests, line["custom_id"])
+
+        return BatchResult(custom_id=line["custom_id"], response=AIResponse(
+            content=body["choices"][0]["message"]["content"],
+            model=model,
+            tokens_used=usage["prompt_tokens"] + usage["completion_tokens"],
+            cost=self._cost(model, usage["prompt_tokens"], usage["completion_tokens"], cached_tokens),
+            cached_tokens=cached_tokens,
+            input_tokens=usage["prompt_tokens"],
+            output_tokens=usage["completion_tokens"],
+        ))
+
+
+class ClaudeBatchClient(BatchClient):
+    """
+    Cliente da Message Batches API da Anthropic.
+    """
+
+    def __init__(
+            self,
+            provider: ClaudeProvider,
+            api_key: str,
+            http_client: httpx.AsyncClient,
+            base_url: str = "https://api.anthropic.com/v1"
+    ):
+        super().__init__(provider, api_key, base_url, http_client)
+        self.headers = {"x-api-key": api_key, "anthropic-version": "2023-06-01"}
+
+    async def submit(self, requests: Dict[str, AIRequest]) -> str:
+        response = await self.http_client.post(
+            f"{self.base_url}/messages/batches",
+            headers=self.headers,
+            json={"requests": [
+                {"custom_id": custom_id, "params": self._params(request)}
+                for custom_id, request in requests.items()
+            ]},
+        )
+        response.raise_for_status()
+        return response.json()["id"]
+
+    async def fetch(self, batch_id: str, requests: Dict[str, AIRequest]) -> Optional[List[BatchResult]]:
+        response = await self.http_client.get(f"{self.base_url}/messages/batches/{batch_id}", headers=self.headers)
+        response.raise_for_status()
+        batch = response.json()
+
+        if batch["processing_status"] != "ended":
+            return None
+        if not batch.get("results_url"):
+            raise RuntimeError(f"Lote {batch_id} terminou sem resultados")
+
+        content = await self.http_client.get(batch["results_url"], headers=self.headers)
+        content.raise_for_status()
+        return [self._result(line, requests) for line in self._read_jsonl(content.text)]
+
+    def _params(self, request: AIRequest) -> dict:
+        """Parâmetros da mensagem, iguais aos da chamada em tempo real."""
+        messages, system = self.provider._build_messages(request)
+        params = {
+            "model": request.model or self.provider.model,
+            "messages": messages,
+            "system": system,
+            "temperature": request.temperature,
+            "max_tokens": self.provider.estimate_request(request).max_tokens,
+            **self.provider._tool_params(request),
+        }
+        if request.stop_sequences:
+            params["stop_sequences"] = request.stop_sequences
+        return params
+
+    def _result(self, line: dict, requests: Dict[str, AIRequest]) -> BatchResult:
+        result = line.get("result") or {}
+        if result.get("type") != "succeeded":
+            return BatchResult(custom_id=line["custom_id"], error=str(result.get("error") or result.get("type")))
+
+        message = result["message"]
+        usage = message["usage"]
+        cached_tokens = usage.get("cache_read_input_tokens") or 0
+        cache_creation_tokens = usage.get("cache_creation_input_tokens") or 0
+        input_tokens = usage["input_tokens"] + cached_tokens + cache_creation_tokens
+        model = self._model(requests, line["custom_id"])
+
+        # Mesmo critério da chamada em tempo real: input da ferramenta em JSON ou o texto
+        content = next(
+            (json.dumps(block["input"], ensure_ascii=False)
+             for block in message["content"] if block.get("type") == "tool_use"),
+            message["content"][0].get("text", "") if message["content"] else ""
+        )
+
+        return BatchResult(custom_id=line["custom_id"], response=AIResponse(
+            content=content,
+            model=model,
+            tokens_used=input_tokens + usage["output_tokens"],
+            cost=self._cost(model, input_tokens, usage["output_tokens"], cached_tokens, cache_creation_tokens),
+            cached_tokens=cached_tokens,
+            input_tokens=input_tokens,
+            output_tokens=usage["output_tokens"],
+        ))
+
+
+def create_batch_client(
+        provider: AIProvider,
+        api_key: str,
+        http_client: httpx.AsyncClient,
+        base_url: Optional[str] = None,
+        organization_id: Optional[str] = None
+) -> BatchClient:
+    """
+    Cria o cliente da API de lotes do provedor.
+
+    Args:
+        provider: Provedor de IA (OpenAI ou Claude)
+        api_key: Chave de API do provedor
+        http_client: Cliente HTTP
+        base_url: URL base da API (default: a API oficial do provedor)
+        organization_id: ID da organização para OpenAI (opcional)
+
+    Returns:
+        Cliente da API de lotes
+
+    Raises:
+        ValueError: Se o provedor não tiver API de lotes suportada
+    """
+    if isinstance(provider, OpenAIProvider):
+        kwargs = {"base_url": base_url} if base_url else {}
+        return OpenAIBatchClient(provider, api_key, http_client, organization_id=organization_id, **kwargs)
+
+    if isinstance(provider, ClaudeProvider):
+        kwargs = {"base_url": base_url} if base_url else {}
+        return ClaudeBatchClient(provider, api_key, http_client, **kwargs)
+
+    raise ValueError(f"Processamento em lote não suportado para o provedor {provider.name}")
+
+
+class BatchAIProvider(AIProviderWrapper):
+    """
+    Provedor que envia as chamadas pela API de lotes em vez da API em tempo real.
+
+    Cada chamada fica pendente até o lote ser enviado: o lote é fechado quando
+    atinge `max_batch_requests` ou quando nenhuma chamada nova chega por
+    `flush_delay` segundos. As operações de alto nível (extração, categorização)
+    funcionam sem alterações, apenas aguardando o resultado do lote. Indicado para
+    reprocessamentos em massa: custa menos e não disputa a cota do tráfego em tempo real.
+    """
+
+    def __init__(
+            self,
+            provider: AIProvider,
+            client: BatchClient,
+            max_batch_requests: int = 10000,
+            flush_delay: float = 5.0,
+            poll_interval: float = 60.0
+    ):
+        """
+        Inicializa o provedor em lote.
+
+        Args:
+            provider: Provedor de IA envolvido
+            client: Cliente da API de lotes do provedor
+            max_batch_requests: Número máximo de requisições por lote
+            flush_delay: Segundos sem chamadas novas antes de enviar o lote
+            poll_interval: Intervalo (segundos) entre consultas ao lote enviado
+        """
+        super().__init__(provider)
+        self.client = client
+        self.max_batch_requests = max_batch_requests
+        self.flush_delay = flush_delay
+        self.poll_interval = poll_interval
+        self._ids = itertools.count(1)
+        self._pending: Dict[str, Tuple[AIRequest, asyncio.Future]] = {}
+        self._last_enqueued = 0.0
+        self._timer: Optional[asyncio.Task] = None
+        self._batches = set()
+
+    async def generate_completion(self, request: AIRequest) -> AIResponse:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        self._pending[f"req-{next(self._ids)}"] = (request, future)
+        self._last_enqueued = loop.time()
+
+        if len(self._pending) >= self.max_batch_requests:
+            self._flush()
+        elif self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._flush_when_idle())
+
+        response = await future
+        self.record_usage(
+            response.model,
+            response.tokens_used,
+            response.cost,
+            response.cached_tokens,
+            response.input_tokens,
+            response.output_tokens
+        )
+        return response
+
+    async def stream_completion(self, request: AIRequest) -> AsyncIterator[str]:
+        # A API de lotes não tem streaming: a resposta chega inteira quando o lote termina
+        response = await self.generate_completion(request)
+        yield response.content
+
+    async def _flush_when_idle(self) -> None:
+        """Envia o lote pendente quando as chamadas param de chegar."""
+        loop = asyncio.get_running_loop()
+
+        while self._pending:
+            delay = self._last_enqueued + self.flush_delay - loop.time()
+            if delay <= 0:
+                self._flush()
+                return
+            await asyncio.sleep(delay)
+
+    def _flush(self) -> None:
+        """Fecha o lote pendente e inicia seu envio em segundo plano."""
+        pending, self._pending = self._pending, {}
+
+        task = asyncio.create_task(self._run_batch(pending))
+        self._batches.add(task)
+        task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, pending: Dict[str, Tuple[AIRequest, asyncio.Future]]) -> None:
+        """Envia um lote, aguarda sua conclusão e entrega os resultados às chamadas."""
+        started = time.monotonic()
+
+        try:
+            requests = {custom_id: request for custom_id, (request, _) in pending.items()}
+            batch_id = await self.client.submit(requests)
+            logger.info(f"Lote {batch_id} enviado para {self.name} com {len(pending)} requisições")
+
+            results = await self.client.fetch(batch_id, requests)
+            while results is None:
+                await asyncio.sleep(self.poll_interval)
+                results = await self.client.fetch(batch_id, requests)
+
+        except Exception as e:
+            logger.error(f"Erro no processamento em lote em {self.name}: {str(e)}")
+            AI_BATCH_REQUESTS.labels(provider=self.name, result="failed").inc(len(pending))
+            for _, future in pending.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        AI_BATCH_DURATION.labels(provider=self.name).observe(time.monotonic() - started)
+        logger.info(f"Lote {batch_id} concluído em {time.monotonic() - started:.0f}s")
+
+        by_id = {result.custom_id: result for result in results}
+
+        for custom_id, (_, future) in pending.items():
+            result = by_id.get(custom_id)
+
+            if result is None or result.response is None:
+                AI_BATCH_REQUESTS.labels(provider=self.name, result="failed").inc()
+                error = result.error if result is not None else "ausente nos resultados"
+                if not future.done():
+                    future.set_exception(RuntimeError(f"Requisição {custom_id} do lote {batch_id} falhou: {error}"))
+                continue
+
+            AI_BATCH_REQUESTS.labels(provider=self.name, result="succeeded").inc()
+            if not future.done():
+                future.set_result(result.response)
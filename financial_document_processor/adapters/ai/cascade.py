@@ -0,0 +1,179 @@
+import logging
+import re
+from typing import AsyncIterator, List, Optional
+
+from financial_document_processor.adapters.ai.ai_provider import AIProvider, AIProviderWrapper, ExtractionStats
+from financial_document_processor.domain.transaction import Transaction
+from financial_document_processor.utils.metrics import AI_CASCADE_DECISIONS
+
+logger = logging.getLogger(__name__)
+
+# Valores monetários com centavos, com ou sem separador de milhar (1.500,00 / 1,500.00 / 150.25)
+_AMOUNT_PATTERN = re.compile(r"\d{1,3}(?:[.,\s]\d{3})*[.,]\d{2}(?!\d)|\d+[.,]\d{2}(?!\d)")
+
+
+class CascadeAIProvider(AIProviderWrapper):
+    """
+    Provedor em cascata: usa primeiro um modelo barato e rápido e escala para o
+    modelo principal apenas quando a resposta não é confiável.
+
+    Um trecho é reprocessado no modelo principal se a resposta do modelo barato
+    falhar na validação do schema, se alguma transação tiver confiança abaixo do
+    limiar, se algum valor extraído não aparecer no texto do trecho ou se nenhuma
+    transação for extraída de um trecho com valores. Na
+    categorização, apenas as transações sem categoria ou com confiança baixa
+    são enviadas ao modelo principal.
+
+    As demais chamadas (ex: `generate_completion`) vão direto ao modelo principal.
+    """
+
+    def __init__(self, fast_provider: AIProvider, provider: AIProvider, confidence_threshold: float = 0.7):
+        """
+        Inicializa a cascata.
+
+        Args:
+            fast_provider: Provedor com o modelo barato, tentado primeiro
+            provider: Provedor com o modelo principal, usado na escalada
+            confidence_threshold: Confiança mínima para aceitar a resposta do modelo barato
+        """
+        super().__init__(provider)
+        self.fast_provider = fast_provider
+        self.confidence_threshold = confidence_threshold
+
+    async def stream_transactions(
+            self,
+            text_content: str,
+            document_type: str,
+            predefined_categories: Optional[List[str]] = None,
+            document_id: int = 0,
+            user_id: int = 0,
+            stats: Optional[ExtractionStats] = None,
+            line_references: bool = False,
+    ) -> AsyncIterator[Transaction]:
+        # A resposta do modelo barato precisa ser avaliada por inteiro antes de ser entregue
+        fast_stats = ExtractionStats()
+        transactions = [
+            tx async for tx in self.fast_provider.stream_transactions(
+                text_content=text_content,
+                document_type=document_type,
+                predefined_categories=predefined_categories,
+                document_id=document_id,
+                user_id=user_id,
+                stats=fast_stats,
+                line_references=line_references
+            )
+        ]
+
+        outcome = self._extraction_outcome(text_content, transactions, fast_stats)
+        AI_CASCADE_DECISIONS.labels(provider=self.name, operation="extraction", outcome=outcome).inc()
+
+        if outcome == "accepted":
+            if stats is not None:
+                stats.found, stats.invalid_items = fast_stats.found, fast_stats.invalid_items
+            for tx in transactions:
+                yield tx
+            return
+
+        logger.info(f"Escalando extração para {getattr(self.provider, 'model', self.name)}: {outcome}")
+
+        async for tx in self.provider.stream_transactions(
+                text_content=text_content,
+                document_type=document_type,
+                predefined_categories=predefined_categories,
+                document_id=document_id,
+                user_id=user_id,
+                stats=stats,
+                line_references=line_references
+        ):
+            yield tx
+
+    async def categorize_transactions(
+            self,
+            transactions: List[Transaction],
+            predefined_categories: Optional[List[str]] = None
+    ) -> List[Transaction]:
+        # Transações que já chegam categorizadas não passam pela cascata
+        uncategorized = [tx for tx in transactions if not tx.categories or "" in tx.categories]
+        if not uncategorized:
+            return transactions
+
+        await self.fast_provider.categorize_transactions(uncategorized, predefined_categories)
+
+        pending = [tx for tx in uncategorized if not self._categorization_accepted(tx)]
+
+        AI_CASCADE_DECISIONS.labels(provider=self.name, operation="categorization", outcome="accepted").inc(
+            len(uncategorized) - len(pending)
+        )
+        if not pending:
+            return transactions
+
+        AI_CASCADE_DECISIONS.labels(provider=self.name, operation="categorization", outcome="low_confidence").inc(
+            len(pending)
+        )
+        logger.info(
+            f"Escalando categorização de {len(pending)} transações para "
+            f"{getattr(self.provider, 'model', self.name)}"
+        )
+
+        # As transações pendentes são alteradas no lugar pelo provedor principal
+        for tx in pending:
+            tx.categories = []
+        await self.provider.categorize_transactions(pending, predefined_categories)
+
+        return transactions
+
+    def _extraction_outcome(
+            self, text_content: str, transactions: List[Transaction], stats: ExtractionStats
+    ) -> str:
+        """Decide se a extração do modelo barato é aceita ou o motivo da escalada."""
+        if not stats.valid:
+            return "invalid"
+
+        if any(
+                tx.confidence_score is not None and tx.confidence_score < self.confidence_threshold
+                for tx in transactions
+        ):
+            return "low_confidence"
+
+        if not self._amounts_reconcile(text_content, transactions):
+            return "unreconciled"
+
+        return "accepted"
+
+    def _categorization_accepted(self, transaction: Transaction) -> bool:
+        """Verifica se a categorização do modelo barato pode ser mantida."""
+        if not transaction.categories:
+            return False
+        return transaction.confidence_score is None or transaction.confidence_score >= self.confidence_threshold
+
+    @staticmethod
+    def _amounts_reconcile(text_content: str, transactions: List[Transaction]) -> bool:
+        """
+        Confere se todos os valores extraídos aparecem no texto do trecho.
+
+        Os valores são comparados em centavos, ignorando separadores, para aceitar
+        tanto o formato brasileiro quanto o americano. Trechos sem valores
+        reconhecíveis não são conferidos; trechos com valores e nenhuma transação
+        extraída não conferem.
+
+        Args:
+            text_content: Texto do trecho
+            transactions: Transações extraídas
+
+        Returns:
+            True se os valores conferem
+        """
+        amounts_in_text = {
+            int(re.sub(r"\D", "", match)) for match in _AMOUNT_PATTERN.findall(text_content)
+        }
+        if not amounts_in_text:
+            return True
+
+        # Resposta vazia para um trecho com valores: o modelo barato pode ter desistido
+        if not transactions:
+            return False
+
+        return all(
+            int((abs(tx.amount) * 100).to_integral_value()) in amounts_in_text
+            for tx in transactions
+        )
@@ -0,0 +1,214 @@
+import logging
+import time
+from collections import deque
+from enum import Enum
+from typing import AsyncIterator, Optional
+
+from financial_document_processor.adapters.ai.ai_provider import AIProvider, AIProviderWrapper, AIRequest, AIResponse
+from financial_document_processor.utils.metrics import AI_CIRCUIT_REJECTED, AI_CIRCUIT_STATE
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitState(str, Enum):
+    """Estados do circuit breaker."""
+    CLOSED = "closed"
+    HALF_OPEN = "half_open"
+    OPEN = "open"
+
+
+# Valor de cada estado no gauge de métricas
+_STATE_VALUES = {CircuitState.CLOSED: 0, CircuitState.HALF_OPEN: 1, CircuitState.OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """Chamada recusada porque o circuito do provedor está aberto."""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker guiado pela taxa de chamadas ruins em uma janela recente.
+
+    Uma chamada é ruim se falha ou se demora mais que `slow_call_seconds` (no
+    streaming, até o primeiro pedaço). Com o circuito fechado, quando a fração de
+    chamadas ruins atinge `failure_rate_threshold` (com ao menos `min_calls` na
+    janela), o circuito abre e recusa chamadas por
+    `open_seconds`. Depois disso fica meio-aberto: deixa passar uma chamada de
+    teste, que fecha o circuito se for boa ou o reabre se for ruim.
+    """
+
+    def __init__(
+            self,
+            failure_rate_threshold: float = 0.5,
+            slow_call_seconds: float = 30.0,
+            open_seconds: float = 30.0,
+            window: int = 20,
+            min_calls: int = 5
+    ):
+        """
+        Inicializa o circuit breaker.
+
+        Args:
+            failure_rate_threshold: Fração de chamadas ruins que abre o circuito
+            slow_call_seconds: Latência a partir da qual uma chamada bem-sucedida conta como ruim
+            open_seconds: Tempo que o circuito fica aberto antes de testar o provedor
+            window: Número de chamadas recentes consideradas
+            min_calls: Chamadas mínimas na janela antes de avaliar a taxa
+        """
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.min_calls = min_calls
+        self._outcomes = deque(maxlen=window)
+        self._state = CircuitState.CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> CircuitState:
+        if self._state == CircuitState.OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = CircuitState.HALF_OPEN
+        return self._state
+
+    def allow_request(self) -> bool:
+        """
+        Verifica se uma chamada pode seguir; no estado meio-aberto reserva a chamada de teste.
+
+        Returns:
+            True se a chamada pode ser feita
+        """
+        state = self.state
+        if state == CircuitState.CLOSED:
+            return True
+        if state == CircuitState.HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self, latency: float) -> None:
+        self._record(latency > self.slow_call_seconds)
+
+    def record_failure(self) -> None:
+        self._record(True)
+
+    def release(self) -> None:
+        """Libera a chamada de teste que terminou sem resultado (ex: cancelada)."""
+        self._trial_in_flight = False
+
+    def _record(self, bad: bool) -> None:
+        if self._state == CircuitState.HALF_OPEN:
+            self._trial_in_flight = False
+            if bad:
+                self._open()
+            else:
+                self._state = CircuitState.CLOSED
+                self._outcomes.clear()
+            return
+
+        self._outcomes.append(bad)
+        if (
+                self._state == CircuitState.CLOSED
+                and len(self._outcomes) >= self.min_calls
+                and sum(self._outcomes) / len(self._outcomes) >= self.failure_rate_threshold
+        ):
+            self._open()
+
+    def _open(self) -> None:
+        self._state = CircuitState.OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+
+
+class CircuitBreakerAIProvider(AIProviderWrapper):
+    """
+    Provedor protegido por um circuit breaker próprio (um por provedor e modelo).
+
+    Com o circuito aberto as chamadas falham imediatamente com `CircuitOpenError`,
+    sem passar pelas novas tentativas do provedor; com failover configurado, a
+    chamada segue para o próximo provedor.
+    """
+
+    def __init__(self, provider: AIProvider, breaker: Optional[CircuitBreaker] = None):
+        """
+        Inicializa o provedor protegido.
+
+        Args:
+            provider: Provedor de IA envolvido
+            breaker: Circuit breaker (default: configuração padrão)
+        """
+        super().__init__(provider)
+        self.breaker = breaker or CircuitBreaker()
+        self._report_state()
+
+    async def generate_completion(self, request: AIRequest) -> AIResponse:
+        self._check()
+
+        started = time.monotonic()
+        try:
+            response = await self.provider.generate_completion(request)
+        except Exception:
+            self._record_failure()
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+
+        self._record_success(time.monotonic() - started)
+        return response
+
+    async def stream_completion(self, request: AIRequest) -> AsyncIterator[str]:
+        self._check()
+
+        # A lentidão é medida até o primeiro pedaço: o restante do stream depende do
+        # tamanho da resposta e do ritmo de quem consome. O resultado só é registrado
+        # no fim do stream, para que falhas no meio dele também contem.
+        started = time.monotonic()
+        first_chunk_latency: Optional[float] = None
+        try:
+            async for delta in self.provider.stream_completion(request):
+                if first_chunk_latency is None:
+                    first_chunk_latency = time.monotonic() - started
+                yield delta
+        except Exception:
+            self._record_failure()
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+
+        self._record_success(
+            first_chunk_latency if first_chunk_latency is not None else time.monotonic() - started
+        )
+
+    def _check(self) -> None:
+        """Recusa a chamada se o circuito estiver aberto."""
+        allowed = self.breaker.allow_request()
+        self._report_state()
+
+        if not allowed:
+            AI_CIRCUIT_REJECTED.labels(provider=self.name, model=self._model_label()).inc()
+            raise CircuitOpenError(f"Circuito aberto para {self.name} ({self._model_label()})")
+
+    def _record_success(self, latency: float) -> None:
+        previous = self.breaker.state
+        self.breaker.record_success(latency)
+        self._after_record(previous)
+
+    def _record_failure(self) -> None:
+        previous = self.breaker.state
+        self.breaker.record_failure()
+        self._after_record(previous)
+
+    def _after_record(self, previous: CircuitState) -> None:
+        """Atualiza a métrica e registra as mudanças de estado do circuito."""
+        self._report_state()
+
+        state = self.breaker.state
+        if state != previous:
+            logger.warning(f"Circuito de {self.name} ({self._model_label()}): {previous.value} -> {state.value}")
+
+    def _report_state(self) -> None:
+        AI_CIRCUIT_STATE.labels(provider=self.name, model=self._model_label()).set(_STATE_VALUES[self.breaker.state])
+
+    def _model_label(self) -> str:
+        return getattr(self.provider, "model", None) or ""
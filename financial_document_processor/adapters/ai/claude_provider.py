@@ -1,27 +1,42 @@
 import json
 import logging
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional, Tuple
 
 import anthropic
+import httpx
 from tenacity import retry, stop_after_attempt, wait_exponential
 
-from financial_document_processor.adapters.ai.ai_provider import AIProvider, AIRequest, AIResponse
-from financial_document_processor.domain.transaction import Transaction
+from financial_document_processor.adapters.ai.ai_provider import AIProvider, AIRequest, AIResponse, StreamOutcome
+from financial_document_processor.adapters.ai.pricing import ModelPrice, get_model_price
+from financial_document_processor.adapters.ai.rate_limiter import RateLimiter, get_rate_limiter, wait_rate_limit_aware
 from financial_document_processor.services.prompt_engineering import PromptEngineering
+from financial_document_processor.utils.tokenizer import TokenEstimate, get_tokenizer_service
 
 logger = logging.getLogger(__name__)
 
+# Preços usados para modelos fora da tabela
+DEFAULT_PRICE = ModelPrice(input=0.015, output=0.075)
+
+# Tamanho mínimo (tokens) do prefixo para a Anthropic gravar o cache de prompt;
+# abaixo disso o cache_control é ignorado pela API
+MIN_CACHEABLE_TOKENS = 1024
+MIN_CACHEABLE_TOKENS_HAIKU = 2048
+
 
 class ClaudeProvider(AIProvider):
     """
     Implementação do provedor de IA para Anthropic Claude.
     """
 
+    prompt_style = "claude"
+
     def __init__(
             self,
             api_key: str,
             model: str = "claude-3-opus-20240229",
-            max_retries: int = 3
+            max_retries: int = 3,
+            http_client: Optional[httpx.AsyncClient] = None,
+            rate_limiter: Optional[RateLimiter] = None
     ):
         """
         Inicializa o provedor Claude.
@@ -30,206 +45,266 @@ class ClaudeProvider(AIProvider):
             api_key: Chave de API da Anthropic
             model: Modelo a ser utilizado (default: claude-3-opus-20240229)
             max_retries: Número máximo de tentativas para chamadas de API
+            http_client: Cliente HTTP compartilhado (opcional)
+            rate_limiter: Limitador de RPM/TPM (default: limitador compartilhado do modelo)
         """
-        self.client = anthropic.Anthropic(api_key=api_key)
+        # Os 429 são tratados pelo RateLimiter, não pelas tentativas internas do SDK
+        self.client = anthropic.AsyncAnthropic(api_key=api_key, http_client=http_client, max_retries=0)
         self.model = model
+        self.rate_limiter = rate_limiter or get_rate_limiter("claude", model)
         self.max_retries = max_retries
         self.prompt_engineering = PromptEngineering()
 
-        # Mapeamento de modelos para custos (USD por 1000 tokens)
-        # Valores aproximados..
-        self._costs = {
-            "claude-3-opus-20240229": 0.015,  # $0.015 por 1K tokens
-            "claude-3-sonnet-20240229": 0.003,  # $0.003 por 1K tokens
-            "claude-3-haiku-20240307": 0.00025  # $0.00025 por 1K tokens
-        }
-
     @property
     def name(self) -> str:
         return "Claude"
 
     def get_cost_per_1k_tokens(self) -> float:
-        return self._costs.get(self.model, 0.015)  # Default se o modelo não estiver no dict
+        # Preço de entrada; o custo das chamadas usa os preços de entrada e saída separados
+        return self.get_model_price().input
+
+    def get_model_price(self, model: Optional[str] = None) -> ModelPrice:
+        return get_model_price(model or self.model, DEFAULT_PRICE)
+
+    def _build_messages(self, request: AIRequest) -> Tuple[List[dict], str]:
+        """Monta as mensagens e o system prompt a partir da requisição."""
+        if request.cacheable_prefix and self._is_cacheable(request):
+            # Marca o fim do prefixo estático como ponto de cache
+            content = [
+                {
+                    "type": "text",
+                    "text": request.cacheable_prefix,
+                    "cache_control": {"type": "ephemeral"}
+                },
+                {"type": "text", "text": request.prompt},
+            ]
+        else:
+            content = (request.cacheable_prefix or "") + request.prompt
+
+        messages = [{"role": "user", "content": content}]
+
+        if request.continuation_of:
+            # Pré-preenche a resposta com o trecho já gerado; o Claude continua do ponto de corte.
+            # A API recusa uma mensagem final do assistente terminada em espaço
+            messages.append({"role": "assistant", "content": request.continuation_of.rstrip()})
+
+        if request.system_message:
+            system = request.system_message
+        else:
+            system = "Você é um assistente útil especializado em processamento de documentos financeiros."
+
+        return messages, system
+
+    def _is_cacheable(self, request: AIRequest) -> bool:
+        """
+        Verifica se o prefixo cacheável atinge o mínimo de tokens do cache de prompt.
+
+        O trecho cacheado inclui as ferramentas e o system prompt, que vêm antes das mensagens.
+        """
+        model = request.model or self.model
+        minimum = MIN_CACHEABLE_TOKENS_HAIKU if "haiku" in model else MIN_CACHEABLE_TOKENS
+        tools = self._tool_params(request).get("tools")
+        prefix = (request.system_message or "") + (json.dumps(tools) if tools else "") + request.cacheable_prefix
+
+        return get_tokenizer_service().count_tokens(prefix, "claude", model) >= minimum
+
+    @staticmethod
+    def _tool_params(request: AIRequest) -> dict:
+        """
+        Parâmetros de tool use que forçam a resposta no schema da requisição.
+
+        O Claude não tem um modo JSON nativo: a resposta estruturada é obtida
+        obrigando o modelo a chamar uma ferramenta cujo input é o schema.
+        """
+        if not request.response_schema:
+            return {}
+
+        return {
+            "tools": [{
+                "name": request.response_schema_name,
+                "description": "Registra a resposta no formato estruturado solicitado.",
+                "input_schema": request.response_schema,
+            }],
+            "tool_choice": {"type": "tool", "name": request.response_schema_name},
+        }
+
+    @staticmethod
+    def _response_text(response) -> str:
+        """Obtém o conteúdo da resposta: o input da ferramenta, em JSON, ou o texto."""
+        for block in response.content:
+            if getattr(block, "type", None) == "tool_use":
+                return json.dumps(block.input, ensure_ascii=False)
+
+        return response.content[0].text
 
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=2, max=10)
-    )
     async def generate_completion(self, request: AIRequest) -> AIResponse:
         """
         Gera uma completion usando a API da Anthropic.
 
+        Respostas cortadas em max_tokens são completadas com requisições de continuação.
+
         Args:
             request: Objeto com os parâmetros da requisição
 
         Returns:
             Objeto AIResponse com a resposta
         """
+        return await self._complete_with_continuation(request, self._generate)
+
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_rate_limit_aware(wait_exponential(multiplier=1, min=2, max=10))
+    )
+    async def _generate(self, request: AIRequest) -> AIResponse:
+        """Faz uma única chamada à API da Anthropic."""
         try:
-            messages = [{"role": "user", "content": request.prompt}]
-
-            if request.system_message:
-                system = request.system_message
-            else:
-                system = "Você é um assistente útil especializado em processamento de documentos financeiros."
-
-            response = self.client.messages.create(
-                model=request.model or self.model,
-                messages=messages,
-                system=system,
-                temperature=request.temperature,
-                max_tokens=request.max_tokens or 4096,
-                stop_sequences=request.stop_sequences or [],
+            messages, system = self._build_messages(request)
+
+            estimate = self.estimate_request(request)
+            logger.debug(
+                f"Chamada Claude estimada em {estimate.prompt_tokens} tokens de entrada "
+                f"(~${estimate.estimated_cost:.4f})"
             )
 
-            # Calcula o custo aproximado
-            input_tokens = response.usage.input_tokens
-            output_tokens = response.usage.output_tokens
-            total_tokens = input_tokens + output_tokens
-            cost = (total_tokens / 1000) * self.get_cost_per_1k_tokens()
+            async with self.rate_limiter.reserve(estimate.expected_total_tokens) as reservation:
+                raw_response = await self.client.messages.with_raw_response.create(
+                    model=request.model or self.model,
+                    messages=messages,
+                    system=system,
+                    temperature=request.temperature,
+                    max_tokens=estimate.max_tokens,
+                    stop_sequences=request.stop_sequences or [],
+                    **self._tool_params(request),
+                )
+                response = raw_response.parse()
+
+                # Tokens lidos do cache e gravados no cache não entram em input_tokens
+                cached_tokens = getattr(response.usage, "cache_read_input_tokens", None) or 0
+                cache_creation_tokens = getattr(response.usage, "cache_creation_input_tokens", None) or 0
+                input_tokens = response.usage.input_tokens + cached_tokens + cache_creation_tokens
+                output_tokens = response.usage.output_tokens
+                total_tokens = input_tokens + output_tokens
+
+                reservation.headers = raw_response.headers
+                reservation.actual_tokens = total_tokens
+
+            cost = self.calculate_cost(
+                request.model or self.model, input_tokens, output_tokens, cached_tokens, cache_creation_tokens
+            )
 
-            return AIResponse(
-                content=response.content[0].text,
+            ai_response = AIResponse(
+                content=self._response_text(response),
                 model=self.model,
                 tokens_used=total_tokens,
-                cost=cost
+                cost=cost,
+                cached_tokens=cached_tokens,
+                truncated=response.stop_reason == "max_tokens",
+                input_tokens=input_tokens,
+                output_tokens=output_tokens
+            )
+            self.record_usage(
+                ai_response.model,
+                ai_response.tokens_used,
+                ai_response.cost,
+                ai_response.cached_tokens,
+                ai_response.input_tokens,
+                ai_response.output_tokens
             )
 
+            return ai_response
+
         except Exception as e:
             logger.error(f"Erro na chamada para Claude: {str(e)}")
             raise
 
-    async def extract_transactions(
-            self,
-            text_content: str,
-            document_type: str,
-            predefined_categories: Optional[List[str]] = None,
-            document_id: int = 0,
-            user_id: int = 0,
-    ) -> List[Transaction]:
+    async def stream_completion(self, request: AIRequest) -> AsyncIterator[str]:
         """
-        Extrai transações de um documento utilizando o Claude.
+        Gera uma completion em streaming usando a API da Anthropic.
+
+        Respostas cortadas em max_tokens seguem no mesmo stream com as continuações.
 
         Args:
-            text_content: Texto extraído do documento
-            document_type: Tipo do documento
-            predefined_categories: Lista de categorias predefinidas (opcional)
-            document_id: ID do documento
-            user_id: ID do usuario
+            request: Objeto com os parâmetros da requisição
 
-        Returns:
-            Lista de objetos Transaction
+        Yields:
+            Pedaços do texto da resposta
         """
-        prompt = self.prompt_engineering.create_extraction_prompt(
-            text_content=text_content,
-            document_type=document_type,
-            predefined_categories=predefined_categories,
-            provider="claude"
-        )
+        async for delta in self._stream_with_continuation(request, self._stream):
+            yield delta
 
-        request = AIRequest(
-            prompt=prompt,
-            system_message="Você é um assistente especializado em extrair transações financeiras de documentos bancários. Forneça apenas o JSON solicitado sem explicações adicionais.",
-            temperature=0.0,  # Mais preciso
-        )
+    async def _stream(self, request: AIRequest, outcome: StreamOutcome) -> AsyncIterator[str]:
+        """Faz um único streaming na API da Anthropic, registrando como ele terminou."""
+        estimate = self.estimate_request(request)
+        stream = await self._open_stream(request, estimate)
 
-        response = await self.generate_completion(request)
+        input_tokens = 0
+        output_tokens = 0
+        cached_tokens = 0
+        cache_creation_tokens = 0
 
         try:
-            response_text = response.content
-            json_start = response_text.find('{')
-            json_end = response_text.rfind('}') + 1
-
-            if json_start >= 0 and json_end > json_start:
-                json_data = response_text[json_start:json_end]
-                parsed_data = json.loads(json_data)
-
-                transactions = []
-                for item in parsed_data.get("transactions", []):
-                    try:
-                        item["user_id"] = user_id
-                        item["document_id"] = document_id
-                        transaction = Transaction(**item)
-                        transactions.append(transaction)
-                    except Exception as e:
-                        logger.error(f"Erro ao converter item para Transaction: {str(e)}")
-
-                return transactions
-            else:
-                logger.error("Não foi possível encontrar JSON na resposta")
-                return []
+            async for event in stream:
+                if event.type == "message_start":
+                    usage = event.message.usage
+                    cached_tokens = getattr(usage, "cache_read_input_tokens", None) or 0
+                    cache_creation_tokens = getattr(usage, "cache_creation_input_tokens", None) or 0
+                    input_tokens = usage.input_tokens + cached_tokens + cache_creation_tokens
+                elif event.type == "content_block_delta":
+                    # Com tool use, o JSON do input chega em pedaços de partial_json
+                    delta = getattr(event.delta, "text", None) or getattr(event.delta, "partial_json", None)
+                    if delta:
+                        yield delta
+                elif event.type == "message_delta":
+                    output_tokens = event.usage.output_tokens
+                    outcome.truncated = getattr(event.delta, "stop_reason", None) == "max_tokens"
 
         except Exception as e:
-            logger.error(f"Erro ao processar resposta do Claude: {str(e)}")
-            return []
-
-    async def categorize_transactions(
-            self,
-            transactions: List[Transaction],
-            predefined_categories: Optional[List[str]] = None
-    ) -> List[Transaction]:
-        """
-        Categoriza uma lista de transações utilizando o Claude.
-
-        Args:
-            transactions: Lista de transações a serem categorizadas
-            predefined_categories: Lista de categorias predefinidas (opcional)
-
-        Returns:
-            Lista de transações com categorias atualizadas
-        """
-        if not transactions:
-            return transactions
-
-        if all(
-                len(transaction.categories) > 0 and not ("" in transaction.categories)
-                for transaction in transactions
-        ):
-            return transactions
-
-        MAX_BATCH_SIZE = 10
-        batches = [
-            transactions[i:i + MAX_BATCH_SIZE]
-            for i in range(0, len(transactions), MAX_BATCH_SIZE)
-        ]
-
-        categorized_transactions = []
-
-        for batch in batches:
-            prompt = self.prompt_engineering.create_categorization_prompt(
-                transactions=batch,
-                predefined_categories=predefined_categories,
-                provider="claude"
-            )
+            logger.error(f"Erro no streaming do Claude: {str(e)}")
+            raise
 
-            request = AIRequest(
-                prompt=prompt,
-                system_message="Você é um assistente especializado em categorizar transações financeiras. Forneça apenas o JSON solicitado sem explicações adicionais.",
-                temperature=0.0,
+        if input_tokens:
+            total_tokens = input_tokens + output_tokens
+            self.rate_limiter.release(estimate.expected_total_tokens - total_tokens)
+            self.record_usage(
+                self.model,
+                total_tokens,
+                self.calculate_cost(
+                    request.model or self.model, input_tokens, output_tokens, cached_tokens, cache_creation_tokens
+                ),
+                cached_tokens,
+                input_tokens,
+                output_tokens
             )
 
-            response = await self.generate_completion(request)
-
-            try:
-                response_text = response.content
-                json_start = response_text.find('{')
-                json_end = response_text.rfind('}') + 1
-
-                if json_start >= 0 and json_end > json_start:
-                    json_data = response_text[json_start:json_end]
-                    parsed_data = json.loads(json_data)
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_rate_limit_aware(wait_exponential(multiplier=1, min=2, max=10))
+    )
+    async def _open_stream(self, request: AIRequest, estimate: TokenEstimate):
+        """
+        Abre a resposta em streaming dentro da reserva do limitador.
 
-                    for i, item in enumerate(parsed_data.get("transactions", [])):
-                        if i < len(batch):
-                            batch[i].categories = item.get("categories", [])
-                            batch[i].confidence_score = item.get("confidence_score", None)
+        Os tokens estimados ficam reservados até o fim do streaming, quando
+        `stream_completion` acerta a reserva com o uso real.
+        """
+        messages, system = self._build_messages(request)
 
-                    categorized_transactions.extend(batch)
-                else:
-                    logger.error("Não foi possível encontrar JSON na resposta de categorização")
-                    categorized_transactions.extend(batch)
-            except Exception as e:
-                logger.error(f"Erro ao processar resposta de categorização: {str(e)}")
-                categorized_transactions.extend(batch)
+        try:
+            async with self.rate_limiter.reserve(estimate.expected_total_tokens) as reservation:
+                raw_response = await self.client.messages.with_raw_response.create(
+                    model=request.model or self.model,
+                    messages=messages,
+                    system=system,
+                    temperature=request.temperature,
+                    max_tokens=estimate.max_tokens,
+                    stop_sequences=request.stop_sequences or [],
+                    **self._tool_params(request),
+                    stream=True,
+                )
+                reservation.headers = raw_response.headers
+
+            return raw_response.parse()
 
-        return categorized_transactions
+        except Exception as e:
+            logger.error(f"Erro na chamada para Claude: {str(e)}")
+            raise
@@ -0,0 +1,405 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from financial_document_processor.adapters.ai.ai_provider import (
+    AIProvider, AIProviderWrapper, AIRequest, AIResponse, ExtractionStats
+)
+from financial_document_processor.domain.transaction import Transaction
+from financial_document_processor.utils.metrics import AI_FAILOVERS, AI_HEDGED_REQUESTS, AI_PROVIDER_HEALTH
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Amostras mínimas de latência antes de usar o p95 como atraso do hedge
+_MIN_LATENCY_SAMPLES = 20
+
+
+class InvalidAIResponseError(Exception):
+    """Resposta recebida, mas reprovada na validação; guarda o resultado para último recurso."""
+
+    def __init__(self, result: Any):
+        super().__init__("Resposta de IA inválida")
+        self.result = result
+
+
+class ProviderHealth:
+    """
+    Saúde de um provedor: média móvel exponencial de sucessos e janela de latências.
+
+    O score vai de 0 (só falhas) a 1 (só sucessos) e ordena os provedores em cada
+    chamada. As latências de cada operação alimentam o p95 usado como atraso do hedge.
+    """
+
+    def __init__(self, decay: float = 0.2, window: int = 100):
+        """
+        Inicializa a saúde do provedor.
+
+        Args:
+            decay: Peso de cada nova observação na média móvel
+            window: Número de latências mantidas por operação
+        """
+        self.decay = decay
+        self.window = window
+        self.score = 1.0
+        self._latencies: Dict[str, deque] = {}
+
+    def record_success(self, operation: str, latency: float) -> None:
+        self.score = (1 - self.decay) * self.score + self.decay
+        self._latencies.setdefault(operation, deque(maxlen=self.window)).append(latency)
+
+    def record_failure(self) -> None:
+        self.score = (1 - self.decay) * self.score
+
+    def latency_p95(self, operation: str) -> Optional[float]:
+        """
+        Calcula o p95 das latências recentes de uma operação.
+
+        Args:
+            operation: Nome da operação
+
+        Returns:
+            Latência em segundos, ou None se ainda não há amostras suficientes
+        """
+        samples = self._latencies.get(operation)
+        if not samples or len(samples) < _MIN_LATENCY_SAMPLES:
+            return None
+
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+class HedgeBudget:
+    """
+    Limita as requisições duplicadas (hedge) a uma fração do tráfego.
+
+    Cada requisição acumula `max_ratio` de crédito, até `burst`; cada hedge
+    consome um crédito inteiro.
+    """
+
+    def __init__(self, max_ratio: float, burst: float = 10.0):
+        """
+        Inicializa o orçamento.
+
+        Args:
+            max_ratio: Fração máxima das requisições que podem ser duplicadas
+            burst: Crédito máximo acumulado
+        """
+        self.max_ratio = max_ratio
+        self.burst = burst
+        self._credits = 0.0
+
+    def record_request(self) -> None:
+        self._credits = min(self.burst, self._credits + self.max_ratio)
+
+    def try_acquire(self) -> bool:
+        if self._credits < 1.0:
+            return False
+        self._credits -= 1.0
+        return True
+
+
+class FailoverAIProvider(AIProviderWrapper):
+    """
+    Provedor composto que distribui as chamadas entre vários provedores.
+
+    Em cada chamada os provedores são ordenados pela saúde (os mais saudáveis
+    primeiro, mantendo a ordem configurada no empate). Se um provedor falha ou
+    devolve uma resposta inválida (extração reprovada na validação, categorização
+    sem nenhuma categoria), a chamada segue para o próximo. Com o hedge habilitado, se o primeiro provedor
+    não responder dentro do p95 de latência da operação, uma cópia da chamada é
+    enviada ao próximo; vale a primeira resposta válida e a outra é cancelada.
+
+    Extração e categorização são delegadas por inteiro a cada provedor, para que
+    prompt e schema sigam o formato de cada um. Nome, modelo e custo são os do
+    primeiro provedor configurado.
+    """
+
+    def __init__(
+            self,
+            providers: List[AIProvider],
+            hedging_enabled: bool = False,
+            hedge_max_ratio: float = 0.05,
+            hedge_default_delay: float = 10.0
+    ):
+        """
+        Inicializa o provedor composto.
+
+        Args:
+            providers: Provedores em ordem de preferência
+            hedging_enabled: Habilita requisições duplicadas para reduzir a latência de cauda
+            hedge_max_ratio: Fração máxima das requisições que podem ser duplicadas
+            hedge_default_delay: Atraso do hedge (segundos) enquanto não há amostras de latência
+        """
+        if not providers:
+            raise ValueError("É necessário ao menos um provedor de IA")
+
+        super().__init__(providers[0])
+        self.providers = providers
+        self.hedging_enabled = hedging_enabled
+        self.hedge_default_delay = hedge_default_delay
+        self.hedge_budget = HedgeBudget(hedge_max_ratio)
+        self.health = {id(provider): ProviderHealth() for provider in providers}
+
+    async def generate_completion(self, request: AIRequest) -> AIResponse:
+        return await self._call("completion", lambda provider: provider.generate_completion(request))
+
+    async def stream_completion(self, request: AIRequest) -> AsyncIterator[str]:
+        # Depois do primeiro pedaço entregue não há como trocar de provedor
+        async for delta in self._stream("completion", lambda provider: provider.stream_completion(request)):
+            yield delta
+
+    async def stream_transactions(
+            self,
+            text_content: str,
+            document_type: str,
+            predefined_categories: Optional[List[str]] = None,
+            document_id: int = 0,
+            user_id: int = 0,
+            stats: Optional[ExtractionStats] = None,
+            line_references: bool = False,
+    ) -> AsyncIterator[Transaction]:
+        attempt_stats = ExtractionStats()
+
+        def extract(provider: AIProvider):
+            nonlocal attempt_stats
+            attempt_stats = ExtractionStats()
+            return provider.stream_transactions(
+                text_content=text_content,
+                document_type=document_type,
+                predefined_categories=predefined_categories,
+                document_id=document_id,
+                user_id=user_id,
+                stats=attempt_stats,
+                line_references=line_references
+            )
+
+        if not self.hedging_enabled:
+            async for tx in self._stream("extraction", extract, lambda: attempt_stats.valid):
+                yield tx
+            if stats is not None:
+                stats.found, stats.invalid_items = attempt_stats.found, attempt_stats.invalid_items
+            return
+
+        # Com hedge, cada tentativa é coletada por inteiro para que apenas a vencedora seja entregue
+        async def extract_all(provider: AIProvider) -> Tuple[List[Transaction], ExtractionStats]:
+            attempt_stats = ExtractionStats()
+            transactions = [
+                tx async for tx in provider.stream_transactions(
+                    text_content=text_content,
+                    document_type=document_type,
+                    predefined_categories=predefined_categories,
+                    document_id=document_id,
+                    user_id=user_id,
+                    stats=attempt_stats,
+                    line_references=line_references
+                )
+            ]
+            if not attempt_stats.valid:
+                raise InvalidAIResponseError((transactions, attempt_stats))
+            return transactions, attempt_stats
+
+        transactions, attempt_stats = await self._call("extraction", extract_all)
+        if stats is not None:
+            stats.found, stats.invalid_items = attempt_stats.found, attempt_stats.invalid_items
+
+        for tx in transactions:
+            yield tx
+
+    async def categorize_transactions(
+            self,
+            transactions: List[Transaction],
+            predefined_categories: Optional[List[str]] = None
+    ) -> List[Transaction]:
+        if not transactions:
+            return transactions
+
+        # Cada tentativa trabalha em cópias, pois as tentativas podem correr em paralelo
+        async def categorize(provider: AIProvider) -> List[Transaction]:
+            copies = [tx.model_copy(deep=True) for tx in transactions]
+            categorized = await provider.categorize_transactions(copies, predefined_categories)
+            # Resposta vazia ou inválida: o provedor base devolve o lote sem categorias
+            if not any(tx.categories for tx in categorized):
+                raise InvalidAIResponseError(categorized)
+            return categorized
+
+        categorized = await self._call("categorization", categorize)
+
+        # Mantém a semântica da classe base: as transações recebidas são alteradas no lugar
+        for transaction, result in zip(transactions, categorized, strict=True):
+            transaction.categories = result.categories
+            transaction.confidence_score = result.confidence_score
+
+        return transactions
+
+    def ranked_providers(self) -> List[AIProvider]:
+        """
+        Ordena os provedores pela saúde, mantendo a ordem configurada no empate.
+
+        Returns:
+            Provedores do mais para o menos saudável
+        """
+        return sorted(self.providers, key=lambda provider: -self.health[id(provider)].score)
+
+    async def _call(self, operation: str, call: Callable[[AIProvider], Awaitable[T]]) -> T:
+        """
+        Executa uma chamada com failover e, se habilitado, hedge.
+
+        Args:
+            operation: Nome da operação (métricas e latências)
+            call: Função que executa a chamada em um provedor
+
+        Returns:
+            Primeira resposta válida
+
+        Raises:
+            Exception: Erro da última tentativa, se todos os provedores falharem
+        """
+        providers = self.ranked_providers()
+        self.hedge_budget.record_request()
+
+        pending: Dict[asyncio.Task, AIProvider] = {}
+        hedge_task: Optional[asyncio.Task] = None
+        next_index = 0
+        hedge_checked = not self.hedging_enabled
+        last_error: Optional[Exception] = None
+
+        def launch() -> asyncio.Task:
+            nonlocal next_index
+            provider = providers[next_index]
+            next_index += 1
+            task = asyncio.create_task(self._attempt(provider, operation, call))
+            pending[task] = provider
+            return task
+
+        launch()
+
+        try:
+            while pending:
+                timeout = None
+                if not hedge_checked and next_index < len(providers):
+                    timeout = self._hedge_delay(providers[0], operation)
+
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    # O primeiro provedor passou do p95: duplica a chamada se houver orçamento
+                    hedge_checked = True
+                    if self.hedge_budget.try_acquire():
+                        logger.info(f"Hedge da operação {operation} em {providers[next_index].name}")
+                        hedge_task = launch()
+                    continue
+
+                for task in done:
+                    provider = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        last_error = e
+                        logger.warning(f"Falha em {provider.name} na operação {operation}: {str(e)}")
+                        continue
+
+                    if hedge_task is not None:
+                        winner = "hedge" if task is hedge_task else "primary"
+                        AI_HEDGED_REQUESTS.labels(operation=operation, winner=winner).inc()
+                    return result
+
+                if not pending and next_index < len(providers):
+                    AI_FAILOVERS.labels(provider=provider.name, operation=operation).inc()
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        if isinstance(last_error, InvalidAIResponseError):
+            # Nenhum provedor respondeu de forma válida: fica com a última resposta
+            return last_error.result
+        raise last_error
+
+    async def _stream(
+            self,
+            operation: str,
+            stream: Callable[[AIProvider], AsyncIterator[T]],
+            validate: Optional[Callable[[], bool]] = None
+    ) -> AsyncIterator[T]:
+        """
+        Consome um stream com failover enquanto nenhum item foi entregue.
+
+        Um stream que termina reprovado por `validate` sem ter entregue nenhum item
+        também segue para o próximo provedor; se já entregou itens, eles são mantidos
+        e apenas a saúde do provedor é penalizada.
+
+        Args:
+            operation: Nome da operação (métricas e latências)
+            stream: Função que abre o stream em um provedor
+            validate: Confere a resposta ao fim do stream (opcional)
+
+        Yields:
+            Itens do primeiro provedor que responder
+        """
+        providers = self.ranked_providers()
+        last_error: Optional[Exception] = None
+
+        for index, provider in enumerate(providers):
+            if index > 0:
+                AI_FAILOVERS.labels(provider=providers[index - 1].name, operation=operation).inc()
+
+            started = time.monotonic()
+            delivered = False
+            try:
+                async for item in stream(provider):
+                    delivered = True
+                    yield item
+            except Exception as e:
+                self._record_failure(provider)
+                if delivered:
+                    raise
+                last_error = e
+                logger.warning(f"Falha em {provider.name} na operação {operation}: {str(e)}")
+                continue
+
+            if validate is not None and not validate():
+                self._record_failure(provider)
+                logger.warning(f"Resposta inválida de {provider.name} na operação {operation}")
+                if delivered:
+                    return
+                last_error = InvalidAIResponseError(None)
+                continue
+
+            self._record_success(provider, operation, time.monotonic() - started)
+            return
+
+        if isinstance(last_error, InvalidAIResponseError):
+            # Nenhum provedor respondeu de forma válida e nada foi entregue
+            return
+        raise last_error
+
+    async def _attempt(self, provider: AIProvider, operation: str, call: Callable[[AIProvider], Awaitable[T]]) -> T:
+        """Executa uma tentativa em um provedor, atualizando sua saúde."""
+        started = time.monotonic()
+        try:
+            result = await call(provider)
+        except Exception:
+            self._record_failure(provider)
+            raise
+
+        self._record_success(provider, operation, time.monotonic() - started)
+        return result
+
+    def _hedge_delay(self, provider: AIProvider, operation: str) -> float:
+        """Atraso antes do hedge: p95 da operação no provedor ou o valor padrão."""
+        p95 = self.health[id(provider)].latency_p95(operation)
+        return p95 if p95 is not None else self.hedge_default_delay
+
+    def _record_success(self, provider: AIProvider, operation: str, latency: float) -> None:
+        health = self.health[id(provider)]
+        health.record_success(operation, latency)
+        AI_PROVIDER_HEALTH.labels(provider=provider.name).set(health.score)
+
+    def _record_failure(self, provider: AIProvider) -> None:
+        health = self.health[id(provider)]
+        health.record_failure()
+        AI_PROVIDER_HEALTH.labels(provider=provider.name).set(health.score)
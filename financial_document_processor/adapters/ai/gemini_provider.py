@@ -1,27 +1,43 @@
 import json
 import logging
-from typing import List, Optional
+from collections import OrderedDict
+from typing import AsyncIterator, List, Optional, Tuple
 
 import google.generativeai as genai
 from tenacity import retry, stop_after_attempt, wait_exponential
 
-from financial_document_processor.adapters.ai.ai_provider import AIProvider, AIRequest, AIResponse
-from financial_document_processor.domain.transaction import Transaction
+from financial_document_processor.adapters.ai.ai_provider import (
+    CONTINUATION_PROMPT,
+    AIProvider,
+    AIRequest,
+    AIResponse,
+    StreamOutcome,
+)
+from financial_document_processor.adapters.ai.pricing import ModelPrice, get_model_price
+from financial_document_processor.adapters.ai.rate_limiter import RateLimiter, get_rate_limiter, wait_rate_limit_aware
 from financial_document_processor.services.prompt_engineering import PromptEngineering
+from financial_document_processor.utils.tokenizer import TokenEstimate, get_tokenizer_service
 
 logger = logging.getLogger(__name__)
 
+# Preços usados para modelos fora da tabela
+DEFAULT_PRICE = ModelPrice(input=0.00125, output=0.005)
+
 
 class GeminiProvider(AIProvider):
     """
     Implementação do provedor de IA para Google Gemini.
     """
 
+    prompt_style = "gemini"
+
     def __init__(
             self,
             api_key: str,
             model: str = "gemini-1.5-pro",
-            max_retries: int = 3
+            max_retries: int = 3,
+            rate_limiter: Optional[RateLimiter] = None,
+            model_cache_size: int = 32
     ):
         """
         Inicializa o provedor Gemini.
@@ -30,211 +46,261 @@ class GeminiProvider(AIProvider):
             api_key: Chave de API da Google
             model: Modelo a ser utilizado (default: gemini-1.5-pro)
             max_retries: Número máximo de tentativas para chamadas de API
+            rate_limiter: Limitador de RPM/TPM (default: limitador compartilhado do modelo)
+            model_cache_size: Número máximo de modelos configurados mantidos para reuso
         """
         genai.configure(api_key=api_key)
         self.model = model
+        self.rate_limiter = rate_limiter or get_rate_limiter("gemini", model)
         self.max_retries = max_retries
         self.prompt_engineering = PromptEngineering()
-
-        # Mapeamento de modelos para custos (USD por 1000 tokens)
-        # Valores aproximados
-        self._costs = {
-            "gemini-1.5-pro": 0.007,  # $0.007 por 1K tokens
-            "gemini-1.5-flash": 0.0035,  # $0.0035 por 1K tokens
-            "gemini-1.0-pro": 0.005  # $0.005 por 1K tokens
-        }
+        self.model_cache_size = model_cache_size
+        self._models: OrderedDict[Tuple[str, str, Optional[str]], genai.GenerativeModel] = OrderedDict()
 
     @property
     def name(self) -> str:
         return "Gemini"
 
     def get_cost_per_1k_tokens(self) -> float:
-        return self._costs.get(self.model, 0.007)  # Default se o modelo não estiver no dict
+        # Preço de entrada; o custo das chamadas usa os preços de entrada e saída separados
+        return self.get_model_price().input
+
+    def get_model_price(self, model: Optional[str] = None) -> ModelPrice:
+        return get_model_price(model or self.model, DEFAULT_PRICE)
+
+    def _generative_model(self, request: AIRequest, estimate: TokenEstimate) -> genai.GenerativeModel:
+        """
+        Obtém o modelo configurado para a requisição.
+
+        Os modelos ficam em um cache LRU indexado por modelo, configuração de
+        geração e instrução de sistema, de modo que chamadas com a mesma
+        configuração reutilizam a mesma instância em vez de recriá-la.
+        """
+        model_name = request.model or self.model
+        generation_config = {
+            "temperature": request.temperature,
+            "max_output_tokens": estimate.max_tokens,
+            "stop_sequences": request.stop_sequences or [],
+        }
+
+        if request.response_schema:
+            generation_config["response_mime_type"] = "application/json"
+            generation_config["response_schema"] = request.response_schema
+
+        key = (model_name, json.dumps(generation_config, sort_keys=True, default=str), request.system_message)
+        model = self._models.get(key)
+
+        if model is not None:
+            self._models.move_to_end(key)
+            return model
+
+        model = genai.GenerativeModel(
+            model_name=model_name,
+            generation_config=generation_config,
+            system_instruction=request.system_message
+        )
+        self._models[key] = model
+
+        if len(self._models) > self.model_cache_size:
+            self._models.popitem(last=False)
+
+        return model
+
+    @staticmethod
+    def _prompt_parts(request: AIRequest) -> List[str]:
+        """Partes da mensagem do usuário; o prefixo estático vai primeiro, para o cache de contexto."""
+        if request.cacheable_prefix:
+            return [request.cacheable_prefix, request.prompt]
+        return [request.prompt]
+
+    def _contents(self, request: AIRequest) -> List[dict]:
+        """
+        Conteúdo de uma chamada de turno único: o prompt ou, na continuação, o
+        prompt, o trecho já gerado como resposta do modelo e o pedido para continuar.
+        """
+        contents = [{"role": "user", "parts": self._prompt_parts(request)}]
+        if request.continuation_of:
+            contents.append({"role": "model", "parts": [request.continuation_of]})
+            contents.append({"role": "user", "parts": [CONTINUATION_PROMPT]})
+        return contents
+
+    async def _token_counts(
+            self, request: AIRequest, estimate: TokenEstimate, response, response_text: str
+    ) -> Tuple[int, int, int]:
+        """
+        Obtém os tokens de entrada, de saída e lidos do cache de uma chamada.
+
+        Usa o usage_metadata da resposta; se ausente, conta com o count_tokens da
+        API e, se este falhar, com o tokenizador aproximado.
+        """
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None and getattr(usage, "prompt_token_count", None):
+            return (
+                usage.prompt_token_count,
+                getattr(usage, "candidates_token_count", None) or 0,
+                getattr(usage, "cached_content_token_count", None) or 0,
+            )
+
+        try:
+            model = self._generative_model(request, estimate)
+            input_tokens = (await model.count_tokens_async(self._contents(request))).total_tokens
+            output_tokens = (await model.count_tokens_async(response_text)).total_tokens if response_text else 0
+            return input_tokens, output_tokens, 0
+
+        except Exception as e:
+            logger.warning(f"Falha no count_tokens do Gemini, usando o tokenizador aproximado: {str(e)}")
+            tokenizer = get_tokenizer_service()
+            model_name = request.model or self.model
+            input_tokens = tokenizer.count_tokens(
+                (request.system_message or "") + (request.cacheable_prefix or "") + request.prompt, "gemini", model_name
+            )
+            return input_tokens, tokenizer.count_tokens(response_text, "gemini", model_name), 0
+
+    @staticmethod
+    def _is_truncated(response) -> bool:
+        """Verifica se a resposta terminou por atingir max_output_tokens."""
+        candidates = getattr(response, "candidates", None) or []
+        if not candidates:
+            return False
+
+        finish_reason = getattr(candidates[0], "finish_reason", None)
+        return getattr(finish_reason, "name", finish_reason) == "MAX_TOKENS"
 
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=2, max=10)
-    )
     async def generate_completion(self, request: AIRequest) -> AIResponse:
         """
         Gera uma completion usando a API do Gemini.
 
+        Respostas cortadas em max_tokens são completadas com requisições de continuação.
+
         Args:
             request: Objeto com os parâmetros da requisição
 
         Returns:
             Objeto AIResponse com a resposta
         """
+        return await self._complete_with_continuation(request, self._generate)
+
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_rate_limit_aware(wait_exponential(multiplier=1, min=2, max=10))
+    )
+    async def _generate(self, request: AIRequest) -> AIResponse:
+        """Faz uma única chamada à API do Gemini."""
         try:
-            model = genai.GenerativeModel(
-                model_name=request.model or self.model,
-                generation_config={
-                    "temperature": request.temperature,
-                    "max_output_tokens": request.max_tokens,
-                    "stop_sequences": request.stop_sequences or [],
-                },
-                system_instruction=request.system_message or request.prompt
+            estimate = self.estimate_request(request)
+            logger.debug(
+                f"Chamada Gemini estimada em {estimate.prompt_tokens} tokens de entrada "
+                f"(~${estimate.estimated_cost:.4f})"
             )
 
-            chat = model.start_chat()
+            model = self._generative_model(request, estimate)
+
+            async with self.rate_limiter.reserve(estimate.expected_total_tokens) as reservation:
+                response = await model.generate_content_async(self._contents(request))
 
-            if request.system_message:
-                response = chat.send_message(request.prompt)
-            else:
-                response = list(chat.history)[-1].parts[0].text
+                response_text = response.text
+                input_tokens, output_tokens, cached_tokens = await self._token_counts(
+                    request, estimate, response, response_text
+                )
+                total_tokens = input_tokens + output_tokens
 
-            # Gemini não fornece contagem de tokens diretamente
-            # Estimativa aproximada: 4 caracteres = 1 token
-            char_count = len(request.prompt) + (len(request.system_message or ""))
-            response_chars = len(response.text if hasattr(response, "text") else response)
-            total_chars = char_count + response_chars
-            estimated_tokens = total_chars // 4
+                # O SDK do Gemini não expõe cabeçalhos de rate limit; só os 429 ajustam o limitador
+                reservation.actual_tokens = total_tokens
 
-            # Calcula o custo aproximado
-            cost = (estimated_tokens / 1000) * self.get_cost_per_1k_tokens()
+            cost = self.calculate_cost(request.model or self.model, input_tokens, output_tokens, cached_tokens)
 
-            return AIResponse(
-                content=response.text if hasattr(response, "text") else response,
+            ai_response = AIResponse(
+                content=response_text,
                 model=self.model,
-                tokens_used=estimated_tokens,
-                cost=cost
+                tokens_used=total_tokens,
+                cost=cost,
+                cached_tokens=cached_tokens,
+                truncated=self._is_truncated(response),
+                input_tokens=input_tokens,
+                output_tokens=output_tokens
             )
+            self.record_usage(
+                ai_response.model,
+                ai_response.tokens_used,
+                ai_response.cost,
+                ai_response.cached_tokens,
+                ai_response.input_tokens,
+                ai_response.output_tokens
+            )
+
+            return ai_response
 
         except Exception as e:
             logger.error(f"Erro na chamada para Gemini: {str(e)}")
             raise
 
-    async def extract_transactions(
-            self,
-            text_content: str,
-            document_type: str,
-            predefined_categories: Optional[List[str]] = None,
-            document_id: int = 0,
-            user_id: int = 0,
-    ) -> List[Transaction]:
+    async def stream_completion(self, request: AIRequest) -> AsyncIterator[str]:
         """
-        Extrai transações de um documento utilizando o Gemini.
+        Gera uma completion em streaming usando a API do Gemini.
+
+        Respostas cortadas em max_tokens seguem no mesmo stream com as continuações.
 
         Args:
-            text_content: Texto extraído do documento
-            document_type: Tipo do documento
-            predefined_categories: Lista de categorias predefinidas (opcional)
-            document_id: ID do documento
-            user_id: ID do usuario
+            request: Objeto com os parâmetros da requisição
 
-        Returns:
-            Lista de objetos Transaction
+        Yields:
+            Pedaços do texto da resposta
         """
-        prompt = self.prompt_engineering.create_extraction_prompt(
-            text_content=text_content,
-            document_type=document_type,
-            predefined_categories=predefined_categories,
-            provider="gemini"
-        )
+        async for delta in self._stream_with_continuation(request, self._stream):
+            yield delta
 
-        request = AIRequest(
-            prompt=prompt,
-            system_message="Você é um assistente especializado em extrair transações financeiras de documentos bancários. Forneça apenas o JSON solicitado sem explicações adicionais.",
-            temperature=0.0,  # Determinístico
-        )
+    async def _stream(self, request: AIRequest, outcome: StreamOutcome) -> AsyncIterator[str]:
+        """Faz um único streaming na API do Gemini, registrando como ele terminou."""
+        estimate = self.estimate_request(request)
+        response = await self._open_stream(request, estimate)
 
-        response = await self.generate_completion(request)
+        parts = []
 
         try:
-            response_text = response.content
-            json_start = response_text.find('{')
-            json_end = response_text.rfind('}') + 1
-
-            if json_start >= 0 and json_end > json_start:
-                json_data = response_text[json_start:json_end]
-                parsed_data = json.loads(json_data)
-
-                transactions = []
-                for item in parsed_data.get("transactions", []):
-                    try:
-                        item["user_id"] = user_id
-                        item["document_id"] = document_id
-                        transaction = Transaction(**item)
-                        transactions.append(transaction)
-                    except Exception as e:
-                        logger.error(f"Erro ao converter item para Transaction: {str(e)}")
-
-                return transactions
-            else:
-                logger.error("Não foi possível encontrar JSON na resposta")
-                return []
+            async for chunk in response:
+                if chunk.text:
+                    parts.append(chunk.text)
+                    yield chunk.text
 
-        except Exception as e:
-            logger.error(f"Erro ao processar resposta do Gemini: {str(e)}")
-            return []
+                if self._is_truncated(chunk):
+                    outcome.truncated = True
 
-    async def categorize_transactions(
-            self,
-            transactions: List[Transaction],
-            predefined_categories: Optional[List[str]] = None
-    ) -> List[Transaction]:
-        """
-        Categoriza uma lista de transações utilizando o Gemini.
+        except Exception as e:
+            logger.error(f"Erro no streaming do Gemini: {str(e)}")
+            raise
 
-        Args:
-            transactions: Lista de transações a serem categorizadas
-            predefined_categories: Lista de categorias predefinidas (opcional)
+        input_tokens, output_tokens, cached_tokens = await self._token_counts(
+            request, estimate, response, "".join(parts)
+        )
+        total_tokens = input_tokens + output_tokens
+        self.rate_limiter.release(estimate.expected_total_tokens - total_tokens)
+
+        self.record_usage(
+            self.model,
+            total_tokens,
+            self.calculate_cost(request.model or self.model, input_tokens, output_tokens, cached_tokens),
+            cached_tokens,
+            input_tokens,
+            output_tokens
+        )
 
-        Returns:
-            Lista de transações com categorias atualizadas
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_rate_limit_aware(wait_exponential(multiplier=1, min=2, max=10))
+    )
+    async def _open_stream(self, request: AIRequest, estimate: TokenEstimate):
         """
-        if not transactions:
-            return transactions
-
-        if all(
-                len(transaction.categories) > 0 and not ("" in transaction.categories)
-                for transaction in transactions
-        ):
-            return transactions
-
-        MAX_BATCH_SIZE = 10
-        batches = [
-            transactions[i:i + MAX_BATCH_SIZE]
-            for i in range(0, len(transactions), MAX_BATCH_SIZE)
-        ]
-
-        categorized_transactions = []
-
-        for batch in batches:
-            prompt = self.prompt_engineering.create_categorization_prompt(
-                transactions=batch,
-                predefined_categories=predefined_categories,
-                provider="gemini"
-            )
-
-            request = AIRequest(
-                prompt=prompt,
-                system_message="Você é um assistente especializado em categorizar transações financeiras. Forneça apenas o JSON solicitado sem explicações adicionais.",
-                temperature=0.0,  # Determinístico
-            )
-
-            response = await self.generate_completion(request)
-
-            try:
-                response_text = response.content
-                json_start = response_text.find('{')
-                json_end = response_text.rfind('}') + 1
+        Abre a resposta em streaming dentro da reserva do limitador.
 
-                if json_start >= 0 and json_end > json_start:
-                    json_data = response_text[json_start:json_end]
-                    parsed_data = json.loads(json_data)
-
-                    for i, item in enumerate(parsed_data.get("transactions", [])):
-                        if i < len(batch):
-                            batch[i].categories = item.get("categories", [])
-                            batch[i].confidence_score = item.get("confidence_score", None)
+        Os tokens estimados ficam reservados até o fim do streaming, quando
+        `stream_completion` acerta a reserva com a contagem da saída.
+        """
+        model = self._generative_model(request, estimate)
 
-                    categorized_transactions.extend(batch)
-                else:
-                    logger.error("Não foi possível encontrar JSON na resposta de categorização")
-                    categorized_transactions.extend(batch)
-            except Exception as e:
-                logger.error(f"Erro ao processar resposta de categorização: {str(e)}")
-                categorized_transactions.extend(batch)
+        try:
+            async with self.rate_limiter.reserve(estimate.expected_total_tokens):
+                return await model.generate_content_async(self._contents(request), stream=True)
 
-        return categorized_transactions
+        except Exception as e:
+            logger.error(f"Erro na chamada para Gemini: {str(e)}")
+            raise
@@ -0,0 +1,118 @@
+import logging
+import time
+from typing import Optional
+
+import httpx
+
+from financial_document_processor.config import AISettings
+from financial_document_processor.utils.metrics import AI_HTTP_CONNECTIONS, AI_HTTP_POOL_WAIT
+
+logger = logging.getLogger(__name__)
+
+# Eventos do httpcore que indicam que a requisição já obteve uma conexão do pool
+_CONNECTION_ACQUIRED_EVENTS = (
+    "connection.connect_tcp.started",
+    "http11.send_request_headers.started",
+    "http2.send_request_headers.started",
+)
+
+_shared_client: Optional[httpx.AsyncClient] = None
+
+
+class _ConnectionTracer:
+    """
+    Acompanha os eventos de trace do httpcore de uma requisição.
+
+    O tempo entre o envio da requisição ao transporte e o primeiro evento de
+    conexão é registrado como espera no pool. Se a requisição chega ao envio
+    dos cabeçalhos sem abrir conexão TCP, a conexão foi reaproveitada.
+    """
+
+    def __init__(self, host: str):
+        self.host = host
+        self.started = time.perf_counter()
+        self.acquired = False
+
+    async def __call__(self, event_name: str, info: dict) -> None:
+        if self.acquired or event_name not in _CONNECTION_ACQUIRED_EVENTS:
+            return
+
+        self.acquired = True
+        AI_HTTP_POOL_WAIT.labels(host=self.host).observe(time.perf_counter() - self.started)
+
+        reused = event_name != "connection.connect_tcp.started"
+        AI_HTTP_CONNECTIONS.labels(host=self.host, reused=str(reused).lower()).inc()
+
+
+async def _trace_request(request: httpx.Request) -> None:
+    """Hook de requisição que instala o tracer de conexões."""
+    request.extensions["trace"] = _ConnectionTracer(request.url.host)
+
+
+def _http2_available() -> bool:
+    """Verifica se o pacote h2, necessário para HTTP/2 no httpx, está instalado."""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def create_http_client(settings: AISettings) -> httpx.AsyncClient:
+    """
+    Cria um cliente HTTP assíncrono com pool de conexões para os provedores de IA.
+
+    Args:
+        settings: Configurações de IA com limites do pool, keep-alive, HTTP/2 e timeouts
+
+    Returns:
+        Instância de httpx.AsyncClient
+    """
+    http2 = settings.http2
+    if http2 and not _http2_available():
+        logger.warning("Pacote h2 não instalado, usando HTTP/1.1 para os provedores de IA")
+        http2 = False
+
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+            keepalive_expiry=settings.http_keepalive_expiry,
+        ),
+        timeout=httpx.Timeout(
+            settings.http_timeout,
+            connect=settings.http_connect_timeout,
+            pool=settings.http_pool_timeout,
+        ),
+        event_hooks={"request": [_trace_request]},
+    )
+
+
+def get_shared_http_client(settings: AISettings) -> httpx.AsyncClient:
+    """
+    Obtém o cliente HTTP compartilhado entre os provedores de IA, criando-o se necessário.
+
+    Args:
+        settings: Configurações de IA
+
+    Returns:
+        Instância compartilhada de httpx.AsyncClient
+    """
+    global _shared_client
+
+    if _shared_client is None or _shared_client.is_closed:
+        _shared_client = create_http_client(settings)
+
+    return _shared_client
+
+
+async def close_shared_http_client() -> None:
+    """
+    Fecha o cliente HTTP compartilhado e suas conexões.
+    """
+    global _shared_client
+
+    if _shared_client is not None:
+        await _shared_client.aclose()
+        _shared_client = None
@@ -0,0 +1,294 @@
+import logging
+import random
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Set, Tuple, TypeVar
+
+from pydantic import BaseModel
+from tenacity import RetryError
+
+from financial_document_processor.adapters.ai.ai_provider import (
+    AIProvider,
+    AIProviderWrapper,
+    AIRequest,
+    AIResponse,
+    UsageTracker,
+    get_usage_tracker,
+    track_usage,
+)
+from financial_document_processor.adapters.ai.rate_limiter import is_rate_limit_error
+from financial_document_processor.utils.metrics import (
+    AI_KEY_ACTIVE,
+    AI_KEY_AVAILABLE_QUOTA,
+    AI_KEY_REQUESTS,
+    AI_KEY_TOKENS,
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class ApiKey(BaseModel):
+    """
+    Chave de API de um provedor, com a organização à qual pertence (OpenAI).
+    """
+    key: str
+    organization_id: Optional[str] = None
+
+    @property
+    def label(self) -> str:
+        """Identificação da chave em logs e métricas, sem expor o segredo."""
+        return f"...{self.key[-4:]}"
+
+    @property
+    def account(self) -> str:
+        """Conta dona da cota: a organização, se informada, ou a própria chave."""
+        return self.organization_id or self.label
+
+
+class NoActiveApiKeyError(RuntimeError):
+    """
+    Todas as chaves do pool foram removidas da rotação.
+    """
+
+
+def parse_api_keys(value: Optional[str]) -> List[ApiKey]:
+    """
+    Lê as chaves de um pool configurado como texto.
+
+    Args:
+        value: Chaves separadas por vírgula, cada uma no formato 'chave' ou
+            'chave:organização'
+
+    Returns:
+        Lista de ApiKey, na ordem configurada e sem repetições
+    """
+    keys: List[ApiKey] = []
+
+    for item in (value or "").split(","):
+        key, _, organization_id = item.strip().partition(":")
+        if key and all(existing.key != key for existing in keys):
+            keys.append(ApiKey(key=key, organization_id=organization_id or None))
+
+    return keys
+
+
+def _root_error(error: Exception) -> Exception:
+    """Obtém o erro original de uma chamada que esgotou as tentativas do tenacity."""
+    if isinstance(error, RetryError) and error.last_attempt.failed:
+        return error.last_attempt.exception()
+    return error
+
+
+def is_authentication_error(error: Exception) -> bool:
+    """
+    Verifica se um erro de provedor corresponde a uma chave inválida ou revogada (HTTP 401).
+
+    Args:
+        error: Exceção lançada pelo SDK do provedor
+
+    Returns:
+        True se for um erro de autenticação
+    """
+    if getattr(error, "status_code", None) == 401:
+        return True
+    if getattr(error, "code", None) == 401:
+        return True
+    return type(error).__name__ in ("AuthenticationError", "Unauthenticated")
+
+
+class PooledKey:
+    """
+    Chave do pool com o provedor configurado para ela.
+    """
+
+    def __init__(self, api_key: ApiKey, provider: AIProvider):
+        self.api_key = api_key
+        self.provider = provider
+        self.active = True
+
+    @property
+    def label(self) -> str:
+        return self.api_key.label
+
+    def available_quota(self) -> float:
+        """Fração da cota do minuto disponível no limitador da chave."""
+        rate_limiter = getattr(self.provider, "rate_limiter", None)
+        if rate_limiter is None:
+            return 1.0
+        return rate_limiter.available_fraction()
+
+
+class KeyPoolAIProvider(AIProviderWrapper):
+    """
+    Provedor que distribui as chamadas entre várias chaves de API do mesmo provedor.
+
+    Cada chave tem o seu provedor e o seu limitador de RPM/TPM, de modo que a
+    vazão soma as cotas das contas. Em cada chamada a chave é sorteada com peso
+    igual à fração da cota do minuto que ainda resta nela; chaves esgotadas ou
+    pausadas por um 429 só são escolhidas quando todas estão nessa situação.
+
+    Uma chave que responde com erro de autenticação (401) sai da rotação e a
+    chamada segue em outra chave; um 429 que persiste após as tentativas do
+    provedor também leva a chamada para outra chave, sem remover a primeira.
+    """
+
+    def __init__(self, keys: List[Tuple[ApiKey, AIProvider]], seed: Optional[int] = None):
+        """
+        Inicializa o pool.
+
+        Args:
+            keys: Chaves com o provedor configurado para cada uma, em ordem de preferência
+            seed: Semente do sorteio das chaves (opcional)
+
+        Raises:
+            ValueError: Se nenhuma chave for informada
+        """
+        if not keys:
+            raise ValueError("É necessário ao menos uma chave de API no pool")
+
+        super().__init__(keys[0][1])
+        self.keys = [PooledKey(api_key, provider) for api_key, provider in keys]
+        self._random = random.Random(seed)
+
+        for key in self.keys:
+            AI_KEY_ACTIVE.labels(provider=self.name, key=key.label).set(1)
+
+    @property
+    def active_keys(self) -> List[PooledKey]:
+        return [key for key in self.keys if key.active]
+
+    async def generate_completion(self, request: AIRequest) -> AIResponse:
+        async def generate(key: PooledKey) -> AIResponse:
+            response = await key.provider.generate_completion(request)
+            AI_KEY_TOKENS.labels(provider=self.name, key=key.label).inc(response.tokens_used)
+            return response
+
+        return await self._call(generate)
+
+    async def stream_completion(self, request: AIRequest) -> AsyncIterator[str]:
+        tried: Set[int] = set()
+        last_error: Optional[Exception] = None
+
+        while True:
+            key = self._select(tried)
+            if key is None:
+                raise last_error or self._no_active_key_error()
+            tried.add(id(key))
+
+            # O uso do streaming é registrado pelo provedor da chave; um acumulador próprio o captura
+            outer_usage = get_usage_tracker()
+            usage = UsageTracker()
+            delivered = False
+
+            try:
+                with track_usage(usage):
+                    async for delta in key.provider.stream_completion(request):
+                        delivered = True
+                        yield delta
+
+            except Exception as e:
+                # Depois do primeiro pedaço entregue não há como trocar de chave
+                if not delivered and self._should_try_another_key(key, e):
+                    last_error = e
+                    continue
+                raise
+
+            finally:
+                AI_KEY_TOKENS.labels(provider=self.name, key=key.label).inc(usage.tokens)
+                if outer_usage is not None:
+                    outer_usage.merge(usage)
+
+            AI_KEY_REQUESTS.labels(provider=self.name, key=key.label, result="success").inc()
+            return
+
+    async def _call(self, call: Callable[[PooledKey], Awaitable[T]]) -> T:
+        """
+        Executa uma chamada em uma chave do pool, passando para outra em erros de chave.
+
+        Args:
+            call: Função que executa a chamada com uma chave
+
+        Returns:
+            Resultado da chamada
+
+        Raises:
+            NoActiveApiKeyError: Se não houver chave ativa
+            Exception: Erro da chamada, se não for um erro de chave ou se todas as chaves falharem
+        """
+        tried: Set[int] = set()
+        last_error: Optional[Exception] = None
+
+        while True:
+            key = self._select(tried)
+            if key is None:
+                raise last_error or self._no_active_key_error()
+            tried.add(id(key))
+
+            try:
+                result = await call(key)
+            except Exception as e:
+                if self._should_try_another_key(key, e):
+                    last_error = e
+                    continue
+                raise
+
+            AI_KEY_REQUESTS.labels(provider=self.name, key=key.label, result="success").inc()
+            return result
+
+    def _select(self, tried: Set[int]) -> Optional[PooledKey]:
+        """
+        Sorteia uma chave ativa ainda não tentada, com peso pela cota disponível.
+
+        Args:
+            tried: Identificadores das chaves já tentadas na chamada
+
+        Returns:
+            Chave escolhida ou None se não restar chave
+        """
+        candidates = [key for key in self.active_keys if id(key) not in tried]
+        if not candidates:
+            return None
+
+        weights = [key.available_quota() for key in candidates]
+        for key, weight in zip(candidates, weights, strict=True):
+            AI_KEY_AVAILABLE_QUOTA.labels(provider=self.name, key=key.label).set(weight)
+
+        if not any(weights):
+            # Todas esgotadas: o limitador da chave escolhida espera a reposição da cota
+            return self._random.choice(candidates)
+
+        return self._random.choices(candidates, weights=weights)[0]
+
+    def _should_try_another_key(self, key: PooledKey, error: Exception) -> bool:
+        """
+        Registra o erro de uma chamada e decide se ela deve seguir em outra chave.
+
+        Args:
+            key: Chave usada na chamada
+            error: Erro da chamada
+
+        Returns:
+            True para erros de autenticação ou de rate limit
+        """
+        error = _root_error(error)
+
+        if is_authentication_error(error):
+            key.active = False
+            AI_KEY_ACTIVE.labels(provider=self.name, key=key.label).set(0)
+            AI_KEY_REQUESTS.labels(provider=self.name, key=key.label, result="unauthorized").inc()
+            logger.error(
+                f"Chave {key.label} de {self.name} recusada pelo provedor e removida do pool "
+                f"({len(self.active_keys)} chaves ativas): {str(error)}"
+            )
+            return True
+
+        if is_rate_limit_error(error):
+            AI_KEY_REQUESTS.labels(provider=self.name, key=key.label, result="rate_limited").inc()
+            logger.warning(f"Cota da chave {key.label} de {self.name} esgotada, tentando outra chave")
+            return True
+
+        AI_KEY_REQUESTS.labels(provider=self.name, key=key.label, result="error").inc()
+        return False
+
+    def _no_active_key_error(self) -> NoActiveApiKeyError:
+        return NoActiveApiKeyError(f"Nenhuma chave de API ativa no pool de {self.name}")
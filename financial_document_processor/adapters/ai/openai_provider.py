@@ -1,29 +1,44 @@
-import json
 import logging
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional
 
+import httpx
 import openai
 from openai.types.chat import ChatCompletion
 from tenacity import retry, stop_after_attempt, wait_exponential
 
-from financial_document_processor.adapters.ai.ai_provider import AIProvider, AIRequest, AIResponse
-from financial_document_processor.domain.transaction import Transaction
+from financial_document_processor.adapters.ai.ai_provider import (
+    CONTINUATION_PROMPT,
+    AIProvider,
+    AIRequest,
+    AIResponse,
+    StreamOutcome,
+)
+from financial_document_processor.adapters.ai.pricing import ModelPrice, get_model_price
+from financial_document_processor.adapters.ai.rate_limiter import RateLimiter, get_rate_limiter, wait_rate_limit_aware
 from financial_document_processor.services.prompt_engineering import PromptEngineering
+from financial_document_processor.utils.tokenizer import TokenEstimate
 
 logger = logging.getLogger(__name__)
 
+# Preços usados para modelos fora da tabela
+DEFAULT_PRICE = ModelPrice(input=0.0025, output=0.01)
+
 
 class OpenAIProvider(AIProvider):
     """
     Implementação do provedor de IA para OpenAI.
     """
 
+    prompt_style = "openai"
+
     def __init__(
             self,
             api_key: str,
             model: str = "gpt-4o",
             organization_id: Optional[str] = None,
-            max_retries: int = 3
+            max_retries: int = 3,
+            http_client: Optional[httpx.AsyncClient] = None,
+            rate_limiter: Optional[RateLimiter] = None
     ):
         """
         Inicializa o provedor OpenAI.
@@ -33,208 +48,224 @@ class OpenAIProvider(AIProvider):
             model: Modelo a ser utilizado (default: gpt-4o)
             organization_id: ID da organização (opcional)
             max_retries: Número máximo de tentativas para chamadas de API
+            http_client: Cliente HTTP compartilhado (opcional)
+            rate_limiter: Limitador de RPM/TPM (default: limitador compartilhado do modelo)
         """
-        self.client = openai.OpenAI(
+        # Os 429 são tratados pelo RateLimiter, não pelas tentativas internas do SDK
+        self.client = openai.AsyncOpenAI(
             api_key=api_key,
-            organization=organization_id
+            organization=organization_id,
+            http_client=http_client,
+            max_retries=0
         )
         self.model = model
+        self.rate_limiter = rate_limiter or get_rate_limiter("openai", model)
         self.max_retries = max_retries
         self.prompt_engineering = PromptEngineering()
 
-        # Mapeamento de modelos para custos (USD por 1000 tokens)
-        # Valores aproximados, atualize conforme necessário
-        self._costs = {
-            "gpt-4o": 0.01,  # $0.01 por 1K tokens
-            "gpt-4": 0.03,  # $0.03 por 1K tokens
-            "gpt-3.5-turbo": 0.0015  # $0.0015 por 1K tokens
-        }
-
     @property
     def name(self) -> str:
         return "OpenAI"
 
     def get_cost_per_1k_tokens(self) -> float:
-        return self._costs.get(self.model, 0.01)  # Default se o modelo não estiver no dict
+        # Preço de entrada; o custo das chamadas usa os preços de entrada e saída separados
+        return self.get_model_price().input
+
+    def get_model_price(self, model: Optional[str] = None) -> ModelPrice:
+        return get_model_price(model or self.model, DEFAULT_PRICE)
+
+    def _build_messages(self, request: AIRequest) -> List[dict]:
+        """Monta as mensagens do chat a partir da requisição."""
+        messages = []
+
+        if request.system_message:
+            messages.append({"role": "system", "content": request.system_message})
+
+        # O prefixo estático vai no início da mensagem: a OpenAI reaproveita
+        # automaticamente prefixos idênticos de chamadas recentes
+        messages.append({"role": "user", "content": (request.cacheable_prefix or "") + request.prompt})
+
+        if request.continuation_of:
+            messages.append({"role": "assistant", "content": request.continuation_of})
+            messages.append({"role": "user", "content": CONTINUATION_PROMPT})
+
+        return messages
+
+    @staticmethod
+    def _response_format_params(request: AIRequest) -> dict:
+        """Parâmetros de saída estruturada (json_schema) da requisição, se houver schema."""
+        if not request.response_schema:
+            return {}
+
+        return {
+            "response_format": {
+                "type": "json_schema",
+                "json_schema": {
+                    "name": request.response_schema_name,
+                    "schema": request.response_schema,
+                    "strict": True,
+                },
+            }
+        }
 
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=2, max=10)
-    )
     async def generate_completion(self, request: AIRequest) -> AIResponse:
         """
         Gera uma completion usando a API da OpenAI.
 
+        Respostas cortadas em max_tokens são completadas com requisições de continuação.
+
         Args:
             request: Objeto com os parâmetros da requisição
 
         Returns:
             Objeto AIResponse com a resposta
         """
-        messages = []
+        return await self._complete_with_continuation(request, self._generate)
 
-        if request.system_message:
-            messages.append({"role": "system", "content": request.system_message})
-
-        messages.append({"role": "user", "content": request.prompt})
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_rate_limit_aware(wait_exponential(multiplier=1, min=2, max=10))
+    )
+    async def _generate(self, request: AIRequest) -> AIResponse:
+        """Faz uma única chamada à API da OpenAI."""
+        messages = self._build_messages(request)
+
+        estimate = self.estimate_request(request)
+        logger.debug(
+            f"Chamada OpenAI estimada em {estimate.prompt_tokens} tokens de entrada "
+            f"(~${estimate.estimated_cost:.4f})"
+        )
 
         try:
-            response: ChatCompletion = self.client.chat.completions.create(
-                model=request.model or self.model,
-                messages=messages,
-                temperature=request.temperature,
-                max_tokens=request.max_tokens,
-                stop=request.stop_sequences,
-            )
-
-            # Calcula o custo aproximado
-            prompt_tokens = response.usage.prompt_tokens
-            completion_tokens = response.usage.completion_tokens
-            total_tokens = prompt_tokens + completion_tokens
-            cost = (total_tokens / 1000) * self.get_cost_per_1k_tokens()
-
-            return AIResponse(
+            async with self.rate_limiter.reserve(estimate.expected_total_tokens) as reservation:
+                raw_response = await self.client.chat.completions.with_raw_response.create(
+                    model=request.model or self.model,
+                    messages=messages,
+                    temperature=request.temperature,
+                    max_tokens=estimate.max_tokens,
+                    stop=request.stop_sequences,
+                    **self._response_format_params(request),
+                )
+                response: ChatCompletion = raw_response.parse()
+
+                prompt_tokens = response.usage.prompt_tokens
+                completion_tokens = response.usage.completion_tokens
+                total_tokens = prompt_tokens + completion_tokens
+
+                reservation.headers = raw_response.headers
+                reservation.actual_tokens = total_tokens
+
+            details = getattr(response.usage, "prompt_tokens_details", None)
+            cached_tokens = getattr(details, "cached_tokens", None) or 0
+
+            cost = self.calculate_cost(request.model or self.model, prompt_tokens, completion_tokens, cached_tokens)
+
+            ai_response = AIResponse(
                 content=response.choices[0].message.content,
                 model=self.model,
                 tokens_used=total_tokens,
-                cost=cost
+                cost=cost,
+                cached_tokens=cached_tokens,
+                truncated=response.choices[0].finish_reason == "length",
+                input_tokens=prompt_tokens,
+                output_tokens=completion_tokens
+            )
+            self.record_usage(
+                ai_response.model,
+                ai_response.tokens_used,
+                ai_response.cost,
+                ai_response.cached_tokens,
+                ai_response.input_tokens,
+                ai_response.output_tokens
             )
 
+            return ai_response
+
         except Exception as e:
             logger.error(f"Erro na chamada para OpenAI: {str(e)}")
             raise
 
-    async def extract_transactions(
-            self,
-            text_content: str,
-            document_type: str,
-            predefined_categories: Optional[List[str]] = None,
-            document_id: int = 0,
-            user_id: int = 0,
-    ) -> List[Transaction]:
+    async def stream_completion(self, request: AIRequest) -> AsyncIterator[str]:
         """
-        Extrai transações de um documento utilizando a OpenAI.
+        Gera uma completion em streaming usando a API da OpenAI.
+
+        Respostas cortadas em max_tokens seguem no mesmo stream com as continuações.
 
         Args:
-            text_content: Texto extraído do documento
-            document_type: Tipo do documento
-            predefined_categories: Lista de categorias predefinidas (opcional)
-            document_id: ID do documento
-            user_id: ID do usuario
+            request: Objeto com os parâmetros da requisição
 
-        Returns:
-            Lista de objetos Transaction
+        Yields:
+            Pedaços do texto da resposta
         """
-        prompt = self.prompt_engineering.create_extraction_prompt(
-            text_content=text_content,
-            document_type=document_type,
-            predefined_categories=predefined_categories,
-            provider="openai"
-        )
+        async for delta in self._stream_with_continuation(request, self._stream):
+            yield delta
 
-        request = AIRequest(
-            prompt=prompt,
-            system_message="Você é um assistente especializado em extrair transações financeiras de documentos bancários. Forneça apenas o JSON solicitado sem explicações adicionais.",
-            temperature=0.0,  # Determinístico
-        )
+    async def _stream(self, request: AIRequest, outcome: StreamOutcome) -> AsyncIterator[str]:
+        """Faz um único streaming na API da OpenAI, registrando como ele terminou."""
+        estimate = self.estimate_request(request)
+        stream = await self._open_stream(request, estimate)
 
-        response = await self.generate_completion(request)
+        usage = None
 
         try:
-            response_text = response.content
-            json_start = response_text.find('{')
-            json_end = response_text.rfind('}') + 1
-
-            if json_start >= 0 and json_end > json_start:
-                json_data = response_text[json_start:json_end]
-                parsed_data = json.loads(json_data)
-
-                transactions = []
-                for item in parsed_data.get("transactions", []):
-                    try:
-                        item["user_id"] = user_id
-                        item["document_id"] = document_id
-                        transaction = Transaction(**item)
-                        transactions.append(transaction)
-                    except Exception as e:
-                        logger.error(f"Erro ao converter item para Transaction: {str(e)}")
-
-                return transactions
-            else:
-                logger.error("Não foi possível encontrar JSON na resposta")
-                return []
-
-        except Exception as e:
-            logger.error(f"Erro ao processar resposta da OpenAI: {str(e)}")
-            return []
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
 
-    async def categorize_transactions(
-            self,
-            transactions: List[Transaction],
-            predefined_categories: Optional[List[str]] = None
-    ) -> List[Transaction]:
-        """
-        Categoriza uma lista de transações utilizando a OpenAI.
+                if chunk.choices and chunk.choices[0].finish_reason:
+                    outcome.truncated = chunk.choices[0].finish_reason == "length"
 
-        Args:
-            transactions: Lista de transações a serem categorizadas
-            predefined_categories: Lista de categorias predefinidas (opcional)
+                # O último evento traz o uso da chamada (stream_options.include_usage)
+                if chunk.usage:
+                    usage = chunk.usage
 
-        Returns:
-            Lista de transações com categorias atualizadas
-        """
-        if not transactions:
-            return transactions
-
-        if all(
-                len(transaction.categories) > 0 and not ("" in transaction.categories)
-                for transaction in transactions
-        ):
-            return transactions
-
-        MAX_BATCH_SIZE = 10
-        batches = [
-            transactions[i:i + MAX_BATCH_SIZE]
-            for i in range(0, len(transactions), MAX_BATCH_SIZE)
-        ]
-
-        categorized_transactions = []
-
-        for batch in batches:
-            prompt = self.prompt_engineering.create_categorization_prompt(
-                transactions=batch,
-                predefined_categories=predefined_categories,
-                provider="openai"
-            )
+        except Exception as e:
+            logger.error(f"Erro no streaming da OpenAI: {str(e)}")
+            raise
 
-            request = AIRequest(
-                prompt=prompt,
-                system_message="Você é um assistente especializado em categorizar transações financeiras. Forneça apenas o JSON solicitado sem explicações adicionais.",
-                temperature=0.0,  # Determinístico
+        if usage is not None:
+            details = getattr(usage, "prompt_tokens_details", None)
+            cached_tokens = getattr(details, "cached_tokens", None) or 0
+
+            self.rate_limiter.release(estimate.expected_total_tokens - usage.total_tokens)
+            self.record_usage(
+                self.model,
+                usage.total_tokens,
+                self.calculate_cost(
+                    request.model or self.model, usage.prompt_tokens, usage.completion_tokens, cached_tokens
+                ),
+                cached_tokens,
+                usage.prompt_tokens,
+                usage.completion_tokens
             )
 
-            response = await self.generate_completion(request)
-
-            try:
-                response_text = response.content
-                json_start = response_text.find('{')
-                json_end = response_text.rfind('}') + 1
-
-                if json_start >= 0 and json_end > json_start:
-                    json_data = response_text[json_start:json_end]
-                    parsed_data = json.loads(json_data)
-
-                    for i, item in enumerate(parsed_data.get("transactions", [])):
-                        if i < len(batch):
-                            batch[i].categories = item.get("categories", [])
-                            batch[i].confidence_score = item.get("confidence_score", None)
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_rate_limit_aware(wait_exponential(multiplier=1, min=2, max=10))
+    )
+    async def _open_stream(self, request: AIRequest, estimate: TokenEstimate):
+        """
+        Abre a resposta em streaming dentro da reserva do limitador.
 
-                    categorized_transactions.extend(batch)
-                else:
-                    logger.error("Não foi possível encontrar JSON na resposta de categorização")
-                    categorized_transactions.extend(batch)
-            except Exception as e:
-                logger.error(f"Erro ao processar resposta de categorização: {str(e)}")
-                categorized_transactions.extend(batch)
+        Os tokens estimados ficam reservados até o fim do streaming, quando
+        `stream_completion` acerta a reserva com o uso real.
+        """
+        try:
+            async with self.rate_limiter.reserve(estimate.expected_total_tokens) as reservation:
+                raw_response = await self.client.chat.completions.with_raw_response.create(
+                    model=request.model or self.model,
+                    messages=self._build_messages(request),
+                    temperature=request.temperature,
+                    max_tokens=estimate.max_tokens,
+                    stop=request.stop_sequences,
+                    **self._response_format_params(request),
+                    stream=True,
+                    stream_options={"include_usage": True},
+                )
+                reservation.headers = raw_response.headers
+
+            return raw_response.parse()
 
-        return categorized_transactions
+        except Exception as e:
+            logger.error(f"Erro na chamada para OpenAI: {str(e)}")
+            raise
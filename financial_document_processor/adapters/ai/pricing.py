@@ -0,0 +1,74 @@
+from typing import Dict, Optional
+
+from pydantic import BaseModel
+
+
+class ModelPrice(BaseModel):
+    """
+    Preços de um modelo em USD por 1000 tokens, separados por tipo de token.
+    """
+    input: float
+    output: float
+    cached_input: Optional[float] = None  # Tokens de entrada lidos do cache de prompt (default: preço de entrada)
+    cache_write: Optional[float] = None  # Tokens de entrada gravados no cache de prompt (default: preço de entrada)
+
+    def cost(
+            self,
+            input_tokens: int,
+            output_tokens: int,
+            cached_tokens: int = 0,
+            cache_write_tokens: int = 0
+    ) -> float:
+        """
+        Calcula o custo de uma chamada.
+
+        Args:
+            input_tokens: Tokens de entrada, incluindo os lidos e os gravados no cache
+            output_tokens: Tokens de saída
+            cached_tokens: Tokens de entrada lidos do cache de prompt
+            cache_write_tokens: Tokens de entrada gravados no cache de prompt
+
+        Returns:
+            Custo em USD
+        """
+        cached_input = self.input if self.cached_input is None else self.cached_input
+        cache_write = self.input if self.cache_write is None else self.cache_write
+        uncached_tokens = max(input_tokens - cached_tokens - cache_write_tokens, 0)
+
+        return (
+            uncached_tokens * self.input
+            + cached_tokens * cached_input
+            + cache_write_tokens * cache_write
+            + output_tokens * self.output
+        ) / 1000
+
+
+# Preços de lista por modelo (USD por 1000 tokens); atualize conforme a tabela de cada provedor
+MODEL_PRICES: Dict[str, ModelPrice] = {
+    "gpt-4o": ModelPrice(input=0.0025, output=0.01, cached_input=0.00125),
+    "gpt-4o-mini": ModelPrice(input=0.00015, output=0.0006, cached_input=0.000075),
+    "gpt-4": ModelPrice(input=0.03, output=0.06),
+    "gpt-3.5-turbo": ModelPrice(input=0.0005, output=0.0015),
+    "claude-3-opus-20240229": ModelPrice(input=0.015, output=0.075, cached_input=0.0015, cache_write=0.01875),
+    "claude-3-sonnet-20240229": ModelPrice(input=0.003, output=0.015, cached_input=0.0003, cache_write=0.00375),
+    "claude-3-haiku-20240307": ModelPrice(input=0.00025, output=0.00125, cached_input=0.00003, cache_write=0.0003),
+    "claude-3-5-sonnet-20241022": ModelPrice(input=0.003, output=0.015, cached_input=0.0003, cache_write=0.00375),
+    "claude-3-5-haiku-20241022": ModelPrice(input=0.0008, output=0.004, cached_input=0.00008, cache_write=0.001),
+    "gemini-1.5-pro": ModelPrice(input=0.00125, output=0.005, cached_input=0.0003125),
+    "gemini-1.5-flash": ModelPrice(input=0.000075, output=0.0003, cached_input=0.00001875),
+    "gemini-1.0-pro": ModelPrice(input=0.0005, output=0.0015),
+}
+
+
+def get_model_price(model: Optional[str], default: ModelPrice) -> ModelPrice:
+    """
+    Obtém os preços de um modelo.
+
+    Args:
+        model: Nome do modelo
+        default: Preços usados quando o modelo não está na tabela
+
+    Returns:
+        Preços do modelo
+    """
+    return MODEL_PRICES.get(model or "", default)
@@ -0,0 +1,438 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Awaitable, Callable, Dict, Mapping, Optional, Tuple
+
+from pydantic import BaseModel
+
+from financial_document_processor.utils.metrics import AI_RATE_LIMIT_WAIT, AI_RATE_LIMITED
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimits(BaseModel):
+    """
+    Cotas de requisições e tokens por minuto de um modelo.
+    """
+    requests_per_minute: int
+    tokens_per_minute: int
+
+
+# Cotas por modelo (valores de contas de nível inicial); os cabeçalhos de
+# rate limit das respostas ajustam as cotas reais da conta em tempo de execução
+MODEL_RATE_LIMITS: Dict[str, RateLimits] = {
+    "gpt-4o": RateLimits(requests_per_minute=500, tokens_per_minute=30000),
+    "gpt-4o-mini": RateLimits(requests_per_minute=500, tokens_per_minute=200000),
+    "gpt-4": RateLimits(requests_per_minute=500, tokens_per_minute=10000),
+    "gpt-3.5-turbo": RateLimits(requests_per_minute=3500, tokens_per_minute=200000),
+    "claude-3-opus-20240229": RateLimits(requests_per_minute=50, tokens_per_minute=20000),
+    "claude-3-sonnet-20240229": RateLimits(requests_per_minute=50, tokens_per_minute=40000),
+    "claude-3-haiku-20240307": RateLimits(requests_per_minute=50, tokens_per_minute=50000),
+    "claude-3-5-sonnet-20241022": RateLimits(requests_per_minute=50, tokens_per_minute=40000),
+    "claude-3-5-haiku-20241022": RateLimits(requests_per_minute=50, tokens_per_minute=50000),
+    "gemini-1.5-pro": RateLimits(requests_per_minute=1000, tokens_per_minute=4000000),
+    "gemini-1.5-flash": RateLimits(requests_per_minute=2000, tokens_per_minute=4000000),
+    "gemini-1.0-pro": RateLimits(requests_per_minute=360, tokens_per_minute=120000),
+}
+
+DEFAULT_RATE_LIMITS = RateLimits(requests_per_minute=60, tokens_per_minute=60000)
+
+# Cabeçalhos de rate limit: (limite, restante) de requisições e de tokens
+_REQUEST_HEADERS = (
+    ("x-ratelimit-limit-requests", "x-ratelimit-remaining-requests"),
+    ("anthropic-ratelimit-requests-limit", "anthropic-ratelimit-requests-remaining"),
+)
+_TOKEN_HEADERS = (
+    ("x-ratelimit-limit-tokens", "x-ratelimit-remaining-tokens"),
+    ("anthropic-ratelimit-tokens-limit", "anthropic-ratelimit-tokens-remaining"),
+)
+
+
+class TokenBucket:
+    """
+    Balde de tokens com reposição contínua.
+
+    A capacidade corresponde à cota por minuto e o balde é reposto
+    proporcionalmente ao tempo decorrido (capacidade / 60 por segundo).
+    """
+
+    def __init__(self, capacity: float, clock: Callable[[], float] = time.monotonic):
+        """
+        Inicializa o balde cheio.
+
+        Args:
+            capacity: Cota por minuto
+            clock: Relógio monotônico em segundos
+        """
+        self.capacity = float(capacity)
+        self.level = float(capacity)
+        self._clock = clock
+        self._updated_at = clock()
+
+    @property
+    def refill_rate(self) -> float:
+        """Reposição por segundo."""
+        return self.capacity / 60.0
+
+    def refill(self) -> None:
+        """Repõe o balde de acordo com o tempo decorrido desde a última atualização."""
+        now = self._clock()
+        self.level = min(self.capacity, self.level + (now - self._updated_at) * self.refill_rate)
+        self._updated_at = now
+
+    def time_until(self, amount: float) -> float:
+        """
+        Calcula quanto tempo falta para o balde ter a quantidade pedida.
+
+        Args:
+            amount: Quantidade desejada
+
+        Returns:
+            Segundos de espera (0 se já houver saldo)
+        """
+        self.refill()
+        deficit = min(amount, self.capacity) - self.level
+        return max(0.0, deficit / self.refill_rate)
+
+    def consume(self, amount: float) -> None:
+        """Retira uma quantidade do balde (o saldo pode ficar negativo)."""
+        self.refill()
+        self.level -= amount
+
+    def give_back(self, amount: float) -> None:
+        """Devolve uma quantidade ao balde, sem ultrapassar a capacidade."""
+        self.refill()
+        self.level = min(self.capacity, self.level + amount)
+
+    def update(self, limit: Optional[float], remaining: Optional[float]) -> None:
+        """
+        Ajusta o balde aos valores informados pelo provedor.
+
+        Args:
+            limit: Cota real da conta, se informada
+            remaining: Saldo restante informado pelo provedor
+        """
+        self.refill()
+        if limit:
+            self.capacity = float(limit)
+        if remaining is not None:
+            self.level = min(self.level, float(remaining))
+
+
+class RateReservation:
+    """
+    Reserva de capacidade para uma chamada.
+
+    Após a chamada, `actual_tokens` deve receber o total real de tokens usados,
+    para que a diferença em relação à estimativa seja devolvida ou cobrada.
+    """
+
+    def __init__(self, tokens: int):
+        self.tokens = tokens
+        self.actual_tokens: Optional[int] = None
+        self.headers: Optional[Mapping[str, str]] = None
+
+
+class RateLimiter:
+    """
+    Limitador de requisições (RPM) e tokens (TPM) por minuto para um modelo.
+
+    Cada chamada reserva uma requisição e os tokens estimados antes de ser
+    enviada, esperando quando a cota do minuto está esgotada. Os cabeçalhos de
+    rate limit das respostas corrigem cotas e saldos, e um 429 com retry-after
+    pausa todas as chamadas do modelo pelo tempo indicado.
+    """
+
+    def __init__(
+            self,
+            requests_per_minute: int,
+            tokens_per_minute: int,
+            name: str = "",
+            clock: Callable[[], float] = time.monotonic,
+            sleep: Callable[[float], Awaitable[None]] = asyncio.sleep
+    ):
+        """
+        Inicializa o limitador.
+
+        Args:
+            requests_per_minute: Cota de requisições por minuto
+            tokens_per_minute: Cota de tokens por minuto
+            name: Nome do provedor, usado nas métricas
+            clock: Relógio monotônico em segundos
+            sleep: Função de espera assíncrona
+        """
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute, clock)
+        self.tokens = TokenBucket(tokens_per_minute, clock)
+        self._clock = clock
+        self._sleep = sleep
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: int) -> float:
+        """
+        Espera até haver cota para uma requisição com a quantidade de tokens informada e a reserva.
+
+        As esperas são atendidas em ordem de chegada.
+
+        Args:
+            tokens: Tokens estimados da chamada
+
+        Returns:
+            Tempo total de espera em segundos
+        """
+        waited = 0.0
+
+        async with self._lock:
+            while True:
+                wait = max(
+                    self._paused_until - self._clock(),
+                    self.requests.time_until(1),
+                    self.tokens.time_until(tokens),
+                )
+                if wait <= 0:
+                    break
+
+                await self._sleep(wait)
+                waited += wait
+
+            self.requests.consume(1)
+            self.tokens.consume(tokens)
+
+        AI_RATE_LIMIT_WAIT.labels(provider=self.name).observe(waited)
+        return waited
+
+    def release(self, tokens: int) -> None:
+        """
+        Devolve tokens reservados e não usados.
+
+        Args:
+            tokens: Quantidade de tokens a devolver (negativa para cobrar a mais)
+        """
+        if tokens >= 0:
+            self.tokens.give_back(tokens)
+        else:
+            self.tokens.consume(-tokens)
+
+    def available_fraction(self) -> float:
+        """
+        Fração da cota do minuto ainda disponível, a menor entre requisições e tokens.
+
+        Returns:
+            Valor entre 0 (esgotada ou pausada por um 429) e 1 (cota cheia)
+        """
+        if self._paused_until > self._clock():
+            return 0.0
+
+        self.requests.refill()
+        self.tokens.refill()
+        return max(0.0, min(self.requests.level / self.requests.capacity, self.tokens.level / self.tokens.capacity))
+
+    def pause(self, seconds: float) -> None:
+        """
+        Suspende novas chamadas pelo tempo indicado (ex: retry-after de um 429).
+
+        Args:
+            seconds: Duração da pausa
+        """
+        self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+    def update_from_headers(self, headers: Mapping[str, str]) -> None:
+        """
+        Ajusta cotas e saldos a partir dos cabeçalhos de rate limit da resposta.
+
+        Args:
+            headers: Cabeçalhos HTTP da resposta
+        """
+        self.requests.update(*_read_header_pair(headers, _REQUEST_HEADERS))
+        self.tokens.update(*_read_header_pair(headers, _TOKEN_HEADERS))
+
+    @asynccontextmanager
+    async def reserve(self, tokens: int) -> AsyncIterator[RateReservation]:
+        """
+        Reserva cota para uma chamada e acerta a reserva ao final.
+
+        Em caso de sucesso, a diferença entre os tokens reservados e
+        `actual_tokens` é devolvida (ou cobrada). Em caso de erro, os tokens
+        são devolvidos e, se o erro for um 429, as chamadas são pausadas pelo
+        retry-after informado.
+
+        Args:
+            tokens: Tokens estimados da chamada
+
+        Yields:
+            RateReservation da chamada
+        """
+        reservation = RateReservation(tokens)
+        await self.acquire(tokens)
+
+        try:
+            yield reservation
+        except Exception as e:
+            self.release(tokens)
+
+            headers = _error_headers(e)
+            if headers:
+                self.update_from_headers(headers)
+
+            if is_rate_limit_error(e):
+                AI_RATE_LIMITED.labels(provider=self.name).inc()
+                delay = retry_after_seconds(e)
+                if delay is None:
+                    # Sem retry-after: espera a reposição de uma fração do minuto
+                    delay = 60.0 / max(1.0, self.requests.capacity) * 2
+                logger.warning(f"Limite de requisições atingido em {self.name}, pausando por {delay:.1f}s")
+                self.pause(delay)
+            raise
+        else:
+            if reservation.headers:
+                self.update_from_headers(reservation.headers)
+            if reservation.actual_tokens is not None:
+                self.release(tokens - reservation.actual_tokens)
+
+
+def _read_header_pair(
+        headers: Mapping[str, str], names: Tuple[Tuple[str, str], ...]
+) -> Tuple[Optional[float], Optional[float]]:
+    """Lê o primeiro par (limite, restante) presente nos cabeçalhos."""
+    for limit_name, remaining_name in names:
+        remaining = _parse_number(headers.get(remaining_name))
+        if remaining is not None:
+            return _parse_number(headers.get(limit_name)), remaining
+    return None, None
+
+
+def _parse_number(value: Optional[str]) -> Optional[float]:
+    """Converte o valor de um cabeçalho numérico, ignorando valores inválidos."""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _error_headers(error: Exception) -> Optional[Mapping[str, str]]:
+    """Obtém os cabeçalhos HTTP da resposta associada a um erro de API, se houver."""
+    response = getattr(error, "response", None)
+    return getattr(response, "headers", None)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """
+    Verifica se um erro de provedor corresponde a um limite de requisições (HTTP 429).
+
+    Args:
+        error: Exceção lançada pelo SDK do provedor
+
+    Returns:
+        True se for um erro de rate limit
+    """
+    if getattr(error, "status_code", None) == 429:
+        return True
+    if getattr(error, "code", None) == 429:
+        return True
+    return type(error).__name__ in ("RateLimitError", "ResourceExhausted")
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """
+    Extrai o tempo de espera sugerido pelo provedor em um erro de rate limit.
+
+    Args:
+        error: Exceção lançada pelo SDK do provedor
+
+    Returns:
+        Segundos de espera ou None se o provedor não informou
+    """
+    headers = _error_headers(error)
+    if not headers:
+        return None
+
+    retry_after_ms = _parse_number(headers.get("retry-after-ms"))
+    if retry_after_ms is not None:
+        return retry_after_ms / 1000
+
+    retry_after = headers.get("retry-after")
+    if retry_after is None:
+        return None
+
+    seconds = _parse_number(retry_after)
+    if seconds is not None:
+        return seconds
+
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def wait_rate_limit_aware(fallback: Callable):
+    """
+    Estratégia de espera do tenacity que não soma backoff a erros de rate limit.
+
+    Em um 429 o RateLimiter já pausou as chamadas pelo retry-after, então a nova
+    tentativa é liberada imediatamente e aguarda na fila do limitador. Demais
+    erros usam a estratégia de espera informada.
+
+    Args:
+        fallback: Estratégia de espera para os demais erros
+
+    Returns:
+        Estratégia de espera para o decorador @retry
+    """
+
+    def wait(retry_state) -> float:
+        outcome = retry_state.outcome
+        if outcome is not None and outcome.failed and is_rate_limit_error(outcome.exception()):
+            return 0.0
+        return fallback(retry_state)
+
+    return wait
+
+
+_rate_limiters: Dict[Tuple[str, Optional[str], Optional[str]], RateLimiter] = {}
+
+
+def get_rate_limiter(
+        provider: str,
+        model: Optional[str],
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        account: Optional[str] = None
+) -> RateLimiter:
+    """
+    Obtém o limitador compartilhado de um provedor e modelo.
+
+    Todas as instâncias de provedor do mesmo modelo e da mesma conta
+    compartilham o limitador, pois a cota é da conta e não de cada cliente.
+    Cotas informadas para um limitador já criado substituem as atuais.
+
+    Args:
+        provider: Nome do provedor
+        model: Nome do modelo
+        requests_per_minute: Cota de requisições configurada (default: tabela por modelo)
+        tokens_per_minute: Cota de tokens configurada (default: tabela por modelo)
+        account: Conta dona da cota, quando há várias chaves no pool (default: conta única)
+
+    Returns:
+        Instância de RateLimiter
+    """
+    key = (provider.lower(), model, account)
+
+    limiter = _rate_limiters.get(key)
+    if limiter is None:
+        limits = MODEL_RATE_LIMITS.get(model or "", DEFAULT_RATE_LIMITS)
+        limiter = RateLimiter(
+            requests_per_minute=requests_per_minute or limits.requests_per_minute,
+            tokens_per_minute=tokens_per_minute or limits.tokens_per_minute,
+            name=provider,
+        )
+        _rate_limiters[key] = limiter
+    else:
+        limiter.requests.update(requests_per_minute, None)
+        limiter.tokens.update(tokens_per_minute, None)
+
+    return limiter
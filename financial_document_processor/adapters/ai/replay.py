@@ -0,0 +1,368 @@
+import asyncio
+import logging
+import math
+import random
+import time
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from financial_document_processor.adapters.ai.ai_provider import (
+    AIProvider,
+    AIProviderWrapper,
+    AIRequest,
+    AIResponse,
+    UsageTracker,
+    get_usage_tracker,
+    request_fingerprint,
+    track_usage,
+)
+from financial_document_processor.services.prompt_engineering import PromptEngineering
+
+logger = logging.getLogger(__name__)
+
+# Distribuições de latência aceitas na reprodução
+LATENCY_DISTRIBUTIONS = ("recorded", "exponential", "lognormal", "none")
+
+
+class CassetteMissError(LookupError):
+    """
+    Requisição sem resposta gravada na cassete.
+    """
+
+
+class InjectedAIError(RuntimeError):
+    """
+    Erro injetado pelo provedor de reprodução para simular falhas do provedor real.
+    """
+
+
+class CassetteEntry(BaseModel):
+    """
+    Resposta gravada de uma requisição, com a latência e o uso da chamada real.
+    """
+    key: str
+    provider: str
+    model: str
+    content: str
+    tokens_used: int
+    cost: float
+    cached_tokens: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    truncated: bool = False
+    latency: float  # Duração total da chamada em segundos
+    first_token_latency: Optional[float] = None  # Tempo até o primeiro pedaço, em streaming
+    chunks: Optional[List[str]] = None  # Pedaços da resposta, em streaming
+
+
+class Cassette:
+    """
+    Arquivo JSONL com respostas gravadas, indexadas pelo hash da requisição.
+
+    As entradas são carregadas na primeira consulta; gravações novas são
+    acrescentadas ao fim do arquivo e, para uma mesma chave, vale a última.
+    """
+
+    def __init__(self, path: str):
+        """
+        Inicializa a cassete.
+
+        Args:
+            path: Caminho do arquivo JSONL
+        """
+        self.path = Path(path)
+        self._entries: Optional[Dict[str, CassetteEntry]] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def entries(self) -> Dict[str, CassetteEntry]:
+        if self._entries is None:
+            self._entries = {}
+            if self.path.exists():
+                with self.path.open(encoding="utf-8") as file:
+                    for line in file:
+                        if line.strip():
+                            entry = CassetteEntry.model_validate_json(line)
+                            self._entries[entry.key] = entry
+                logger.info(f"Cassete {self.path} carregada com {len(self._entries)} respostas")
+
+        return self._entries
+
+    def get(self, key: str) -> Optional[CassetteEntry]:
+        """
+        Obtém a resposta gravada de uma requisição.
+
+        Args:
+            key: Hash da requisição
+
+        Returns:
+            Entrada gravada ou None se ausente
+        """
+        return self.entries.get(key)
+
+    async def add(self, entry: CassetteEntry) -> None:
+        """
+        Grava uma resposta.
+
+        Args:
+            entry: Entrada a gravar
+        """
+        async with self._lock:
+            self.entries[entry.key] = entry
+            await asyncio.to_thread(self._append, entry.model_dump_json())
+
+    def _append(self, line: str) -> None:
+        with self.path.open("a", encoding="utf-8") as file:
+            file.write(line + "\n")
+
+
+_cassettes: Dict[str, Cassette] = {}
+
+
+def get_cassette(path: str) -> Cassette:
+    """
+    Obtém a cassete compartilhada de um arquivo, criando-a na primeira chamada.
+
+    Args:
+        path: Caminho do arquivo JSONL
+
+    Returns:
+        Instância de Cassette
+    """
+    cassette = _cassettes.get(path)
+    if cassette is None:
+        cassette = Cassette(path)
+        _cassettes[path] = cassette
+    return cassette
+
+
+class RecordingAIProvider(AIProviderWrapper):
+    """
+    Provedor que repassa as chamadas ao provedor real e grava cada resposta, com
+    latência e uso, na cassete.
+
+    A chave combina o estilo de prompt do provedor, o modelo e a requisição, de
+    modo que a reprodução encontre a resposta sem conhecer o provedor real.
+    """
+
+    def __init__(self, provider: AIProvider, cassette: Cassette):
+        """
+        Inicializa o provedor de gravação.
+
+        Args:
+            provider: Provedor de IA real
+            cassette: Cassete onde as respostas são gravadas
+        """
+        super().__init__(provider)
+        self.cassette = cassette
+
+    def cassette_key(self, request: AIRequest) -> str:
+        return request_fingerprint(
+            self.prompt_style, request.model or getattr(self.provider, "model", None), request
+        )
+
+    async def generate_completion(self, request: AIRequest) -> AIResponse:
+        started = time.monotonic()
+        response = await self.provider.generate_completion(request)
+
+        await self.cassette.add(CassetteEntry(
+            key=self.cassette_key(request),
+            provider=self.name,
+            model=response.model,
+            content=response.content,
+            tokens_used=response.tokens_used,
+            cost=response.cost,
+            cached_tokens=response.cached_tokens,
+            input_tokens=response.input_tokens,
+            output_tokens=response.output_tokens,
+            truncated=response.truncated,
+            latency=time.monotonic() - started
+        ))
+
+        return response
+
+    async def stream_completion(self, request: AIRequest) -> AsyncIterator[str]:
+        model = request.model or getattr(self.provider, "model", None) or ""
+        started = time.monotonic()
+        first_token_latency = None
+        chunks = []
+
+        # O uso do streaming é registrado pelo provedor real; um acumulador próprio o captura
+        outer_usage = get_usage_tracker()
+        usage = UsageTracker()
+        with track_usage(usage):
+            async for delta in self.provider.stream_completion(request):
+                if first_token_latency is None:
+                    first_token_latency = time.monotonic() - started
+                chunks.append(delta)
+                yield delta
+
+        latency = time.monotonic() - started
+        # Repassa o uso ao acumulador do contexto externo, se houver
+        if outer_usage is not None:
+            outer_usage.merge(usage)
+
+        await self.cassette.add(CassetteEntry(
+            key=self.cassette_key(request),
+            provider=self.name,
+            model=model,
+            content="".join(chunks),
+            tokens_used=usage.tokens,
+            cost=usage.cost,
+            input_tokens=usage.input_tokens,
+            output_tokens=usage.output_tokens,
+            latency=latency,
+            first_token_latency=first_token_latency,
+            chunks=chunks
+        ))
+
+
+class ReplayAIProvider(AIProvider):
+    """
+    Provedor que serve respostas gravadas de uma cassete, sem chamadas de rede,
+    para testes de carga e de regressão reproduzíveis.
+
+    A latência de cada chamada segue a distribuição configurada em torno da
+    latência gravada ('recorded' repete a gravada, 'exponential' e 'lognormal'
+    sorteiam com a mesma média, 'none' responde imediatamente), multiplicada por
+    `latency_scale`. Uma fração `error_rate` das chamadas falha com
+    `InjectedAIError` após a latência sorteada.
+    """
+
+    def __init__(
+            self,
+            cassette: Cassette,
+            provider_name: str,
+            model: Optional[str] = None,
+            prompt_style: str = "openai",
+            latency_distribution: str = "recorded",
+            latency_scale: float = 1.0,
+            latency_sigma: float = 0.5,
+            error_rate: float = 0.0,
+            seed: Optional[int] = None
+    ):
+        """
+        Inicializa o provedor de reprodução.
+
+        Args:
+            cassette: Cassete com as respostas gravadas
+            provider_name: Nome do provedor gravado
+            model: Modelo gravado
+            prompt_style: Estilo de prompt do provedor gravado, para que as requisições coincidam
+            latency_distribution: Distribuição da latência ('recorded', 'exponential', 'lognormal', 'none')
+            latency_scale: Multiplicador da latência gravada
+            latency_sigma: Desvio padrão do logaritmo da latência na distribuição 'lognormal'
+            error_rate: Fração das chamadas que falham com erro injetado
+            seed: Semente do sorteio de latências e erros (opcional)
+
+        Raises:
+            ValueError: Se a distribuição de latência não for suportada
+        """
+        if latency_distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(
+                f"Distribuição de latência não suportada: {latency_distribution}. "
+                f"Opções disponíveis: {list(LATENCY_DISTRIBUTIONS)}"
+            )
+
+        self.cassette = cassette
+        self.provider_name = provider_name.lower()
+        self.model = model
+        self.prompt_style = prompt_style
+        self.latency_distribution = latency_distribution
+        self.latency_scale = latency_scale
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.prompt_engineering = PromptEngineering()
+        self._random = random.Random(seed)
+
+    @property
+    def name(self) -> str:
+        return f"Replay:{self.provider_name}"
+
+    def get_cost_per_1k_tokens(self) -> float:
+        # Custo médio das respostas gravadas para o modelo
+        entries = [entry for entry in self.cassette.entries.values() if entry.model == self.model]
+        tokens = sum(entry.tokens_used for entry in entries)
+        return sum(entry.cost for entry in entries) / tokens * 1000 if tokens else 0.0
+
+    async def generate_completion(self, request: AIRequest) -> AIResponse:
+        entry = self._lookup(request)
+        await asyncio.sleep(self._sample_latency(entry.latency))
+        self._maybe_fail()
+
+        response = AIResponse(
+            content=entry.content,
+            model=entry.model,
+            tokens_used=entry.tokens_used,
+            cost=entry.cost,
+            cached_tokens=entry.cached_tokens,
+            truncated=entry.truncated,
+            input_tokens=entry.input_tokens,
+            output_tokens=entry.output_tokens
+        )
+        self.record_usage(
+            response.model,
+            response.tokens_used,
+            response.cost,
+            response.cached_tokens,
+            response.input_tokens,
+            response.output_tokens
+        )
+
+        return response
+
+    async def stream_completion(self, request: AIRequest) -> AsyncIterator[str]:
+        entry = self._lookup(request)
+        chunks = entry.chunks or [entry.content]
+
+        # Mantém a proporção gravada entre o primeiro pedaço e o restante do stream
+        latency = self._sample_latency(entry.latency)
+        factor = latency / entry.latency if entry.latency else 0.0
+        first_token_latency = (entry.first_token_latency or 0.0) * factor
+        interval = (latency - first_token_latency) / max(len(chunks) - 1, 1)
+
+        await asyncio.sleep(first_token_latency)
+        self._maybe_fail()
+
+        for index, chunk in enumerate(chunks):
+            if index:
+                await asyncio.sleep(interval)
+            yield chunk
+
+        self.record_usage(
+            entry.model, entry.tokens_used, entry.cost, entry.cached_tokens, entry.input_tokens, entry.output_tokens
+        )
+
+    def _lookup(self, request: AIRequest) -> CassetteEntry:
+        """Obtém a resposta gravada da requisição ou falha se não houver."""
+        key = request_fingerprint(self.prompt_style, request.model or self.model, request)
+        entry = self.cassette.get(key)
+
+        if entry is None:
+            raise CassetteMissError(f"Nenhuma resposta gravada em {self.cassette.path} para a requisição {key[:12]}")
+
+        return entry
+
+    def _sample_latency(self, recorded: float) -> float:
+        """Sorteia a latência de uma chamada a partir da latência gravada."""
+        mean = recorded * self.latency_scale
+
+        if self.latency_distribution == "none" or mean <= 0:
+            return 0.0
+
+        if self.latency_distribution == "exponential":
+            return self._random.expovariate(1 / mean)
+
+        if self.latency_distribution == "lognormal":
+            # mu escolhido para que a média da distribuição seja a latência gravada
+            mu = math.log(mean) - self.latency_sigma ** 2 / 2
+            return self._random.lognormvariate(mu, self.latency_sigma)
+
+        return mean
+
+    def _maybe_fail(self) -> None:
+        """Falha com erro injetado na fração configurada das chamadas."""
+        if self.error_rate and self._random.random() < self.error_rate:
+            raise InjectedAIError(f"Erro injetado pelo provedor {self.name}")
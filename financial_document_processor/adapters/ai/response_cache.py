@@ -0,0 +1,345 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Optional
+
+from financial_document_processor.adapters.ai.ai_provider import (
+    AIProvider,
+    AIProviderWrapper,
+    AIRequest,
+    AIResponse,
+    request_fingerprint,
+)
+from financial_document_processor.utils.metrics import AI_RESPONSE_CACHE_REQUESTS, AI_RESPONSE_CACHE_SAVED_TOKENS
+from financial_document_processor.utils.tokenizer import get_tokenizer_service
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCacheBackend(ABC):
+    """
+    Interface para armazenamento de respostas de IA em cache.
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[str]:
+        """
+        Obtém uma resposta armazenada.
+
+        Args:
+            key: Chave da requisição
+
+        Returns:
+            Resposta serializada ou None se ausente ou expirada
+        """
+        pass
+
+    @abstractmethod
+    async def set(self, key: str, value: str) -> None:
+        """
+        Armazena uma resposta.
+
+        Args:
+            key: Chave da requisição
+            value: Resposta serializada
+        """
+        pass
+
+
+class SQLiteResponseCache(ResponseCacheBackend):
+    """
+    Cache de respostas em um arquivo SQLite local.
+
+    Entradas expiram após `ttl_seconds` e, quando o total passa de `max_entries`,
+    as menos usadas recentemente são removidas.
+    """
+
+    def __init__(self, path: str, max_entries: int = 10000, ttl_seconds: int = 7 * 24 * 3600):
+        """
+        Inicializa o cache.
+
+        Args:
+            path: Caminho do arquivo SQLite (':memory:' para cache em memória)
+            max_entries: Número máximo de respostas armazenadas
+            ttl_seconds: Tempo de vida de cada resposta em segundos
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = asyncio.Lock()
+
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS ai_response_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS idx_ai_response_cache_accessed_at ON ai_response_cache (accessed_at)"
+        )
+        self._connection.commit()
+
+    async def get(self, key: str) -> Optional[str]:
+        async with self._lock:
+            return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: str) -> None:
+        async with self._lock:
+            await asyncio.to_thread(self._set, key, value)
+
+    def _get(self, key: str) -> Optional[str]:
+        now = time.time()
+        row = self._connection.execute(
+            "SELECT value FROM ai_response_cache WHERE key = ? AND created_at > ?",
+            (key, now - self.ttl_seconds)
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        self._connection.execute("UPDATE ai_response_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        self._connection.commit()
+        return row[0]
+
+    def _set(self, key: str, value: str) -> None:
+        now = time.time()
+        self._connection.execute(
+            "INSERT OR REPLACE INTO ai_response_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, value, now, now)
+        )
+        self._evict(now)
+        self._connection.commit()
+
+    def _evict(self, now: float) -> None:
+        """Remove entradas expiradas e as menos usadas além do limite."""
+        self._connection.execute(
+            "DELETE FROM ai_response_cache WHERE created_at <= ?", (now - self.ttl_seconds,)
+        )
+        self._connection.execute("""
+            DELETE FROM ai_response_cache WHERE key IN (
+                SELECT key FROM ai_response_cache
+                ORDER BY accessed_at DESC
+                LIMIT -1 OFFSET ?
+            )
+        """, (self.max_entries,))
+
+
+class PostgresResponseCache(ResponseCacheBackend):
+    """
+    Cache de respostas no PostgreSQL, compartilhado entre réplicas do serviço.
+
+    Usa o pool asyncpg do repositório. Entradas expiram após `ttl_seconds`; a
+    limpeza das expiradas acontece a cada gravação.
+    """
+
+    def __init__(self, pool, ttl_seconds: int = 7 * 24 * 3600):
+        """
+        Inicializa o cache.
+
+        Args:
+            pool: Pool de conexões asyncpg
+            ttl_seconds: Tempo de vida de cada resposta em segundos
+        """
+        self.pool = pool
+        self.ttl_seconds = ttl_seconds
+
+    async def setup(self) -> None:
+        """
+        Verifica se a tabela do cache existe.
+
+        A tabela é criada pelas migrações do Alembic (002_ai_response_cache).
+
+        Raises:
+            RuntimeError: Se a tabela não existir
+        """
+        async with self.pool.acquire() as conn:
+            table = await conn.fetchval("SELECT to_regclass('ai_response_cache')")
+
+        if table is None:
+            raise RuntimeError(
+                "Tabela ai_response_cache não encontrada; "
+                "aplique as migrações com 'python scripts/db_migrate.py upgrade'"
+            )
+
+    async def get(self, key: str) -> Optional[str]:
+        async with self.pool.acquire() as conn:
+            return await conn.fetchval(
+                """
+                SELECT value FROM ai_response_cache
+                WHERE key = $1 AND created_at > now() - make_interval(secs => $2)
+                """,
+                key, float(self.ttl_seconds)
+            )
+
+    async def set(self, key: str, value: str) -> None:
+        async with self.pool.acquire() as conn:
+            await conn.execute(
+                """
+                INSERT INTO ai_response_cache (key, value, created_at) VALUES ($1, $2, now())
+                ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value, created_at = EXCLUDED.created_at
+                """,
+                key, value
+            )
+            await conn.execute(
+                "DELETE FROM ai_response_cache WHERE created_at <= now() - make_interval(secs => $1)",
+                float(self.ttl_seconds)
+            )
+
+
+class CachingAIProvider(AIProviderWrapper):
+    """
+    Provedor que guarda respostas de IA em cache antes de chamar o provedor real.
+
+    A chave combina provedor, modelo, temperatura, max_tokens, sequências de parada,
+    schema da resposta e o hash do system message com o prompt completo. Apenas
+    requisições com temperatura 0 são cacheadas, pois só elas são determinísticas.
+
+    Respostas cortadas em max_tokens e, quando a requisição define um schema,
+    respostas sem um objeto JSON com os campos obrigatórios não são gravadas:
+    a próxima chamada idêntica volta ao provedor em vez de repetir a falha.
+    """
+
+    def __init__(self, provider: AIProvider, backend: ResponseCacheBackend):
+        """
+        Inicializa o provedor com cache.
+
+        Args:
+            provider: Provedor de IA envolvido
+            backend: Armazenamento das respostas
+        """
+        super().__init__(provider)
+        self.backend = backend
+
+    def cache_key(self, request: AIRequest) -> str:
+        """
+        Calcula a chave de cache de uma requisição.
+
+        Args:
+            request: Parâmetros da requisição
+
+        Returns:
+            Hash SHA-256 hexadecimal
+        """
+        return request_fingerprint(self.name, request.model or getattr(self.provider, "model", None), request)
+
+    async def generate_completion(self, request: AIRequest) -> AIResponse:
+        if request.temperature != 0:
+            return await self.provider.generate_completion(request)
+
+        key = self.cache_key(request)
+
+        cached = await self._lookup(key)
+        if cached is not None:
+            return cached
+
+        response = await self.provider.generate_completion(request)
+        if not response.truncated and self._is_complete(request, response.content):
+            await self._store(key, response)
+
+        return response
+
+    async def stream_completion(self, request: AIRequest) -> AsyncIterator[str]:
+        if request.temperature != 0:
+            async for delta in self.provider.stream_completion(request):
+                yield delta
+            return
+
+        key = self.cache_key(request)
+
+        cached = await self._lookup(key)
+        if cached is not None:
+            yield cached.content
+            return
+
+        parts = []
+        async for delta in self.provider.stream_completion(request):
+            parts.append(delta)
+            yield delta
+
+        # O streaming não devolve o uso do provedor; os tokens são estimados localmente
+        content = "".join(parts)
+        if not self._is_complete(request, content):
+            return
+
+        estimate = self.estimate_request(request)
+        output_tokens = get_tokenizer_service().count_tokens(
+            content, self.name.lower(), request.model or getattr(self.provider, "model", None)
+        )
+
+        await self._store(key, AIResponse(
+            content=content,
+            model=request.model or getattr(self.provider, "model", ""),
+            tokens_used=estimate.prompt_tokens + output_tokens,
+            cost=0.0
+        ))
+
+    async def _lookup(self, key: str) -> Optional[AIResponse]:
+        """Consulta o cache, registrando acerto ou falha nas métricas."""
+        try:
+            cached = await self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"Erro ao consultar cache de respostas de IA: {str(e)}")
+            cached = None
+
+        if cached is None:
+            AI_RESPONSE_CACHE_REQUESTS.labels(provider=self.name, result="miss").inc()
+            return None
+
+        try:
+            response = AIResponse.model_validate_json(cached)
+        except ValueError as e:
+            # Entrada corrompida conta como falha; a resposta nova a substitui
+            logger.warning(f"Entrada inválida no cache de respostas de IA: {str(e)}")
+            AI_RESPONSE_CACHE_REQUESTS.labels(provider=self.name, result="miss").inc()
+            return None
+
+        AI_RESPONSE_CACHE_REQUESTS.labels(provider=self.name, result="hit").inc()
+        AI_RESPONSE_CACHE_SAVED_TOKENS.labels(provider=self.name).inc(response.tokens_used)
+        # A resposta em cache não gera nova cobrança
+        return response.model_copy(update={"cost": 0.0, "tokens_used": 0})
+
+    @staticmethod
+    def _is_complete(request: AIRequest, content: str) -> bool:
+        """
+        Verifica se uma resposta pode ser gravada no cache.
+
+        Sem schema, qualquer resposta é aceita. Com schema, a resposta precisa
+        conter um objeto JSON válido com os campos obrigatórios do schema; uma
+        resposta cortada (mesmo após as continuações) não fecha o JSON e é recusada.
+
+        Args:
+            request: Parâmetros da requisição
+            content: Texto da resposta
+
+        Returns:
+            True se a resposta pode ser cacheada
+        """
+        if not request.response_schema:
+            return True
+
+        # Provedores sem saída estruturada podem cercar o JSON com texto
+        json_start = content.find('{')
+        json_end = content.rfind('}') + 1
+        if json_start < 0 or json_end <= json_start:
+            return False
+
+        try:
+            parsed = json.loads(content[json_start:json_end])
+        except ValueError:
+            return False
+
+        return isinstance(parsed, dict) and all(
+            field in parsed for field in request.response_schema.get("required", [])
+        )
+
+    async def _store(self, key: str, response: AIResponse) -> None:
+        """Grava uma resposta no cache; falhas do armazenamento não interrompem a chamada."""
+        try:
+            await self.backend.set(key, response.model_dump_json())
+        except Exception as e:
+            logger.warning(f"Erro ao gravar cache de respostas de IA: {str(e)}")
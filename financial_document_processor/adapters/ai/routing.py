@@ -0,0 +1,143 @@
+import logging
+import math
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, TypeAdapter
+
+from financial_document_processor.adapters.ai.ai_provider import AIProvider
+
+logger = logging.getLogger(__name__)
+
+
+class Route(BaseModel):
+    """
+    Rota da tabela de roteamento: condições do documento e o modelo que o processa.
+
+    Condições ausentes aceitam qualquer valor.
+    """
+    name: str
+    provider: str
+    model: str
+    max_input_tokens: Optional[int] = None  # Aplica-se a documentos com até este tamanho estimado
+    document_types: Optional[List[str]] = None
+    content_types: Optional[List[str]] = None  # Prefixos de tipo MIME (ex: "image/")
+
+
+class RoutingTable:
+    """
+    Tabela ordenada de rotas; a primeira rota cujas condições são atendidas é escolhida.
+
+    As condições são pré-processadas na criação da tabela, de modo que a escolha
+    de uma rota é uma varredura de poucas comparações.
+    """
+
+    def __init__(self, routes: List[Route]):
+        """
+        Inicializa a tabela.
+
+        Args:
+            routes: Rotas em ordem de prioridade
+        """
+        self.routes = routes
+        self._conditions = [
+            (
+                route,
+                route.max_input_tokens if route.max_input_tokens is not None else math.inf,
+                frozenset(route.document_types) if route.document_types else None,
+                tuple(route.content_types) if route.content_types else None,
+            )
+            for route in routes
+        ]
+
+    @classmethod
+    def from_json(cls, text: str) -> "RoutingTable":
+        """
+        Cria a tabela a partir de uma lista de rotas em JSON.
+
+        Args:
+            text: JSON com a lista de rotas
+
+        Returns:
+            Instância de RoutingTable
+
+        Raises:
+            ValueError: Se o JSON não for uma lista de rotas válida
+        """
+        return cls(TypeAdapter(List[Route]).validate_json(text))
+
+    def select(self, input_tokens: int, document_type: str, content_type: str) -> Optional[Route]:
+        """
+        Escolhe a rota de um documento.
+
+        Args:
+            input_tokens: Tokens estimados do documento
+            document_type: Tipo do documento (ex: bank_statement)
+            content_type: Tipo MIME do conteúdo (ex: application/pdf)
+
+        Returns:
+            Primeira rota compatível ou None se nenhuma se aplicar
+        """
+        for route, max_tokens, document_types, content_types in self._conditions:
+            if input_tokens > max_tokens:
+                continue
+            if document_types is not None and document_type not in document_types:
+                continue
+            if content_types is not None and not content_type.startswith(content_types):
+                continue
+            return route
+
+        return None
+
+
+class ModelRouter:
+    """
+    Escolhe o provedor de IA de cada documento pela tabela de roteamento.
+
+    Os provedores de cada rota são criados sob demanda pela factory e reutilizados;
+    documentos sem rota compatível usam o provedor padrão.
+    """
+
+    DEFAULT_ROUTE = "default"
+
+    def __init__(
+            self,
+            table: RoutingTable,
+            provider_factory: Callable[[Route], AIProvider],
+            default_provider: AIProvider
+    ):
+        """
+        Inicializa o roteador.
+
+        Args:
+            table: Tabela de roteamento
+            provider_factory: Cria o provedor de uma rota
+            default_provider: Provedor usado quando nenhuma rota se aplica
+        """
+        self.table = table
+        self.provider_factory = provider_factory
+        self.default_provider = default_provider
+        self._providers: Dict[str, AIProvider] = {}
+
+    def route(self, input_tokens: int, document_type: str, content_type: str) -> Tuple[str, AIProvider]:
+        """
+        Escolhe a rota e o provedor de um documento.
+
+        Args:
+            input_tokens: Tokens estimados do documento
+            document_type: Tipo do documento
+            content_type: Tipo MIME do conteúdo
+
+        Returns:
+            Tupla (nome da rota, provedor)
+        """
+        route = self.table.select(input_tokens, document_type, content_type)
+        if route is None:
+            return self.DEFAULT_ROUTE, self.default_provider
+
+        provider = self._providers.get(route.name)
+        if provider is None:
+            provider = self.provider_factory(route)
+            self._providers[route.name] = provider
+            logger.info(f"Rota {route.name}: usando {route.provider}/{route.model}")
+
+        return route.name, provider
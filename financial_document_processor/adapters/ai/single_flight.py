@@ -0,0 +1,178 @@
+import asyncio
+import logging
+from typing import AsyncIterator, Dict, List, Optional
+
+from financial_document_processor.adapters.ai.ai_provider import (
+    AIProvider,
+    AIProviderWrapper,
+    AIRequest,
+    AIResponse,
+    request_fingerprint,
+)
+from financial_document_processor.utils.metrics import AI_SINGLE_FLIGHT_COALESCED, current_ai_usage_labels
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    """
+    Chamada em andamento compartilhada pelas requisições idênticas.
+    """
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class _StreamFlight:
+    """
+    Streaming em andamento compartilhado: guarda os pedaços recebidos para que
+    cada leitor os receba desde o início, inclusive os chegados antes de entrar.
+    """
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self.task: Optional[asyncio.Task] = None
+        self.readers = 0
+        self._changed = asyncio.Event()
+
+    def push(self, chunk: str) -> None:
+        self.chunks.append(chunk)
+        self._notify()
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.finished = True
+        self.error = error
+        self._notify()
+
+    def _notify(self) -> None:
+        # Acorda os leitores à espera e prepara o evento da próxima mudança
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def read(self) -> AsyncIterator[str]:
+        index = 0
+        while True:
+            while index < len(self.chunks):
+                yield self.chunks[index]
+                index += 1
+
+            if self.finished:
+                if self.error is not None:
+                    raise self.error
+                return
+
+            await self._changed.wait()
+
+
+class SingleFlightAIProvider(AIProviderWrapper):
+    """
+    Provedor que agrupa requisições idênticas em andamento em uma única chamada.
+
+    Enquanto uma chamada está em andamento, requisições com o mesmo hash
+    (provedor, modelo e parâmetros, como no cache de respostas) aguardam o seu
+    resultado em vez de gerar outra chamada. Complementa o cache, que só ajuda
+    depois que a primeira chamada termina.
+
+    O uso é cobrado uma única vez, no contexto da requisição que iniciou a
+    chamada; as agrupadas recebem a resposta com tokens e custo zerados. A
+    chamada compartilhada só é cancelada quando todas as requisições que a
+    aguardam são canceladas.
+    """
+
+    def __init__(self, provider: AIProvider):
+        """
+        Inicializa o provedor.
+
+        Args:
+            provider: Provedor de IA envolvido
+        """
+        super().__init__(provider)
+        self._flights: Dict[str, _Flight] = {}
+        self._stream_flights: Dict[str, _StreamFlight] = {}
+
+    def flight_key(self, request: AIRequest) -> str:
+        """
+        Calcula a chave que identifica requisições idênticas.
+
+        Args:
+            request: Parâmetros da requisição
+
+        Returns:
+            Hash SHA-256 hexadecimal
+        """
+        return request_fingerprint(self.name, request.model or getattr(self.provider, "model", None), request)
+
+    async def generate_completion(self, request: AIRequest) -> AIResponse:
+        key = self.flight_key(request)
+        flight = self._flights.get(key)
+        leader = flight is None
+
+        if leader:
+            # A tarefa herda o contexto de quem iniciou a chamada, onde o uso é registrado
+            flight = _Flight(asyncio.create_task(self.provider.generate_completion(request)))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(self._flights, key, flight))
+        else:
+            self._record_coalesced()
+
+        flight.waiters += 1
+        try:
+            response = await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+
+        if leader:
+            return response
+        return response.model_copy(update={"cost": 0.0, "tokens_used": 0, "input_tokens": 0, "output_tokens": 0})
+
+    async def stream_completion(self, request: AIRequest) -> AsyncIterator[str]:
+        key = self.flight_key(request)
+        flight = self._stream_flights.get(key)
+
+        if flight is None:
+            flight = _StreamFlight()
+            flight.task = asyncio.create_task(self._pump(request, flight))
+            self._stream_flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(self._stream_flights, key, flight))
+        else:
+            self._record_coalesced()
+
+        flight.readers += 1
+        try:
+            async for delta in flight.read():
+                yield delta
+        finally:
+            flight.readers -= 1
+            if flight.readers == 0 and not flight.task.done():
+                flight.task.cancel()
+
+    async def _pump(self, request: AIRequest, flight: _StreamFlight) -> None:
+        """Consome o streaming do provedor, repassando os pedaços aos leitores."""
+        try:
+            async for delta in self.provider.stream_completion(request):
+                flight.push(delta)
+        except asyncio.CancelledError as e:
+            flight.finish(e)
+            raise
+        except Exception as e:
+            # O erro é entregue aos leitores, e não à tarefa, que ninguém aguarda
+            flight.finish(e)
+        else:
+            flight.finish()
+
+    def _record_coalesced(self) -> None:
+        """Registra uma requisição atendida pela chamada em andamento."""
+        operation = current_ai_usage_labels()["operation"]
+        AI_SINGLE_FLIGHT_COALESCED.labels(provider=self.name, operation=operation).inc()
+        logger.debug(f"Requisição idêntica a uma chamada em andamento em {self.name} agrupada ({operation})")
+
+    @staticmethod
+    def _forget(flights: Dict, key: str, flight) -> None:
+        """Remove a chamada encerrada, se ainda for a registrada para a chave."""
+        if flights.get(key) is flight:
+            del flights[key]
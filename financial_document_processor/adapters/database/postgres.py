@@ -261,6 +261,52 @@ class PostgresRepository(Repository):
                 logger.error(f"Erro ao buscar documento {document_id}: {str(e)}")
                 raise
 
+    @async_retry(max_retries=3)
+    async def get_documents_by_status(
+            self, status: DocumentStatus, limit: int = 100, after_id: int = 0
+    ) -> List[Document]:
+        """
+        Obtém documentos em um status, em ordem de ID.
+
+        Args:
+            status: Status dos documentos
+            limit: Número máximo de documentos
+            after_id: Retorna apenas documentos com ID maior que este (paginação)
+
+        Returns:
+            Lista de documentos
+        """
+        async with self.pool.acquire() as conn:
+            try:
+                rows = await conn.fetch(
+                    "SELECT * FROM documents WHERE status = $1 AND id > $2 ORDER BY id LIMIT $3",
+                    status.value, after_id, limit
+                )
+
+                documents = []
+                for row in rows:
+                    categories = json.loads(row['categories']) if row['categories'] else None
+
+                    documents.append(Document(
+                        id=row['id'],
+                        external_id=row['external_id'],
+                        user_id=row['user_id'],
+                        document_type=row['document_type'],
+                        filename=row['filename'],
+                        content_type=row['content_type'],
+                        file_content=row['file_content'],
+                        categories=categories,
+                        status=DocumentStatus(row['status']),
+                        created_at=row['created_at'],
+                        updated_at=row['updated_at']
+                    ))
+
+                return documents
+
+            except Exception as e:
+                logger.error(f"Erro ao buscar documentos com status {status.value}: {str(e)}")
+                raise
+
     @async_retry(max_retries=3)
     async def update_document_status(
             self, document_id: int, status: DocumentStatus
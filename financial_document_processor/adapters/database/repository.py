@@ -48,6 +48,23 @@ class Repository(ABC):
         """
         pass
 
+    @abstractmethod
+    async def get_documents_by_status(
+            self, status: DocumentStatus, limit: int = 100, after_id: int = 0
+    ) -> List[Document]:
+        """
+        Obtém documentos em um status, em ordem de ID.
+
+        Args:
+            status: Status dos documentos
+            limit: Número máximo de documentos
+            after_id: Retorna apenas documentos com ID maior que este (paginação)
+
+        Returns:
+            Lista de documentos
+        """
+        pass
+
     @abstractmethod
     async def update_document_status(
             self, document_id: int, status: DocumentStatus
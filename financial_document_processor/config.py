@@ -62,6 +62,27 @@ class AISettings(BaseModel):
         default=None,
         description="ID da organização na OpenAI"
     )
+    openai_api_keys: str = Field(
+        default="",
+        description="Chaves de API adicionais da OpenAI para o pool, separadas por vírgula, "
+                    "no formato chave ou chave:organização"
+    )
+    openai_chunk_tokens: int = Field(
+        default=4000,
+        description="Tamanho máximo (tokens) de cada trecho enviado à OpenAI"
+    )
+    openai_max_concurrency: int = Field(
+        default=4,
+        description="Número máximo de extrações simultâneas na OpenAI"
+    )
+    openai_rate_limit_rpm: Optional[int] = Field(
+        default=None,
+        description="Cota de requisições por minuto do modelo principal da OpenAI (default: tabela por modelo)"
+    )
+    openai_rate_limit_tpm: Optional[int] = Field(
+        default=None,
+        description="Cota de tokens por minuto do modelo principal da OpenAI (default: tabela por modelo)"
+    )
     gemini_api_key: Optional[str] = Field(
         default=None,
         description="Chave de API do Google Gemini"
@@ -70,18 +91,224 @@ class AISettings(BaseModel):
         default="gemini-1.5-pro",
         description="Modelo do Gemini a ser utilizado"
     )
+    gemini_chunk_tokens: int = Field(
+        default=8000,
+        description="Tamanho máximo (tokens) de cada trecho enviado ao Gemini"
+    )
+    gemini_max_concurrency: int = Field(
+        default=4,
+        description="Número máximo de extrações simultâneas no Gemini"
+    )
+    gemini_rate_limit_rpm: Optional[int] = Field(
+        default=None,
+        description="Cota de requisições por minuto do modelo principal do Gemini (default: tabela por modelo)"
+    )
+    gemini_rate_limit_tpm: Optional[int] = Field(
+        default=None,
+        description="Cota de tokens por minuto do modelo principal do Gemini (default: tabela por modelo)"
+    )
+    gemini_model_cache_size: int = Field(
+        default=32,
+        description="Número máximo de modelos do Gemini configurados mantidos para reuso"
+    )
     claude_api_key: Optional[str] = Field(
         default=None,
         description="Chave de API da Anthropic Claude"
     )
+    claude_api_keys: str = Field(
+        default="",
+        description="Chaves de API adicionais da Anthropic para o pool, separadas por vírgula"
+    )
     claude_model: str = Field(
         default="claude-3-opus-20240229",
         description="Modelo do Claude a ser utilizado"
     )
+    claude_chunk_tokens: int = Field(
+        default=6000,
+        description="Tamanho máximo (tokens) de cada trecho enviado ao Claude"
+    )
+    claude_max_concurrency: int = Field(
+        default=4,
+        description="Número máximo de extrações simultâneas no Claude"
+    )
+    claude_rate_limit_rpm: Optional[int] = Field(
+        default=None,
+        description="Cota de requisições por minuto do modelo principal do Claude (default: tabela por modelo)"
+    )
+    claude_rate_limit_tpm: Optional[int] = Field(
+        default=None,
+        description="Cota de tokens por minuto do modelo principal do Claude (default: tabela por modelo)"
+    )
+    cascade_enabled: bool = Field(
+        default=False,
+        description="Tenta primeiro o modelo barato e escala para o modelo principal quando necessário"
+    )
+    openai_cascade_model: str = Field(
+        default="gpt-4o-mini",
+        description="Modelo barato da OpenAI usado na cascata"
+    )
+    gemini_cascade_model: str = Field(
+        default="gemini-1.5-flash",
+        description="Modelo barato do Gemini usado na cascata"
+    )
+    claude_cascade_model: str = Field(
+        default="claude-3-haiku-20240307",
+        description="Modelo barato do Claude usado na cascata"
+    )
+    cascade_confidence_threshold: float = Field(
+        default=0.7,
+        description="Confiança mínima para aceitar a resposta do modelo barato"
+    )
+    routing_table: Optional[str] = Field(
+        default=None,
+        description="Tabela de roteamento de modelos em JSON (lista de rotas avaliadas em ordem)"
+    )
+    failover_providers: str = Field(
+        default="",
+        description="Provedores reserva separados por vírgula, em ordem, usados quando o principal falha"
+    )
+    hedging_enabled: bool = Field(
+        default=False,
+        description="Duplica a requisição no próximo provedor quando a primeira passa do p95 de latência"
+    )
+    hedge_max_ratio: float = Field(
+        default=0.05,
+        description="Fração máxima das requisições que podem ser duplicadas pelo hedge"
+    )
+    hedge_default_delay: float = Field(
+        default=10.0,
+        description="Atraso (segundos) do hedge enquanto não há amostras de latência"
+    )
+    circuit_breaker_enabled: bool = Field(
+        default=True,
+        description="Protege cada provedor e modelo com um circuit breaker"
+    )
+    circuit_failure_rate: float = Field(
+        default=0.5,
+        description="Fração de chamadas ruins (erro ou lentas) que abre o circuito"
+    )
+    circuit_slow_call_seconds: float = Field(
+        default=30.0,
+        description="Latência (segundos) a partir da qual uma chamada conta como ruim"
+    )
+    circuit_open_seconds: float = Field(
+        default=30.0,
+        description="Tempo (segundos) que o circuito fica aberto antes de testar o provedor"
+    )
+    batch_api_max_requests: int = Field(
+        default=10000,
+        description="Número máximo de requisições por lote no reprocessamento em massa"
+    )
+    batch_api_flush_delay: float = Field(
+        default=5.0,
+        description="Segundos sem chamadas novas antes de enviar um lote"
+    )
+    batch_api_poll_interval: float = Field(
+        default=60.0,
+        description="Intervalo (segundos) entre consultas a um lote enviado"
+    )
+    batch_api_base_url: Optional[str] = Field(
+        default=None,
+        description="URL base da API de lotes (default: a API oficial do provedor)"
+    )
+    replay_mode: str = Field(
+        default="off",
+        description="Gravação ou reprodução das respostas de IA (off, record, replay)"
+    )
+    replay_cassette_path: str = Field(
+        default="ai_cassette.jsonl",
+        description="Arquivo JSONL com as respostas gravadas"
+    )
+    replay_latency_distribution: str = Field(
+        default="recorded",
+        description="Distribuição da latência na reprodução (recorded, exponential, lognormal, none)"
+    )
+    replay_latency_scale: float = Field(
+        default=1.0,
+        description="Multiplicador da latência gravada na reprodução"
+    )
+    replay_error_rate: float = Field(
+        default=0.0,
+        description="Fração das chamadas reproduzidas que falham com erro injetado"
+    )
+    replay_seed: Optional[int] = Field(
+        default=None,
+        description="Semente do sorteio de latências e erros na reprodução"
+    )
+    chunk_overlap_tokens: int = Field(
+        default=150,
+        description="Sobreposição (tokens) entre trechos consecutivos de um documento"
+    )
+    line_filter_enabled: bool = Field(
+        default=False,
+        description="Retira do texto as linhas sem datas nem valores (cabeçalhos, avisos) antes da extração"
+    )
+    line_filter_context_lines: int = Field(
+        default=1,
+        description="Linhas mantidas pelo pré-filtro antes e depois de cada linha de transação"
+    )
+    extraction_line_references: bool = Field(
+        default=False,
+        description="Extração por referência de linha: o modelo responde com o número da linha "
+                    "de cada transação e a descrição é recortada do texto, reduzindo os tokens de saída"
+    )
+    category_shortlist_size: int = Field(
+        default=20,
+        description="Categorias enviadas por lote ou trecho, escolhidas por similaridade "
+                    "(TF-IDF) com as transações; 0 envia a lista completa"
+    )
     batch_size: int = Field(
         default=10,
         description="Tamanho do lote para chamadas de API"
     )
+    response_cache_backend: str = Field(
+        default="none",
+        description="Armazenamento do cache de respostas de IA (none, sqlite, postgres)"
+    )
+    response_cache_path: str = Field(
+        default="ai_response_cache.sqlite3",
+        description="Arquivo SQLite do cache de respostas de IA"
+    )
+    response_cache_max_entries: int = Field(
+        default=10000,
+        description="Número máximo de respostas no cache SQLite"
+    )
+    response_cache_ttl_seconds: int = Field(
+        default=604800,
+        description="Tempo de vida (segundos) das respostas em cache"
+    )
+    single_flight_enabled: bool = Field(
+        default=True,
+        description="Agrupa requisições de IA idênticas em andamento em uma única chamada"
+    )
+    http_max_connections: int = Field(
+        default=100,
+        description="Número máximo de conexões HTTP simultâneas com os provedores de IA"
+    )
+    http_max_keepalive_connections: int = Field(
+        default=20,
+        description="Número máximo de conexões HTTP ociosas mantidas abertas"
+    )
+    http_keepalive_expiry: float = Field(
+        default=30.0,
+        description="Tempo (segundos) que uma conexão ociosa permanece aberta"
+    )
+    http2: bool = Field(
+        default=True,
+        description="Usa HTTP/2 nas chamadas aos provedores de IA"
+    )
+    http_timeout: float = Field(
+        default=120.0,
+        description="Timeout (segundos) de leitura e escrita das chamadas HTTP"
+    )
+    http_connect_timeout: float = Field(
+        default=10.0,
+        description="Timeout (segundos) para abrir uma conexão HTTP"
+    )
+    http_pool_timeout: float = Field(
+        default=30.0,
+        description="Timeout (segundos) de espera por uma conexão livre no pool"
+    )
 
 
 class OCRSettings(BaseModel):
@@ -161,11 +388,67 @@ def get_settings() -> Settings:
         openai_api_key=os.getenv("OPENAI_API_KEY"),
         openai_model=os.getenv("OPENAI_MODEL", "gpt-4o"),
         openai_organization_id=os.getenv("OPENAI_ORGANIZATION_ID"),
+        openai_api_keys=os.getenv("OPENAI_API_KEYS", ""),
+        openai_chunk_tokens=int(os.getenv("OPENAI_CHUNK_TOKENS", "4000")),
+        openai_max_concurrency=int(os.getenv("OPENAI_MAX_CONCURRENCY", "4")),
+        openai_rate_limit_rpm=int(os.getenv("OPENAI_RATE_LIMIT_RPM") or "0") or None,
+        openai_rate_limit_tpm=int(os.getenv("OPENAI_RATE_LIMIT_TPM") or "0") or None,
         gemini_api_key=os.getenv("GEMINI_API_KEY"),
         gemini_model=os.getenv("GEMINI_MODEL", "gemini-1.5-pro"),
+        gemini_chunk_tokens=int(os.getenv("GEMINI_CHUNK_TOKENS", "8000")),
+        gemini_max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", "4")),
+        gemini_rate_limit_rpm=int(os.getenv("GEMINI_RATE_LIMIT_RPM") or "0") or None,
+        gemini_rate_limit_tpm=int(os.getenv("GEMINI_RATE_LIMIT_TPM") or "0") or None,
+        gemini_model_cache_size=int(os.getenv("GEMINI_MODEL_CACHE_SIZE", "32")),
         claude_api_key=os.getenv("ANTHROPIC_API_KEY"),
+        claude_api_keys=os.getenv("ANTHROPIC_API_KEYS", ""),
         claude_model=os.getenv("CLAUDE_MODEL", "claude-3-opus-20240229"),
+        claude_chunk_tokens=int(os.getenv("CLAUDE_CHUNK_TOKENS", "6000")),
+        claude_max_concurrency=int(os.getenv("CLAUDE_MAX_CONCURRENCY", "4")),
+        claude_rate_limit_rpm=int(os.getenv("CLAUDE_RATE_LIMIT_RPM") or "0") or None,
+        claude_rate_limit_tpm=int(os.getenv("CLAUDE_RATE_LIMIT_TPM") or "0") or None,
+        cascade_enabled=os.getenv("AI_CASCADE_ENABLED", "false").lower() in ("true", "1", "yes"),
+        openai_cascade_model=os.getenv("OPENAI_CASCADE_MODEL", "gpt-4o-mini"),
+        gemini_cascade_model=os.getenv("GEMINI_CASCADE_MODEL", "gemini-1.5-flash"),
+        claude_cascade_model=os.getenv("CLAUDE_CASCADE_MODEL", "claude-3-haiku-20240307"),
+        cascade_confidence_threshold=float(os.getenv("AI_CASCADE_CONFIDENCE_THRESHOLD", "0.7")),
+        routing_table=os.getenv("AI_ROUTING_TABLE") or None,
+        failover_providers=os.getenv("AI_FAILOVER_PROVIDERS", ""),
+        hedging_enabled=os.getenv("AI_HEDGING_ENABLED", "false").lower() in ("true", "1", "yes"),
+        hedge_max_ratio=float(os.getenv("AI_HEDGE_MAX_RATIO", "0.05")),
+        hedge_default_delay=float(os.getenv("AI_HEDGE_DEFAULT_DELAY", "10")),
+        circuit_breaker_enabled=os.getenv("AI_CIRCUIT_BREAKER_ENABLED", "true").lower() in ("true", "1", "yes"),
+        circuit_failure_rate=float(os.getenv("AI_CIRCUIT_FAILURE_RATE", "0.5")),
+        circuit_slow_call_seconds=float(os.getenv("AI_CIRCUIT_SLOW_CALL_SECONDS", "30")),
+        circuit_open_seconds=float(os.getenv("AI_CIRCUIT_OPEN_SECONDS", "30")),
+        batch_api_max_requests=int(os.getenv("AI_BATCH_API_MAX_REQUESTS", "10000")),
+        batch_api_flush_delay=float(os.getenv("AI_BATCH_API_FLUSH_DELAY", "5")),
+        batch_api_poll_interval=float(os.getenv("AI_BATCH_API_POLL_INTERVAL", "60")),
+        batch_api_base_url=os.getenv("AI_BATCH_API_BASE_URL") or None,
+        replay_mode=os.getenv("AI_REPLAY_MODE", "off"),
+        replay_cassette_path=os.getenv("AI_REPLAY_CASSETTE_PATH", "ai_cassette.jsonl"),
+        replay_latency_distribution=os.getenv("AI_REPLAY_LATENCY_DISTRIBUTION", "recorded"),
+        replay_latency_scale=float(os.getenv("AI_REPLAY_LATENCY_SCALE", "1.0")),
+        replay_error_rate=float(os.getenv("AI_REPLAY_ERROR_RATE", "0")),
+        replay_seed=int(os.getenv("AI_REPLAY_SEED")) if os.getenv("AI_REPLAY_SEED") else None,
+        chunk_overlap_tokens=int(os.getenv("AI_CHUNK_OVERLAP_TOKENS", "150")),
+        line_filter_enabled=os.getenv("AI_LINE_FILTER_ENABLED", "false").lower() in ("true", "1", "yes"),
+        line_filter_context_lines=int(os.getenv("AI_LINE_FILTER_CONTEXT_LINES", "1")),
+        extraction_line_references=os.getenv("AI_EXTRACTION_LINE_REFERENCES", "false").lower() in ("true", "1", "yes"),
+        category_shortlist_size=int(os.getenv("AI_CATEGORY_SHORTLIST_SIZE", "20")),
         batch_size=int(os.getenv("AI_BATCH_SIZE", "10")),
+        response_cache_backend=os.getenv("AI_RESPONSE_CACHE_BACKEND", "none"),
+        response_cache_path=os.getenv("AI_RESPONSE_CACHE_PATH", "ai_response_cache.sqlite3"),
+        response_cache_max_entries=int(os.getenv("AI_RESPONSE_CACHE_MAX_ENTRIES", "10000")),
+        response_cache_ttl_seconds=int(os.getenv("AI_RESPONSE_CACHE_TTL_SECONDS", "604800")),
+        single_flight_enabled=os.getenv("AI_SINGLE_FLIGHT_ENABLED", "true").lower() in ("true", "1", "yes"),
+        http_max_connections=int(os.getenv("AI_HTTP_MAX_CONNECTIONS", "100")),
+        http_max_keepalive_connections=int(os.getenv("AI_HTTP_MAX_KEEPALIVE_CONNECTIONS", "20")),
+        http_keepalive_expiry=float(os.getenv("AI_HTTP_KEEPALIVE_EXPIRY", "30")),
+        http2=os.getenv("AI_HTTP2", "true").lower() in ("true", "1", "yes"),
+        http_timeout=float(os.getenv("AI_HTTP_TIMEOUT", "120")),
+        http_connect_timeout=float(os.getenv("AI_HTTP_CONNECT_TIMEOUT", "10")),
+        http_pool_timeout=float(os.getenv("AI_HTTP_POOL_TIMEOUT", "30")),
     )
 
     ocr_settings = OCRSettings(
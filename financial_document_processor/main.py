@@ -2,9 +2,22 @@ import asyncio
 import logging
 import signal
 import sys
-from typing import Dict
+from typing import Dict, Optional, Tuple
 
 from financial_document_processor.adapters.ai import create_ai_provider
+from financial_document_processor.adapters.ai.ai_provider import AIProvider
+from financial_document_processor.adapters.ai.cascade import CascadeAIProvider
+from financial_document_processor.adapters.ai.circuit_breaker import CircuitBreaker, CircuitBreakerAIProvider
+from financial_document_processor.adapters.ai.failover import FailoverAIProvider
+from financial_document_processor.adapters.ai.http_client import close_shared_http_client
+from financial_document_processor.adapters.ai.response_cache import (
+    CachingAIProvider,
+    PostgresResponseCache,
+    ResponseCacheBackend,
+    SQLiteResponseCache,
+)
+from financial_document_processor.adapters.ai.routing import ModelRouter, RoutingTable
+from financial_document_processor.adapters.ai.single_flight import SingleFlightAIProvider
 from financial_document_processor.adapters.database.postgres import PostgresRepository
 from financial_document_processor.adapters.kafka_consumer import KafkaConsumer
 from financial_document_processor.adapters.kafka_producer import KafkaProducer
@@ -40,6 +53,7 @@ class Application:
         self.kafka_consumer = None
         self.kafka_producer = None
         self.ai_provider = None
+        self.model_router = None
         self.file_decoder = None
         self.categorization_service = None
         self.document_processor = None
@@ -63,12 +77,7 @@ class Application:
             )
             await self.kafka_producer.start()
 
-            self.ai_provider = create_ai_provider(
-                provider_name=self.settings.ai.provider,
-                api_key=self._get_api_key_for_provider(),
-                model=self._get_model_for_provider(),
-                organization_id=self.settings.ai.openai_organization_id
-            )
+            self.ai_provider = await self._setup_ai_provider()
             logger.info(f"Usando provedor de IA: {self.settings.ai.provider}")
 
             self.file_decoder = FileDecoder(
@@ -81,15 +90,25 @@ class Application:
                 ai_provider=self.ai_provider,
                 predefined_categories=None,
                 batch_size=self.settings.ai.batch_size,
-                enable_caching=True
+                enable_caching=True,
+                category_shortlist_size=self.settings.ai.category_shortlist_size
             )
             logger.info("Serviço de categorização inicializado")
 
+            chunk_size, max_concurrency = self._get_chunking_for_provider()
             self.document_processor = DocumentProcessor(
                 file_decoder=self.file_decoder,
                 ai_provider=self.ai_provider,
                 parsers=self.parsers,
-                categorization_service=self.categorization_service
+                categorization_service=self.categorization_service,
+                chunk_size=chunk_size,
+                chunk_overlap=self.settings.ai.chunk_overlap_tokens,
+                max_concurrency=max_concurrency,
+                router=self.model_router,
+                line_filter_enabled=self.settings.ai.line_filter_enabled,
+                line_filter_context_lines=self.settings.ai.line_filter_context_lines,
+                line_references=self.settings.ai.extraction_line_references,
+                category_shortlist_size=self.settings.ai.category_shortlist_size
             )
 
             self.kafka_consumer = KafkaConsumer(
@@ -118,22 +137,194 @@ class Application:
             "bank_statement": BankStatementParser(ai_provider=self.ai_provider),
         }
 
-    def _get_api_key_for_provider(self) -> str:
+    async def _setup_ai_provider(self) -> AIProvider:
+        """
+        Cria o provedor de IA configurado, com cache de respostas, a cascata entre o
+        modelo barato e o modelo principal e o failover entre provedores, se habilitados.
+
+        Returns:
+            Provedor de IA
+        """
+        cache_backend = await self._setup_response_cache()
+
+        provider = self._with_failover(self._create_provider_chain(cache_backend), cache_backend)
+
+        if self.settings.ai.routing_table:
+            # Rotas passam pela mesma cascata e pelo mesmo failover que o provedor padrão
+            self.model_router = ModelRouter(
+                table=RoutingTable.from_json(self.settings.ai.routing_table),
+                provider_factory=lambda route: self._with_failover(
+                    self._create_provider_chain(cache_backend, route.provider, route.model),
+                    cache_backend,
+                    route.provider
+                ),
+                default_provider=provider
+            )
+            logger.info(f"Roteamento de modelos habilitado ({len(self.model_router.table.routes)} rotas)")
+
+        return provider
+
+    def _with_failover(
+            self,
+            provider: AIProvider,
+            cache_backend: Optional[ResponseCacheBackend],
+            provider_name: Optional[str] = None
+    ) -> AIProvider:
+        """
+        Envolve um provedor no failover entre provedores, se habilitado.
+
+        Args:
+            provider: Provedor principal, tentado primeiro
+            cache_backend: Armazenamento do cache de respostas (opcional)
+            provider_name: Nome do provedor principal (default: o provedor configurado)
+
+        Returns:
+            Provedor de IA
+        """
+        provider_name = provider_name or self.settings.ai.provider
+        failover_names = [
+            name.strip() for name in self.settings.ai.failover_providers.split(",")
+            if name.strip() and name.strip() != provider_name
+        ]
+        if not failover_names:
+            return provider
+
+        logger.info(f"Failover de provedores habilitado: {provider_name} -> {', '.join(failover_names)}")
+        return FailoverAIProvider(
+            providers=[provider] + [self._create_provider_chain(cache_backend, name) for name in failover_names],
+            hedging_enabled=self.settings.ai.hedging_enabled,
+            hedge_max_ratio=self.settings.ai.hedge_max_ratio,
+            hedge_default_delay=self.settings.ai.hedge_default_delay
+        )
+
+    def _create_provider_chain(
+            self,
+            cache_backend: Optional[ResponseCacheBackend],
+            provider_name: Optional[str] = None,
+            model: Optional[str] = None
+    ) -> AIProvider:
+        """
+        Cria o provedor com o modelo principal e, se habilitada, a cascata com o modelo barato.
+
+        Args:
+            cache_backend: Armazenamento do cache de respostas (opcional)
+            provider_name: Nome do provedor (default: o provedor configurado)
+            model: Modelo principal (default: o modelo configurado para o provedor)
+
+        Returns:
+            Provedor de IA
+        """
+        model = model or self._get_model_for_provider(provider_name)
+        provider = self._create_provider(model, cache_backend, provider_name)
+
+        fast_model = self._get_cascade_model_for_provider(provider_name)
+        # Rotas que já usam o modelo barato não precisam da cascata
+        if not self.settings.ai.cascade_enabled or fast_model == model:
+            return provider
+
+        logger.info(f"Cascata de modelos habilitada: {fast_model} -> {model}")
+
+        return CascadeAIProvider(
+            fast_provider=self._create_provider(fast_model, cache_backend, provider_name),
+            provider=provider,
+            confidence_threshold=self.settings.ai.cascade_confidence_threshold
+        )
+
+    def _create_provider(
+            self,
+            model: str,
+            cache_backend: Optional[ResponseCacheBackend],
+            provider_name: Optional[str] = None
+    ) -> AIProvider:
+        """
+        Cria o provedor de IA para um modelo, protegido pelo circuit breaker,
+        com as requisições idênticas em andamento agrupadas e envolvido pelo
+        cache de respostas, se habilitados.
+
+        Args:
+            model: Nome do modelo
+            cache_backend: Armazenamento do cache de respostas (opcional)
+            provider_name: Nome do provedor (default: o provedor configurado)
+
+        Returns:
+            Provedor de IA
+        """
+        provider_name = provider_name or self.settings.ai.provider
+
+        provider = create_ai_provider(
+            provider_name=provider_name,
+            api_key=self._get_api_key_for_provider(provider_name),
+            model=model,
+            organization_id=self.settings.ai.openai_organization_id
+        )
+
+        if self.settings.ai.circuit_breaker_enabled:
+            # O cache fica por fora para que respostas em cache sigam disponíveis com o circuito aberto
+            provider = CircuitBreakerAIProvider(provider, CircuitBreaker(
+                failure_rate_threshold=self.settings.ai.circuit_failure_rate,
+                slow_call_seconds=self.settings.ai.circuit_slow_call_seconds,
+                open_seconds=self.settings.ai.circuit_open_seconds
+            ))
+
+        if self.settings.ai.single_flight_enabled:
+            # Por dentro do cache: requisições idênticas que erram o cache ao mesmo tempo viram uma chamada
+            provider = SingleFlightAIProvider(provider)
+
+        if cache_backend is None:
+            return provider
+        return CachingAIProvider(provider, cache_backend)
+
+    async def _setup_response_cache(self) -> Optional[ResponseCacheBackend]:
+        """
+        Cria o armazenamento do cache de respostas de IA configurado.
+
+        Returns:
+            Armazenamento do cache ou None se o cache estiver desabilitado
         """
-        Obtém a chave de API para o provedor configurado.
+        backend_name = self.settings.ai.response_cache_backend.lower()
+
+        if backend_name == "sqlite":
+            backend = SQLiteResponseCache(
+                path=self.settings.ai.response_cache_path,
+                max_entries=self.settings.ai.response_cache_max_entries,
+                ttl_seconds=self.settings.ai.response_cache_ttl_seconds
+            )
+        elif backend_name == "postgres":
+            backend = PostgresResponseCache(
+                pool=self.repository.pool,
+                ttl_seconds=self.settings.ai.response_cache_ttl_seconds
+            )
+            await backend.setup()
+        else:
+            return None
+
+        logger.info(f"Cache de respostas de IA habilitado ({backend_name})")
+        return backend
+
+    def _get_api_key_for_provider(self, provider: Optional[str] = None) -> str:
+        """
+        Obtém a chave de API de um provedor.
+
+        Args:
+            provider: Nome do provedor (default: o provedor configurado)
 
         Returns:
-            Chave de API
+            Chave de API principal (vazia se houver apenas chaves no pool)
 
         Raises:
-            ValueError: Se a chave não estiver configurada
+            ValueError: Se nenhuma chave estiver configurada
         """
-        provider = self.settings.ai.provider.lower()
+        provider = (provider or self.settings.ai.provider).lower()
+
+        # Na reprodução as respostas vêm da cassete: nenhuma chave é necessária
+        if self.settings.ai.replay_mode.lower() == "replay":
+            return ""
 
+        # Com chaves no pool, a chave principal é opcional
         if provider == "openai":
-            if not self.settings.ai.openai_api_key:
+            if not self.settings.ai.openai_api_key and not self.settings.ai.openai_api_keys:
                 raise ValueError("Chave de API da OpenAI não configurada")
-            return self.settings.ai.openai_api_key
+            return self.settings.ai.openai_api_key or ""
 
         elif provider == "gemini":
             if not self.settings.ai.gemini_api_key:
@@ -141,21 +332,24 @@ class Application:
             return self.settings.ai.gemini_api_key
 
         elif provider == "claude":
-            if not self.settings.ai.claude_api_key:
+            if not self.settings.ai.claude_api_key and not self.settings.ai.claude_api_keys:
                 raise ValueError("Chave de API do Claude não configurada")
-            return self.settings.ai.claude_api_key
+            return self.settings.ai.claude_api_key or ""
 
         else:
             raise ValueError(f"Provedor não suportado: {provider}")
 
-    def _get_model_for_provider(self) -> str:
+    def _get_model_for_provider(self, provider: Optional[str] = None) -> str:
         """
-        Obtém o modelo para o provedor configurado.
+        Obtém o modelo de um provedor.
+
+        Args:
+            provider: Nome do provedor (default: o provedor configurado)
 
         Returns:
             Nome do modelo
         """
-        provider = self.settings.ai.provider.lower()
+        provider = (provider or self.settings.ai.provider).lower()
 
         if provider == "openai":
             return self.settings.ai.openai_model
@@ -169,6 +363,51 @@ class Application:
         else:
             raise ValueError(f"Provedor não suportado: {provider}")
 
+    def _get_cascade_model_for_provider(self, provider: Optional[str] = None) -> str:
+        """
+        Obtém o modelo barato da cascata de um provedor.
+
+        Args:
+            provider: Nome do provedor (default: o provedor configurado)
+
+        Returns:
+            Nome do modelo
+        """
+        provider = (provider or self.settings.ai.provider).lower()
+
+        if provider == "openai":
+            return self.settings.ai.openai_cascade_model
+
+        elif provider == "gemini":
+            return self.settings.ai.gemini_cascade_model
+
+        elif provider == "claude":
+            return self.settings.ai.claude_cascade_model
+
+        else:
+            raise ValueError(f"Provedor não suportado: {provider}")
+
+    def _get_chunking_for_provider(self) -> Tuple[int, int]:
+        """
+        Obtém o tamanho de trecho e a concorrência de extração para o provedor configurado.
+
+        Returns:
+            Tupla (tamanho do trecho em tokens, número máximo de extrações simultâneas)
+        """
+        provider = self.settings.ai.provider.lower()
+
+        if provider == "openai":
+            return self.settings.ai.openai_chunk_tokens, self.settings.ai.openai_max_concurrency
+
+        elif provider == "gemini":
+            return self.settings.ai.gemini_chunk_tokens, self.settings.ai.gemini_max_concurrency
+
+        elif provider == "claude":
+            return self.settings.ai.claude_chunk_tokens, self.settings.ai.claude_max_concurrency
+
+        else:
+            raise ValueError(f"Provedor não suportado: {provider}")
+
     async def handle_document(self, document: Document):
         """
         Processa um documento recebido do Kafka.
@@ -283,6 +522,8 @@ class Application:
         if self.repository:
             await self.repository.disconnect()
 
+        await close_shared_http_client()
+
         logger.info("Aplicação desligada com sucesso")
 
     def handle_signals(self):
@@ -0,0 +1,137 @@
+import asyncio
+import logging
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+from financial_document_processor.adapters.database.repository import Repository
+from financial_document_processor.domain.document import Document, DocumentStatus
+from financial_document_processor.services.categorization import CategorizationService
+from financial_document_processor.services.document_processor import DocumentProcessor
+from financial_document_processor.utils.metrics import ai_usage_labels
+
+logger = logging.getLogger(__name__)
+
+
+class BackfillReport(BaseModel):
+    """
+    Resumo de um reprocessamento em massa.
+    """
+    documents: int = 0
+    processed: int = 0
+    failed: int = 0
+    transactions: int = 0
+
+
+class BackfillService:
+    """
+    Reprocessamento em massa de documentos já armazenados (ex: histórico de um
+    novo banco parceiro).
+
+    Os documentos de cada página são processados ao mesmo tempo para que suas
+    chamadas de IA se acumulem em poucos lotes quando o processador usa um
+    `BatchAIProvider`: primeiro as extrações, depois as categorizações. Os
+    resultados são gravados no repositório; nenhuma mensagem é publicada no Kafka.
+    """
+
+    def __init__(
+            self,
+            repository: Repository,
+            document_processor: DocumentProcessor,
+            categorization_service: Optional[CategorizationService] = None
+    ):
+        """
+        Inicializa o serviço.
+
+        Args:
+            repository: Repositório onde documentos e transações são gravados
+            document_processor: Processador usado na extração
+            categorization_service: Serviço para categorizar as transações que vierem sem categoria (opcional)
+        """
+        self.repository = repository
+        self.document_processor = document_processor
+        self.categorization_service = categorization_service
+
+    async def run(
+            self,
+            status: DocumentStatus = DocumentStatus.PENDING,
+            page_size: int = 1000,
+            limit: Optional[int] = None
+    ) -> BackfillReport:
+        """
+        Reprocessa os documentos em um status, página a página.
+
+        Args:
+            status: Status dos documentos a reprocessar
+            page_size: Documentos processados em conjunto (cada página gera seus próprios lotes)
+            limit: Número máximo de documentos (opcional)
+
+        Returns:
+            Resumo do reprocessamento
+        """
+        report = BackfillReport()
+        after_id = 0
+
+        while limit is None or report.documents < limit:
+            size = page_size if limit is None else min(page_size, limit - report.documents)
+            documents = await self.repository.get_documents_by_status(status, limit=size, after_id=after_id)
+            if not documents:
+                break
+
+            await self.process_documents(documents, report)
+            after_id = documents[-1].id
+
+            logger.info(
+                f"Reprocessamento: {report.documents} documentos, {report.processed} processados, "
+                f"{report.failed} com falha, {report.transactions} transações"
+            )
+
+        return report
+
+    async def process_documents(
+            self, documents: List[Document], report: Optional[BackfillReport] = None
+    ) -> BackfillReport:
+        """
+        Processa um conjunto de documentos ao mesmo tempo e grava os resultados.
+
+        Args:
+            documents: Documentos a processar
+            report: Resumo a atualizar (default: um novo)
+
+        Returns:
+            Resumo atualizado
+        """
+        report = report or BackfillReport()
+        report.documents += len(documents)
+
+        counts = await asyncio.gather(*(self._process_document(document) for document in documents))
+
+        for count in counts:
+            if count is None:
+                report.failed += 1
+            else:
+                report.processed += 1
+                report.transactions += count
+
+        return report
+
+    async def _process_document(self, document: Document) -> Optional[int]:
+        """Processa e grava um documento; retorna o número de transações ou None em caso de falha."""
+        try:
+            transactions = await self.document_processor.process(document)
+
+            uncategorized = [tx for tx in transactions if not tx.categories]
+            if uncategorized and self.categorization_service:
+                with ai_usage_labels(document_type=document.document_type):
+                    await self.categorization_service.categorize_transactions(uncategorized)
+
+            if transactions:
+                await self.repository.save_transactions(transactions)
+
+            await self.repository.update_document_status(document_id=document.id, status=DocumentStatus.PROCESSED)
+            return len(transactions)
+
+        except Exception as e:
+            logger.error(f"Erro ao reprocessar documento {document.id}: {str(e)}")
+            await self.repository.update_document_status(document_id=document.id, status=DocumentStatus.FAILED)
+            return None
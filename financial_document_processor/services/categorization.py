@@ -3,11 +3,58 @@ import re
 from typing import Dict, List, Optional, Tuple
 
 from financial_document_processor.adapters.ai.ai_provider import AIProvider
+from financial_document_processor.domain.category import Category, CategoryRegistry
 from financial_document_processor.domain.transaction import Transaction, TransactionType
+from financial_document_processor.services.category_shortlist import CategoryShortlist
 from financial_document_processor.utils.validators import sanitize_categories
 
 logger = logging.getLogger(__name__)
 
+# Palavras-chave das categorias padrão, registradas no CategoryRegistry para a
+# seleção de categorias por lote (termos comuns nas descrições dos extratos)
+DEFAULT_CATEGORY_KEYWORDS: Dict[str, List[str]] = {
+    "aluguel": ["locação", "imobiliária"],
+    "condomínio": ["condominio", "administradora"],
+    "água": ["saneamento", "sabesp", "cedae", "copasa"],
+    "luz": ["energia", "elétrica", "enel", "cemig", "light", "copel"],
+    "gás": ["comgas", "ultragaz", "botijão"],
+    "internet": ["fibra", "banda larga", "vivo", "claro", "tim", "telecom"],
+    "supermercado": ["mercado", "carrefour", "assaí", "atacadão", "pão de açúcar", "extra"],
+    "restaurante": ["lanchonete", "churrascaria", "pizzaria", "bar"],
+    "delivery": ["ifood", "rappi", "entrega"],
+    "café": ["cafeteria", "padaria", "starbucks"],
+    "combustível": ["gasolina", "etanol", "diesel", "posto", "ipiranga", "shell", "petrobras"],
+    "estacionamento": ["parking", "valet", "estapar"],
+    "transporte público": ["metrô", "trem", "ônibus", "bilhete único", "passagem"],
+    "aplicativo de transporte": ["uber", "táxi", "cabify"],
+    "seguro auto": ["seguro veículo", "porto seguro auto"],
+    "plano de saúde": ["unimed", "amil", "sulamérica", "bradesco saúde", "hapvida"],
+    "medicamentos": ["remédio", "drogaria"],
+    "consulta médica": ["médico", "clínica", "psicólogo", "dentista"],
+    "exames": ["laboratório", "fleury", "dasa"],
+    "academia": ["gym", "smart fit", "bodytech"],
+    "farmácia": ["drogaria", "droga raia", "drogasil", "pague menos"],
+    "mensalidade escolar": ["faculdade", "universidade", "colégio", "escola"],
+    "curso": ["workshop", "treinamento", "udemy", "alura"],
+    "livros": ["livraria", "amazon", "book"],
+    "streaming": ["netflix", "disney", "hbo", "prime video", "spotify", "deezer", "globoplay"],
+    "cinema": ["cinemark", "ingresso", "filme"],
+    "viagem": ["passagem aérea", "latam", "gol", "azul", "decolar"],
+    "hotel": ["hospedagem", "pousada", "airbnb", "booking"],
+    "vestuário": ["roupa", "renner", "riachuelo", "c&a", "zara"],
+    "calçados": ["sapato", "tênis", "centauro", "netshoes"],
+    "eletrônicos": ["magazine luiza", "casas bahia", "fast shop", "kabum"],
+    "tarifa bancária": ["tarifa", "anuidade", "cesta de serviços", "manutenção conta"],
+    "juros": ["encargos", "mora", "iof"],
+    "investimento": ["aplicação", "resgate", "cdb", "tesouro", "poupança"],
+    "seguro": ["seguradora", "porto seguro", "apólice"],
+    "empréstimo": ["financiamento", "parcela", "crédito pessoal", "consignado"],
+    "salário": ["folha", "vencimentos", "pagamento salário", "remuneração"],
+    "dividendos": ["rendimento", "proventos", "jcp"],
+    "reembolso": ["estorno", "devolução", "ressarcimento"],
+    "imposto de renda": ["irpf", "receita federal", "darf"],
+}
+
 
 class CategorizationService:
     """
@@ -24,7 +71,8 @@ class CategorizationService:
             predefined_categories: Optional[List[str]] = None,
             batch_size: int = 10,
             min_confidence_threshold: float = 0.7,
-            enable_caching: bool = True
+            enable_caching: bool = True,
+            category_shortlist_size: int = 0
     ):
         """
         Inicializa o serviço de categorização.
@@ -35,6 +83,8 @@ class CategorizationService:
             batch_size: Tamanho do lote para processamento em batch
             min_confidence_threshold: Limite mínimo de confiança para aceitação
             enable_caching: Se deve habilitar cache de categorizações
+            category_shortlist_size: Número de categorias enviadas à IA por lote, escolhidas
+                pela similaridade com as transações (0 envia todas as categorias)
         """
         self.ai_provider = ai_provider
         self.predefined_categories = predefined_categories
@@ -49,6 +99,8 @@ class CategorizationService:
         if not self.predefined_categories:
             self._load_default_categories()
 
+        self.category_shortlist = CategoryShortlist(self.predefined_categories, category_shortlist_size)
+
     def _load_default_categories(self):
         """
         Carrega as categorias padrão para uso quando não há categorias predefinidas.
@@ -90,6 +142,11 @@ class CategorizationService:
             "imposto de renda", "inss", "fgts"
         ]
 
+        # Palavras-chave usadas na seleção de categorias por lote; não sobrescreve categorias já registradas
+        for name, keywords in DEFAULT_CATEGORY_KEYWORDS.items():
+            if CategoryRegistry.get(name) is None:
+                CategoryRegistry.register(Category(name=name, keywords=keywords))
+
         logger.info(f"Carregadas {len(self.predefined_categories)} categorias padrão")
 
     async def categorize_transaction(
@@ -138,7 +195,7 @@ class CategorizationService:
             transactions_batch = [transaction]
             categorized_batch = await self.ai_provider.categorize_transactions(
                 transactions=transactions_batch,
-                predefined_categories=self.predefined_categories
+                predefined_categories=self.category_shortlist.select([transaction.description])
             )
 
             if categorized_batch and len(categorized_batch) > 0:
@@ -226,7 +283,7 @@ class CategorizationService:
                     # Chama a IA para categorizar o lote
                     categorized_batch = await self.ai_provider.categorize_transactions(
                         transactions=batch,
-                        predefined_categories=self.predefined_categories
+                        predefined_categories=self.category_shortlist.select(tx.description for tx in batch)
                     )
 
                     # Atualiza o cache com resultados de alta confiança
@@ -0,0 +1,147 @@
+import math
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List, Set
+
+from financial_document_processor.domain.category import CategoryRegistry
+
+_WORDS = re.compile(r"[a-z]+")
+
+# Palavras mantidas só até o radical: aproxima plurais e descrições truncadas
+# pelos bancos ("SUPERMERC", "FARMAC")
+STEM_LENGTH = 5
+
+_STOPWORDS: Set[str] = {"das", "dos", "para", "com", "por", "the", "and"}
+
+
+def _terms(text: str) -> List[str]:
+    """
+    Divide um texto em termos: palavras sem acentos, em minúsculas, com pelo
+    menos 3 letras, cortadas em `STEM_LENGTH` caracteres.
+    """
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(char for char in text if not unicodedata.combining(char)).lower()
+    return [
+        word[:STEM_LENGTH]
+        for word in _WORDS.findall(text)
+        if len(word) >= 3 and word not in _STOPWORDS
+    ]
+
+
+class CategoryShortlist:
+    """
+    Seleção local das categorias mais plausíveis de um lote, para que os prompts
+    não precisem listar todas as categorias predefinidas.
+
+    Cada categoria é indexada por TF-IDF a partir do nome e, se estiver no
+    `CategoryRegistry`, da descrição, da categoria pai e das palavras-chave. As
+    descrições das transações (ou as linhas do trecho, na extração) são
+    comparadas com o índice, e as categorias são escolhidas em rodízio: a mais
+    similar de cada texto, depois a segunda de cada texto, e assim por diante,
+    até completar `size`. Se sobrar espaço, a lista é completada na ordem
+    original, para que o lote nunca fique sem categorias.
+
+    As categorias escolhidas mantêm a ordem da lista original e são enviadas
+    ao modelo identificadas por número, como a lista completa.
+    """
+
+    def __init__(self, categories: List[str], size: int = 20):
+        """
+        Cria o índice das categorias.
+
+        Args:
+            categories: Lista completa de categorias predefinidas
+            size: Número de categorias enviadas por lote (0 envia sempre a lista completa)
+        """
+        self.categories = list(categories)
+        self.size = size
+
+        documents = [self._category_terms(name) for name in self.categories]
+        document_frequency = Counter(term for terms in documents for term in set(terms))
+        total = len(documents)
+
+        # IDF suavizado: termos presentes em muitas categorias pesam menos
+        self._idf: Dict[str, float] = {
+            term: math.log((1 + total) / (1 + count)) + 1
+            for term, count in document_frequency.items()
+        }
+        self._vectors = [self._vector(terms) for terms in documents]
+
+        # Índice invertido: termo -> categorias que o contêm
+        self._postings: Dict[str, List[int]] = {}
+        for index, vector in enumerate(self._vectors):
+            for term in vector:
+                self._postings.setdefault(term, []).append(index)
+
+    def rank(self, text: str) -> List[int]:
+        """
+        Ordena as categorias pela similaridade com um texto.
+
+        Args:
+            text: Descrição da transação ou linha do documento
+
+        Returns:
+            Índices das categorias com algum termo em comum com o texto, da mais
+            para a menos similar
+        """
+        query = self._vector(_terms(text))
+        scores: Counter = Counter()
+
+        for term, weight in query.items():
+            for index in self._postings.get(term, ()):
+                scores[index] += weight * self._vectors[index][term]
+
+        return [index for index, _ in sorted(scores.items(), key=lambda item: (-item[1], item[0]))]
+
+    def select(self, texts: Iterable[str]) -> List[str]:
+        """
+        Escolhe as categorias enviadas ao modelo para um lote.
+
+        Args:
+            texts: Descrições das transações do lote ou linhas do trecho
+
+        Returns:
+            Até `size` categorias, na ordem da lista original (a lista completa se
+            ela não for maior que `size`)
+        """
+        if not self.size or len(self.categories) <= self.size:
+            return self.categories
+
+        rankings = [ranking for ranking in (self.rank(text) for text in texts) if ranking]
+        selected: Dict[int, None] = {}
+
+        depth = 0
+        while len(selected) < self.size and any(depth < len(ranking) for ranking in rankings):
+            for ranking in rankings:
+                if depth < len(ranking):
+                    selected.setdefault(ranking[depth])
+                    if len(selected) >= self.size:
+                        break
+            depth += 1
+
+        for index in range(len(self.categories)):
+            if len(selected) >= self.size:
+                break
+            selected.setdefault(index)
+
+        return [self.categories[index] for index in sorted(selected)]
+
+    @staticmethod
+    def _category_terms(name: str) -> List[str]:
+        """Termos que descrevem uma categoria: nome e dados do registro, se houver."""
+        parts = [name]
+        category = CategoryRegistry.get(name)
+        if category is not None:
+            parts += [category.description or "", category.parent or ""] + list(category.keywords or [])
+        return _terms(" ".join(parts))
+
+    def _vector(self, terms: List[str]) -> Dict[str, float]:
+        """Vetor TF-IDF normalizado dos termos conhecidos pelo índice."""
+        counts = Counter(term for term in terms if term in self._idf)
+        weights = {term: count * self._idf[term] for term, count in counts.items()}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+
+        if not norm:
+            return {}
+        return {term: weight / norm for term, weight in weights.items()}
@@ -0,0 +1,235 @@
+import re
+import unicodedata
+from collections import defaultdict
+from typing import AsyncIterator, Callable, Dict, List, Tuple
+
+from financial_document_processor.domain.transaction import Transaction
+
+
+class TextChunker:
+    """
+    Agrupa páginas de um documento em trechos para extração paralela.
+
+    Os trechos respeitam os limites de página sempre que possível e cada trecho
+    começa com uma pequena sobreposição (as últimas linhas do trecho anterior),
+    para que transações na fronteira entre trechos não sejam perdidas.
+    Páginas maiores que o tamanho do trecho são divididas por linhas.
+    """
+
+    def __init__(
+            self,
+            chunk_size: int = 15000,
+            overlap: int = 500,
+            length_function: Callable[[str], int] = len
+    ):
+        """
+        Inicializa o agrupador de trechos.
+
+        Args:
+            chunk_size: Tamanho máximo de cada trecho, medido por length_function
+            overlap: Tamanho máximo da sobreposição entre trechos consecutivos
+            length_function: Função que mede o tamanho de um texto (default: caracteres)
+        """
+        if chunk_size <= 0:
+            raise ValueError("O tamanho do trecho deve ser positivo")
+        if overlap >= chunk_size:
+            raise ValueError("A sobreposição deve ser menor que o tamanho do trecho")
+
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.length_function = length_function
+
+        self._buffer: List[str] = []
+        self._buffer_size = 0
+        self._has_content = False
+
+    def add_page(self, page_text: str) -> List[str]:
+        """
+        Adiciona uma página e retorna os trechos que ficaram completos.
+
+        Args:
+            page_text: Texto da página
+
+        Returns:
+            Lista de trechos completos (possivelmente vazia)
+        """
+        completed = []
+
+        for piece in self._split_oversized(page_text):
+            piece_size = self.length_function(piece)
+
+            if self._has_content and self._buffer_size + piece_size > self.chunk_size:
+                completed.append(self._emit())
+
+            self._buffer.append(piece)
+            self._buffer_size += piece_size
+            self._has_content = True
+
+        # Trecho cheio: emite já, sem esperar a próxima página
+        if self._has_content and self._buffer_size >= self.chunk_size - self.overlap:
+            completed.append(self._emit())
+
+        return completed
+
+    def flush(self) -> List[str]:
+        """
+        Retorna o trecho pendente, se houver conteúdo novo desde o último trecho emitido.
+
+        Returns:
+            Lista com o último trecho ou vazia
+        """
+        if not self._has_content:
+            return []
+
+        chunk = "".join(self._buffer)
+        self._buffer = []
+        self._buffer_size = 0
+        self._has_content = False
+        return [chunk]
+
+    async def iter_chunks(self, pages: AsyncIterator[str]) -> AsyncIterator[str]:
+        """
+        Agrupa páginas recebidas de forma assíncrona, produzindo cada trecho assim que fica completo.
+
+        Args:
+            pages: Iterador assíncrono de textos de página
+
+        Yields:
+            Trechos de texto
+        """
+        async for page_text in pages:
+            if not page_text.strip():
+                continue
+            for chunk in self.add_page(page_text):
+                yield chunk
+
+        for chunk in self.flush():
+            yield chunk
+
+    def _emit(self) -> str:
+        """Fecha o trecho atual e inicia o próximo com a sobreposição."""
+        chunk = "".join(self._buffer)
+
+        overlap_text = self._tail(chunk)
+        self._buffer = [overlap_text] if overlap_text else []
+        self._buffer_size = self.length_function(overlap_text) if overlap_text else 0
+        self._has_content = False
+
+        return chunk
+
+    def _tail(self, text: str) -> str:
+        """Retorna as últimas linhas completas do texto que cabem na sobreposição."""
+        if self.overlap <= 0:
+            return ""
+
+        lines = text.splitlines(keepends=True)
+        tail: List[str] = []
+        size = 0
+
+        for line in reversed(lines):
+            line_size = self.length_function(line)
+            if size + line_size > self.overlap:
+                break
+            tail.insert(0, line)
+            size += line_size
+
+        return "".join(tail)
+
+    def _split_oversized(self, page_text: str) -> List[str]:
+        """Divide por linhas uma página que não cabe sozinha em um trecho."""
+        limit = self.chunk_size - self.overlap
+
+        if self.length_function(page_text) <= limit:
+            return [page_text]
+
+        pieces = []
+        current: List[str] = []
+        current_size = 0
+
+        for line in page_text.splitlines(keepends=True):
+            line_size = self.length_function(line)
+            if current and current_size + line_size > limit:
+                pieces.append("".join(current))
+                current, current_size = [], 0
+            current.append(line)
+            current_size += line_size
+
+        if current:
+            pieces.append("".join(current))
+
+        return pieces
+
+
+def normalize_description(description: str) -> str:
+    """
+    Normaliza uma descrição para comparação: minúsculas, sem acentos e sem pontuação.
+
+    Args:
+        description: Descrição da transação
+
+    Returns:
+        Descrição normalizada
+    """
+    text = unicodedata.normalize("NFKD", description or "")
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = re.sub(r"[^a-z0-9]+", " ", text.lower())
+    return text.strip()
+
+
+class TransactionMerger:
+    """
+    Combina as transações extraídas de trechos sobrepostos.
+
+    Uma transação é considerada duplicada quando um trecho vizinho (anterior ou
+    posterior) já produziu uma transação com a mesma chave
+    (data, valor, descrição normalizada) que ainda não foi pareada.
+    Transações idênticas dentro de um mesmo trecho são mantidas, pois
+    representam lançamentos legítimos repetidos.
+    """
+
+    def __init__(self):
+        # chave -> {índice do trecho: quantidade de transações ainda não pareadas}
+        self._unmatched: Dict[Tuple, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+
+    @staticmethod
+    def dedup_key(transaction: Transaction) -> Tuple:
+        """Chave de deduplicação de uma transação."""
+        return transaction.date, transaction.amount, normalize_description(transaction.description)
+
+    def add(self, chunk_index: int, transaction: Transaction) -> bool:
+        """
+        Registra uma transação extraída de um trecho.
+
+        Args:
+            chunk_index: Índice do trecho de origem
+            transaction: Transação extraída
+
+        Returns:
+            True se a transação é nova, False se é duplicata de fronteira
+        """
+        counts = self._unmatched[self.dedup_key(transaction)]
+
+        for neighbor in (chunk_index - 1, chunk_index + 1):
+            if counts.get(neighbor, 0) > 0:
+                counts[neighbor] -= 1
+                return False
+
+        counts[chunk_index] += 1
+        return True
+
+    def merge(self, results: Dict[int, List[Transaction]]) -> List[Transaction]:
+        """
+        Combina os resultados de todos os trechos, na ordem do documento.
+
+        Args:
+            results: Transações extraídas, indexadas pelo índice do trecho
+
+        Returns:
+            Lista de transações sem as duplicatas de fronteira
+        """
+        return [
+            tx
+            for index in sorted(results)
+            for tx in results[index]
+            if self.add(index, tx)
+        ]
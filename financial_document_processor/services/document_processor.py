@@ -1,12 +1,26 @@
+import asyncio
 import logging
 import time
-from typing import Dict, List
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 
-from financial_document_processor.adapters.ai.ai_provider import AIProvider
+from financial_document_processor.adapters.ai.ai_provider import AIProvider, UsageTracker, track_usage
+from financial_document_processor.adapters.ai.routing import ModelRouter
 from financial_document_processor.domain.document import Document
 from financial_document_processor.domain.transaction import Transaction
+from financial_document_processor.services.category_shortlist import CategoryShortlist
+from financial_document_processor.services.chunking import TextChunker, TransactionMerger
 from financial_document_processor.services.file_decoder import FileDecoder
+from financial_document_processor.services.line_filter import LineFilter
 from financial_document_processor.services.parsers.parser import DocumentParser
+from financial_document_processor.utils.metrics import (
+    AI_DOCUMENT_COST,
+    AI_ROUTE_DURATION,
+    LINE_FILTER_REDUCTION,
+    LINE_FILTER_TOKENS,
+    PROCESSING_TIME,
+    timing_metric,
+)
+from financial_document_processor.utils.tokenizer import Tokenizer, get_tokenizer_service
 
 logger = logging.getLogger(__name__)
 
@@ -24,7 +38,16 @@ class DocumentProcessor:
             file_decoder: FileDecoder,
             ai_provider: AIProvider,
             parsers: Dict[str, DocumentParser],
-            categorization_service=None
+            categorization_service=None,
+            chunk_size: int = 4000,
+            chunk_overlap: int = 150,
+            max_concurrency: int = 4,
+            tokenizer: Optional[Tokenizer] = None,
+            router: Optional[ModelRouter] = None,
+            line_filter_enabled: bool = False,
+            line_filter_context_lines: int = 1,
+            line_references: bool = False,
+            category_shortlist_size: int = 0
     ):
         """
         Inicializa o processador de documentos.
@@ -34,12 +57,39 @@ class DocumentProcessor:
             ai_provider: Provedor de IA a ser utilizado
             parsers: Dicionário de parsers por tipo de documento
             categorization_service: Serviço de categorização (opcional)
+            chunk_size: Tamanho máximo (tokens) de cada trecho enviado para extração
+            chunk_overlap: Sobreposição (tokens) entre trechos consecutivos
+            max_concurrency: Número máximo de extrações simultâneas
+            tokenizer: Tokenizador usado para medir os trechos (default: o do provedor)
+            router: Roteador que escolhe o modelo de cada documento (default: sempre `ai_provider`)
+            line_filter_enabled: Retira do texto as linhas sem transações antes da extração,
+                com o pré-filtro do parser do tipo de documento
+            line_filter_context_lines: Linhas mantidas pelo pré-filtro antes e depois de cada linha de transação
+            line_references: Extrai com as linhas numeradas e respostas compactas por número de linha,
+                recortando as descrições localmente; as transações de cada trecho são categorizadas
+                em seguida, pois a resposta compacta não traz categorias
+            category_shortlist_size: Número de categorias do documento enviadas em cada trecho,
+                escolhidas pela similaridade com as linhas do trecho (0 envia todas)
         """
         self.file_decoder = file_decoder
         self.ai_provider = ai_provider
         self.parsers = parsers
         self.categorization_service = categorization_service
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.router = router
+        self.line_filter_enabled = line_filter_enabled
+        self.line_filter_context_lines = line_filter_context_lines
+        self.line_references = line_references
+        self.category_shortlist_size = category_shortlist_size
+        self.tokenizer = tokenizer or get_tokenizer_service().get_tokenizer(
+            ai_provider.name, getattr(ai_provider, "model", None)
+        )
+
+        # Limita as chamadas simultâneas ao provedor, somando todos os documentos em processamento
+        self._extraction_semaphore = asyncio.Semaphore(max_concurrency)
 
+    @timing_metric(PROCESSING_TIME, labels=lambda self, document: {"document_type": document.document_type})
     async def process(self, document: Document) -> List[Transaction]:
         """
         Processa um documento, extraindo e categorizando transações.
@@ -61,33 +111,21 @@ class DocumentProcessor:
         )
 
         try:
-            if document.document_type not in self.parsers:
-                raise ValueError(f"Tipo de documento não suportado: {document.document_type}")
-
-            parser = self.parsers[document.document_type]
+            # Os trechos terminam fora de ordem; reordena para preservar a ordem do documento
+            results: Dict[int, List[Transaction]] = {}
+            route, provider = await self._select_provider(document)
+            usage = UsageTracker()
+            async for index, tx in self._extract_incrementally(document, provider, usage):
+                results.setdefault(index, []).append(tx)
 
-            text_content = self.file_decoder.decode_and_extract_text(
-                document.file_content, document.content_type
-            )
+            self._record_document_usage(document, route, usage, time.time() - start_time)
 
-            if not text_content.strip():
-                logger.warning(f"Nenhum texto extraído do documento {document.id}")
-                return []
-
-            transactions = await self.ai_provider.extract_transactions(
-                text_content=text_content,
-                document_type=document.document_type,
-                predefined_categories=document.categories
-            )
+            transactions = TransactionMerger().merge(results)
 
             if not transactions:
                 logger.warning(f"Nenhuma transação extraída do documento {document.id}")
                 return []
 
-            for tx in transactions:
-                tx.document_id = document.id
-                tx.user_id = document.user_id
-
             processing_time = time.time() - start_time
             logger.info(
                 f"Processamento do documento {document.id} concluído em {processing_time:.2f}s. "
@@ -98,4 +136,231 @@ class DocumentProcessor:
 
         except Exception as e:
             logger.error(f"Erro ao processar documento {document.id}: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+
+    async def iter_transactions(self, document: Document) -> AsyncIterator[Transaction]:
+        """
+        Processa um documento produzindo as transações à medida que são extraídas.
+
+        Cada transação é entregue assim que o modelo termina de gerá-la, sem esperar
+        o fim da resposta do trecho nem a decodificação das páginas seguintes. A ordem
+        entre trechos não é garantida; duplicatas nas fronteiras entre trechos são descartadas.
+
+        Args:
+            document: Objeto Document a ser processado
+
+        Yields:
+            Transações extraídas
+
+        Raises:
+            ValueError: Se o tipo de documento não for suportado
+        """
+        start_time = time.time()
+        merger = TransactionMerger()
+        route, provider = await self._select_provider(document)
+        usage = UsageTracker()
+
+        async for index, tx in self._extract_incrementally(document, provider, usage):
+            if merger.add(index, tx):
+                yield tx
+
+        self._record_document_usage(document, route, usage, time.time() - start_time)
+
+    async def _select_provider(self, document: Document) -> Tuple[str, AIProvider]:
+        """
+        Escolhe a rota e o provedor de IA de um documento.
+
+        Args:
+            document: Documento a ser processado
+
+        Returns:
+            Tupla (nome da rota, provedor)
+        """
+        if self.router is None:
+            return ModelRouter.DEFAULT_ROUTE, self.ai_provider
+
+        # Conta páginas do PDF fora do event loop
+        input_tokens = await asyncio.to_thread(
+            self.file_decoder.estimate_tokens, document.file_content, document.content_type
+        )
+        route, provider = self.router.route(input_tokens, document.document_type, document.content_type)
+
+        logger.info(f"Documento {document.id} (~{input_tokens} tokens) roteado para {route}")
+        return route, provider
+
+    def _record_document_usage(
+            self, document: Document, route: str, usage: UsageTracker, duration: float
+    ) -> None:
+        """Registra o tempo e o custo de IA do processamento de um documento."""
+        AI_ROUTE_DURATION.labels(route=route).observe(duration)
+        AI_DOCUMENT_COST.labels(route=route, document_type=document.document_type).observe(usage.cost)
+        logger.info(
+            f"Documento {document.id}: {usage.calls} chamadas de IA, {usage.tokens} tokens "
+            f"({usage.input_tokens} de entrada, {usage.output_tokens} de saída), custo ${usage.cost:.4f}"
+        )
+
+    def _create_line_filter(self, document: Document) -> Optional[LineFilter]:
+        """Cria o pré-filtro de linhas do documento, se habilitado e disponível no parser."""
+        if not self.line_filter_enabled:
+            return None
+
+        return self.parsers[document.document_type].create_line_filter(
+            context_lines=self.line_filter_context_lines,
+            length_function=self.tokenizer.count
+        )
+
+    def _record_line_filter(self, document: Document, line_filter: LineFilter) -> None:
+        """Registra a redução de tokens obtida pelo pré-filtro de linhas em um documento."""
+        LINE_FILTER_TOKENS.labels(document_type=document.document_type, stage="input").inc(line_filter.input_size)
+        LINE_FILTER_TOKENS.labels(document_type=document.document_type, stage="kept").inc(line_filter.output_size)
+        LINE_FILTER_REDUCTION.labels(document_type=document.document_type).observe(line_filter.reduction)
+        logger.info(
+            f"Pré-filtro do documento {document.id}: {line_filter.output_size} de {line_filter.input_size} "
+            f"tokens enviados à extração (redução de {line_filter.reduction:.0%})"
+        )
+
+    async def _categorize(
+            self,
+            document: Document,
+            provider: AIProvider,
+            shortlist: Optional[CategoryShortlist],
+            transactions: List[Transaction]
+    ) -> List[Transaction]:
+        """
+        Categoriza as transações de um trecho extraído por referência de linha.
+
+        Com categorias no documento, o provedor do documento categoriza com elas (ou
+        com as mais similares às descrições, se houver seleção); sem elas, usa o
+        serviço de categorização, se configurado.
+
+        Args:
+            document: Documento em processamento
+            provider: Provedor de IA do documento
+            shortlist: Seleção das categorias do documento (opcional)
+            transactions: Transações do trecho
+
+        Returns:
+            Transações categorizadas
+        """
+        if not transactions:
+            return transactions
+
+        if document.categories:
+            categories = (
+                shortlist.select(tx.description for tx in transactions) if shortlist else document.categories
+            )
+            return await provider.categorize_transactions(transactions, categories)
+
+        if self.categorization_service is not None:
+            return await self.categorization_service.categorize_transactions(transactions)
+
+        return transactions
+
+    async def _extract_incrementally(
+            self, document: Document, provider: AIProvider, usage: Optional[UsageTracker] = None
+    ) -> AsyncIterator[Tuple[int, Transaction]]:
+        """
+        Decodifica o documento página a página, agrupa as páginas em trechos e dispara
+        a extração de cada trecho assim que ele fica completo. As transações de cada
+        trecho são recebidas em streaming do provedor; na extração por referência de
+        linha, são entregues depois da categorização do trecho.
+
+        Args:
+            document: Objeto Document a ser processado
+            provider: Provedor de IA usado na extração
+            usage: Acumulador do uso de IA das extrações (opcional)
+
+        Yields:
+            Tuplas (índice do trecho, transação), na ordem em que são geradas
+
+        Raises:
+            ValueError: Se o tipo de documento não for suportado
+        """
+        if document.document_type not in self.parsers:
+            raise ValueError(f"Tipo de documento não suportado: {document.document_type}")
+
+        results: asyncio.Queue = asyncio.Queue()
+        finished = object()
+
+        chunker = TextChunker(
+            chunk_size=self.chunk_size,
+            overlap=self.chunk_overlap,
+            length_function=self.tokenizer.count
+        )
+        line_filter = self._create_line_filter(document)
+        shortlist = (
+            CategoryShortlist(document.categories, self.category_shortlist_size) if document.categories else None
+        )
+
+        async def extract(index: int, text_content: str):
+            def emit(tx: Transaction) -> None:
+                tx.document_id = document.id
+                tx.user_id = document.user_id
+                results.put_nowait((index, tx))
+
+            async with self._extraction_semaphore:
+                if not self.line_references:
+                    async for tx in provider.stream_transactions(
+                            text_content=text_content,
+                            document_type=document.document_type,
+                            predefined_categories=(
+                                shortlist.select(text_content.splitlines()) if shortlist else document.categories
+                            )
+                    ):
+                        emit(tx)
+                    return
+
+                # A resposta compacta não traz categorias: o trecho é categorizado em seguida
+                transactions = [
+                    tx async for tx in provider.stream_transactions(
+                        text_content=text_content,
+                        document_type=document.document_type,
+                        line_references=True
+                    )
+                ]
+                for tx in await self._categorize(document, provider, shortlist, transactions):
+                    emit(tx)
+
+        async def dispatch():
+            extraction_tasks: List[asyncio.Task] = []
+            try:
+                # As tarefas de extração herdam o acumulador de uso desta tarefa
+                with track_usage(usage):
+                    pages = self.file_decoder.iter_pages(document.file_content, document.content_type)
+                    if line_filter is not None:
+                        pages = line_filter.filter_pages(pages)
+
+                    async for chunk in chunker.iter_chunks(pages):
+                        task = asyncio.create_task(extract(len(extraction_tasks), chunk))
+                        # A tarefa concluída entra na fila para propagar erros de extração
+                        task.add_done_callback(results.put_nowait)
+                        extraction_tasks.append(task)
+
+                    if line_filter is not None:
+                        self._record_line_filter(document, line_filter)
+
+                    if not extraction_tasks:
+                        logger.warning(f"Nenhum texto extraído do documento {document.id}")
+
+                    await asyncio.gather(*extraction_tasks)
+            finally:
+                for task in extraction_tasks:
+                    task.cancel()
+                results.put_nowait(finished)
+
+        dispatcher = asyncio.create_task(dispatch())
+
+        try:
+            while True:
+                item = await results.get()
+                if item is finished:
+                    break
+                if isinstance(item, asyncio.Task):
+                    item.result()
+                    continue
+                yield item
+
+            # Propaga erros de decodificação
+            await dispatcher
+        finally:
+            dispatcher.cancel()
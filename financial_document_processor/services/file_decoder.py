@@ -1,9 +1,11 @@
+import asyncio
 import base64
 import io
 import logging
 import os
+import shutil
 import tempfile
-from typing import Optional
+from typing import AsyncIterator, Optional
 
 import pytesseract
 from PIL import Image
@@ -11,6 +13,12 @@ from pypdf import PdfReader
 
 logger = logging.getLogger(__name__)
 
+# Marcador inserido entre páginas no texto completo de PDFs
+PAGE_SEPARATOR = "#page\n\npage#"
+
+# Tokens estimados por página de PDF ou imagem, antes da extração do texto
+ESTIMATED_TOKENS_PER_PAGE = 800
+
 
 class FileDecoder:
     """
@@ -67,6 +75,119 @@ class FileDecoder:
             logger.error(f"Erro ao decodificar arquivo: {str(e)}")
             raise
 
+    def estimate_tokens(self, file_content_base64: str, content_type: str) -> int:
+        """
+        Estima os tokens do texto de um arquivo sem extraí-lo.
+
+        PDFs e imagens são estimados pelo número de páginas; textos, pelo tamanho.
+        A estimativa é barata (não há OCR nem extração de texto) e serve para
+        escolher o modelo antes do processamento.
+
+        Args:
+            file_content_base64: Conteúdo do arquivo em Base64
+            content_type: Tipo MIME do conteúdo (ex: application/pdf)
+
+        Returns:
+            Número estimado de tokens
+        """
+        if content_type == "application/pdf":
+            try:
+                file_content = base64.b64decode(file_content_base64)
+                return len(PdfReader(io.BytesIO(file_content)).pages) * ESTIMATED_TOKENS_PER_PAGE
+            except Exception as e:
+                logger.warning(f"Não foi possível contar as páginas do PDF: {str(e)}")
+
+        elif content_type.startswith("image/"):
+            return ESTIMATED_TOKENS_PER_PAGE
+
+        # Base64 tem 4 caracteres para cada 3 bytes; ~4 bytes por token
+        return len(file_content_base64) * 3 // 4 // 4
+
+    async def iter_pages(self, file_content_base64: str, content_type: str) -> AsyncIterator[str]:
+        """
+        Decodifica o conteúdo em Base64 e produz o texto de cada página assim que fica pronto.
+
+        A extração (pypdf/OCR) de cada página roda em uma thread separada, permitindo
+        que o consumidor inicie a extração de transações das primeiras páginas
+        enquanto as seguintes ainda estão sendo decodificadas.
+
+        Args:
+            file_content_base64: Conteúdo do arquivo em Base64
+            content_type: Tipo MIME do conteúdo (ex: application/pdf)
+
+        Yields:
+            Texto de cada página, na ordem do documento
+
+        Raises:
+            ValueError: Se o tipo de arquivo não for suportado
+        """
+        try:
+            file_content = base64.b64decode(file_content_base64)
+
+            if content_type == "application/pdf":
+                async for page_text in self._iter_pdf_pages(file_content):
+                    yield page_text
+
+            elif content_type.startswith("image/"):
+                yield await asyncio.to_thread(self._extract_text_from_image, file_content)
+
+            elif content_type in ("text/plain", "text/csv"):
+                yield file_content.decode("utf-8")
+
+            else:
+                raise ValueError(f"Tipo de conteúdo não suportado: {content_type}")
+
+        except Exception as e:
+            logger.error(f"Erro ao decodificar arquivo: {str(e)}")
+            raise
+
+    async def _iter_pdf_pages(self, pdf_content: bytes) -> AsyncIterator[str]:
+        """
+        Extrai o texto de um PDF página a página, fora do event loop.
+
+        Páginas sem texto extraível (escaneadas) são processadas com OCR individualmente.
+        Se o PDF não puder ser lido pelo pypdf, recorre ao OCR do documento inteiro.
+
+        Args:
+            pdf_content: Conteúdo do arquivo PDF em bytes
+
+        Yields:
+            Texto de cada página
+        """
+        try:
+            pdf = await asyncio.to_thread(PdfReader, io.BytesIO(pdf_content))
+            page_count = len(pdf.pages)
+        except Exception as e:
+            logger.error(f"Erro ao ler o PDF: {str(e)}")
+            yield await asyncio.to_thread(self._extract_text_from_pdf_with_ocr, pdf_content)
+            return
+
+        for page_number in range(page_count):
+            yield await asyncio.to_thread(self._extract_pdf_page, pdf, pdf_content, page_number)
+
+    def _extract_pdf_page(self, pdf: PdfReader, pdf_content: bytes, page_number: int) -> str:
+        """
+        Extrai o texto de uma página do PDF, com OCR como fallback.
+
+        Args:
+            pdf: Leitor do PDF já aberto
+            pdf_content: Conteúdo do arquivo PDF em bytes (usado pelo OCR)
+            page_number: Índice da página (base 0)
+
+        Returns:
+            Texto da página
+        """
+        try:
+            page_text = pdf.pages[page_number].extract_text() or ""
+        except Exception as e:
+            logger.error(f"Erro ao extrair texto da página {page_number + 1} do PDF: {str(e)}")
+            page_text = ""
+
+        if not page_text.strip():
+            return self._extract_text_from_pdf_with_ocr(pdf_content, page_number=page_number)
+
+        return page_text + PAGE_SEPARATOR
+
     def _extract_text_from_pdf(self, pdf_content: bytes) -> str:
         """
         Extrai texto de um arquivo PDF.
@@ -77,14 +198,13 @@ class FileDecoder:
         Returns:
             Texto extraído do PDF
         """
-        text = ""
-
         try:
             pdf = PdfReader(io.BytesIO(pdf_content))
 
-            for page in pdf.pages:
-                page_text = page.extract_text() or ""
-                text += page_text + "#page\n\npage#"
+            text = "".join(
+                (page.extract_text() or "") + PAGE_SEPARATOR
+                for page in pdf.pages
+            )
 
             # Se não conseguiu extrair texto, pode ser um PDF escaneado, tenta OCR
             if not text.strip():
@@ -97,17 +217,18 @@ class FileDecoder:
             # Tenta OCR como fallback
             return self._extract_text_from_pdf_with_ocr(pdf_content)
 
-    def _extract_text_from_pdf_with_ocr(self, pdf_content: bytes) -> str:
+    def _extract_text_from_pdf_with_ocr(self, pdf_content: bytes, page_number: Optional[int] = None) -> str:
         """
         Extrai texto de um PDF usando OCR (para PDFs escaneados).
 
         Args:
             pdf_content: Conteúdo do arquivo PDF em bytes
+            page_number: Índice da página a processar (base 0); todas se None
 
         Returns:
             Texto extraído usando OCR
         """
-        all_text = ""
+        page_texts = []
 
         try:
             # Salvar o PDF em um arquivo temporário
@@ -121,7 +242,8 @@ class FileDecoder:
 
                 # Converte PDF para imagens usando ImageMagick
                 # pdftoppm é alternativa: pdftoppm -png {temp_pdf_path} {os.path.join(temp_dir, "page")}
-                cmd = f"convert -density 300 {temp_pdf_path} {os.path.join(temp_dir, 'page-%03d.png')}"
+                source = temp_pdf_path if page_number is None else f"{temp_pdf_path}[{page_number}]"
+                cmd = f"convert -density 300 {source} {os.path.join(temp_dir, 'page-%03d.png')}"
                 os.system(cmd)
 
                 # Processa cada imagem com OCR
@@ -130,11 +252,11 @@ class FileDecoder:
                         img_path = os.path.join(temp_dir, filename)
                         try:
                             text = pytesseract.image_to_string(Image.open(img_path), lang='por')
-                            all_text += text + "\n\n"
+                            page_texts.append(text + "\n\n")
                         except Exception as e:
                             logger.error(f"Erro OCR na imagem {filename}: {str(e)}")
 
-                return all_text
+                return "".join(page_texts)
 
             finally:
                 # Limpa arquivos temporários
@@ -142,7 +264,6 @@ class FileDecoder:
                     os.unlink(temp_pdf_path)
 
                 # Remove o diretório temporário e seu conteúdo
-                import shutil
                 if os.path.exists(temp_dir):
                     shutil.rmtree(temp_dir)
 
@@ -0,0 +1,201 @@
+import re
+import unicodedata
+from typing import AsyncIterator, Callable, List, Pattern, Sequence, Set, Tuple
+
+# Trechos que variam entre páginas (números, datas) não distinguem linhas repetidas
+_VARIABLE_PARTS = re.compile(r"\d+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_line(line: str) -> str:
+    """
+    Normaliza uma linha para detectar repetições entre páginas: minúsculas, sem
+    acentos, com os números trocados por '#' e os espaços colapsados.
+
+    Args:
+        line: Linha do documento
+
+    Returns:
+        Linha normalizada
+    """
+    text = unicodedata.normalize("NFKD", line)
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = _VARIABLE_PARTS.sub("#", text.lower())
+    return _SPACES.sub(" ", text).strip()
+
+
+class LineFilter:
+    """
+    Pré-filtro local que retira do texto enviado à extração as linhas que não
+    descrevem transações.
+
+    Cada linha recebe um ponto por padrão de data e um por padrão de valor
+    encontrado; as linhas com pontuação mínima são candidatas a transação e
+    ficam no texto com `context_lines` linhas vizinhas (descrições em várias
+    linhas, cabeçalho das colunas). As primeiras `header_lines` linhas do
+    documento também ficam, pois costumam trazer banco, conta e período.
+
+    Linhas de contexto que já apareceram na mesma posição de páginas anteriores
+    (cabeçalhos e rodapés repetidos, avisos legais) são descartadas; a posição é
+    contada a partir do topo e a partir do fim da página, e a comparação usa a
+    linha normalizada, com os números trocados por '#'. Uma linha repetida em
+    outra posição (ex: a segunda linha da descrição de um lançamento recorrente)
+    é mantida, e linhas candidatas nunca são descartadas por repetição.
+
+    As páginas são filtradas à medida que chegam. Enquanto nenhuma linha
+    candidata aparece, as páginas ficam retidas; se o documento terminar sem
+    candidatas (formato não reconhecido pelos padrões), as páginas são
+    entregues sem filtro.
+    """
+
+    def __init__(
+            self,
+            date_patterns: Sequence[Pattern],
+            amount_pattern: Pattern,
+            context_lines: int = 1,
+            header_lines: int = 3,
+            min_score: int = 1,
+            length_function: Callable[[str], int] = len
+    ):
+        """
+        Inicializa o filtro.
+
+        Args:
+            date_patterns: Padrões de data das linhas de transação
+            amount_pattern: Padrão de valor monetário das linhas de transação
+            context_lines: Linhas mantidas antes e depois de cada linha candidata
+            header_lines: Primeiras linhas não vazias do documento mantidas como contexto
+            min_score: Pontuação mínima de uma linha candidata
+            length_function: Função que mede o tamanho de um texto, para o relatório de redução
+        """
+        self.date_patterns = list(date_patterns)
+        self.amount_pattern = amount_pattern
+        self.context_lines = context_lines
+        self.header_lines = header_lines
+        self.min_score = min_score
+        self.length_function = length_function
+
+        self.input_size = 0
+        self.output_size = 0
+
+        # Linhas normalizadas das páginas anteriores, com a posição contada a partir
+        # do topo (0, 1, ...) e a partir do fim (-1, -2, ...) da página
+        self._seen: Set[Tuple[int, str]] = set()
+        self._header_remaining = header_lines
+        self._found_candidates = False
+
+    @property
+    def reduction(self) -> float:
+        """Fração do texto removida pelo filtro (0 se nada foi filtrado)."""
+        if not self.input_size:
+            return 0.0
+        return 1 - self.output_size / self.input_size
+
+    def score_line(self, line: str) -> int:
+        """
+        Pontua uma linha pela presença de data e de valor.
+
+        Args:
+            line: Linha do documento
+
+        Returns:
+            0, 1 ou 2
+        """
+        score = 0
+        if any(pattern.search(line) for pattern in self.date_patterns):
+            score += 1
+        if self.amount_pattern.search(line):
+            score += 1
+        return score
+
+    def filter_page(self, page_text: str) -> str:
+        """
+        Filtra uma página, mantendo as regiões de transações e o contexto mínimo.
+
+        Args:
+            page_text: Texto da página
+
+        Returns:
+            Texto filtrado (vazio se a página não tiver transações)
+        """
+        lines = page_text.splitlines(keepends=True)
+        candidates = [self.score_line(line) >= self.min_score for line in lines]
+        keep = list(candidates)
+        positions = self._positions(lines)
+
+        for index, candidate in enumerate(candidates):
+            if not candidate:
+                continue
+            self._found_candidates = True
+            start = max(0, index - self.context_lines)
+            for neighbor in range(start, min(len(lines), index + self.context_lines + 1)):
+                keep[neighbor] = keep[neighbor] or self._is_new(lines[neighbor], positions[neighbor])
+
+        if self._header_remaining > 0:
+            for index, line in enumerate(lines):
+                if self._header_remaining <= 0:
+                    break
+                if line.strip():
+                    keep[index] = True
+                    self._header_remaining -= 1
+
+        for line, (top, bottom) in zip(lines, positions, strict=True):
+            if line.strip():
+                normalized = normalize_line(line)
+                self._seen.update(((top, normalized), (bottom, normalized)))
+
+        return "".join(line for line, kept in zip(lines, keep, strict=True) if kept and line.strip())
+
+    async def filter_pages(self, pages: AsyncIterator[str]) -> AsyncIterator[str]:
+        """
+        Filtra as páginas recebidas de forma assíncrona, produzindo cada página filtrada.
+
+        Args:
+            pages: Iterador assíncrono de textos de página
+
+        Yields:
+            Texto filtrado das páginas que têm conteúdo
+        """
+        held: List[str] = []
+        held_filtered: List[str] = []
+
+        async for page_text in pages:
+            self.input_size += self.length_function(page_text)
+            filtered = self.filter_page(page_text)
+
+            if not self._found_candidates:
+                # Ainda não se sabe se os padrões reconhecem o formato do documento
+                held.append(page_text)
+                held_filtered.append(filtered)
+                continue
+
+            for text in held_filtered + [filtered]:
+                if text:
+                    self.output_size += self.length_function(text)
+                    yield text
+            held, held_filtered = [], []
+
+        # Nenhuma linha candidata: entrega o documento sem filtro
+        for page_text in held:
+            self.output_size += self.length_function(page_text)
+            yield page_text
+
+    @staticmethod
+    def _positions(lines: List[str]) -> List[Tuple[int, int]]:
+        """Posição de cada linha entre as linhas não vazias da página, a partir do topo e do fim."""
+        total = sum(1 for line in lines if line.strip())
+        positions = []
+        top = 0
+        for line in lines:
+            positions.append((top, top - total))
+            if line.strip():
+                top += 1
+        return positions
+
+    def _is_new(self, line: str, position: Tuple[int, int]) -> bool:
+        """Verifica se uma linha de contexto tem conteúdo e não apareceu na mesma posição em páginas anteriores."""
+        if not line.strip():
+            return False
+        normalized = normalize_line(line)
+        top, bottom = position
+        return (top, normalized) not in self._seen and (bottom, normalized) not in self._seen
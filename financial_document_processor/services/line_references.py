@@ -0,0 +1,114 @@
+import re
+from decimal import Decimal
+from typing import Any, Dict, List
+
+from financial_document_processor.services.structured_output import LineReferencedTransaction
+
+# Data da transação (15/01/2023, 15/01, 15-01-23, 2023-01-15); só a primeira da linha
+# é retirada, para preservar parcelas como "PARC 02/10"
+_DATE_PATTERN = re.compile(r"(?<!\d)(?:\d{4}-\d{2}-\d{2}|\d{1,2}[/.-]\d{1,2}(?:[/.-]\d{2,4})?)(?![\d/])")
+
+# Valores monetários com centavos, com sinal, "R$" e indicador de débito/crédito opcionais
+_AMOUNT_PATTERN = re.compile(
+    r"(?<![\d.,])[-+]?(?:R\$\s*)?\d{1,3}(?:[.,\s]?\d{3})*[.,]\d{2}(?![\d%])(?:\s?[-+]|\s[DC]\b)?"
+)
+
+# Separadores que sobram nas pontas da descrição depois de retirar a data e os valores
+_EDGE_CHARACTERS = " \t-|:;*"
+
+
+def _digits(text: str) -> str:
+    """Dígitos significativos de um valor, sem separadores nem zeros à esquerda."""
+    return re.sub(r"\D", "", text).lstrip("0")
+
+
+class NumberedText:
+    """
+    Texto de um trecho com as linhas numeradas, para a extração por referência de linha.
+
+    O modelo recebe cada linha não vazia precedida do seu número e responde com
+    registros compactos (linha, data, valor, tipo, método), sem repetir a
+    descrição. A descrição é recortada localmente das linhas indicadas, retirando
+    a data e os valores, e o valor de cada registro é conferido com o texto da linha.
+    """
+
+    def __init__(self, text: str):
+        """
+        Inicializa o texto numerado.
+
+        Args:
+            text: Texto do trecho
+        """
+        self.lines: List[str] = [line.strip() for line in text.splitlines() if line.strip()]
+
+    def render(self) -> str:
+        """
+        Gera o texto enviado ao modelo, com o número de cada linha seguido de '|'.
+
+        Returns:
+            Texto numerado
+        """
+        return "\n".join(f"{index}|{line}" for index, line in enumerate(self.lines))
+
+    def resolve(self, item: LineReferencedTransaction) -> Dict[str, Any]:
+        """
+        Converte um registro compacto nos campos de uma transação.
+
+        Args:
+            item: Registro da resposta do modelo
+
+        Returns:
+            Campos da transação (data, descrição, valor, tipo e método)
+
+        Raises:
+            ValueError: Se a linha não existir, se o valor não aparecer nas linhas
+                indicadas ou se não sobrar descrição
+        """
+        if not 0 <= item.l < len(self.lines):
+            raise ValueError(f"Linha {item.l} fora do trecho ({len(self.lines)} linhas)")
+
+        lines = self.lines[item.l:item.l + max(item.n, 1)]
+
+        if not any(self.contains_amount(line, item.v) for line in lines):
+            raise ValueError(f"Valor {item.v} não aparece na linha {item.l}: {lines[0]!r}")
+
+        description = " - ".join(part for part in (self.describe(line) for line in lines) if part)
+        if not description:
+            raise ValueError(f"Linha {item.l} sem descrição: {lines[0]!r}")
+
+        return {
+            "date": item.d,
+            "description": description,
+            "amount": item.v,
+            "type": item.t,
+            "method": item.m,
+        }
+
+    @staticmethod
+    def describe(line: str) -> str:
+        """
+        Recorta a descrição de uma linha, retirando a data e os valores.
+
+        Args:
+            line: Linha do texto
+
+        Returns:
+            Descrição, com os espaços colapsados
+        """
+        text = _AMOUNT_PATTERN.sub(" ", _DATE_PATTERN.sub(" ", line, count=1))
+        return " ".join(text.split()).strip(_EDGE_CHARACTERS)
+
+    @staticmethod
+    def contains_amount(line: str, amount: Decimal) -> bool:
+        """
+        Verifica se um valor aparece em uma linha, em qualquer formato (1.500,00 ou 1,500.00).
+
+        Args:
+            line: Linha do texto
+            amount: Valor do registro
+
+        Returns:
+            True se algum valor da linha tiver os mesmos dígitos
+        """
+        expected = _digits(f"{abs(amount):.2f}")
+        return any(_digits(match.group()) == expected for match in _AMOUNT_PATTERN.finditer(line))
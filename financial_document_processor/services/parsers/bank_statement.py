@@ -1,9 +1,10 @@
 import logging
 import re
-from typing import List, Optional
+from typing import Callable, List, Optional
 
 from financial_document_processor.adapters.ai.ai_provider import AIProvider
 from financial_document_processor.domain.transaction import Transaction
+from financial_document_processor.services.line_filter import LineFilter
 from financial_document_processor.services.parsers.parser import DocumentParser
 
 logger = logging.getLogger(__name__)
@@ -33,6 +34,8 @@ class BankStatementParser(DocumentParser):
             re.compile(r'(\d{2}/\d{2}/\d{2})'),  # DD/MM/YY
             re.compile(r'(\d{2}\.\d{2}\.\d{4})'),  # DD.MM.YYYY
             re.compile(r'(\d{2}-\d{2}-\d{4})'),  # DD-MM-YYYY
+            re.compile(r'(\d{4}-\d{2}-\d{2})'),  # YYYY-MM-DD
+            re.compile(r'(?<![\d/])(\d{2}/\d{2})(?![\d/])'),  # DD/MM (extratos com o ano no cabeçalho)
         ]
 
         # Padrões para transações (variam muito por banco)
@@ -45,7 +48,30 @@ class BankStatementParser(DocumentParser):
             'deposito': re.compile(r'deposito', re.IGNORECASE),
         }
 
-        self.amount_pattern = re.compile(r'[\d.,]+')
+        # Valores com centavos (150,00; 1.234,56; 150.00), exceto percentuais
+        self.amount_pattern = re.compile(r'(?<![\d.,])-?\d{1,3}(?:[.,]?\d{3})*[.,]\d{2}\b(?!\s*%)')
+
+    def create_line_filter(
+            self,
+            context_lines: int = 1,
+            length_function: Callable[[str], int] = len
+    ) -> Optional[LineFilter]:
+        """
+        Cria o pré-filtro de linhas a partir dos padrões de data e valor do extrato.
+
+        Args:
+            context_lines: Linhas mantidas antes e depois de cada linha de transação
+            length_function: Função que mede o tamanho de um texto, para o relatório de redução
+
+        Returns:
+            Filtro de linhas do extrato
+        """
+        return LineFilter(
+            date_patterns=self.date_patterns,
+            amount_pattern=self.amount_pattern,
+            context_lines=context_lines,
+            length_function=length_function
+        )
 
     async def parse(
             self,
@@ -1,7 +1,8 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from typing import Callable, List, Optional
 
 from financial_document_processor.domain.transaction import Transaction
+from financial_document_processor.services.line_filter import LineFilter
 
 
 class DocumentParser(ABC):
@@ -28,4 +29,21 @@ class DocumentParser(ABC):
         Returns:
             Lista de transações extraídas
         """
-        pass
\ No newline at end of file
+        pass
+
+    def create_line_filter(
+            self,
+            context_lines: int = 1,
+            length_function: Callable[[str], int] = len
+    ) -> Optional[LineFilter]:
+        """
+        Cria o pré-filtro que retira do texto as linhas sem transações antes da extração.
+
+        Args:
+            context_lines: Linhas mantidas antes e depois de cada linha de transação
+            length_function: Função que mede o tamanho de um texto, para o relatório de redução
+
+        Returns:
+            Filtro de linhas ou None se o tipo de documento não tiver pré-filtro
+        """
+        return None
@@ -1,8 +1,33 @@
-import json
-from typing import List, Optional
+from typing import List, Optional, Tuple, Union
+
+from pydantic import BaseModel
 
 from financial_document_processor.domain.category import CategoryRegistry
-from financial_document_processor.domain.transaction import Transaction
+from financial_document_processor.domain.transaction import Transaction, TransactionType
+
+# Cabeçalho da tabela compacta de transações enviada para categorização
+COMPACT_TRANSACTIONS_HEADER = "i|valor|método|descrição"
+
+
+class PromptParts(BaseModel):
+    """
+    Prompt dividido em prefixo estático e sufixo dinâmico.
+
+    O prefixo (instruções, esquema de saída e exemplos) se repete entre chamadas do
+    mesmo tipo e pode ser reaproveitado pelo cache de prompt dos provedores; o sufixo
+    traz o conteúdo que muda a cada chamada (categorias escolhidas para o lote e texto
+    do documento ou transações).
+
+    Os provedores só fazem cache de prefixos longos (a partir de 1024 tokens), o que
+    os templates padrão não atingem sozinhos.
+    """
+    prefix: str
+    suffix: str
+
+    @property
+    def text(self) -> str:
+        """Prompt completo (prefixo seguido do sufixo)."""
+        return self.prefix + self.suffix
 
 
 class PromptEngineering:
@@ -11,6 +36,8 @@ class PromptEngineering:
 
     Este serviço implementa técnicas de engenharia de prompts para maximizar a qualidade
     dos resultados enquanto minimiza o uso de tokens (e consequentemente os custos).
+    Todos os templates colocam a parte estática antes do conteúdo dinâmico, para que
+    o cache de prompt dos provedores possa reaproveitar o prefixo entre chamadas.
     """
 
     def __init__(self):
@@ -18,14 +45,17 @@ class PromptEngineering:
         self.provider_styles = {
             "openai": {
                 "extraction_template": self._openai_extraction_template,
+                "line_reference_template": self._openai_line_reference_template,
                 "categorization_template": self._openai_categorization_template,
             },
             "gemini": {
                 "extraction_template": self._gemini_extraction_template,
+                "line_reference_template": self._gemini_line_reference_template,
                 "categorization_template": self._gemini_categorization_template,
             },
             "claude": {
                 "extraction_template": self._claude_extraction_template,
+                "line_reference_template": self._claude_line_reference_template,
                 "categorization_template": self._claude_categorization_template,
             },
         }
@@ -35,36 +65,74 @@ class PromptEngineering:
             text_content: str,
             document_type: str,
             predefined_categories: Optional[List[str]] = None,
-            provider: str = "openai"
+            provider: str = "openai",
+            line_references: bool = False
     ) -> str:
         """
         Cria um prompt otimizado para extração de transações.
 
+        O texto é usado integralmente; documentos longos devem ser divididos em
+        trechos antes da chamada (ver TextChunker).
+
         Args:
             text_content: Texto do documento a ser processado
             document_type: Tipo do documento (ex: bank_statement)
             predefined_categories: Lista de categorias predefinidas (opcional)
             provider: Nome do provedor de IA ('openai', 'gemini', 'claude')
+            line_references: Pede registros compactos por número de linha (texto numerado por NumberedText)
 
         Returns:
             String com o prompt formatado
         """
-        # Limita o tamanho do texto para evitar exceder limites de tokens
-        max_text_length = 15000  # Ajuste conforme necessário
-        if len(text_content) > max_text_length:
-            text_content = text_content[:max_text_length] + "..."
+        return self.create_extraction_prompt_parts(
+            text_content, document_type, predefined_categories, provider, line_references
+        ).text
 
-        categories_str = ""
+    def create_extraction_prompt_parts(
+            self,
+            text_content: str,
+            document_type: str,
+            predefined_categories: Optional[List[str]] = None,
+            provider: str = "openai",
+            line_references: bool = False
+    ) -> PromptParts:
+        """
+        Cria o prompt de extração separado em prefixo cacheável e sufixo dinâmico.
+
+        Com `line_references`, o texto deve vir numerado e o modelo responde com o
+        número da linha de cada transação em vez de repetir a descrição, o que
+        reduz os tokens de saída. Nesse formato as categorias não são pedidas:
+        ficam para a etapa de categorização.
+
+        Args:
+            text_content: Texto do documento a ser processado
+            document_type: Tipo do documento (ex: bank_statement)
+            predefined_categories: Lista de categorias predefinidas (opcional)
+            provider: Nome do provedor de IA ('openai', 'gemini', 'claude')
+            line_references: Pede registros compactos por número de linha
+
+        Returns:
+            PromptParts com o prefixo estático e as categorias e o texto do documento no sufixo
+        """
+        categories_instructions = ""
+        categories_list = ""
+        # Exemplos de "categories" na resposta: nomes por extenso ou números das categorias
+        example_categories = ('["salário"]', '["utilidades", "conta de luz"]')
         if predefined_categories and len(predefined_categories) > 0:
-            categories_str = "\n\nCategorias disponíveis para uso: " + ", ".join(predefined_categories)
+            example_categories = ('["2"]', '["0", "3"]')
+            # Categorias identificadas por número, como na categorização: o modelo não repete os nomes.
+            # A lista muda a cada trecho e fica no sufixo, para não invalidar o cache do prefixo
+            categories_instructions = (
+                "\n\nUse apenas as categorias listadas antes do documento, identificadas por número "
+                "(número=nome): preencha \"categories\" com os números, ex: [\"2\"]."
+            )
+            categories_list = self._encode_categories(predefined_categories)
 
         template_func = self.provider_styles.get(
             provider, self.provider_styles["openai"]
-        )["extraction_template"]
-
-        template = template_func(text_content, document_type, categories_str)
+        )["line_reference_template" if line_references else "extraction_template"]
 
-        return template
+        return template_func(text_content, document_type, categories_instructions, categories_list, example_categories)
 
     def create_categorization_prompt(
             self,
@@ -83,64 +151,146 @@ class PromptEngineering:
         Returns:
             String com o prompt formatado
         """
-        transactions_json = []
-        for tx in transactions:
-            transactions_json.append({
-                "id": str(tx.id),
-                "date": tx.date.isoformat(),
-                "description": tx.description,
-                "amount": str(tx.amount),
-                "type": tx.type,
-                "method": tx.method,
-                "categories": tx.categories if tx.categories else []
-            })
-
-        transactions_str = json.dumps(transactions_json, ensure_ascii=False, indent=2)
+        return self.create_categorization_prompt_parts(
+            transactions, predefined_categories, provider
+        ).text
+
+    def create_categorization_prompt_parts(
+            self,
+            transactions: List[Transaction],
+            predefined_categories: Optional[List[str]] = None,
+            provider: str = "openai"
+    ) -> PromptParts:
+        """
+        Cria o prompt de categorização separado em prefixo cacheável e sufixo dinâmico.
+
+        Args:
+            transactions: Lista de transações a serem categorizadas
+            predefined_categories: Lista de categorias predefinidas (opcional)
+            provider: Nome do provedor de IA ('openai', 'gemini', 'claude')
+
+        Returns:
+            PromptParts com as instruções no prefixo e as categorias e transações no sufixo
+        """
+        transactions_str = self.encode_transactions(transactions)
 
         categories_instructions = ""
+        categories_list = ""
         if predefined_categories and len(predefined_categories) > 0:
-            categories_str = ", ".join(predefined_categories)
-            categories_instructions = f"""
-Você deve usar APENAS as seguintes categorias: {categories_str}.
+            # A lista muda a cada lote e fica no sufixo, para não invalidar o cache do prefixo
+            categories_list = self._encode_categories(predefined_categories)
+            categories_instructions = """
+Você deve usar APENAS as seguintes categorias, identificadas por número (número=nome) e listadas junto com as transações.
 
-Se a transação não se encaixar em nenhuma dessas categorias, deixe a lista de categorias vazia.
+Preencha "c" com os números das categorias. Se a transação não se encaixar em nenhuma dessas categorias, deixe a lista de categorias vazia.
 """
+            # Exemplos de "c" na resposta: números das categorias
+            example_categories = ("[2]", "[0,3]")
         else:
             generic_categories = list(CategoryRegistry.get_generic_categories())
             generic_categories_str = ", ".join(f'"{cat}"' for cat in generic_categories)
 
             categories_instructions = f"""
-Atribua categorias específicas e descritivas para cada transação.
+Atribua categorias específicas e descritivas para cada transação, escritas por extenso em "c".
 
 Evite categorias genéricas como: {generic_categories_str}.
 
 Se você não conseguir determinar uma categoria específica para a transação, deixe a lista de categorias vazia em vez de usar uma categoria genérica.
 """
+            # Exemplos de "c" na resposta: nomes por extenso
+            example_categories = ('["supermercado"]', '["conta de luz","moradia"]')
 
         template_func = self.provider_styles.get(
             provider, self.provider_styles["openai"]
         )["categorization_template"]
 
-        return template_func(transactions_str, categories_instructions)
+        return template_func(transactions_str, categories_instructions, categories_list, example_categories)
+
+    @staticmethod
+    def _encode_categories(categories: List[str]) -> str:
+        """Lista compacta de categorias identificadas pela posição (ex: '0=aluguel;1=luz')."""
+        return ";".join(f"{index}={category}" for index, category in enumerate(categories))
+
+    @staticmethod
+    def encode_transactions(transactions: List[Transaction]) -> str:
+        """
+        Codifica transações em formato tabular compacto para a categorização.
+
+        Cada linha traz o índice posicional da transação no lote, o valor (negativo
+        para débitos), o método e a descrição, separados por '|'. O índice substitui
+        o UUID da transação na resposta do modelo.
+
+        Args:
+            transactions: Transações do lote
+
+        Returns:
+            Tabela com cabeçalho e uma linha por transação
+        """
+        rows = [COMPACT_TRANSACTIONS_HEADER]
+
+        for index, tx in enumerate(transactions):
+            sign = "-" if tx.type == TransactionType.DEBIT else ""
+            method = tx.method.value if tx.method else ""
+            description = " ".join(tx.description.split()).replace("|", "/")
+            rows.append(f"{index}|{sign}{tx.amount}|{method}|{description}")
+
+        return "\n".join(rows)
+
+    @staticmethod
+    def decode_categories(
+            values: List[Union[int, str]],
+            predefined_categories: Optional[List[str]] = None
+    ) -> List[str]:
+        """
+        Converte as categorias de uma resposta compacta em nomes de categorias.
+
+        Números, inclusive escritos como texto (a extração usa listas de strings),
+        são interpretados como índices da lista de categorias predefinidas;
+        índices inválidos são descartados. Com lista de categorias, os demais textos
+        só são mantidos se forem nomes da lista; sem ela, são mantidos como nomes.
+
+        Args:
+            values: Valores do campo "c" da resposta
+            predefined_categories: Lista de categorias predefinidas (opcional)
+
+        Returns:
+            Lista de nomes de categorias
+        """
+        categories = []
+
+        for value in values or []:
+            if isinstance(value, bool):
+                continue
+            if isinstance(value, str) and value.strip().isdigit():
+                value = int(value)
+            if isinstance(value, int):
+                if predefined_categories and 0 <= value < len(predefined_categories):
+                    categories.append(predefined_categories[value])
+            elif isinstance(value, str) and value.strip():
+                if not predefined_categories or value.strip() in predefined_categories:
+                    categories.append(value.strip())
+
+        return categories
 
     def _openai_extraction_template(
-            self, text_content: str, document_type: str, categories_str: str
-    ) -> str:
+            self,
+            text_content: str,
+            document_type: str,
+            categories_instructions: str,
+            categories_list: str,
+            example_categories: Tuple[str, str]
+    ) -> PromptParts:
         """Template de extração para OpenAI."""
-        return f"""
+        prefix = f"""
 # Tarefa: Extração de Transações Financeiras
 
 ## Contexto
 Você está analisando um extrato bancário do tipo '{document_type}'.
-O conteúdo está em formato de texto plano, extraído de um documento original.
-
-## Conteúdo do Documento
-```
-{text_content}
-```
+O conteúdo está em formato de texto plano, extraído de um documento original,
+e aparece no final desta mensagem, na seção "Conteúdo do Documento".
 
 ## Instruções
-1. Extraia TODAS as transações financeiras encontradas no extrato acima.
+1. Extraia TODAS as transações financeiras encontradas no extrato.
 2. Para cada transação, identifique:
    - Data da transação (formato ISO 'YYYY-MM-DD')
    - Descrição
@@ -148,8 +298,7 @@ O conteúdo está em formato de texto plano, extraído de um documento original.
    - Tipo (CREDIT para entradas, DEBIT para saídas)
    - Método (PIX, TED, BOLETO, etc. se puder identificar)
    - Categorias (lista de strings)
-3. Atribua uma pontuação de confiança (0 a 1) para cada transação extraída.
-{categories_str}
+3. Atribua uma pontuação de confiança (0 a 1) para cada transação extraída.{categories_instructions}
 
 ## Formato de Saída
 Retorne os resultados em formato JSON conforme o exemplo abaixo:
@@ -161,18 +310,18 @@ Retorne os resultados em formato JSON conforme o exemplo abaixo:
       "date": "2023-01-15",
       "description": "TRANSFERÊNCIA RECEBIDA - JOÃO SILVA",
       "amount": "1500.00",
-      "type": "CREDIT",
-      "method": "TED",
-      "categories": ["salário"],
+      "type": "credit",
+      "method": "ted",
+      "categories": {example_categories[0]},
       "confidence_score": 0.95
     }},
     {{
       "date": "2023-01-20",
       "description": "PAGAMENTO - CONTA DE LUZ",
       "amount": "150.25",
-      "type": "DEBIT",
-      "method": "BOLETO",
-      "categories": ["utilidades", "conta de luz"],
+      "type": "debit",
+      "method": "boleto",
+      "categories": {example_categories[1]},
       "confidence_score": 0.92
     }}
   ]
@@ -186,21 +335,29 @@ Retorne os resultados em formato JSON conforme o exemplo abaixo:
 - Forneça APENAS o JSON solicitado, sem explicações adicionais.
 - Se não houver transações identificáveis, retorne um array vazio.
 """
-
-    def _gemini_extraction_template(
-            self, text_content: str, document_type: str, categories_str: str
-    ) -> str:
-        """Template de extração para Gemini."""
-        return f"""
-Extraia todas as transações financeiras do seguinte documento do tipo '{document_type}'.
-
-DOCUMENTO:
+        categories_block = f"\n## Categorias Disponíveis\n{categories_list}\n" if categories_list else ""
+        suffix = f"""{categories_block}
+## Conteúdo do Documento
 ```
 {text_content}
 ```
+"""
+        return PromptParts(prefix=prefix, suffix=suffix)
+
+    def _gemini_extraction_template(
+            self,
+            text_content: str,
+            document_type: str,
+            categories_instructions: str,
+            categories_list: str,
+            example_categories: Tuple[str, str]
+    ) -> PromptParts:
+        """Template de extração para Gemini."""
+        prefix = f"""
+Extraia todas as transações financeiras do documento do tipo '{document_type}' apresentado ao final.
 
 INSTRUÇÕES DETALHADAS:
-1. Analise o documento acima e extraia todas as transações financeiras individuais.
+1. Analise o documento e extraia todas as transações financeiras individuais.
 2. Para cada transação, identifique:
    * Data da transação (formato ISO 'YYYY-MM-DD')
    * Descrição completa da transação
@@ -209,8 +366,7 @@ INSTRUÇÕES DETALHADAS:
    * Método utilizado, se identificável  ('pix', 'ted', 'doc', 'boleto', 'payment', 'transfer', 'withdrawal', 'deposit', 'loan' ou 'other')
    * Categorias apropriadas para a transação
 3. Atribua uma pontuação de confiança (0 a 1) para cada extração
-4. Não crie categorias genericas como "transferencia", "recebimento", "pix", etc.
-{categories_str}
+4. Não crie categorias genericas como "transferencia", "recebimento", "pix", etc.{categories_instructions}
 
 DIRETRIZES DE PRECISÃO:
 - Inclua TODAS as transações visíveis no documento
@@ -228,9 +384,9 @@ Retorne exclusivamente um objeto JSON com a seguinte estrutura:
         "date": "2023-01-15",
       "description": "TRANSFERÊNCIA RECEBIDA - JOÃO SILVA",
       "amount": "1500.00",
-      "type": "CREDIT",
-      "method": "TED",
-      "categories": ["salário"],
+      "type": "credit",
+      "method": "ted",
+      "categories": {example_categories[0]},
       "confidence_score": 0.95
     }}
   ]
@@ -241,18 +397,25 @@ Se não encontrar transações, retorne um array vazio: {{"transactions": []}}
 
 IMPORTANTE: Responda APENAS com o JSON solicitado, sem texto adicional ou explicações.
 """
+        categories_block = f"\nCATEGORIAS DISPONÍVEIS:\n{categories_list}\n" if categories_list else ""
+        suffix = f"""{categories_block}
+DOCUMENTO:
+```
+{text_content}
+```
+"""
+        return PromptParts(prefix=prefix, suffix=suffix)
 
     def _claude_extraction_template(
-            self, text_content: str, document_type: str, categories_str: str
-    ) -> str:
+            self,
+            text_content: str,
+            document_type: str,
+            categories_instructions: str,
+            categories_list: str,
+            example_categories: Tuple[str, str]
+    ) -> PromptParts:
         """Template de extração para Claude."""
-        return f"""<documento>
-{text_content}
-</documento>
-
-Extraia todas as transações financeiras do documento acima, que é um '{document_type}'.
-
-{categories_str}
+        prefix = f"""Extraia todas as transações financeiras do documento em <documento>, que é um '{document_type}'.{categories_instructions}
 
 Siga estas regras rigorosamente:
 
@@ -280,18 +443,18 @@ Retorne os resultados em um JSON estruturado exatamente assim:
         "date": "2023-01-15",
       "description": "TRANSFERÊNCIA RECEBIDA - JOÃO SILVA",
       "amount": "1500.00",
-      "type": "CREDIT",
-      "method": "TED",
-      "categories": ["salário"],
+      "type": "credit",
+      "method": "ted",
+      "categories": {example_categories[0]},
       "confidence_score": 0.95
     }},
     {{
         "date": "2023-01-20",
       "description": "PAGAMENTO - CONTA DE LUZ",
       "amount": "150.25",
-      "type": "DEBIT",
-      "method": "BOLETO",
-      "categories": ["utilidades", "conta de luz"],
+      "type": "debit",
+      "method": "boleto",
+      "categories": {example_categories[1]},
       "confidence_score": 0.92
     }}
   ]
@@ -300,80 +463,192 @@ Retorne os resultados em um JSON estruturado exatamente assim:
 
 Responda APENAS com o JSON, sem explicações adicionais.
 """
+        categories_block = f"\n<categorias>\n{categories_list}\n</categorias>\n" if categories_list else ""
+        suffix = f"""{categories_block}
+<documento>
+{text_content}
+</documento>
+"""
+        return PromptParts(prefix=prefix, suffix=suffix)
 
-    def _openai_categorization_template(
-            self, transactions_str: str, categories_instructions: str
-    ) -> str:
-        """Template de categorização para OpenAI."""
-        return f"""
-# Tarefa: Categorização de Transações Financeiras
+    def _openai_line_reference_template(
+            self,
+            text_content: str,
+            document_type: str,
+            categories_instructions: str,
+            categories_list: str,
+            example_categories: Tuple[str, str]
+    ) -> PromptParts:
+        """Template de extração por referência de linha para OpenAI."""
+        prefix = f"""
+# Tarefa: Extração de Transações Financeiras
 
-## Dados
-Abaixo está uma lista de transações financeiras em formato JSON:
+## Contexto
+Você está analisando um extrato bancário do tipo '{document_type}'.
+O conteúdo aparece no final desta mensagem, na seção "Conteúdo do Documento",
+com cada linha precedida do seu número e de '|'.
 
-```json
-{transactions_str}
+## Instruções
+1. Extraia TODAS as transações financeiras encontradas no extrato.
+2. Para cada transação, informe apenas:
+   - "l": número da linha onde está a transação
+   - "n": quantas linhas a descrição ocupa a partir de "l" (1 se couber na linha)
+   - "d": data (formato ISO 'YYYY-MM-DD')
+   - "v": valor sem sinal (número decimal)
+   - "t": tipo (credit para entradas, debit para saídas)
+   - "m": método (pix, ted, doc, boleto, payment, transfer, withdrawal, deposit, loan, other ou null)
+3. NÃO escreva a descrição: ela é lida da linha indicada.
+
+## Formato de Saída
+Retorne um objeto JSON compacto, sem espaços:
+
+{{"r":[{{"l":4,"n":1,"d":"2023-01-15","v":"1500.00","t":"credit","m":"ted"}}]}}
+
+## Observações Importantes
+- Não extraia saldos, totais ou informações de cabeçalho.
+- Forneça APENAS o JSON solicitado, sem explicações adicionais.
+- Se não houver transações identificáveis, retorne {{"r":[]}}.
+"""
+        suffix = f"""
+## Conteúdo do Documento
+```
+{text_content}
+```
+"""
+        return PromptParts(prefix=prefix, suffix=suffix)
+
+    def _gemini_line_reference_template(
+            self,
+            text_content: str,
+            document_type: str,
+            categories_instructions: str,
+            categories_list: str,
+            example_categories: Tuple[str, str]
+    ) -> PromptParts:
+        """Template de extração por referência de linha para Gemini."""
+        prefix = f"""
+Extraia todas as transações financeiras do documento do tipo '{document_type}' apresentado ao final.
+Cada linha do documento começa com o seu número seguido de '|'.
+
+INSTRUÇÕES DETALHADAS:
+1. Analise o documento e extraia todas as transações financeiras individuais.
+2. Para cada transação, informe apenas:
+   * "l": número da linha da transação
+   * "n": número de linhas ocupadas pela descrição a partir de "l" (normalmente 1)
+   * "d": data no formato ISO 'YYYY-MM-DD'
+   * "v": valor exato, sem sinal, como número decimal
+   * "t": 'credit' para entradas de dinheiro ou 'debit' para saídas
+   * "m": método, se identificável ('pix', 'ted', 'doc', 'boleto', 'payment', 'transfer', 'withdrawal', 'deposit', 'loan' ou 'other')
+3. NÃO repita a descrição da transação; ela é lida da linha informada.
+
+DIRETRIZES DE PRECISÃO:
+- Inclua TODAS as transações visíveis no documento
+- Não inclua saldos, totais ou informações de cabeçalho
+
+FORMATO DE RESPOSTA:
+Retorne exclusivamente um objeto JSON compacto, sem espaços:
+
+{{"r":[{{"l":4,"n":1,"d":"2023-01-15","v":"1500.00","t":"credit","m":"ted"}}]}}
+
+Se não encontrar transações, retorne: {{"r":[]}}
+
+IMPORTANTE: Responda APENAS com o JSON solicitado, sem texto adicional ou explicações.
+"""
+        suffix = f"""
+DOCUMENTO:
+```
+{text_content}
 ```
+"""
+        return PromptParts(prefix=prefix, suffix=suffix)
+
+    def _claude_line_reference_template(
+            self,
+            text_content: str,
+            document_type: str,
+            categories_instructions: str,
+            categories_list: str,
+            example_categories: Tuple[str, str]
+    ) -> PromptParts:
+        """Template de extração por referência de linha para Claude."""
+        prefix = f"""Extraia todas as transações financeiras do documento em <documento>, que é um '{document_type}'.
+Cada linha de <documento> começa com o seu número seguido de '|'.
+
+Siga estas regras rigorosamente:
+
+1. Identifique CADA transação individual presente no documento
+2. Para cada transação, informe apenas:
+   - "l": número da linha da transação
+   - "n": quantas linhas a descrição ocupa a partir de "l" (1 se couber na linha)
+   - "d": data (formato YYYY-MM-DD)
+   - "v": valor monetário sem sinal (string decimal)
+   - "t": "credit" para recebimentos ou "debit" para pagamentos
+   - "m": método quando identificável ('pix', 'ted', 'doc', 'boleto', 'payment', 'transfer', 'withdrawal', 'deposit', 'loan' ou 'other')
+3. NÃO escreva a descrição: ela é lida da linha indicada
+4. Não inclua saldos, totais ou informações que não sejam transações
+
+Retorne um JSON compacto, sem espaços, exatamente neste formato:
+
+{{"r":[{{"l":4,"n":1,"d":"2023-01-15","v":"1500.00","t":"credit","m":"ted"}}]}}
+
+Responda APENAS com o JSON, sem explicações adicionais.
+"""
+        suffix = f"""
+<documento>
+{text_content}
+</documento>
+"""
+        return PromptParts(prefix=prefix, suffix=suffix)
+
+    def _openai_categorization_template(
+            self,
+            transactions_str: str,
+            categories_instructions: str,
+            categories_list: str,
+            example_categories: Tuple[str, str]
+    ) -> PromptParts:
+        """Template de categorização para OpenAI."""
+        prefix = f"""
+# Tarefa: Categorização de Transações Financeiras
 
 ## Instruções
-1. Categorize cada transação com base em sua descrição e outros detalhes disponíveis.
-2. Adicione ou atualize o campo `categories` para cada transação com uma lista de 1-3 categorias relevantes.
-3. Adicione uma pontuação de confiança (`confidence_score`) entre 0 e 1 para cada categorização.
+1. Categorize cada transação listada na seção "Dados", no final desta mensagem, com base em sua descrição e outros detalhes disponíveis.
+2. Os dados são uma tabela com colunas separadas por '|': índice, valor (negativo para saídas), método e descrição.
+3. Atribua de 1 a 3 categorias relevantes e uma pontuação de confiança entre 0 e 1 para cada transação.
 
 {categories_instructions}
 
 ## Formato de Saída
-Retorne um objeto JSON contendo a mesma lista de transações, com os campos `categories` e `confidence_score` atualizados:
+Retorne um objeto JSON compacto, sem espaços, com um item por transação: "i" é o índice da transação, "c" a lista de categorias e "p" a confiança:
 
-```json
-{{
-  "transactions": [
-    {{
-      "id": "transaction-id-1",
-      "date": "2023-01-15",
-      "description": "TRANSFERÊNCIA RECEBIDA - JOÃO SILVA",
-      "amount": "1500.00",
-      "type": "CREDIT",
-      "method": "TED",
-      "categories": ["salário", "renda fixa"],
-      "confidence_score": 0.95
-    }},
-    {{
-      "id": "transaction-id-2",
-      "description": "SUPERMERCADO SILVA",
-      "date": "2023-01-16",
-      "amount": "253.45",
-      "type": "DEBIT",
-      "method": "CARTÃO DE CRÉDITO",
-      "categories": ["alimentação", "supermercado"],
-      "confidence_score": 0.92
-    }}
-  ]
-}}
-```
+{{"r":[{{"i":0,"c":{example_categories[0]},"p":0.95}},{{"i":1,"c":{example_categories[1]},"p":0.9}}]}}
 
 ## Observações Importantes
 - Forneça APENAS o JSON solicitado, sem explicações adicionais.
-- Mantenha todos os campos originais das transações.
-- Atualize apenas os campos `categories` e `confidence_score`.
+- Não repita a descrição nem os demais campos das transações.
+"""
+        categories_block = f"\n## Categorias\n{categories_list}\n" if categories_list else ""
+        suffix = f"""{categories_block}
+## Dados
+{transactions_str}
 """
+        return PromptParts(prefix=prefix, suffix=suffix)
 
     def _gemini_categorization_template(
-            self, transactions_str: str, categories_instructions: str
-    ) -> str:
+            self,
+            transactions_str: str,
+            categories_instructions: str,
+            categories_list: str,
+            example_categories: Tuple[str, str]
+    ) -> PromptParts:
         """Template de categorização para Gemini."""
-        return f"""
-Categorize as seguintes transações financeiras:
-
-```json
-{transactions_str}
-```
+        prefix = f"""
+Categorize as seguintes transações financeiras, apresentadas ao final.
 
 INSTRUÇÕES DETALHADAS:
-1. Analise cada transação e atribua categorias adequadas com base na descrição e outros detalhes
-2. Para cada transação, atualize apenas:
-   * O campo "categories": lista com 1-3 categorias relevantes
-   * O campo "confidence_score": valor entre 0 e 1 indicando a confiança da categorização
+1. As transações estão em uma tabela com colunas separadas por '|': índice, valor (negativo para saídas), método e descrição
+2. Analise cada transação e atribua categorias adequadas com base na descrição e outros detalhes
+3. Para cada transação, informe apenas o índice, as categorias e a confiança (entre 0 e 1)
 
 {categories_instructions}
 
@@ -384,67 +659,48 @@ DIRETRIZES DE CATEGORIZAÇÃO:
 - Mantenha consistência nas categorias entre transações similares
 
 FORMATO DE RESPOSTA:
-Retorne um objeto JSON contendo a lista de transações com os campos "categories" e "confidence_score" atualizados:
+Retorne um objeto JSON compacto, sem espaços: "i" é o índice, "c" a lista de categorias e "p" a confiança:
 
-```json
-{{
-        "transactions": [
-    {{
-        "id": "transaction-id-1",
-      "date": "2023-01-15",
-      "description": "TRANSFERÊNCIA RECEBIDA - JOÃO SILVA",
-      "amount": "1500.00",
-      "type": "CREDIT",
-      "method": "TED",
-      "categories": ["salário"],
-      "confidence_score": 0.95
-    }}
-  ]
-}}
-```
+{{"r":[{{"i":0,"c":{example_categories[0]},"p":0.95}}]}}
 
 IMPORTANTE: Responda APENAS com o JSON solicitado, sem texto adicional ou explicações.
 """
+        categories_block = f"\nCATEGORIAS:\n{categories_list}\n" if categories_list else ""
+        suffix = f"""{categories_block}
+TRANSAÇÕES:
+{transactions_str}
+"""
+        return PromptParts(prefix=prefix, suffix=suffix)
 
     def _claude_categorization_template(
-            self, transactions_str: str, categories_instructions: str
-    ) -> str:
+            self,
+            transactions_str: str,
+            categories_instructions: str,
+            categories_list: str,
+            example_categories: Tuple[str, str]
+    ) -> PromptParts:
         """Template de categorização para Claude."""
-        return f"""<transações>
-{transactions_str}
-</transações>
-
-Categorize cada transação financeira acima segundo as seguintes instruções:
+        prefix = f"""Categorize cada transação financeira em <transações> segundo as seguintes instruções:
 
 {categories_instructions}
 
 Diretrizes específicas:
-1. Analise cuidadosamente a descrição, valor, tipo e método de cada transação
-2. Atribua de 1 a 3 categorias precisas e relevantes para cada transação
-3. Adicione uma pontuação de confiança (0-1) para cada categorização
-4. Mantenha consistência nas categorias entre transações similares
-5. Use categorias específicas e significativas que ajudem na organização financeira
+1. <transações> é uma tabela com colunas separadas por '|': índice, valor (negativo para saídas), método e descrição
+2. Analise cuidadosamente a descrição, valor e método de cada transação
+3. Atribua de 1 a 3 categorias precisas e relevantes para cada transação
+4. Adicione uma pontuação de confiança (0-1) para cada categorização
+5. Mantenha consistência nas categorias entre transações similares
 
-Retorne as transações categorizadas em um JSON estruturado exatamente como este exemplo:
-
-```json
-{{
-        "transactions": [
-    {{
-        "id": "transaction-id-1",
-      "date": "2023-01-15",
-      "description": "TRANSFERÊNCIA RECEBIDA - JOÃO SILVA",
-      "amount": "1500.00",
-      "type": "CREDIT",
-      "method": "TED",
-      "categories": ["salário", "renda fixa"],
-      "confidence_score": 0.95
-    }}
-  ]
-}}
-```
+Retorne um JSON compacto, sem espaços, exatamente neste formato ("i" é o índice, "c" as categorias e "p" a confiança):
 
-Importante: Mantenha todos os campos originais das transações, atualizando apenas os campos "categories" e "confidence_score".
+{{"r":[{{"i":0,"c":{example_categories[0]},"p":0.95}}]}}
 
 Responda APENAS com o JSON, sem explicações adicionais.
-"""
\ No newline at end of file
+"""
+        categories_block = f"\n<categorias>\n{categories_list}\n</categorias>\n" if categories_list else ""
+        suffix = f"""{categories_block}
+<transações>
+{transactions_str}
+</transações>
+"""
+        return PromptParts(prefix=prefix, suffix=suffix)
@@ -0,0 +1,186 @@
+from datetime import date
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Type, Union
+
+from pydantic import BaseModel, TypeAdapter, create_model
+
+from financial_document_processor.domain.transaction import Transaction, TransactionMethod, TransactionType
+
+# Campos de Transaction preenchidos pelo modelo na extração; IDs e datas de
+# criação são definidos pelo sistema
+EXTRACTED_TRANSACTION_FIELDS = (
+    "date", "description", "amount", "type", "method", "categories", "confidence_score"
+)
+
+ExtractedTransaction: Type[BaseModel] = create_model(
+    "ExtractedTransaction",
+    **{
+        name: (
+            Transaction.model_fields[name].annotation,
+            ... if Transaction.model_fields[name].is_required() else Transaction.model_fields[name].default
+        )
+        for name in EXTRACTED_TRANSACTION_FIELDS
+    }
+)
+
+
+class ExtractionResult(BaseModel):
+    """
+    Resposta estruturada da extração de transações.
+    """
+    transactions: List[ExtractedTransaction]
+
+
+class LineReferencedTransaction(BaseModel):
+    """
+    Item da resposta compacta de extração por referência de linha: a descrição
+    não é repetida pelo modelo, e sim recortada das linhas indicadas. As
+    categorias ficam para a etapa de categorização.
+    """
+    l: int  # Número da linha da transação no texto numerado
+    n: int = 1  # Linhas ocupadas pela descrição, a partir de "l"
+    d: date  # Data
+    v: Decimal  # Valor
+    t: TransactionType  # Tipo
+    m: Optional[TransactionMethod] = None  # Método
+
+
+class LineReferenceResult(BaseModel):
+    """
+    Resposta estruturada da extração por referência de linha.
+    """
+    r: List[LineReferencedTransaction]
+
+
+class CategorizedTransaction(BaseModel):
+    """
+    Item da resposta compacta de categorização.
+    """
+    i: int  # Índice da transação no lote
+    c: List[Union[int, str]] = []  # IDs das categorias predefinidas ou nomes por extenso
+    p: Optional[float] = None  # Confiança
+
+
+class CategorizationResult(BaseModel):
+    """
+    Resposta estruturada da categorização de um lote.
+    """
+    r: List[CategorizedTransaction]
+
+
+class _CategoryIdsItem(CategorizedTransaction):
+    c: List[int] = []
+
+
+class _CategoryIdsResult(BaseModel):
+    r: List[_CategoryIdsItem]
+
+
+class _CategoryNamesItem(CategorizedTransaction):
+    c: List[str] = []
+
+
+class _CategoryNamesResult(BaseModel):
+    r: List[_CategoryNamesItem]
+
+
+# Validadores das respostas; a categorização é validada de uma vez por lote
+EXTRACTED_TRANSACTION_ADAPTER = TypeAdapter(ExtractedTransaction)
+LINE_REFERENCE_ADAPTER = TypeAdapter(LineReferencedTransaction)
+CATEGORIZATION_ADAPTER = TypeAdapter(CategorizationResult)
+
+
+def extraction_schema(provider: str = "openai", line_references: bool = False) -> Dict[str, Any]:
+    """
+    Gera o schema da resposta de extração no dialeto do provedor.
+
+    Args:
+        provider: Nome do provedor ('openai', 'gemini', 'claude')
+        line_references: Se a resposta usa o formato compacto por referência de linha
+
+    Returns:
+        JSON schema da resposta
+    """
+    return response_schema(LineReferenceResult if line_references else ExtractionResult, provider)
+
+
+def categorization_schema(predefined: bool, provider: str = "openai") -> Dict[str, Any]:
+    """
+    Gera o schema da resposta de categorização no dialeto do provedor.
+
+    Com categorias predefinidas o campo "c" contém números; sem elas, nomes.
+
+    Args:
+        predefined: Se há categorias predefinidas
+        provider: Nome do provedor ('openai', 'gemini', 'claude')
+
+    Returns:
+        JSON schema da resposta
+    """
+    return response_schema(_CategoryIdsResult if predefined else _CategoryNamesResult, provider)
+
+
+def response_schema(model: Type[BaseModel], provider: str = "openai") -> Dict[str, Any]:
+    """
+    Converte o schema de um modelo pydantic para o subconjunto aceito pelo provedor.
+
+    As referências são expandidas e campos opcionais viram tipos anuláveis. Para a
+    OpenAI (modo strict) todos os campos são obrigatórios e não são aceitas
+    propriedades extras; o Gemini usa `nullable` e não aceita `format` em datas.
+
+    Args:
+        model: Modelo pydantic da resposta
+        provider: Nome do provedor ('openai', 'gemini', 'claude')
+
+    Returns:
+        JSON schema da resposta
+    """
+    schema = model.model_json_schema(mode="serialization")
+    definitions = schema.pop("$defs", {})
+    return _normalize(schema, definitions, provider)
+
+
+def _normalize(node: Dict[str, Any], definitions: Dict[str, Any], provider: str) -> Dict[str, Any]:
+    """Normaliza um nó do schema para o dialeto do provedor."""
+    if "$ref" in node:
+        return _normalize(definitions[node["$ref"].split("/")[-1]], definitions, provider)
+
+    if "anyOf" in node:
+        options = [option for option in node["anyOf"] if option.get("type") != "null"]
+        nullable = len(options) < len(node["anyOf"])
+
+        if len(options) == 1:
+            result = _normalize(options[0], definitions, provider)
+        else:
+            result = {"anyOf": [_normalize(option, definitions, provider) for option in options]}
+
+        if nullable:
+            if provider == "gemini":
+                result["nullable"] = True
+            elif "type" in result:
+                result["type"] = [result["type"], "null"]
+                if "enum" in result:
+                    result["enum"] = result["enum"] + [None]
+
+        return result
+
+    result = {key: node[key] for key in ("type", "enum") if key in node}
+
+    if "format" in node and provider != "gemini":
+        result["format"] = node["format"]
+
+    if "items" in node:
+        result["items"] = _normalize(node["items"], definitions, provider)
+
+    if "properties" in node:
+        result["properties"] = {
+            name: _normalize(value, definitions, provider)
+            for name, value in node["properties"].items()
+        }
+        if provider == "openai":
+            result["required"] = list(node["properties"])
+            result["additionalProperties"] = False
+        else:
+            result["required"] = node.get("required", [])
+
+    return result
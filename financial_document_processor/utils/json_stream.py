@@ -0,0 +1,195 @@
+import json
+import logging
+import re
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Caracteres mantidos enquanto a chave do array ainda não apareceu (ela pode chegar partida)
+_KEY_LOOKBEHIND = 64
+
+
+class JSONArrayStreamParser:
+    """
+    Parser incremental dos objetos de um array JSON recebido em pedaços.
+
+    Localiza o array da chave informada (ex: `"transactions": [`) e devolve cada
+    objeto do array assim que ele se fecha, sem esperar o restante da resposta.
+    Apenas o objeto em andamento fica em memória; o texto já consumido é descartado.
+    """
+
+    def __init__(self, key: str):
+        """
+        Inicializa o parser.
+
+        Args:
+            key: Chave do array de objetos na resposta
+        """
+        self._key_pattern = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+        self._buffer = ""
+        self._position = 0
+        self._object_start = None
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self.found = False
+        self.finished = False
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """
+        Consome um pedaço da resposta.
+
+        Args:
+            text: Próximo pedaço de texto recebido do modelo
+
+        Returns:
+            Objetos do array que se completaram com este pedaço
+        """
+        if self.finished or not text:
+            return []
+
+        self._buffer += text
+
+        if not self.found:
+            match = self._key_pattern.search(self._buffer)
+            if match is None:
+                self._buffer = self._buffer[-_KEY_LOOKBEHIND:]
+                return []
+
+            self.found = True
+            self._buffer = self._buffer[match.end():]
+
+        items = []
+        buffer = self._buffer
+        position = self._position
+
+        while position < len(buffer):
+            char = buffer[position]
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if self._depth == 0:
+                    self._object_start = position
+                self._depth += 1
+            elif char in "}]":
+                if self._depth == 0:
+                    # Fim do array
+                    self.finished = True
+                    break
+
+                self._depth -= 1
+                if self._depth == 0:
+                    item = self._decode(buffer[self._object_start:position + 1])
+                    if item is not None:
+                        items.append(item)
+                    self._object_start = None
+
+            position += 1
+
+        # Descarta o que já foi consumido, mantendo apenas o objeto em andamento
+        if self.finished or self._object_start is None:
+            self._buffer = ""
+            self._position = 0
+        else:
+            self._buffer = buffer[self._object_start:]
+            self._position = position - self._object_start
+            self._object_start = 0
+
+        return items
+
+    @staticmethod
+    def _decode(text: str):
+        """Converte um objeto completo, ignorando trechos inválidos."""
+        try:
+            item = json.loads(text)
+        except json.JSONDecodeError as e:
+            logger.warning(f"Objeto JSON inválido na resposta em streaming: {str(e)}")
+            return None
+
+        return item if isinstance(item, dict) else None
+
+
+# Tamanho mínimo de sobreposição para considerar que a continuação repetiu o fim da resposta
+_MIN_OVERLAP = 16
+# Trecho inicial da continuação examinado ao costurar os pedaços
+STITCH_WINDOW = 256
+
+_CODE_FENCE = re.compile(r"^\s*```(?:json)?\s*")
+
+
+def stitch_continuation(previous: str, continuation: str) -> str:
+    """
+    Prepara o início de uma continuação para ser anexado à resposta cortada.
+
+    Remove a cerca de código que alguns modelos abrem ao continuar e o trecho
+    repetido do fim da resposta anterior, se houver.
+
+    Args:
+        previous: Resposta acumulada até o corte
+        continuation: Início da continuação (ao menos `STITCH_WINDOW` caracteres, se houver)
+
+    Returns:
+        Texto da continuação a anexar
+    """
+    continuation = _CODE_FENCE.sub("", continuation, count=1)
+
+    for size in range(min(len(previous), len(continuation), STITCH_WINDOW), _MIN_OVERLAP - 1, -1):
+        if previous.endswith(continuation[:size]):
+            return continuation[size:]
+
+    return continuation
+
+
+def repair_truncated_json(text: str) -> str:
+    """
+    Recupera um documento JSON cortado, mantendo apenas os elementos completos.
+
+    O texto é cortado logo após o último objeto ou array que se fechou e os
+    colchetes e chaves ainda abertos são fechados. Um documento completo é
+    devolvido sem alterações.
+
+    Args:
+        text: JSON possivelmente incompleto
+
+    Returns:
+        JSON com os elementos completos
+    """
+    stack = []
+    in_string = False
+    escaped = False
+    cut = None
+    cut_stack = []
+
+    for position, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]":
+            if not stack:
+                break
+
+            stack.pop()
+            if not stack:
+                return text[:position + 1]
+            cut, cut_stack = position + 1, list(stack)
+
+    if cut is None:
+        return text
+
+    return text[:cut] + "".join(reversed(cut_stack))
@@ -1,6 +1,10 @@
 import asyncio
+import inspect
 import time
+from contextlib import contextmanager
+from contextvars import ContextVar
 from functools import wraps
+from typing import Callable, Dict, Iterator, Optional, Tuple
 
 from prometheus_client import Counter, Gauge, Histogram
 from prometheus_client import start_http_server
@@ -25,6 +29,19 @@ PROCESSING_TIME = Histogram(
     buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
 )
 
+LINE_FILTER_TOKENS = Counter(
+    'document_line_filter_tokens_total',
+    'Tokens do texto dos documentos antes (input) e depois (kept) do pré-filtro de linhas',
+    ['document_type', 'stage']
+)
+
+LINE_FILTER_REDUCTION = Histogram(
+    'document_line_filter_reduction_ratio',
+    'Fração dos tokens de cada documento removida pelo pré-filtro de linhas antes da extração',
+    ['document_type'],
+    buckets=(0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+)
+
 AI_API_CALLS = Counter(
     'ai_api_calls_total',
     'Número total de chamadas para APIs de IA',
@@ -33,16 +50,167 @@ AI_API_CALLS = Counter(
 
 AI_TOKEN_USAGE = Counter(
     'ai_token_usage_total',
-    'Número total de tokens usados em APIs de IA',
-    ['provider', 'operation']
+    'Número total de tokens usados em APIs de IA, por tipo (input, output e cached, '
+    'parte dos tokens de entrada lida do cache de prompt)',
+    ['provider', 'operation', 'document_type', 'token_type']
 )
 
 AI_COST = Counter(
     'ai_cost_usd_total',
     'Custo total em USD para APIs de IA',
+    ['provider', 'operation', 'document_type']
+)
+
+AI_CACHED_TOKENS = Counter(
+    'ai_cached_tokens_total',
+    'Tokens de entrada servidos pelo cache de prompt do provedor de IA',
+    ['provider', 'model']
+)
+
+AI_HTTP_POOL_WAIT = Histogram(
+    'ai_http_pool_wait_seconds',
+    'Tempo de espera por uma conexão do pool HTTP dos provedores de IA',
+    ['host'],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+
+AI_HTTP_CONNECTIONS = Counter(
+    'ai_http_connections_total',
+    'Requisições HTTP aos provedores de IA por reaproveitamento de conexão',
+    ['host', 'reused']
+)
+
+AI_RATE_LIMIT_WAIT = Histogram(
+    'ai_rate_limit_wait_seconds',
+    'Tempo de espera por cota de requisições/tokens antes de chamar o provedor de IA',
+    ['provider'],
+    buckets=(0.0, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+
+AI_RATE_LIMITED = Counter(
+    'ai_rate_limited_total',
+    'Respostas 429 (rate limit) recebidas dos provedores de IA',
+    ['provider']
+)
+
+AI_KEY_REQUESTS = Counter(
+    'ai_key_requests_total',
+    'Chamadas por chave de API do pool, por resultado (success/error/rate_limited/unauthorized)',
+    ['provider', 'key', 'result']
+)
+
+AI_KEY_TOKENS = Counter(
+    'ai_key_tokens_total',
+    'Tokens consumidos por chave de API do pool',
+    ['provider', 'key']
+)
+
+AI_KEY_AVAILABLE_QUOTA = Gauge(
+    'ai_key_available_quota',
+    'Fração da cota do minuto disponível em cada chave de API do pool, na última escolha de chave',
+    ['provider', 'key']
+)
+
+AI_KEY_ACTIVE = Gauge(
+    'ai_key_active',
+    'Chaves de API em rotação no pool (1 = ativa, 0 = removida após erro de autenticação)',
+    ['provider', 'key']
+)
+
+AI_RESPONSE_CACHE_REQUESTS = Counter(
+    'ai_response_cache_requests_total',
+    'Consultas ao cache de respostas de IA por resultado (hit/miss)',
+    ['provider', 'result']
+)
+
+AI_RESPONSE_CACHE_SAVED_TOKENS = Counter(
+    'ai_response_cache_saved_tokens_total',
+    'Tokens não cobrados graças ao cache de respostas de IA',
+    ['provider']
+)
+
+AI_SINGLE_FLIGHT_COALESCED = Counter(
+    'ai_single_flight_coalesced_total',
+    'Requisições de IA idênticas atendidas por uma chamada já em andamento, sem nova chamada ao provedor',
     ['provider', 'operation']
 )
 
+AI_RESPONSE_PARSE = Counter(
+    'ai_response_parse_total',
+    'Respostas estruturadas de IA validadas, por operação e resultado (ok/invalid)',
+    ['provider', 'operation', 'result']
+)
+
+AI_CONTINUATIONS = Counter(
+    'ai_continuations_total',
+    'Requisições de continuação feitas porque a resposta foi cortada em max_tokens',
+    ['provider']
+)
+
+AI_CASCADE_DECISIONS = Counter(
+    'ai_cascade_decisions_total',
+    'Decisões da cascata de modelos: trechos (extração) ou transações (categorização) '
+    'aceitos no modelo barato ou escalados, por motivo',
+    ['provider', 'operation', 'outcome']
+)
+
+AI_DOCUMENT_COST = Histogram(
+    'ai_document_cost_usd',
+    'Custo de IA (USD) por documento processado, por rota de modelo e tipo de documento',
+    ['route', 'document_type'],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+)
+
+AI_ROUTE_DURATION = Histogram(
+    'ai_route_document_seconds',
+    'Tempo de extração de um documento, por rota de modelo',
+    ['route'],
+    buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+)
+
+AI_PROVIDER_HEALTH = Gauge(
+    'ai_provider_health',
+    'Score de saúde de cada provedor no failover (0 = só falhas, 1 = só sucessos)',
+    ['provider']
+)
+
+AI_FAILOVERS = Counter(
+    'ai_failovers_total',
+    'Chamadas redirecionadas ao próximo provedor após falha, por provedor que falhou',
+    ['provider', 'operation']
+)
+
+AI_HEDGED_REQUESTS = Counter(
+    'ai_hedged_requests_total',
+    'Chamadas duplicadas (hedge) em outro provedor, por tentativa vencedora (primary/hedge)',
+    ['operation', 'winner']
+)
+
+AI_CIRCUIT_STATE = Gauge(
+    'ai_circuit_breaker_state',
+    'Estado do circuit breaker por provedor e modelo (0 = fechado, 1 = meio-aberto, 2 = aberto)',
+    ['provider', 'model']
+)
+
+AI_CIRCUIT_REJECTED = Counter(
+    'ai_circuit_breaker_rejected_total',
+    'Chamadas recusadas imediatamente por circuito aberto',
+    ['provider', 'model']
+)
+
+AI_BATCH_REQUESTS = Counter(
+    'ai_batch_requests_total',
+    'Requisições processadas pelas APIs de lote, por resultado (succeeded/failed)',
+    ['provider', 'result']
+)
+
+AI_BATCH_DURATION = Histogram(
+    'ai_batch_duration_seconds',
+    'Tempo entre o envio de um lote e a obtenção dos resultados',
+    ['provider'],
+    buckets=(60, 300, 900, 1800, 3600, 7200, 14400, 28800, 86400)
+)
+
 DOCUMENT_QUEUE_SIZE = Gauge(
     'document_queue_size',
     'Tamanho atual da fila de documentos para processamento'
@@ -64,28 +232,32 @@ def setup_metrics(port: int = 8000):
     # REGISTRY.unregister(PLATFORM_COLLECTOR)
 
 
-def timing_metric(metric: Histogram):
+def timing_metric(metric: Histogram, labels: Optional[Callable[..., Dict[str, str]]] = None):
     """
     Decorador para medir o tempo de execução de uma função e registrar no Prometheus.
 
     Args:
         metric: Histograma Prometheus para registrar o tempo
+        labels: Função que recebe os argumentos da chamada e devolve os labels da métrica (opcional)
 
     Returns:
         Função decorada
     """
 
     def decorator(func):
+        def observe(execution_time: float, args, kwargs):
+            if labels is None:
+                metric.observe(execution_time)
+            else:
+                metric.labels(**labels(*args, **kwargs)).observe(execution_time)
+
         @wraps(func)
         async def async_wrapper(*args, **kwargs):
             start_time = time.time()
             try:
                 return await func(*args, **kwargs)
             finally:
-                execution_time = time.time() - start_time
-                # Extrair labels apropriados do contexto, se necessário
-                # Por exemplo, o tipo de documento poderia vir dos args
-                metric.observe(execution_time)
+                observe(time.time() - start_time, args, kwargs)
 
         @wraps(func)
         def sync_wrapper(*args, **kwargs):
@@ -93,8 +265,7 @@ def timing_metric(metric: Histogram):
             try:
                 return func(*args, **kwargs)
             finally:
-                execution_time = time.time() - start_time
-                metric.observe(execution_time)
+                observe(time.time() - start_time, args, kwargs)
 
         # Escolhe o wrapper apropriado com base no tipo da função
         if asyncio.iscoroutinefunction(func):
@@ -104,39 +275,85 @@ def timing_metric(metric: Histogram):
     return decorator
 
 
-def track_ai_usage(func):
+# Operação e tipo de documento das chamadas de IA feitas no contexto atual
+_ai_usage_labels: ContextVar[Tuple[str, str]] = ContextVar("ai_usage_labels", default=("completion", "unknown"))
+
+
+def current_ai_usage_labels() -> Dict[str, str]:
+    """
+    Obtém os labels de uso de IA do contexto atual.
+
+    Returns:
+        Dicionário com `operation` e `document_type`
     """
-    Decorador para rastrear uso de APIs de IA.
+    operation, document_type = _ai_usage_labels.get()
+    return {"operation": operation, "document_type": document_type}
+
 
-    Registra o número de chamadas, tokens utilizados e custo estimado.
+@contextmanager
+def ai_usage_labels(operation: Optional[str] = None, document_type: Optional[str] = None) -> Iterator[None]:
+    """
+    Define a operação e o tipo de documento atribuídos às chamadas de IA feitas
+    dentro do bloco, inclusive em tarefas criadas nele. Valores omitidos são
+    herdados do contexto externo.
 
     Args:
-        func: Função a ser decorada
+        operation: Operação (ex: extraction, categorization)
+        document_type: Tipo do documento (ex: bank_statement)
+    """
+    current_operation, current_document_type = _ai_usage_labels.get()
+    token = _ai_usage_labels.set((operation or current_operation, document_type or current_document_type))
+    try:
+        yield
+    finally:
+        _ai_usage_labels.reset(token)
 
-    Returns:
-        Função decorada
+
+def track_ai_usage(operation: str):
     """
+    Decorador que atribui à operação as chamadas de IA feitas pela função.
 
-    @wraps(func)
-    async def wrapper(*args, **kwargs):
-        # Extrai o nome do provedor da instância self
-        self = args[0]  # Assume que o primeiro argumento é self
-        provider = self.name
+    Tokens, custo e número de chamadas são registrados por `AIProvider.record_usage`
+    com os labels do contexto; o tipo de documento vem do argumento `document_type`,
+    se houver, ou do contexto externo. Funciona com corrotinas e geradores assíncronos.
 
-        # Infere a operação com base no nome da função
-        operation = func.__name__
+    Args:
+        operation: Nome da operação nas métricas
 
-        # Incrementa o contador de chamadas
-        AI_API_CALLS.labels(provider=provider, operation=operation).inc()
+    Returns:
+        Decorador
+    """
 
-        # Executa a função
-        result = await func(*args, **kwargs)
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        def document_type_of(args, kwargs) -> Optional[str]:
+            return signature.bind_partial(*args, **kwargs).arguments.get("document_type")
+
+        if inspect.isasyncgenfunction(func):
+            @wraps(func)
+            async def async_gen_wrapper(*args, **kwargs):
+                document_type = document_type_of(args, kwargs)
+                generator = func(*args, **kwargs)
+                try:
+                    while True:
+                        # Os labels valem só durante cada passo do gerador, sem vazar para quem o consome
+                        with ai_usage_labels(operation, document_type):
+                            try:
+                                item = await generator.__anext__()
+                            except StopAsyncIteration:
+                                return
+                        yield item
+                finally:
+                    await generator.aclose()
+
+            return async_gen_wrapper
 
-        # Registra o uso de tokens e custo
-        if hasattr(result, 'tokens_used') and hasattr(result, 'cost'):
-            AI_TOKEN_USAGE.labels(provider=provider, operation=operation).inc(result.tokens_used)
-            AI_COST.labels(provider=provider, operation=operation).inc(result.cost)
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            with ai_usage_labels(operation, document_type_of(args, kwargs)):
+                return await func(*args, **kwargs)
 
-        return result
+        return wrapper
 
-    return wrapper
+    return decorator
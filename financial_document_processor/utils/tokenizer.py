@@ -0,0 +1,316 @@
+import logging
+import math
+import re
+import threading
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+
+class Tokenizer(ABC):
+    """
+    Interface para contadores de tokens.
+    """
+
+    @abstractmethod
+    def count(self, text: str) -> int:
+        """
+        Conta os tokens de um texto.
+
+        Args:
+            text: Texto a ser medido
+
+        Returns:
+            Número de tokens
+        """
+        pass
+
+
+class TiktokenTokenizer(Tokenizer):
+    """
+    Contador de tokens exato para modelos da OpenAI, baseado no tiktoken.
+    """
+
+    def __init__(self, encoding):
+        """
+        Inicializa o contador.
+
+        Args:
+            encoding: Instância de tiktoken.Encoding
+        """
+        self.encoding = encoding
+
+    def count(self, text: str) -> int:
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+
+class ApproximateTokenizer(Tokenizer):
+    """
+    Contador de tokens aproximado, para provedores sem tokenizador local.
+
+    Em vez de uma razão fixa de caracteres por token, pré-segmenta o texto como
+    os tokenizadores BPE fazem: números viram grupos de até 3 dígitos, palavras em
+    maiúsculas e com acentos (comuns em extratos em português) custam mais tokens
+    por caractere, e cada sinal de pontuação conta separadamente.
+    """
+
+    _pieces = re.compile(r"\d+|[^\W\d_]+|\n+|[^\w\s]")
+
+    def __init__(
+            self,
+            chars_per_token: float = 4.0,
+            upper_chars_per_token: float = 2.5,
+            non_ascii_penalty: float = 0.5
+    ):
+        """
+        Inicializa o contador.
+
+        Args:
+            chars_per_token: Caracteres por token em palavras minúsculas
+            upper_chars_per_token: Caracteres por token em palavras maiúsculas
+            non_ascii_penalty: Tokens extras por caractere não-ASCII (acentos)
+        """
+        self.chars_per_token = chars_per_token
+        self.upper_chars_per_token = upper_chars_per_token
+        self.non_ascii_penalty = non_ascii_penalty
+
+    def count(self, text: str) -> int:
+        tokens = 0.0
+
+        for piece in self._pieces.findall(text):
+            first = piece[0]
+
+            if first.isdigit():
+                tokens += math.ceil(len(piece) / 3)
+            elif first.isalpha():
+                ratio = self.upper_chars_per_token if piece.isupper() else self.chars_per_token
+                non_ascii = sum(1 for char in piece if ord(char) > 127)
+                tokens += max(1.0, len(piece) / ratio) + non_ascii * self.non_ascii_penalty
+            else:
+                tokens += 1
+
+        return math.ceil(tokens)
+
+
+class ModelLimits(BaseModel):
+    """
+    Limites de contexto e de saída de um modelo.
+    """
+    context_window: int
+    max_output_tokens: int
+
+
+class TokenEstimate(BaseModel):
+    """
+    Estimativa de tokens e custo de uma requisição, calculada antes da chamada.
+    """
+    prompt_tokens: int
+    max_tokens: int
+    estimated_cost: float
+    expected_output_tokens: int = 0
+
+    @property
+    def expected_total_tokens(self) -> int:
+        """Tokens de entrada mais a saída esperada."""
+        return self.prompt_tokens + self.expected_output_tokens
+
+
+# Parâmetros de aproximação por provedor (usados quando não há tokenizador exato)
+APPROXIMATION_TABLE: Dict[str, Dict[str, float]] = {
+    "openai": {"chars_per_token": 4.0, "upper_chars_per_token": 2.5, "non_ascii_penalty": 0.5},
+    "claude": {"chars_per_token": 3.5, "upper_chars_per_token": 2.2, "non_ascii_penalty": 0.7},
+    "gemini": {"chars_per_token": 4.0, "upper_chars_per_token": 2.8, "non_ascii_penalty": 0.3},
+}
+
+# Limites por modelo; modelos desconhecidos usam DEFAULT_MODEL_LIMITS
+MODEL_LIMITS: Dict[str, ModelLimits] = {
+    "gpt-4o": ModelLimits(context_window=128000, max_output_tokens=16384),
+    "gpt-4o-mini": ModelLimits(context_window=128000, max_output_tokens=16384),
+    "gpt-4": ModelLimits(context_window=8192, max_output_tokens=4096),
+    "gpt-3.5-turbo": ModelLimits(context_window=16385, max_output_tokens=4096),
+    "claude-3-opus-20240229": ModelLimits(context_window=200000, max_output_tokens=4096),
+    "claude-3-sonnet-20240229": ModelLimits(context_window=200000, max_output_tokens=4096),
+    "claude-3-haiku-20240307": ModelLimits(context_window=200000, max_output_tokens=4096),
+    "claude-3-5-sonnet-20241022": ModelLimits(context_window=200000, max_output_tokens=8192),
+    "claude-3-5-haiku-20241022": ModelLimits(context_window=200000, max_output_tokens=8192),
+    "gemini-1.5-pro": ModelLimits(context_window=2097152, max_output_tokens=8192),
+    "gemini-1.5-flash": ModelLimits(context_window=1048576, max_output_tokens=8192),
+    "gemini-1.0-pro": ModelLimits(context_window=32760, max_output_tokens=8192),
+}
+
+DEFAULT_MODEL_LIMITS = ModelLimits(context_window=32000, max_output_tokens=4096)
+
+
+class TokenizerService:
+    """
+    Serviço de contagem de tokens por provedor e modelo.
+
+    Mantém uma instância de tokenizador por (provedor, modelo): tiktoken para a OpenAI,
+    quando disponível, e a tabela de aproximação para os demais provedores.
+    Os tokens estimados orientam o tamanho dos trechos, a escolha de max_tokens
+    e a estimativa de custo antes de cada chamada.
+    """
+
+    def __init__(self, safety_margin: int = 256):
+        """
+        Inicializa o serviço.
+
+        Args:
+            safety_margin: Tokens reservados para compensar erros de aproximação
+        """
+        self.safety_margin = safety_margin
+        self._tokenizers: Dict[Tuple[str, Optional[str]], Tokenizer] = {}
+        self._lock = threading.Lock()
+
+    def get_tokenizer(self, provider: str, model: Optional[str] = None) -> Tokenizer:
+        """
+        Obtém (e guarda em cache) o tokenizador de um provedor e modelo.
+
+        Args:
+            provider: Nome do provedor ('openai', 'gemini', 'claude')
+            model: Nome do modelo (opcional)
+
+        Returns:
+            Instância de Tokenizer
+        """
+        key = (provider.lower(), model)
+
+        tokenizer = self._tokenizers.get(key)
+        if tokenizer is None:
+            with self._lock:
+                tokenizer = self._tokenizers.get(key)
+                if tokenizer is None:
+                    tokenizer = self._create_tokenizer(*key)
+                    self._tokenizers[key] = tokenizer
+
+        return tokenizer
+
+    def count_tokens(self, text: str, provider: str, model: Optional[str] = None) -> int:
+        """
+        Conta os tokens de um texto para um provedor e modelo.
+
+        Args:
+            text: Texto a ser medido
+            provider: Nome do provedor
+            model: Nome do modelo (opcional)
+
+        Returns:
+            Número de tokens
+        """
+        if not text:
+            return 0
+        return self.get_tokenizer(provider, model).count(text)
+
+    def get_model_limits(self, model: Optional[str]) -> ModelLimits:
+        """
+        Obtém os limites de contexto e saída de um modelo.
+
+        Args:
+            model: Nome do modelo
+
+        Returns:
+            Limites do modelo
+        """
+        return MODEL_LIMITS.get(model or "", DEFAULT_MODEL_LIMITS)
+
+    def select_max_tokens(self, prompt_tokens: int, model: Optional[str]) -> int:
+        """
+        Escolhe o max_tokens de uma chamada: o máximo de saída do modelo,
+        limitado ao espaço que sobra na janela de contexto.
+
+        Args:
+            prompt_tokens: Tokens estimados da entrada
+            model: Nome do modelo
+
+        Returns:
+            Valor de max_tokens
+
+        Raises:
+            ValueError: Se a entrada não couber na janela de contexto do modelo
+        """
+        limits = self.get_model_limits(model)
+        available = limits.context_window - prompt_tokens - self.safety_margin
+
+        if available <= 0:
+            raise ValueError(
+                f"Entrada com ~{prompt_tokens} tokens excede a janela de contexto "
+                f"de {limits.context_window} tokens do modelo {model}"
+            )
+
+        return min(limits.max_output_tokens, available)
+
+    def estimate(
+            self,
+            prompt: str,
+            provider: str,
+            model: Optional[str],
+            cost_per_1k_tokens: float,
+            max_tokens: Optional[int] = None,
+            expected_output_ratio: float = 1.0,
+            output_cost_per_1k_tokens: Optional[float] = None
+    ) -> TokenEstimate:
+        """
+        Estima tokens e custo de uma chamada antes de realizá-la.
+
+        Args:
+            prompt: Texto completo enviado ao modelo
+            provider: Nome do provedor
+            model: Nome do modelo
+            cost_per_1k_tokens: Custo em USD por 1000 tokens (de entrada, se o custo de saída for informado)
+            max_tokens: max_tokens já definido na requisição (opcional)
+            expected_output_ratio: Tamanho esperado da saída em relação à entrada
+            output_cost_per_1k_tokens: Custo em USD por 1000 tokens de saída (default: `cost_per_1k_tokens`)
+
+        Returns:
+            Estimativa com tokens de entrada, max_tokens e custo esperado
+        """
+        prompt_tokens = self.count_tokens(prompt, provider, model)
+        if max_tokens is None:
+            max_tokens = self.select_max_tokens(prompt_tokens, model)
+
+        expected_output = min(max_tokens, int(prompt_tokens * expected_output_ratio))
+        if output_cost_per_1k_tokens is None:
+            output_cost_per_1k_tokens = cost_per_1k_tokens
+        estimated_cost = (prompt_tokens * cost_per_1k_tokens + expected_output * output_cost_per_1k_tokens) / 1000
+
+        return TokenEstimate(
+            prompt_tokens=prompt_tokens,
+            max_tokens=max_tokens,
+            estimated_cost=estimated_cost,
+            expected_output_tokens=expected_output
+        )
+
+    def _create_tokenizer(self, provider: str, model: Optional[str]) -> Tokenizer:
+        """Cria o tokenizador mais preciso disponível para o provedor."""
+        if provider == "openai":
+            try:
+                import tiktoken
+
+                try:
+                    encoding = tiktoken.encoding_for_model(model or "gpt-4o")
+                except KeyError:
+                    encoding = tiktoken.get_encoding("o200k_base")
+
+                return TiktokenTokenizer(encoding)
+
+            except Exception as e:
+                # tiktoken ausente ou sem acesso aos arquivos de vocabulário
+                logger.warning(f"tiktoken indisponível para {model}, usando aproximação: {str(e)}")
+
+        params = APPROXIMATION_TABLE.get(provider, APPROXIMATION_TABLE["openai"])
+        return ApproximateTokenizer(**params)
+
+
+@lru_cache()
+def get_tokenizer_service() -> TokenizerService:
+    """
+    Obtém a instância compartilhada do serviço de tokenização.
+
+    Returns:
+        Instância de TokenizerService
+    """
+    return TokenizerService()
@@ -0,0 +1,40 @@
+"""AI response cache table
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '002'
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+
+    # Cache de respostas de IA compartilhado entre réplicas
+    if 'ai_response_cache' not in inspector.get_table_names():
+        op.create_table(
+            'ai_response_cache',
+            sa.Column('key', sa.String(64), nullable=False),
+            sa.Column('value', sa.Text(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.text('now()')),
+            sa.PrimaryKeyConstraint('key', name='pk_ai_response_cache')
+        )
+
+        op.create_index('idx_ai_response_cache_created_at', 'ai_response_cache', ['created_at'])
+
+
+def downgrade():
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+
+    if 'ai_response_cache' in inspector.get_table_names():
+        op.drop_table('ai_response_cache')
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+"""
+Script para reprocessar documentos em massa pelas APIs de lote dos provedores.
+
+Os documentos no status informado são processados em páginas; as chamadas de
+IA de cada página são enviadas em lotes (OpenAI Batch API ou Anthropic Message
+Batches), com custo menor e sem disputar a cota do tráfego em tempo real.
+
+Uso:
+    python scripts/backfill.py                       # Reprocessa todos os documentos pendentes
+    python scripts/backfill.py --limit 50000         # Limita o número de documentos
+    python scripts/backfill.py --status failed --page-size 500
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# Adiciona o diretório raiz do projeto ao PATH
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+# Carrega variáveis de ambiente do arquivo .env
+from dotenv import load_dotenv
+env_path = ROOT_DIR / '.env'
+if env_path.exists():
+    load_dotenv(dotenv_path=env_path)
+else:
+    load_dotenv()
+
+from financial_document_processor.adapters.ai import create_ai_provider
+from financial_document_processor.adapters.ai.batch import BatchAIProvider, create_batch_client
+from financial_document_processor.adapters.ai.http_client import close_shared_http_client, get_shared_http_client
+from financial_document_processor.adapters.database.postgres import PostgresRepository
+from financial_document_processor.config import get_settings
+from financial_document_processor.domain.document import DocumentStatus
+from financial_document_processor.services.backfill import BackfillService
+from financial_document_processor.services.categorization import CategorizationService
+from financial_document_processor.services.document_processor import DocumentProcessor
+from financial_document_processor.services.file_decoder import FileDecoder
+from financial_document_processor.services.parsers.bank_statement import BankStatementParser
+from financial_document_processor.utils.logging import setup_logging
+
+
+async def run_backfill(args):
+    """Monta os componentes com o provedor em lote e executa o reprocessamento."""
+    settings = get_settings()
+    setup_logging(settings.app.log_level)
+
+    # Apenas OpenAI e Claude têm API de lotes
+    provider_name = settings.ai.provider.lower()
+    if provider_name not in ("openai", "claude"):
+        print(f"Erro: processamento em lote não suportado para o provedor {provider_name}")
+        sys.exit(1)
+
+    api_key = getattr(settings.ai, f"{provider_name}_api_key")
+    if not api_key:
+        print(f"Erro: chave de API do provedor {provider_name} não configurada")
+        sys.exit(1)
+
+    http_client = get_shared_http_client(settings.ai)
+    provider = create_ai_provider(
+        provider_name=provider_name,
+        api_key=api_key,
+        model=getattr(settings.ai, f"{provider_name}_model"),
+        organization_id=settings.ai.openai_organization_id,
+        http_client=http_client
+    )
+    batch_provider = BatchAIProvider(
+        provider,
+        create_batch_client(
+            provider,
+            api_key,
+            http_client,
+            base_url=settings.ai.batch_api_base_url,
+            organization_id=settings.ai.openai_organization_id
+        ),
+        max_batch_requests=settings.ai.batch_api_max_requests,
+        flush_delay=settings.ai.batch_api_flush_delay,
+        poll_interval=settings.ai.batch_api_poll_interval
+    )
+
+    repository = PostgresRepository(settings.database.url)
+    await repository.connect()
+
+    try:
+        categorization_service = CategorizationService(
+            ai_provider=batch_provider,
+            batch_size=settings.ai.batch_size,
+            category_shortlist_size=settings.ai.category_shortlist_size
+        )
+        document_processor = DocumentProcessor(
+            file_decoder=FileDecoder(tesseract_path=settings.ocr.tesseract_path),
+            ai_provider=batch_provider,
+            parsers={"bank_statement": BankStatementParser(ai_provider=batch_provider)},
+            categorization_service=categorization_service,
+            chunk_size=getattr(settings.ai, f"{provider_name}_chunk_tokens"),
+            chunk_overlap=settings.ai.chunk_overlap_tokens,
+            # As chamadas só terminam junto com o lote: a concorrência é o tamanho do lote
+            max_concurrency=settings.ai.batch_api_max_requests,
+            line_filter_enabled=settings.ai.line_filter_enabled,
+            line_filter_context_lines=settings.ai.line_filter_context_lines,
+            line_references=settings.ai.extraction_line_references,
+            category_shortlist_size=settings.ai.category_shortlist_size
+        )
+
+        report = await BackfillService(repository, document_processor, categorization_service).run(
+            status=DocumentStatus(args.status),
+            page_size=args.page_size,
+            limit=args.limit
+        )
+
+    finally:
+        await repository.disconnect()
+        await close_shared_http_client()
+
+    print(
+        f"Reprocessamento concluído: {report.processed} documentos processados, "
+        f"{report.failed} com falha, {report.transactions} transações"
+    )
+
+
+def main():
+    """Função principal do script."""
+    parser = argparse.ArgumentParser(description="Reprocessamento de documentos em massa pelas APIs de lote")
+    parser.add_argument(
+        "--status", default=DocumentStatus.PENDING.value,
+        choices=[status.value for status in DocumentStatus], help="Status dos documentos a reprocessar"
+    )
+    parser.add_argument("--page-size", type=int, default=1000, help="Documentos processados em conjunto")
+    parser.add_argument("--limit", type=int, default=None, help="Número máximo de documentos")
+
+    asyncio.run(run_backfill(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -15,7 +15,7 @@ setup(
         "aiokafka>=0.8.0",
         "pydantic>=2.0.0",
         "loguru>=0.7.0",
-        "httpx>=0.24.0",
+        "httpx[http2]>=0.24.0",
         "sqlalchemy>=2.0.0",
         "psycopg2-binary>=2.9.5",
         "asyncpg>=0.27.0",
@@ -25,6 +25,7 @@ setup(
         "pypdf>=3.15.1",
         "pytesseract>=0.3.10",
         "tenacity>=8.2.0",
+        "tiktoken>=0.5.0",
         "prometheus-client>=0.17.0",
         "alembic>=1.10.0",
         "python-dotenv>=1.1.0",
@@ -9,6 +9,7 @@ import uuid
 from datetime import datetime, timezone
 from decimal import Decimal
 from pathlib import Path
+from typing import Optional
 from unittest.mock import MagicMock, AsyncMock
 
 import pytest
@@ -16,10 +17,16 @@ from sqlalchemy import create_engine, text
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
-from financial_document_processor.adapters.ai.ai_provider import AIProvider, AIResponse
+from financial_document_processor.adapters.ai.ai_provider import AIProvider, AIRequest, AIResponse
 from financial_document_processor.adapters.database.models import Base
 from financial_document_processor.domain.document import Document
 from financial_document_processor.domain.transaction import Transaction, TransactionType, TransactionMethod
+from financial_document_processor.services.prompt_engineering import PromptEngineering
+
+# Resposta de extração com uma transação, usada como padrão pelo ScriptedAIProvider
+EXTRACTION_RESPONSE = json.dumps({"transactions": [
+    {"date": "2023-01-15", "description": "SUPERMERCADO EXTRA", "amount": "150.00", "type": "debit"}
+]})
 
 
 # Configuração do banco de dados de teste
@@ -124,6 +131,13 @@ class MockAIProvider(AIProvider):
             transaction.document_id = document_id
         return self.transactions
 
+    async def stream_transactions(self, text_content, document_type, predefined_categories=None, document_id=1, user_id=1,
+                                  line_references=False):
+        """Mock para extrair transações em streaming."""
+        transactions = await self.extract_transactions(text_content, document_type, predefined_categories)
+        for transaction in transactions or []:
+            yield transaction
+
     async def categorize_transactions(self, transactions, predefined_categories=None):
         """Mock para categorizar transações."""
         self.call_count += 1
@@ -144,6 +158,80 @@ class MockAIProvider(AIProvider):
         return self.transactions
 
 
+class ScriptedAIProvider(AIProvider):
+    """
+    Provedor de IA de teste que passa pelas operações de alto nível da classe base
+    (prompts, parsing e validação), com resposta, atraso e erro configuráveis.
+
+    Conta as chamadas em `calls` e registra se a chamada em andamento foi cancelada.
+    """
+
+    prompt_style = "openai"
+
+    def __init__(
+            self,
+            model: str = "scripted-model",
+            content: str = EXTRACTION_RESPONSE,
+            delay: float = 0.0,
+            error: Optional[Exception] = None,
+            cost: float = 0.001,
+            name: str = "Scripted",
+            chunk_size: int = 20
+    ):
+        """
+        Inicializa o provedor.
+
+        Args:
+            model: Nome do modelo, devolvido nas respostas
+            content: Conteúdo das respostas
+            delay: Atraso (segundos) antes da resposta ou do primeiro pedaço do streaming
+            error: Erro levantado em cada chamada, após o atraso (opcional)
+            cost: Custo registrado por chamada
+            name: Nome do provedor
+            chunk_size: Tamanho dos pedaços do streaming
+        """
+        self.model = model
+        self.content = content
+        self.delay = delay
+        self.error = error
+        self.cost = cost
+        self.chunk_size = chunk_size
+        self.calls = 0
+        self.cancelled = False
+        self.prompt_engineering = PromptEngineering()
+        self._name = name
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def get_cost_per_1k_tokens(self) -> float:
+        return 0.01
+
+    async def generate_completion(self, request: AIRequest) -> AIResponse:
+        self.calls += 1
+        await self._wait()
+        self.record_usage(self.model, 100, self.cost)
+        return AIResponse(content=self.content, model=self.model, tokens_used=100, cost=self.cost)
+
+    async def stream_completion(self, request: AIRequest):
+        self.calls += 1
+        await self._wait()
+        for start in range(0, len(self.content), self.chunk_size):
+            yield self.content[start:start + self.chunk_size]
+        self.record_usage(self.model, 100, self.cost)
+
+    async def _wait(self) -> None:
+        """Aplica o atraso e o erro configurados."""
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error:
+            raise self.error
+
+
 @pytest.fixture
 def mock_ai_provider():
     """Cria um mock do provedor de IA."""
@@ -1,13 +1,26 @@
 """
 Testes unitários para os adaptadores de IA.
 """
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import google.generativeai as genai
+import openai
 import pytest
+from prometheus_client import REGISTRY
 from datetime import datetime
 from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock
 from uuid import uuid4
 
 from financial_document_processor.adapters.ai import create_ai_provider
-from financial_document_processor.adapters.ai.ai_provider import AIRequest
+from financial_document_processor.adapters.ai.ai_provider import AIRequest, AIResponse
+from financial_document_processor.adapters.ai.claude_provider import ClaudeProvider
+from financial_document_processor.adapters.ai.gemini_provider import GeminiProvider
+from financial_document_processor.adapters.ai.http_client import create_http_client
+from financial_document_processor.config import AISettings
 from financial_document_processor.domain.transaction import Transaction, TransactionType
 
 
@@ -105,4 +118,449 @@ async def test_create_ai_provider():
 
     # Testa se a função levanta a exceção esperada para provedor inválido
     with pytest.raises(ValueError, match="Provedor não suportado"):
-        create_ai_provider("invalid_provider", "fake_api_key")
\ No newline at end of file
+        create_ai_provider("invalid_provider", "fake_api_key")
+
+@pytest.mark.asyncio
+async def test_claude_marks_cacheable_prefix():
+    """Testa que o Claude marca o prefixo estático com cache_control e contabiliza o cache."""
+    provider = ClaudeProvider(api_key="fake_api_key", model="claude-3-haiku-20240307")
+
+    api_response = MagicMock()
+    api_response.content = [MagicMock(text='{"transactions": []}')]
+    api_response.usage = MagicMock(
+        input_tokens=50,
+        output_tokens=10,
+        cache_read_input_tokens=1200,
+        cache_creation_input_tokens=0
+    )
+    raw_response = MagicMock(headers={})
+    raw_response.parse.return_value = api_response
+    provider.client = MagicMock()
+    provider.client.messages.with_raw_response.create = AsyncMock(return_value=raw_response)
+
+    # O Haiku só grava prefixos a partir de 2048 tokens
+    prefix = "Instruções estáticas de extração. " * 300
+    response = await provider.generate_completion(AIRequest(
+        prompt="<documento>texto</documento>",
+        cacheable_prefix=prefix,
+        system_message="Sistema"
+    ))
+
+    content = provider.client.messages.with_raw_response.create.call_args.kwargs["messages"][0]["content"]
+    assert content[0] == {
+        "type": "text",
+        "text": prefix,
+        "cache_control": {"type": "ephemeral"}
+    }
+    assert content[1]["text"] == "<documento>texto</documento>"
+    assert response.cached_tokens == 1200
+    assert response.tokens_used == 1260
+
+
+def test_claude_skips_cache_breakpoint_for_short_prefix():
+    """Testa que um prefixo abaixo do mínimo do cache de prompt é enviado sem cache_control."""
+    provider = ClaudeProvider(api_key="fake_api_key", model="claude-3-5-sonnet-20241022")
+    request = AIRequest(prompt="<documento>texto</documento>", cacheable_prefix="Instruções estáticas. ")
+
+    messages, _ = provider._build_messages(request)
+    assert messages[0]["content"] == "Instruções estáticas. <documento>texto</documento>"
+
+    long_request = request.model_copy(update={"cacheable_prefix": "Instruções estáticas. " * 200})
+    messages, _ = provider._build_messages(long_request)
+    assert messages[0]["content"][0]["cache_control"] == {"type": "ephemeral"}
+
+
+@pytest.mark.asyncio
+async def test_openai_stream_transactions_yields_before_response_ends():
+    """Testa que cada transação é entregue assim que seu objeto JSON se fecha no streaming."""
+    provider = create_ai_provider("openai", "fake_api_key", model="gpt-4o")
+
+    response_text = json.dumps({"transactions": [
+        {"amount": "150.00", "date": "2023-01-15T00:00:00", "description": "Supermercado",
+         "type": "debit", "categories": [], "original_text": "Supermercado 150,00"},
+        {"amount": "3000.00", "date": "2023-01-20T00:00:00", "description": "Salário",
+         "type": "credit", "categories": [], "original_text": "Salário 3000,00"},
+    ]})
+    pieces = [response_text[i:i + 7] for i in range(0, len(response_text), 7)]
+    sent = []
+
+    async def chunks():
+        for piece in pieces:
+            sent.append(piece)
+            yield MagicMock(choices=[MagicMock(delta=MagicMock(content=piece))], usage=None)
+        yield MagicMock(choices=[], usage=MagicMock(
+            total_tokens=120, prompt_tokens=100, completion_tokens=20, prompt_tokens_details=None
+        ))
+
+    raw_response = MagicMock(headers={})
+    raw_response.parse.return_value = chunks()
+    provider.client = MagicMock()
+    provider.client.chat.completions.with_raw_response.create = AsyncMock(return_value=raw_response)
+
+    received = []
+    async for transaction in provider.stream_transactions("texto", "bank_statement", document_id=7, user_id=3):
+        received.append((transaction, len(sent)))
+
+    assert provider.client.chat.completions.with_raw_response.create.call_args.kwargs["stream"] is True
+    assert [tx.description for tx, _ in received] == ["Supermercado", "Salário"]
+    assert received[0][0].document_id == 7
+    # A primeira transação chega antes do fim da resposta
+    assert received[0][1] < len(pieces)
+
+
+@pytest.mark.asyncio
+async def test_openai_stream_continues_response_cut_at_max_tokens():
+    """Testa que uma resposta cortada em max_tokens é continuada no mesmo stream, sem perder transações."""
+    provider = create_ai_provider("openai", "fake_api_key", model="gpt-4o")
+
+    response_text = json.dumps({"transactions": [
+        {"date": "2023-01-15", "description": "Supermercado", "amount": "150.00", "type": "debit"},
+        {"date": "2023-01-20", "description": "Salário", "amount": "3000.00", "type": "credit"},
+    ]}, ensure_ascii=False)
+    cut = response_text.index("Salário")
+    # A continuação repete o fim da resposta anterior, como os modelos costumam fazer
+    pieces = [(response_text[:cut], "length"), (response_text[cut - 40:], "stop")]
+
+    def stream_for(text, finish_reason):
+        async def chunks():
+            yield MagicMock(choices=[MagicMock(delta=MagicMock(content=text), finish_reason=None)], usage=None)
+            yield MagicMock(choices=[MagicMock(delta=MagicMock(content=None), finish_reason=finish_reason)], usage=None)
+
+        raw_response = MagicMock(headers={})
+        raw_response.parse.return_value = chunks()
+        return raw_response
+
+    provider.client = MagicMock()
+    provider.client.chat.completions.with_raw_response.create = AsyncMock(
+        side_effect=[stream_for(*piece) for piece in pieces]
+    )
+
+    transactions = await provider.extract_transactions("texto", "bank_statement")
+
+    assert [tx.description for tx in transactions] == ["Supermercado", "Salário"]
+    continuation = provider.client.chat.completions.with_raw_response.create.call_args_list[1].kwargs
+    assert continuation["messages"][-2] == {"role": "assistant", "content": response_text[:cut]}
+    assert "response_format" not in continuation
+
+
+@pytest.mark.asyncio
+async def test_claude_continues_with_assistant_prefill():
+    """Testa que o Claude continua a resposta cortada pré-preenchendo a mensagem do assistente."""
+    provider = ClaudeProvider(api_key="fake_api_key", model="claude-3-haiku-20240307")
+
+    def api_response(text, stop_reason):
+        response = MagicMock(content=[MagicMock(text=text)], stop_reason=stop_reason)
+        response.usage = MagicMock(
+            input_tokens=50, output_tokens=10, cache_read_input_tokens=0, cache_creation_input_tokens=0
+        )
+        raw_response = MagicMock(headers={})
+        raw_response.parse.return_value = response
+        return raw_response
+
+    provider.client = MagicMock()
+    provider.client.messages.with_raw_response.create = AsyncMock(side_effect=[
+        api_response('{"r": [{"i": 0, "c": ["mer', "max_tokens"),
+        api_response('cado"], "p": 0.9}]}', "end_turn"),
+    ])
+
+    response = await provider.generate_completion(AIRequest(prompt="categorize"))
+
+    assert json.loads(response.content) == {"r": [{"i": 0, "c": ["mercado"], "p": 0.9}]}
+    assert response.tokens_used == 120
+    messages = provider.client.messages.with_raw_response.create.call_args.kwargs["messages"]
+    assert messages[-1] == {"role": "assistant", "content": '{"r": [{"i": 0, "c": ["mer'}
+
+
+@pytest.mark.asyncio
+async def test_extraction_uses_structured_output_and_counts_invalid_items():
+    """Testa que a extração envia o schema à OpenAI e descarta itens inválidos, registrando a falha."""
+    provider = create_ai_provider("openai", "fake_api_key", model="gpt-4o")
+
+    response_text = json.dumps({"transactions": [
+        {"date": "2023-01-15", "description": "Supermercado", "amount": "150.00", "type": "debit"},
+        {"date": "2023-01-16", "description": "Sem tipo", "amount": "10.00", "type": "CREDIT"},
+    ]})
+
+    async def chunks():
+        yield MagicMock(choices=[MagicMock(delta=MagicMock(content=response_text))], usage=None)
+
+    raw_response = MagicMock(headers={})
+    raw_response.parse.return_value = chunks()
+    provider.client = MagicMock()
+    provider.client.chat.completions.with_raw_response.create = AsyncMock(return_value=raw_response)
+
+    labels = {"provider": "OpenAI", "operation": "extraction", "result": "invalid"}
+    before = REGISTRY.get_sample_value("ai_response_parse_total", labels) or 0
+
+    transactions = await provider.extract_transactions("texto", "bank_statement")
+
+    response_format = provider.client.chat.completions.with_raw_response.create.call_args.kwargs["response_format"]
+    assert response_format["type"] == "json_schema"
+    assert response_format["json_schema"]["strict"] is True
+    assert "transactions" in response_format["json_schema"]["schema"]["properties"]
+    assert [tx.description for tx in transactions] == ["Supermercado"]
+    assert REGISTRY.get_sample_value("ai_response_parse_total", labels) == before + 1
+
+
+@pytest.mark.asyncio
+async def test_line_reference_extraction_slices_descriptions_from_source():
+    """Testa que a extração por linha recorta as descrições do texto e descarta registros que não conferem."""
+    provider = create_ai_provider("openai", "fake_api_key", model="gpt-4o")
+    text = (
+        "EXTRATO JANEIRO/2023\n"
+        "15/01/2023 PIX RECEBIDO 1.500,00 2.500,00\n"
+        "   JOAO DA SILVA\n"
+        "\n"
+        "16/01/2023 PAGAMENTO BOLETO -150,25 2.349,75\n"
+    )
+    response_text = json.dumps({"r": [
+        {"l": 1, "n": 2, "d": "2023-01-15", "v": "1500.00", "t": "credit", "m": "pix"},
+        {"l": 3, "n": 1, "d": "2023-01-16", "v": "150.25", "t": "debit", "m": "boleto"},
+        {"l": 3, "n": 1, "d": "2023-01-16", "v": "99.00", "t": "debit", "m": None},
+        {"l": 9, "n": 1, "d": "2023-01-17", "v": "10.00", "t": "debit", "m": None},
+    ]}, separators=(",", ":"))
+
+    async def chunks():
+        yield MagicMock(choices=[MagicMock(delta=MagicMock(content=response_text))], usage=None)
+
+    raw_response = MagicMock(headers={})
+    raw_response.parse.return_value = chunks()
+    provider.client = MagicMock()
+    provider.client.chat.completions.with_raw_response.create = AsyncMock(return_value=raw_response)
+
+    labels = {"provider": "OpenAI", "operation": "extraction", "result": "invalid"}
+    before = REGISTRY.get_sample_value("ai_response_parse_total", labels) or 0
+
+    transactions = [
+        tx async for tx in provider.stream_transactions(text, "bank_statement", line_references=True)
+    ]
+
+    kwargs = provider.client.chat.completions.with_raw_response.create.call_args.kwargs
+    assert "r" in kwargs["response_format"]["json_schema"]["schema"]["properties"]
+    assert "2|JOAO DA SILVA\n3|16/01/2023 PAGAMENTO BOLETO" in kwargs["messages"][-1]["content"]
+    assert [(tx.description, tx.amount) for tx in transactions] == [
+        ("PIX RECEBIDO - JOAO DA SILVA", Decimal("1500.00")),
+        ("PAGAMENTO BOLETO", Decimal("150.25")),
+    ]
+    # Valor ausente da linha e linha inexistente são descartados como inválidos
+    assert REGISTRY.get_sample_value("ai_response_parse_total", labels) == before + 1
+
+
+@pytest.mark.asyncio
+async def test_claude_reads_tool_use_response():
+    """Testa que o Claude força a ferramenta do schema e devolve o input dela como JSON."""
+    provider = ClaudeProvider(api_key="fake_api_key", model="claude-3-haiku-20240307")
+
+    api_response = MagicMock()
+    api_response.content = [MagicMock(type="tool_use", input={"r": [{"i": 0, "c": [1], "p": 0.9}]})]
+    api_response.usage = MagicMock(
+        input_tokens=50, output_tokens=10, cache_read_input_tokens=0, cache_creation_input_tokens=0
+    )
+    raw_response = MagicMock(headers={})
+    raw_response.parse.return_value = api_response
+    provider.client = MagicMock()
+    provider.client.messages.with_raw_response.create = AsyncMock(return_value=raw_response)
+
+    response = await provider.generate_completion(AIRequest(
+        prompt="<transações>0|-10.00||PIX</transações>",
+        system_message="Sistema",
+        response_schema={"type": "object", "properties": {"r": {"type": "array"}}},
+        response_schema_name="categorizacao_transacoes"
+    ))
+
+    kwargs = provider.client.messages.with_raw_response.create.call_args.kwargs
+    assert kwargs["tool_choice"] == {"type": "tool", "name": "categorizacao_transacoes"}
+    assert kwargs["tools"][0]["input_schema"]["properties"]["r"] == {"type": "array"}
+    assert json.loads(response.content) == {"r": [{"i": 0, "c": [1], "p": 0.9}]}
+
+
+@pytest.mark.asyncio
+async def test_categorize_transactions_maps_compact_response():
+    """Testa que a resposta compacta é aplicada pelo índice, convertendo IDs de categoria."""
+    provider = create_ai_provider("openai", "fake_api_key", model="gpt-4o")
+    provider.generate_completion = AsyncMock(return_value=AIResponse(
+        content='{"r":[{"i":1,"c":[1],"p":0.8},{"i":0,"c":[0,5],"p":0.9}]}',
+        model="gpt-4o",
+        tokens_used=10,
+        cost=0.0
+    ))
+
+    transactions = [
+        Transaction(
+            id=uuid4(),
+            document_id=1,
+            user_id=123,
+            date=datetime.now().date(),
+            description=description,
+            amount=Decimal("10.00"),
+            type=TransactionType.DEBIT
+        )
+        for description in ("SUPERMERCADO", "UBER")
+    ]
+
+    categorized = await provider.categorize_transactions(
+        transactions, predefined_categories=["alimentação", "transporte"]
+    )
+
+    assert categorized[0].categories == ["alimentação"]
+    assert categorized[0].confidence_score == 0.9
+    assert categorized[1].categories == ["transporte"]
+    assert categorized[1].confidence_score == 0.8
+
+
+FAKE_API_LATENCY = 0.3
+
+OPENAI_FAKE_RESPONSE = {
+    "id": "chatcmpl-1",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "gpt-4o",
+    "choices": [{
+        "index": 0,
+        "message": {"role": "assistant", "content": '{"transactions": []}'},
+        "finish_reason": "stop"
+    }],
+    "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}
+}
+
+@pytest.mark.asyncio
+async def test_gemini_reuses_configured_models_under_concurrent_calls(monkeypatch):
+    """Testa que chamadas concorrentes com a mesma configuração reutilizam um único modelo, em turno único."""
+    response = SimpleNamespace(
+        text='{"transactions": []}',
+        candidates=[],
+        usage_metadata=SimpleNamespace(prompt_token_count=50, candidates_token_count=5, cached_content_token_count=0)
+    )
+    generate = AsyncMock(return_value=response)
+    monkeypatch.setattr(genai.GenerativeModel, "generate_content_async", generate)
+    constructed = []
+    original_init = genai.GenerativeModel.__init__
+
+    def counting_init(self, *args, **kwargs):
+        constructed.append(kwargs)
+        original_init(self, *args, **kwargs)
+
+    monkeypatch.setattr(genai.GenerativeModel, "__init__", counting_init)
+    provider = GeminiProvider(api_key="fake_api_key", model="gemini-1.5-flash", model_cache_size=2)
+
+    responses = await asyncio.gather(*[
+        provider.generate_completion(AIRequest(prompt=f"chamada {i}", system_message="Sistema"))
+        for i in range(20)
+    ])
+
+    assert all(response.content == '{"transactions": []}' for response in responses)
+    assert len(constructed) == 1
+    # O prompt vai como conteúdo do usuário, sem chat nem histórico
+    assert generate.await_args_list[0].args[0] == [{"role": "user", "parts": ["chamada 0"]}]
+
+    # Sem system message o prompt não vira instrução do modelo
+    await provider.generate_completion(AIRequest(prompt="sem sistema"))
+    assert constructed[-1]["system_instruction"] is None
+    assert generate.await_args.args[0] == [{"role": "user", "parts": ["sem sistema"]}]
+
+    # O cache é limitado: a configuração menos usada recentemente sai primeiro
+    await provider.generate_completion(AIRequest(prompt="outro", system_message="Outro sistema"))
+    assert len(provider._models) == 2
+    assert all(key[2] != "Sistema" for key in provider._models)
+
+
+def test_gemini_model_cache_reuses_configured_model():
+    """Testa que o modelo configurado é reaproveitado, e recriado quando o cache está desligado."""
+    request = AIRequest(prompt="extrato", system_message="Sistema " * 200, response_schema={"type": "object"})
+    cached = GeminiProvider(api_key="fake_api_key", model="gemini-1.5-flash")
+    uncached = GeminiProvider(api_key="fake_api_key", model="gemini-1.5-flash", model_cache_size=0)
+    estimate = cached.estimate_request(request)
+
+    assert cached._generative_model(request, estimate) is cached._generative_model(request, estimate)
+    assert uncached._generative_model(request, estimate) is not uncached._generative_model(request, estimate)
+
+
+@pytest.fixture
+async def fake_ai_api():
+    """Servidor HTTP local que responde como a API da OpenAI, com latência fixa."""
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode().partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                await reader.readexactly(int(headers.get("content-length", 0)))
+                await asyncio.sleep(FAKE_API_LATENCY)
+
+                body = json.dumps(OPENAI_FAKE_RESPONSE).encode()
+
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\n"
+                    b"Content-Type: application/json\r\n"
+                    + f"Content-Length: {len(body)}\r\n\r\n".encode()
+                    + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+
+    yield f"http://127.0.0.1:{port}"
+
+    server.close()
+    await server.wait_closed()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_completions_do_not_block_event_loop(fake_ai_api):
+    """Testa que N chamadas concorrentes terminam em aproximadamente a latência de uma chamada."""
+    provider = create_ai_provider("openai", "fake_api_key", model="gpt-4o")
+    provider.client = openai.AsyncOpenAI(api_key="fake_api_key", base_url=f"{fake_ai_api}/v1", max_retries=0)
+
+    calls = 5
+    started = time.perf_counter()
+
+    responses = await asyncio.gather(*[
+        provider.generate_completion(AIRequest(prompt=f"chamada {i}", system_message="Sistema"))
+        for i in range(calls)
+    ])
+
+    elapsed = time.perf_counter() - started
+
+    assert all(response.content == '{"transactions": []}' for response in responses)
+    # Chamadas sequenciais levariam calls * FAKE_API_LATENCY
+    assert elapsed < FAKE_API_LATENCY * 2
+
+
+@pytest.mark.asyncio
+async def test_shared_http_client_reuses_connections(fake_ai_api):
+    """Testa que o cliente HTTP compartilhado reaproveita conexões e registra as métricas do pool."""
+    client = create_http_client(AISettings(http2=False))
+    host = "127.0.0.1"
+
+    def sample(name, **labels):
+        return REGISTRY.get_sample_value(name, {"host": host, **labels}) or 0
+
+    new_before = sample("ai_http_connections_total", reused="false")
+    reused_before = sample("ai_http_connections_total", reused="true")
+    waits_before = sample("ai_http_pool_wait_seconds_count")
+
+    try:
+        for _ in range(3):
+            response = await client.post(f"{fake_ai_api}/v1/chat/completions", json={})
+            assert response.status_code == 200
+    finally:
+        await client.aclose()
+
+    assert sample("ai_http_connections_total", reused="false") - new_before == 1
+    assert sample("ai_http_connections_total", reused="true") - reused_before == 2
+    assert sample("ai_http_pool_wait_seconds_count") - waits_before == 3
@@ -0,0 +1,276 @@
+"""
+Testes unitários para o processamento em lote (OpenAI Batch API e Anthropic
+Message Batches), usando um servidor local que simula os endpoints de lote.
+"""
+import asyncio
+import json
+from datetime import date
+from decimal import Decimal
+
+import httpx
+import pytest
+
+from financial_document_processor.adapters.ai.ai_provider import AIRequest
+from financial_document_processor.adapters.ai.batch import (
+    BatchAIProvider,
+    ClaudeBatchClient,
+    OpenAIBatchClient,
+)
+from financial_document_processor.adapters.ai.claude_provider import ClaudeProvider
+from financial_document_processor.adapters.ai.openai_provider import OpenAIProvider
+from financial_document_processor.domain.document import Document, DocumentStatus
+from financial_document_processor.domain.transaction import Transaction, TransactionType
+from financial_document_processor.services.backfill import BackfillService
+
+EXTRACTION = {"transactions": [
+    {"date": "2023-01-15", "description": "SUPERMERCADO EXTRA", "amount": "150.00", "type": "debit"}
+]}
+
+
+class BatchStubServer:
+    """
+    Servidor local com os endpoints de lote da OpenAI e da Anthropic.
+
+    Cada lote fica em processamento até ser consultado `polls_until_done` vezes;
+    a resposta de cada requisição é obtida de `answer(custom_id, body)`, que pode
+    devolver None para simular uma requisição com erro.
+    """
+
+    def __init__(self, answer, polls_until_done: int = 1):
+        self.answer = answer
+        self.polls_until_done = polls_until_done
+        self.files = {}
+        self.batches = {}
+        self.transport = httpx.MockTransport(self.handle)
+
+    def client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=self.transport)
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+
+        # OpenAI
+        if path == "/v1/files" and request.method == "POST":
+            body = request.content.decode("utf-8")
+            content = body[body.index("\r\n\r\n", body.index('name="file"')) + 4:body.rindex("\r\n--")]
+            file_id = f"file-{len(self.files) + 1}"
+            self.files[file_id] = content
+            return httpx.Response(200, json={"id": file_id})
+
+        if path == "/v1/batches" and request.method == "POST":
+            payload = json.loads(request.content)
+            lines = [json.loads(line) for line in self.files[payload["input_file_id"]].splitlines()]
+            return self._create("openai", [(line["custom_id"], line["body"]) for line in lines])
+
+        if path.startswith("/v1/batches/"):
+            batch = self._poll(path.rsplit("/", 1)[1])
+            done = batch["polls"] >= self.polls_until_done
+            return httpx.Response(200, json={
+                "id": batch["id"],
+                "status": "completed" if done else "in_progress",
+                "output_file_id": f"out-{batch['id']}" if done else None,
+            })
+
+        if path.startswith("/v1/files/out-"):
+            batch = self.batches[path.split("/")[3][4:]]
+            return httpx.Response(200, text="\n".join(
+                json.dumps(self._openai_line(custom_id, body)) for custom_id, body in batch["requests"]
+            ))
+
+        # Anthropic
+        if path == "/v1/messages/batches" and request.method == "POST":
+            payload = json.loads(request.content)
+            return self._create("claude", [(item["custom_id"], item["params"]) for item in payload["requests"]])
+
+        if path.startswith("/v1/messages/batches/") and path.endswith("/results"):
+            batch = self.batches[path.split("/")[4]]
+            return httpx.Response(200, text="\n".join(
+                json.dumps(self._claude_line(custom_id, params)) for custom_id, params in batch["requests"]
+            ))
+
+        if path.startswith("/v1/messages/batches/"):
+            batch = self._poll(path.rsplit("/", 1)[1])
+            done = batch["polls"] >= self.polls_until_done
+            return httpx.Response(200, json={
+                "id": batch["id"],
+                "processing_status": "ended" if done else "in_progress",
+                "results_url": f"http://stub/v1/messages/batches/{batch['id']}/results" if done else None,
+            })
+
+        return httpx.Response(404)
+
+    def _create(self, kind: str, requests) -> httpx.Response:
+        batch_id = f"batch{len(self.batches) + 1}"
+        self.batches[batch_id] = {"id": batch_id, "kind": kind, "requests": requests, "polls": 0}
+        return httpx.Response(200, json={"id": batch_id, "status": "validating", "processing_status": "in_progress"})
+
+    def _poll(self, batch_id: str) -> dict:
+        batch = self.batches[batch_id]
+        batch["polls"] += 1
+        return batch
+
+    def _openai_line(self, custom_id: str, body: dict) -> dict:
+        content = self.answer(custom_id, body)
+        if content is None:
+            return {"custom_id": custom_id, "response": None, "error": {"message": "falha"}}
+
+        # A Batch API devolve o snapshot datado do modelo, não o nome enviado
+        return {"custom_id": custom_id, "response": {"status_code": 200, "body": {
+            "model": f"{body['model']}-2024-07-18",
+            "choices": [{"message": {"content": json.dumps(content)}}],
+            "usage": {"prompt_tokens": 800, "completion_tokens": 200},
+        }}, "error": None}
+
+    def _claude_line(self, custom_id: str, params: dict) -> dict:
+        content = self.answer(custom_id, params)
+        if content is None:
+            return {"custom_id": custom_id, "result": {"type": "errored", "error": {"type": "overloaded"}}}
+
+        return {"custom_id": custom_id, "result": {"type": "succeeded", "message": {
+            "model": params["model"],
+            "content": [{"type": "tool_use", "name": params["tool_choice"]["name"], "input": content}],
+            "usage": {"input_tokens": 800, "output_tokens": 200},
+        }}}
+
+
+def openai_batch_provider(server: BatchStubServer, **kwargs) -> BatchAIProvider:
+    provider = OpenAIProvider(api_key="test", model="gpt-4o")
+    client = OpenAIBatchClient(provider, "test", server.client(), base_url="http://stub/v1")
+    return BatchAIProvider(provider, client, flush_delay=0.01, poll_interval=0.01, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_openai_batch_groups_concurrent_calls_in_one_batch():
+    """Testa que chamadas simultâneas vão em um único lote, com o schema e metade do custo."""
+    server = BatchStubServer(lambda custom_id, body: EXTRACTION, polls_until_done=2)
+    batch_provider = openai_batch_provider(server)
+
+    results = await asyncio.gather(*(
+        batch_provider.extract_transactions(f"extrato {i}", "bank_statement", document_id=i) for i in range(3)
+    ))
+
+    assert [[tx.document_id for tx in transactions] for transactions in results] == [[0], [1], [2]]
+    assert len(server.batches) == 1
+
+    _, body = server.batches["batch1"]["requests"][0]
+    assert body["response_format"]["type"] == "json_schema"
+    assert "extrato 0" in body["messages"][-1]["content"]
+
+    response = await batch_provider.generate_completion(AIRequest(prompt="oi"))
+    # gpt-4o: 800 tokens de entrada a $0.0025/1K e 200 de saída a $0.01/1K, com metade do custo
+    assert response.cost == pytest.approx((800 * 0.0025 + 200 * 0.01) / 1000 * 0.5)
+    assert (response.input_tokens, response.output_tokens) == (800, 200)
+
+
+@pytest.mark.asyncio
+async def test_openai_batch_prices_by_requested_model():
+    """Testa que o custo usa o modelo enviado, não o snapshot datado devolvido pela Batch API."""
+    server = BatchStubServer(lambda custom_id, body: {"ok": True})
+    batch_provider = openai_batch_provider(server)
+
+    response = await batch_provider.generate_completion(AIRequest(prompt="oi", model="gpt-4o-mini"))
+
+    # gpt-4o-mini: 800 tokens de entrada a $0.00015/1K e 200 de saída a $0.0006/1K, com metade do custo
+    assert response.cost == pytest.approx((800 * 0.00015 + 200 * 0.0006) / 1000 * 0.5)
+    assert response.model == "gpt-4o-mini"
+
+
+@pytest.mark.asyncio
+async def test_claude_batch_categorizes_with_tool_use():
+    """Testa a categorização pela Message Batches API com a resposta via tool use."""
+    server = BatchStubServer(lambda custom_id, params: {"r": [{"i": 0, "c": ["mercado"], "p": 0.9}]})
+    provider = ClaudeProvider(api_key="test", model="claude-3-haiku-20240307")
+    client = ClaudeBatchClient(provider, "test", server.client(), base_url="http://stub/v1")
+    batch_provider = BatchAIProvider(provider, client, flush_delay=0.01, poll_interval=0.01)
+
+    transaction = Transaction(
+        date=date(2023, 1, 15), description="SUPERMERCADO EXTRA", amount=Decimal("150.00"),
+        type=TransactionType.DEBIT, document_id=1, user_id=1
+    )
+    [categorized] = await batch_provider.categorize_transactions([transaction])
+
+    assert categorized.categories == ["mercado"]
+    assert categorized.confidence_score == 0.9
+    _, params = server.batches["batch1"]["requests"][0]
+    assert params["tool_choice"] == {"type": "tool", "name": "categorizacao_transacoes"}
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_request_raises_only_for_its_caller():
+    """Testa que uma requisição com erro no lote falha sem afetar as demais."""
+    server = BatchStubServer(lambda custom_id, body: None if custom_id == "req-2" else EXTRACTION)
+    batch_provider = openai_batch_provider(server)
+
+    results = await asyncio.gather(
+        *(batch_provider.extract_transactions(f"extrato {i}", "bank_statement") for i in range(3)),
+        return_exceptions=True
+    )
+
+    assert isinstance(results[1], RuntimeError)
+    assert len(results[0]) == len(results[2]) == 1
+
+
+@pytest.mark.asyncio
+async def test_batch_is_flushed_when_full():
+    """Testa que o lote é enviado ao atingir o número máximo de requisições."""
+    server = BatchStubServer(lambda custom_id, body: EXTRACTION)
+    batch_provider = openai_batch_provider(server, max_batch_requests=2)
+
+    await asyncio.gather(*(batch_provider.extract_transactions(f"extrato {i}", "bank_statement") for i in range(5)))
+
+    assert [len(batch["requests"]) for batch in server.batches.values()] == [2, 2, 1]
+
+
+class InMemoryRepository:
+    """Repositório em memória com as operações usadas no reprocessamento."""
+
+    def __init__(self, documents):
+        self.documents = {document.id: document for document in documents}
+        self.statuses = {document.id: document.status for document in documents}
+        self.transactions = []
+
+    async def get_documents_by_status(self, status, limit=100, after_id=0):
+        matching = sorted(
+            (d for d in self.documents.values() if self.statuses[d.id] == status and d.id > after_id), key=lambda d: d.id
+        )
+        return matching[:limit]
+
+    async def save_transactions(self, transactions):
+        self.transactions.extend(transactions)
+        return transactions
+
+    async def update_document_status(self, document_id, status):
+        self.statuses[document_id] = status
+        return True
+
+
+class FakeDocumentProcessor:
+    """Processador que extrai pelo provedor em lote, falhando nos documentos marcados."""
+
+    def __init__(self, provider, failing_ids=()):
+        self.provider = provider
+        self.failing_ids = failing_ids
+
+    async def process(self, document):
+        if document.id in self.failing_ids:
+            raise ValueError("documento inválido")
+        return await self.provider.extract_transactions(
+            "extrato", document.document_type, document_id=document.id, user_id=document.user_id
+        )
+
+
+@pytest.mark.asyncio
+async def test_backfill_saves_results_and_updates_status(sample_document_dict):
+    """Testa que o reprocessamento grava as transações e atualiza o status de cada documento."""
+    documents = [Document(**{**sample_document_dict, "id": i}) for i in (1, 2, 3)]
+    repository = InMemoryRepository(documents)
+    server = BatchStubServer(lambda custom_id, body: EXTRACTION)
+    processor = FakeDocumentProcessor(openai_batch_provider(server), failing_ids={2})
+
+    report = await BackfillService(repository, processor).run(page_size=2)
+
+    assert (report.documents, report.processed, report.failed, report.transactions) == (3, 2, 1, 2)
+    assert repository.statuses == {
+        1: DocumentStatus.PROCESSED, 2: DocumentStatus.FAILED, 3: DocumentStatus.PROCESSED
+    }
+    assert sorted(tx.document_id for tx in repository.transactions) == [1, 3]
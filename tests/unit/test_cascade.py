@@ -0,0 +1,88 @@
+"""
+Testes unitários para a cascata de modelos.
+"""
+import json
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from financial_document_processor.adapters.ai.ai_provider import track_usage
+from financial_document_processor.adapters.ai.cascade import CascadeAIProvider
+from financial_document_processor.domain.transaction import Transaction, TransactionType
+from tests.conftest import ScriptedAIProvider
+
+DOCUMENT_TEXT = """
+15/01/2023 SUPERMERCADO EXTRA          -150,00
+20/01/2023 SALARIO EMPRESA X         3.000,00
+"""
+
+
+def extraction_response(*items) -> str:
+    return json.dumps({"transactions": [
+        {"date": "2023-01-15", "description": description, "amount": amount, "type": "debit",
+         "confidence_score": confidence}
+        for description, amount, confidence in items
+    ]})
+
+
+def make_cascade(fast_content: str, premium_content: str):
+    fast = ScriptedAIProvider("fast-model", fast_content, cost=0.0001)
+    premium = ScriptedAIProvider("premium-model", premium_content, cost=0.01)
+    return CascadeAIProvider(fast, premium, confidence_threshold=0.7), fast, premium
+
+
+@pytest.mark.asyncio
+async def test_confident_fast_response_is_accepted():
+    """Testa que uma resposta válida e confiante do modelo barato não chama o modelo principal."""
+    cascade, fast, premium = make_cascade(
+        extraction_response(("SUPERMERCADO EXTRA", "150.00", 0.95), ("SALARIO EMPRESA X", "3000.00", 0.9)),
+        extraction_response(("PREMIUM", "150.00", 0.99)),
+    )
+
+    with track_usage() as usage:
+        transactions = await cascade.extract_transactions(DOCUMENT_TEXT, "bank_statement")
+
+    assert [tx.description for tx in transactions] == ["SUPERMERCADO EXTRA", "SALARIO EMPRESA X"]
+    assert (fast.calls, premium.calls) == (1, 0)
+    assert usage.cost == pytest.approx(0.0001)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("fast_content", [
+    extraction_response(("SUPERMERCADO EXTRA", "150.00", 0.4)),  # confiança baixa
+    extraction_response(("SUPERMERCADO EXTRA", "155.00", 0.95)),  # valor que não está no texto
+    '{"transactions": [{"date": "15/01", "amount": "150,00"}]}',  # falha no schema
+    "Não consegui ler o documento.",  # sem JSON
+    '{"transactions": []}',  # nenhuma transação em um trecho com valores
+])
+async def test_unreliable_fast_response_escalates(fast_content):
+    """Testa a escalada para o modelo principal quando a resposta do modelo barato não é confiável."""
+    cascade, fast, premium = make_cascade(fast_content, extraction_response(("PREMIUM", "150.00", 0.99)))
+
+    with track_usage() as usage:
+        transactions = await cascade.extract_transactions(DOCUMENT_TEXT, "bank_statement")
+
+    assert [tx.description for tx in transactions] == ["PREMIUM"]
+    assert (fast.calls, premium.calls) == (1, 1)
+    assert usage.cost == pytest.approx(0.0101)
+
+
+@pytest.mark.asyncio
+async def test_categorization_escalates_only_low_confidence_transactions():
+    """Testa que apenas as transações com confiança baixa vão para o modelo principal."""
+    cascade, fast, premium = make_cascade(
+        '{"r":[{"i":0,"c":["mercado"],"p":0.95},{"i":1,"c":["outros"],"p":0.3}]}',
+        '{"r":[{"i":0,"c":["salário"],"p":0.9}]}',
+    )
+    transactions = [
+        Transaction(document_id=1, user_id=1, date=date(2023, 1, 15), description="SUPERMERCADO EXTRA",
+                    amount=Decimal("150.00"), type=TransactionType.DEBIT),
+        Transaction(document_id=1, user_id=1, date=date(2023, 1, 20), description="SALARIO EMPRESA X",
+                    amount=Decimal("3000.00"), type=TransactionType.CREDIT),
+    ]
+
+    result = await cascade.categorize_transactions(transactions)
+
+    assert [tx.categories for tx in result] == [["mercado"], ["salário"]]
+    assert (fast.calls, premium.calls) == (1, 1)
@@ -0,0 +1,145 @@
+"""
+Testes unitários para a seleção de categorias por lote.
+"""
+import json
+from datetime import date
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock
+from uuid import uuid4
+
+import pytest
+
+from financial_document_processor.adapters.ai import create_ai_provider
+from financial_document_processor.adapters.ai.ai_provider import AIResponse
+from financial_document_processor.domain.category import Category, CategoryRegistry
+from financial_document_processor.domain.transaction import Transaction, TransactionType
+from financial_document_processor.services.categorization import CategorizationService
+from financial_document_processor.services.category_shortlist import CategoryShortlist
+from financial_document_processor.services.document_processor import DocumentProcessor
+from financial_document_processor.services.file_decoder import FileDecoder
+from financial_document_processor.services.prompt_engineering import PromptEngineering
+from financial_document_processor.utils.tokenizer import get_tokenizer_service
+
+
+def debit(description: str) -> Transaction:
+    return Transaction(
+        id=uuid4(),
+        document_id=1,
+        user_id=1,
+        date=date(2023, 1, 15),
+        description=description,
+        amount=Decimal("99.90"),
+        type=TransactionType.DEBIT
+    )
+
+
+@pytest.fixture
+def default_categories():
+    """Lista de categorias padrão, com as palavras-chave registradas."""
+    return CategorizationService(ai_provider=None).predefined_categories
+
+
+def test_selects_most_similar_categories_per_transaction(default_categories):
+    """Testa que cada transação do lote tem as suas categorias mais similares na seleção."""
+    shortlist = CategoryShortlist(default_categories, size=10)
+
+    selected = shortlist.select(["UBER *TRIP HELP.UBER.COM", "SUPERMERC EXTRA 123", "DROGARIA SAO PAULO"])
+
+    assert len(selected) == 10
+    assert {"aplicativo de transporte", "supermercado", "farmácia"} <= set(selected)
+    # Mantém a ordem da lista original
+    assert selected == [category for category in default_categories if category in selected]
+
+    assert shortlist.select([]) == default_categories[:10]
+    assert CategoryShortlist(default_categories, size=0).select(["UBER"]) == default_categories
+    assert CategoryShortlist(["luz", "água"], size=10).select(["UBER"]) == ["luz", "água"]
+
+
+def test_uses_registry_keywords_for_custom_taxonomies():
+    """Testa que categorias do cliente são encontradas pelas palavras-chave do registro."""
+    CategoryRegistry.register(Category(name="Frota - Abastecimento", keywords=["posto", "diesel"]))
+    categories = [f"Centro de custo {i}" for i in range(200)] + ["Frota - Abastecimento"]
+
+    selected = CategoryShortlist(categories, size=5).select(["POSTO BR RODOVIA 123"])
+
+    assert "Frota - Abastecimento" in selected
+    assert len(selected) == 5
+
+
+@pytest.mark.asyncio
+async def test_categorization_sends_shortlist_and_maps_ids_back():
+    """Testa que a categorização envia só as categorias escolhidas e converte os IDs da resposta."""
+    provider = create_ai_provider("openai", "fake_api_key", model="gpt-4o")
+    service = CategorizationService(ai_provider=provider, category_shortlist_size=8, enable_caching=False)
+    requests = []
+
+    async def generate_completion(request):
+        requests.append(request)
+        categories = request.prompt.split("## Categorias\n")[1].split("\n")[0].split(";")
+        ids = {name: int(index) for index, name in (entry.split("=", 1) for entry in categories)}
+        return AIResponse(
+            content=json.dumps({"r": [
+                {"i": 0, "c": [ids["eletrônicos"]], "p": 0.9},
+                {"i": 1, "c": [ids["vestuário"]], "p": 0.9},
+            ]}),
+            model="gpt-4o",
+            tokens_used=10,
+            cost=0.0
+        )
+
+    provider.generate_completion = AsyncMock(side_effect=generate_completion)
+
+    transactions = await service.categorize_transactions([debit("KABUM COMERCIO"), debit("LOJAS RENNER")])
+
+    assert [tx.categories for tx in transactions] == [["eletrônicos"], ["vestuário"]]
+    assert "aluguel recebido" not in requests[0].prompt
+    # A lista escolhida para o lote fica fora do prefixo cacheável
+    assert "eletrônicos" not in requests[0].cacheable_prefix
+
+
+@pytest.mark.parametrize("provider", ["openai", "gemini", "claude"])
+def test_shortlist_shrinks_categorization_prompt(default_categories, provider):
+    """Regressão de tokens: com 20 categorias, o prompt de categorização cai pelo menos 20%."""
+    tokenizer = get_tokenizer_service()
+    prompt_engineering = PromptEngineering()
+    batch = [debit(f"COMPRA CARTAO LOJA {i}") for i in range(10)]
+    shortlist = CategoryShortlist(default_categories, size=20)
+
+    full = prompt_engineering.create_categorization_prompt(batch, default_categories, provider)
+    short = prompt_engineering.create_categorization_prompt(
+        batch, shortlist.select(tx.description for tx in batch), provider
+    )
+
+    assert tokenizer.count_tokens(short, provider) < tokenizer.count_tokens(full, provider) * 0.8
+
+
+@pytest.mark.asyncio
+async def test_extraction_receives_shortlist_of_document_categories(sample_document, default_categories):
+    """Testa que cada trecho é extraído só com as categorias do documento mais similares às suas linhas."""
+    async def pages(content, content_type):
+        yield "15/01/2023 POSTO IPIRANGA 150,00\n16/01/2023 NETFLIX.COM 39,90\n"
+
+    file_decoder = MagicMock(spec=FileDecoder)
+    file_decoder.iter_pages = MagicMock(side_effect=pages)
+    received = []
+
+    async def stream_transactions(text_content, predefined_categories=None, **kwargs):
+        received.append(predefined_categories)
+        return
+        yield
+
+    provider = MagicMock(model="gpt-4o", stream_transactions=stream_transactions)
+    provider.name = "OpenAI"
+    processor = DocumentProcessor(
+        file_decoder=file_decoder,
+        ai_provider=provider,
+        parsers={"bank_statement": MagicMock()},
+        category_shortlist_size=3
+    )
+    document = sample_document.model_copy(
+        update={"categories": ["aluguel", "combustível", "luz", "streaming", "salário", "viagem"]}
+    )
+
+    await processor.process(document)
+
+    assert received == [["aluguel", "combustível", "streaming"]]
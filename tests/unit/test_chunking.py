@@ -0,0 +1,98 @@
+"""
+Testes unitários para a divisão de documentos em trechos e a combinação dos resultados.
+"""
+import pytest
+from datetime import date
+from decimal import Decimal
+from uuid import uuid4
+
+from financial_document_processor.domain.transaction import Transaction, TransactionType
+from financial_document_processor.services.chunking import TextChunker, TransactionMerger, normalize_description
+
+
+def make_transaction(description="PAGAMENTO - CONTA DE LUZ", amount="150.25"):
+    """Cria uma transação de exemplo."""
+    return Transaction(
+        id=uuid4(),
+        document_id=1,
+        user_id=123,
+        date=date(2023, 5, 5),
+        description=description,
+        amount=Decimal(amount),
+        type=TransactionType.DEBIT,
+    )
+
+
+def test_chunker_keeps_pages_together():
+    """Testa que páginas pequenas são agrupadas sem serem quebradas."""
+    chunker = TextChunker(chunk_size=50, overlap=0)
+    pages = ["a" * 20 + "\n", "b" * 20 + "\n", "c" * 20 + "\n"]
+
+    chunks = []
+    for page in pages:
+        chunks.extend(chunker.add_page(page))
+    chunks.extend(chunker.flush())
+
+    assert chunks == [pages[0] + pages[1], pages[2]]
+
+
+def test_chunker_adds_overlap_between_chunks():
+    """Testa que cada trecho começa com as últimas linhas do trecho anterior."""
+    chunker = TextChunker(chunk_size=30, overlap=8)
+    first_page = "linha 1\nlinha 2\n"
+    second_page = "linha 3\nlinha 4\n"
+
+    chunks = chunker.add_page(first_page) + chunker.add_page(second_page) + chunker.flush()
+
+    assert chunks == [first_page, "linha 2\n" + second_page]
+
+
+def test_chunker_splits_oversized_page_by_lines():
+    """Testa que uma página maior que o trecho é dividida por linhas."""
+    chunker = TextChunker(chunk_size=30, overlap=0)
+    page = "".join(f"linha {i:02d}\n" for i in range(10))
+
+    chunks = chunker.add_page(page) + chunker.flush()
+
+    assert all(len(chunk) <= 30 for chunk in chunks)
+    assert "".join(chunks) == page
+
+
+@pytest.mark.asyncio
+async def test_chunker_iter_chunks_skips_empty_pages():
+    """Testa o agrupamento a partir de um iterador assíncrono de páginas."""
+    async def pages():
+        for page in ["", "texto da página\n", "   "]:
+            yield page
+
+    chunks = [chunk async for chunk in TextChunker(chunk_size=100, overlap=0).iter_chunks(pages())]
+
+    assert chunks == ["texto da página\n"]
+
+
+def test_normalize_description():
+    """Testa a normalização de descrições."""
+    assert normalize_description("Pagamento - CONTA de Luz!") == "pagamento conta de luz"
+    assert normalize_description("TRANSFERÊNCIA") == "transferencia"
+
+
+def test_merger_drops_duplicates_between_neighbor_chunks():
+    """Testa a remoção de uma transação extraída por dois trechos vizinhos."""
+    merged = TransactionMerger().merge({
+        0: [make_transaction()],
+        1: [make_transaction(description="Pagamento Conta de Luz")],
+    })
+
+    assert len(merged) == 1
+
+
+def test_merger_keeps_repeated_transactions_within_chunk():
+    """Testa que transações iguais no mesmo trecho são mantidas."""
+    merged = TransactionMerger().merge({
+        0: [make_transaction(), make_transaction()],
+        1: [make_transaction()],
+        3: [make_transaction()],
+    })
+
+    # Uma das duas do trecho 0 pareia com a do trecho 1; o trecho 3 não é vizinho
+    assert len(merged) == 3
@@ -0,0 +1,108 @@
+"""
+Testes unitários para o circuit breaker dos provedores de IA.
+"""
+import asyncio
+
+import pytest
+
+from financial_document_processor.adapters.ai.ai_provider import AIProvider, AIRequest
+from financial_document_processor.adapters.ai.circuit_breaker import (
+    CircuitBreaker,
+    CircuitBreakerAIProvider,
+    CircuitOpenError,
+    CircuitState,
+)
+from financial_document_processor.adapters.ai.failover import FailoverAIProvider
+from tests.conftest import ScriptedAIProvider
+
+
+async def fail_times(provider: AIProvider, times: int) -> None:
+    for _ in range(times):
+        with pytest.raises(RuntimeError):
+            await provider.generate_completion(AIRequest(prompt="oi"))
+
+
+@pytest.mark.asyncio
+async def test_circuit_opens_and_fails_fast():
+    """Testa que o circuito abre com a taxa de erros e recusa chamadas sem chamar o provedor."""
+    flaky = ScriptedAIProvider(content="ok", error=RuntimeError("erro do provedor"))
+    provider = CircuitBreakerAIProvider(flaky, CircuitBreaker(min_calls=3, open_seconds=60))
+
+    await fail_times(provider, 3)
+    assert provider.breaker.state == CircuitState.OPEN
+
+    with pytest.raises(CircuitOpenError):
+        await provider.generate_completion(AIRequest(prompt="oi"))
+    assert flaky.calls == 3
+
+
+@pytest.mark.asyncio
+async def test_half_open_trial_closes_or_reopens_circuit():
+    """Testa que a chamada de teste do estado meio-aberto fecha ou reabre o circuito."""
+    flaky = ScriptedAIProvider(content="ok", error=RuntimeError("erro do provedor"))
+    provider = CircuitBreakerAIProvider(flaky, CircuitBreaker(min_calls=3, open_seconds=60))
+
+    await fail_times(provider, 3)
+    provider.breaker._opened_at -= 60
+    assert provider.breaker.state == CircuitState.HALF_OPEN
+
+    await fail_times(provider, 1)
+    assert provider.breaker.state == CircuitState.OPEN
+
+    provider.breaker._opened_at -= 60
+    flaky.error = None
+    response = await provider.generate_completion(AIRequest(prompt="oi"))
+
+    assert response.content == "ok"
+    assert provider.breaker.state == CircuitState.CLOSED
+    assert flaky.calls == 5
+
+
+def test_slow_calls_open_circuit():
+    """Testa que chamadas bem-sucedidas, porém lentas, também abrem o circuito."""
+    breaker = CircuitBreaker(slow_call_seconds=1.0, min_calls=4, open_seconds=60)
+
+    for latency in (0.1, 2.0, 3.0, 0.2):
+        breaker.record_success(latency)
+
+    assert breaker.state == CircuitState.OPEN
+    assert not breaker.allow_request()
+
+
+@pytest.mark.asyncio
+async def test_stream_latency_is_time_to_first_chunk():
+    """Testa que um consumidor lento não conta como lentidão e que a falha no meio do stream conta."""
+    provider = CircuitBreakerAIProvider(
+        ScriptedAIProvider(chunk_size=5), CircuitBreaker(slow_call_seconds=0.05, min_calls=1, open_seconds=60)
+    )
+
+    async for _ in provider.stream_completion(AIRequest(prompt="oi")):
+        await asyncio.sleep(0.02)
+    assert provider.breaker.state == CircuitState.CLOSED
+
+    async def broken_stream(request):
+        yield "{"
+        raise RuntimeError("conexão perdida")
+
+    provider.provider.stream_completion = broken_stream
+    with pytest.raises(RuntimeError):
+        async for _ in provider.stream_completion(AIRequest(prompt="oi")):
+            pass
+    assert provider.breaker.state == CircuitState.OPEN
+
+
+@pytest.mark.asyncio
+async def test_open_circuit_reroutes_through_failover():
+    """Testa que, com failover, a chamada recusada pelo circuito segue para o próximo provedor."""
+    broken = CircuitBreakerAIProvider(
+        ScriptedAIProvider("broken", content="ok", error=RuntimeError("erro do provedor")),
+        CircuitBreaker(min_calls=1, open_seconds=60)
+    )
+    healthy = ScriptedAIProvider("healthy", content="ok")
+
+    await fail_times(broken, 1)
+    failover = FailoverAIProvider([broken, healthy])
+    response = await failover.generate_completion(AIRequest(prompt="oi"))
+
+    assert response.model == "healthy"
+    assert broken.provider.calls == 1
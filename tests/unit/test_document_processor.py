@@ -1,12 +1,25 @@
 """
 Testes unitários para o processador de documentos.
 """
+import asyncio
 import base64
+from datetime import date
+from decimal import Decimal
+
 import pytest
 from unittest.mock import AsyncMock, MagicMock
+from financial_document_processor.domain.transaction import Transaction, TransactionType
 from financial_document_processor.services.document_processor import DocumentProcessor
 from financial_document_processor.services.file_decoder import FileDecoder
 from financial_document_processor.services.parsers.bank_statement import BankStatementParser
+from financial_document_processor.utils.tokenizer import Tokenizer
+
+
+class CharacterTokenizer(Tokenizer):
+    """Tokenizador de teste que conta caracteres."""
+
+    def count(self, text: str) -> int:
+        return len(text)
 
 
 @pytest.fixture
@@ -14,6 +27,13 @@ def mock_file_decoder():
     """Cria um mock do decodificador de arquivos."""
     decoder = MagicMock(spec=FileDecoder)
     decoder.decode_and_extract_text.return_value = "Conteúdo de texto extraído para teste"
+    decoder.pages = ["Conteúdo de texto extraído para teste"]
+
+    async def iter_pages(file_content, content_type):
+        for page in decoder.pages:
+            yield page
+
+    decoder.iter_pages = MagicMock(side_effect=iter_pages)
     return decoder
 
 
@@ -43,7 +63,7 @@ async def test_process_document(document_processor, sample_document, mock_file_d
     transactions = await document_processor.process(sample_document)
 
     # Verifica se o decodificador foi chamado com os parâmetros corretos
-    mock_file_decoder.decode_and_extract_text.assert_called_once_with(
+    mock_file_decoder.iter_pages.assert_called_once_with(
         sample_document.file_content, sample_document.content_type
     )
 
@@ -91,7 +111,7 @@ async def test_process_unsupported_document_type(document_processor):
 async def test_process_document_no_text_content(document_processor, sample_document, mock_file_decoder):
     """Testa o comportamento quando nenhum texto é extraído."""
     # Configura o mock para retornar texto vazio
-    mock_file_decoder.decode_and_extract_text.return_value = ""
+    mock_file_decoder.pages = [""]
 
     # Processa o documento
     transactions = await document_processor.process(sample_document)
@@ -101,6 +121,76 @@ async def test_process_document_no_text_content(document_processor, sample_docum
     assert len(transactions) == 0
 
 
+@pytest.mark.asyncio
+async def test_extraction_starts_before_decoding_finishes(sample_document, mock_file_decoder, mock_ai_provider,
+                                                          mock_parser):
+    """Testa que a extração da primeira página começa enquanto as seguintes ainda são decodificadas."""
+    document_processor = DocumentProcessor(
+        file_decoder=mock_file_decoder,
+        ai_provider=mock_ai_provider,
+        parsers={"bank_statement": mock_parser},
+        chunk_size=len("Página 1"),
+        chunk_overlap=0,
+        tokenizer=CharacterTokenizer()
+    )
+    first_page_extracted = asyncio.Event()
+
+    async def iter_pages(file_content, content_type):
+        yield "Página 1"
+        # A segunda página só fica pronta depois que a primeira já foi enviada para extração
+        await asyncio.wait_for(first_page_extracted.wait(), timeout=1)
+        yield "Página 2"
+
+    async def extract_transactions(text_content, document_type, predefined_categories=None):
+        if text_content == "Página 1":
+            first_page_extracted.set()
+            return [mock_ai_provider.transactions[0].model_copy()]
+        return [mock_ai_provider.transactions[1].model_copy()]
+
+    mock_file_decoder.iter_pages.side_effect = iter_pages
+    mock_ai_provider.extract_transactions = extract_transactions
+
+    transactions = [tx async for tx in document_processor.iter_transactions(sample_document)]
+
+    assert len(transactions) == 2
+    assert all(tx.document_id == sample_document.id for tx in transactions)
+
+
+@pytest.mark.asyncio
+async def test_process_document_limits_concurrency_and_merges_chunks(sample_document, mock_file_decoder,
+                                                                      mock_ai_provider, mock_parser):
+    """Testa a extração concorrente limitada e a remoção de duplicatas de fronteira."""
+    document_processor = DocumentProcessor(
+        file_decoder=mock_file_decoder,
+        ai_provider=mock_ai_provider,
+        parsers={"bank_statement": mock_parser},
+        chunk_size=20,
+        chunk_overlap=0,
+        max_concurrency=2,
+        tokenizer=CharacterTokenizer()
+    )
+    mock_file_decoder.pages = [f"página {i:02d} do extrato\n" for i in range(6)]
+    active = 0
+    max_active = 0
+
+    async def extract_transactions(text_content, document_type, predefined_categories=None):
+        nonlocal active, max_active
+        active += 1
+        max_active = max(max_active, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        # Todos os trechos "veem" a mesma transação, como aconteceria em uma sobreposição
+        return [mock_ai_provider.transactions[0].model_copy()]
+
+    mock_ai_provider.extract_transactions = extract_transactions
+
+    transactions = await document_processor.process(sample_document)
+
+    assert max_active == 2
+    # Trechos vizinhos deduplicam entre si: 6 trechos -> 3 transações distintas
+    assert len(transactions) == 3
+
+
 @pytest.mark.asyncio
 async def test_document_processor_with_categorization_service(mock_file_decoder, mock_ai_provider, mock_parser):
     """Testa o processador com serviço de categorização."""
@@ -130,4 +220,55 @@ async def test_document_processor_with_categorization_service(mock_file_decoder,
     await processor.process(document)
 
     # Verifica se o serviço de categorização foi chamado
-    mock_categorization_service.categorize_transactions.assert_called_once()
\ No newline at end of file
+    mock_categorization_service.categorize_transactions.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_line_reference_extraction_is_categorized(sample_document, mock_file_decoder, mock_parser):
+    """Testa que a extração por referência de linha, que não traz categorias, é seguida da categorização."""
+    mock_file_decoder.pages = ["15/01/2023 POSTO IPIRANGA 150,00\n16/01/2023 NETFLIX.COM 39,90\n"]
+    received = []
+
+    async def stream_transactions(text_content, document_type, **kwargs):
+        received.append(kwargs)
+        for description in ("POSTO IPIRANGA", "NETFLIX.COM"):
+            yield Transaction(
+                date=date(2023, 1, 15), description=description, amount=Decimal("10.00"),
+                type=TransactionType.DEBIT, document_id=0, user_id=0
+            )
+
+    def categorize(transactions, categories=None):
+        for tx in transactions:
+            tx.categories = ["categorizada"]
+        return transactions
+
+    provider = MagicMock(model="gpt-4o", stream_transactions=stream_transactions)
+    provider.name = "OpenAI"
+    provider.categorize_transactions = AsyncMock(side_effect=categorize)
+    categorization_service = MagicMock()
+    categorization_service.categorize_transactions = AsyncMock(side_effect=categorize)
+    processor = DocumentProcessor(
+        file_decoder=mock_file_decoder,
+        ai_provider=provider,
+        parsers={"bank_statement": mock_parser},
+        categorization_service=categorization_service,
+        line_references=True,
+        category_shortlist_size=3
+    )
+
+    # Sem categorias no documento: usa o serviço de categorização
+    transactions = await processor.process(sample_document.model_copy(update={"categories": None}))
+
+    assert [tx.categories for tx in transactions] == [["categorizada"]] * 2
+    assert categorization_service.categorize_transactions.await_count == 1
+    # A lista de categorias não é enviada na extração compacta
+    assert received == [{"line_references": True}]
+
+    # Com categorias no documento: o provedor categoriza com as mais similares às descrições
+    document = sample_document.model_copy(
+        update={"categories": ["aluguel", "combustível", "luz", "streaming", "salário", "viagem"]}
+    )
+    transactions = await processor.process(document)
+
+    assert [tx.categories for tx in transactions] == [["categorizada"]] * 2
+    [call] = provider.categorize_transactions.await_args_list
+    assert call.args[1] == ["aluguel", "combustível", "streaming"]
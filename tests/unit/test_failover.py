@@ -0,0 +1,98 @@
+"""
+Testes unitários para o failover e o hedge entre provedores de IA.
+"""
+import asyncio
+
+import pytest
+
+from financial_document_processor.adapters.ai.ai_provider import AIRequest
+from financial_document_processor.adapters.ai.failover import FailoverAIProvider, HedgeBudget
+from tests.conftest import ScriptedAIProvider
+
+
+@pytest.mark.asyncio
+async def test_failover_to_next_provider_on_error():
+    """Testa que a falha do primeiro provedor leva a chamada ao próximo e reduz sua saúde."""
+    primary = ScriptedAIProvider("primary", error=RuntimeError("indisponível"))
+    backup = ScriptedAIProvider("backup")
+    failover = FailoverAIProvider([primary, backup])
+
+    transactions = await failover.extract_transactions("texto", "bank_statement")
+
+    assert [tx.description for tx in transactions] == ["SUPERMERCADO EXTRA"]
+    assert (primary.calls, backup.calls) == (1, 1)
+    assert failover.ranked_providers() == [backup, primary]
+
+    response = await failover.generate_completion(AIRequest(prompt="oi"))
+    assert response.model == "backup"
+
+
+@pytest.mark.asyncio
+async def test_invalid_answers_fail_over():
+    """Testa que respostas recebidas, mas inválidas, também seguem para o próximo provedor."""
+    primary = ScriptedAIProvider("primary", content="Não consegui ler o documento.")
+    backup = ScriptedAIProvider("backup")
+    failover = FailoverAIProvider([primary, backup])
+
+    transactions = await failover.extract_transactions("texto", "bank_statement")
+
+    assert [tx.description for tx in transactions] == ["SUPERMERCADO EXTRA"]
+    assert (primary.calls, backup.calls) == (1, 1)
+
+    # Novo failover, para que o primeiro provedor volte a ser tentado primeiro
+    primary.content, backup.content = '{"r": []}', '{"r": [{"i": 0, "c": ["mercado"], "p": 0.9}]}'
+    [categorized] = await FailoverAIProvider([primary, backup]).categorize_transactions(transactions)
+
+    assert categorized.categories == ["mercado"]
+    assert (primary.calls, backup.calls) == (2, 2)
+
+
+@pytest.mark.asyncio
+async def test_all_providers_failing_raises_last_error():
+    """Testa que o erro da última tentativa é propagado quando todos falham."""
+    failover = FailoverAIProvider([
+        ScriptedAIProvider("a", error=RuntimeError("a")),
+        ScriptedAIProvider("b", error=RuntimeError("b")),
+    ])
+
+    with pytest.raises(RuntimeError, match="b"):
+        await failover.generate_completion(AIRequest(prompt="oi"))
+
+
+@pytest.mark.asyncio
+async def test_hedge_takes_first_response_and_cancels_the_other():
+    """Testa que o hedge dispara após o atraso, usa a resposta mais rápida e cancela a outra."""
+    slow = ScriptedAIProvider("slow", delay=5.0)
+    fast = ScriptedAIProvider("fast", delay=0.01)
+    failover = FailoverAIProvider([slow, fast], hedging_enabled=True, hedge_max_ratio=1.0, hedge_default_delay=0.05)
+
+    transactions = await failover.extract_transactions("texto", "bank_statement")
+    await asyncio.sleep(0)
+
+    assert [tx.description for tx in transactions] == ["SUPERMERCADO EXTRA"]
+    assert (slow.calls, fast.calls) == (1, 1)
+    assert slow.cancelled
+
+
+@pytest.mark.asyncio
+async def test_hedge_respects_budget():
+    """Testa que sem orçamento o hedge não é disparado."""
+    slow = ScriptedAIProvider("slow", delay=0.1)
+    other = ScriptedAIProvider("other")
+    failover = FailoverAIProvider([slow, other], hedging_enabled=True, hedge_max_ratio=0.0, hedge_default_delay=0.01)
+
+    response = await failover.generate_completion(AIRequest(prompt="oi"))
+
+    assert response.model == "slow"
+    assert other.calls == 0
+
+
+def test_hedge_budget_caps_ratio():
+    """Testa que o orçamento libera um hedge a cada 1/max_ratio requisições."""
+    budget = HedgeBudget(max_ratio=0.25)
+    granted = 0
+    for _ in range(100):
+        budget.record_request()
+        granted += budget.try_acquire()
+
+    assert granted == 25
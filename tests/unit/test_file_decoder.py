@@ -4,7 +4,7 @@ Testes unitários para o decodificador de arquivos.
 import base64
 import pytest
 
-from financial_document_processor.services.file_decoder import FileDecoder
+from financial_document_processor.services.file_decoder import ESTIMATED_TOKENS_PER_PAGE, FileDecoder
 
 
 @pytest.fixture
@@ -88,5 +88,28 @@ def test_multiple_content_types(file_decoder, content_type, expected_substring):
     # Verifica se o texto decodificado contém a substring esperada
     assert expected_substring in decoded_text
 
+@pytest.mark.asyncio
+async def test_iter_pages_text_file(file_decoder, sample_text_content, sample_text_base64):
+    """Testa a iteração por páginas de um arquivo de texto."""
+    pages = [page async for page in file_decoder.iter_pages(sample_text_base64, "text/plain")]
+
+    # Arquivos de texto são tratados como uma única página
+    assert pages == [sample_text_content]
+
+
+@pytest.mark.asyncio
+async def test_iter_pages_unsupported_content_type(file_decoder, sample_text_base64):
+    """Testa a iteração por páginas com um tipo de conteúdo não suportado."""
+    with pytest.raises(ValueError, match="Tipo de conteúdo não suportado"):
+        async for _ in file_decoder.iter_pages(sample_text_base64, "application/unsupported"):
+            pass
+
+
+def test_estimate_tokens(file_decoder, sample_text_content, sample_text_base64):
+    """Testa a estimativa de tokens sem extração de texto."""
+    # Textos são estimados pelo tamanho; imagens contam como uma página
+    assert file_decoder.estimate_tokens(sample_text_base64, "text/plain") == len(sample_text_content.encode()) // 4
+    assert file_decoder.estimate_tokens(sample_text_base64, "image/png") == ESTIMATED_TOKENS_PER_PAGE
+
 # Testes específicos para PDF e imagens podem ser adicionados
 # conforme necessário, usando mocks para evitar dependências externas
\ No newline at end of file
@@ -0,0 +1,80 @@
+"""
+Testes unitários para o parser incremental de JSON.
+"""
+import json
+
+from financial_document_processor.utils.json_stream import (
+    JSONArrayStreamParser,
+    repair_truncated_json,
+    stitch_continuation,
+)
+
+
+def feed_all(parser, pieces):
+    items = []
+    for piece in pieces:
+        items.extend(parser.feed(piece))
+    return items
+
+
+def test_parser_yields_objects_as_they_close():
+    """Testa que cada objeto é entregue no pedaço em que se fecha."""
+    parser = JSONArrayStreamParser("transactions")
+
+    assert parser.feed('{"transactions": [{"a": 1}, {"a"') == [{"a": 1}]
+    assert parser.feed(': 2}') == [{"a": 2}]
+    assert parser.feed(']}') == []
+    assert parser.finished
+
+
+def test_parser_handles_character_by_character_input():
+    """Testa a leitura caractere a caractere, com a chave partida entre pedaços."""
+    text = 'Aqui está: {"transactions": [{"d": "x", "n": {"v": [1, 2]}}, {"d": "y"}]}'
+    parser = JSONArrayStreamParser("transactions")
+
+    assert feed_all(parser, list(text)) == [{"d": "x", "n": {"v": [1, 2]}}, {"d": "y"}]
+
+
+def test_parser_ignores_braces_inside_strings():
+    """Testa que chaves, colchetes e aspas escapadas dentro de strings não fecham o objeto."""
+    expected = [{"d": 'PIX {loja} [1] \\ "x"'}, {"d": "}"}]
+    text = json.dumps({"transactions": expected})
+    parser = JSONArrayStreamParser("transactions")
+
+    items = feed_all(parser, [text[i:i + 3] for i in range(0, len(text), 3)])
+
+    assert items == expected
+
+
+def test_parser_skips_invalid_objects():
+    """Testa que um objeto inválido é descartado sem interromper os seguintes."""
+    parser = JSONArrayStreamParser("transactions")
+
+    items = parser.feed('{"transactions": [{"a": 01}, {"a": 2}]}')
+
+    assert items == [{"a": 2}]
+
+
+def test_parser_without_key():
+    """Testa que nada é produzido quando a resposta não contém o array."""
+    parser = JSONArrayStreamParser("transactions")
+
+    assert feed_all(parser, ["desculpe, ", "não encontrei transações"]) == []
+    assert not parser.found
+
+
+def test_stitch_continuation_removes_repeated_overlap_and_fence():
+    """Testa que a continuação perde a cerca de código e o trecho repetido da resposta anterior."""
+    previous = '{"transactions": [{"description": "SUPERMERCADO EXTRA", "amou'
+    continuation = '```json\n"SUPERMERCADO EXTRA", "amount": "150.00"}]}'
+
+    assert stitch_continuation(previous, continuation) == 'nt": "150.00"}]}'
+    assert stitch_continuation(previous, 'nt": "150.00"}]}') == 'nt": "150.00"}]}'
+
+
+def test_repair_truncated_json_keeps_complete_elements():
+    """Testa que o JSON cortado é fechado logo após o último elemento completo."""
+    text = '{"r": [{"i": 0, "c": ["mercado"]}, {"i": 1, "c": ["transp'
+
+    assert json.loads(repair_truncated_json(text)) == {"r": [{"i": 0, "c": ["mercado"]}]}
+    assert repair_truncated_json('{"r": []} fim') == '{"r": []}'
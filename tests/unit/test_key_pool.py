@@ -0,0 +1,138 @@
+"""
+Testes unitários para o pool de chaves de API.
+"""
+from typing import Optional
+
+import pytest
+from prometheus_client import REGISTRY
+
+from financial_document_processor.adapters.ai import create_ai_provider
+from financial_document_processor.adapters.ai.ai_provider import AIRequest, track_usage
+from financial_document_processor.adapters.ai.key_pool import (
+    ApiKey,
+    KeyPoolAIProvider,
+    NoActiveApiKeyError,
+    parse_api_keys,
+)
+from financial_document_processor.adapters.ai.rate_limiter import RateLimiter
+from financial_document_processor.config import get_settings
+from tests.conftest import ScriptedAIProvider
+
+
+class FakeAPIError(Exception):
+    """Erro de API com o status HTTP informado."""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def key_provider(error: Optional[Exception] = None) -> ScriptedAIProvider:
+    """Provedor de teste de uma chave, com limitador próprio e erro opcional."""
+    provider = ScriptedAIProvider("gpt-4o", content="ok", error=error, name="OpenAI", chunk_size=1)
+    provider.rate_limiter = RateLimiter(requests_per_minute=100, tokens_per_minute=10000, name="OpenAI")
+    return provider
+
+
+def key_metric(name: str, key: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, {"provider": "OpenAI", "key": key, **labels}) or 0
+
+
+def test_parse_api_keys_reads_organizations_and_drops_duplicates():
+    """Testa a leitura das chaves do pool, com organização opcional."""
+    keys = parse_api_keys("sk-one:org-a, sk-two,,sk-one")
+
+    assert keys == [ApiKey(key="sk-one", organization_id="org-a"), ApiKey(key="sk-two")]
+    assert (keys[0].label, keys[0].account, keys[1].account) == ("...-one", "org-a", "...-two")
+
+
+@pytest.mark.asyncio
+async def test_requests_are_weighted_by_remaining_quota():
+    """Testa que chaves com a cota esgotada ou pausadas por 429 não recebem chamadas enquanto outras têm cota."""
+    full, exhausted, paused = key_provider(), key_provider(), key_provider()
+    exhausted.rate_limiter.tokens.level = -5000
+    paused.rate_limiter.pause(60)
+    pool = KeyPoolAIProvider(
+        [(ApiKey(key="sk-full"), full), (ApiKey(key="sk-exhausted"), exhausted), (ApiKey(key="sk-paused"), paused)],
+        seed=1
+    )
+
+    for _ in range(20):
+        await pool.generate_completion(AIRequest(prompt="oi"))
+
+    assert (full.calls, exhausted.calls, paused.calls) == (20, 0, 0)
+    assert key_metric("ai_key_available_quota", "...sted") == 0
+
+    # Duas chaves com cota repartem as chamadas
+    other = key_provider()
+    pool = KeyPoolAIProvider([(ApiKey(key="sk-a"), key_provider()), (ApiKey(key="sk-b"), other)], seed=1)
+    for _ in range(40):
+        await pool.generate_completion(AIRequest(prompt="oi"))
+    assert 0 < other.calls < 40
+
+
+@pytest.mark.asyncio
+async def test_unauthorized_key_leaves_rotation():
+    """Testa que uma chave recusada com 401 sai do pool e a chamada segue em outra chave."""
+    revoked, valid = key_provider(FakeAPIError(401)), key_provider()
+    pool = KeyPoolAIProvider([(ApiKey(key="sk-revoked"), revoked), (ApiKey(key="sk-valid"), valid)], seed=3)
+    unauthorized_before = key_metric("ai_key_requests_total", "...oked", result="unauthorized")
+    tokens_before = key_metric("ai_key_tokens_total", "...alid")
+
+    for _ in range(10):
+        response = await pool.generate_completion(AIRequest(prompt="oi"))
+        assert response.content == "ok"
+
+    assert revoked.calls == 1
+    assert [key.label for key in pool.active_keys] == ["...alid"]
+    assert key_metric("ai_key_active", "...oked") == 0
+    assert key_metric("ai_key_requests_total", "...oked", result="unauthorized") - unauthorized_before == 1
+    assert key_metric("ai_key_tokens_total", "...alid") - tokens_before == 1000
+
+    # Outros erros não removem a chave nem trocam de chave
+    valid.error = FakeAPIError(500)
+    with pytest.raises(FakeAPIError):
+        await pool.generate_completion(AIRequest(prompt="oi"))
+    assert len(pool.active_keys) == 1
+
+    valid.error = FakeAPIError(401)
+    with pytest.raises(FakeAPIError):
+        await pool.generate_completion(AIRequest(prompt="oi"))
+    with pytest.raises(NoActiveApiKeyError):
+        await pool.generate_completion(AIRequest(prompt="oi"))
+
+
+@pytest.mark.asyncio
+async def test_stream_moves_to_another_key_on_rate_limit():
+    """Testa que um 429 antes do primeiro pedaço leva o streaming para outra chave, somando o uso."""
+    limited, valid = key_provider(FakeAPIError(429)), key_provider()
+    pool = KeyPoolAIProvider([(ApiKey(key="sk-limited"), limited), (ApiKey(key="sk-valid"), valid)], seed=0)
+    limited.rate_limiter.tokens.level = 10000
+    valid.rate_limiter.tokens.level = 1
+
+    with track_usage() as usage:
+        deltas = [delta async for delta in pool.stream_completion(AIRequest(prompt="oi"))]
+
+    assert deltas == ["o", "k"]
+    assert (limited.calls, valid.calls) == (1, 1)
+    assert limited in [key.provider for key in pool.active_keys]
+    assert usage.tokens == 100
+
+
+def test_factory_creates_pool_with_a_rate_limiter_per_account(monkeypatch):
+    """Testa que a factory cria um provedor por chave, com o limitador da conta de cada uma."""
+    monkeypatch.setenv("OPENAI_API_KEYS", "sk-pool-one:org-a,sk-pool-two:org-a,sk-pool-three")
+    get_settings.cache_clear()
+
+    try:
+        provider = create_ai_provider("openai", "sk-main", model="gpt-4o-mini")
+    finally:
+        get_settings.cache_clear()
+
+    assert isinstance(provider, KeyPoolAIProvider)
+    assert [key.label for key in provider.keys] == ["...main", "...-one", "...-two", "...hree"]
+    limiters = [key.provider.rate_limiter for key in provider.keys]
+    # Chaves da mesma organização dividem a cota
+    assert limiters[1] is limiters[2]
+    assert len({id(limiter) for limiter in limiters}) == 3
+    assert provider.keys[1].provider.client.organization == "org-a"
@@ -0,0 +1,120 @@
+"""
+Testes unitários para o pré-filtro de linhas dos extratos.
+"""
+from unittest.mock import MagicMock
+
+import pytest
+from prometheus_client import REGISTRY
+
+from financial_document_processor.services.document_processor import DocumentProcessor
+from financial_document_processor.services.file_decoder import FileDecoder
+from financial_document_processor.services.parsers.bank_statement import BankStatementParser
+
+HEADER = (
+    "BANCO EXEMPLO S.A.\n"
+    "Extrato de conta corrente - Agência 1234 Conta 56789-0\n"
+    "Página {page} de 2\n"
+    "Data Histórico Valor Saldo\n"
+)
+FOOTER = (
+    "Ouvidoria: 0800 000 0000. Central de atendimento 24 horas.\n"
+    "Este extrato não substitui o informe de rendimentos para fins de declaração.\n"
+)
+MARKETING = (
+    "\n"
+    "Conheça o novo cartão Exemplo Black com anuidade grátis no primeiro ano!\n"
+    "Invista com taxa de 1,20% ao mês no CDB Exemplo. Consulte condições.\n"
+)
+
+PAGES = [
+    HEADER.format(page=1)
+    + "02/01/2023 SALDO ANTERIOR 1.000,00\n"
+    + "05/01/2023 PIX RECEBIDO 2.500,00 3.500,00\n"
+    + "   JOAO DA SILVA\n"
+    + "10/01/2023 TARIFA PACOTE SERVICOS -25,00 3.475,00\n"
+    + MARKETING
+    + FOOTER,
+    HEADER.format(page=2)
+    + "15/01/2023 PAGAMENTO BOLETO -150,25 3.324,75\n"
+    + "10/02/2023 TARIFA PACOTE SERVICOS -25,00 3.299,75\n"
+    + "12/02/2023 PIX RECEBIDO 300,00 3.599,75\n"
+    + "   JOAO DA SILVA\n"
+    + MARKETING
+    + FOOTER,
+]
+
+
+async def iterate(pages):
+    for page in pages:
+        yield page
+
+
+async def filtered(line_filter, pages):
+    return [page async for page in line_filter.filter_pages(iterate(pages))]
+
+
+@pytest.mark.asyncio
+async def test_keeps_transaction_regions_and_drops_boilerplate():
+    """Testa que ficam as linhas de transação com o contexto e saem avisos, propaganda e cabeçalhos repetidos."""
+    line_filter = BankStatementParser(ai_provider=None).create_line_filter()
+
+    first, second = await filtered(line_filter, PAGES)
+
+    assert "PIX RECEBIDO 2.500,00" in first and "JOAO DA SILVA" in first
+    assert "BANCO EXEMPLO" in first and "Data Histórico Valor Saldo" in first
+    assert "PAGAMENTO BOLETO" in second
+    # Lançamentos recorrentes não são tratados como repetição, nem as linhas de contexto
+    # que se repetem em outra posição da página
+    assert second.count("TARIFA PACOTE SERVICOS") == 1
+    assert "JOAO DA SILVA" in second
+    # O cabeçalho da segunda página já apareceu na primeira
+    assert "Data Histórico" not in second and "Página 2" not in second
+    for page in (first, second):
+        assert "Ouvidoria" not in page and "cartão" not in page and "CDB" not in page
+
+    assert line_filter.reduction > 0.4
+
+
+@pytest.mark.asyncio
+async def test_document_without_recognized_lines_is_not_filtered():
+    """Testa que um documento sem nenhuma linha com data ou valor reconhecido segue sem filtro."""
+    line_filter = BankStatementParser(ai_provider=None).create_line_filter()
+    pages = ["Statement January\nSUPERMARKET Jan 15 USD 150\n", "COFFEE SHOP Jan 16 USD 5\n"]
+
+    assert await filtered(line_filter, pages) == pages
+    assert line_filter.reduction == 0
+
+
+@pytest.mark.asyncio
+async def test_document_processor_sends_filtered_text_and_reports_reduction(sample_document):
+    """Testa que a extração recebe o texto filtrado e que a redução de tokens é registrada."""
+    file_decoder = MagicMock(spec=FileDecoder)
+    file_decoder.iter_pages = MagicMock(side_effect=lambda content, content_type: iterate(PAGES))
+    received = []
+
+    async def stream_transactions(text_content, **kwargs):
+        received.append(text_content)
+        return
+        yield
+
+    provider = MagicMock(model="gpt-4o", stream_transactions=stream_transactions)
+    provider.name = "OpenAI"
+    processor = DocumentProcessor(
+        file_decoder=file_decoder,
+        ai_provider=provider,
+        parsers={"bank_statement": BankStatementParser(ai_provider=provider)},
+        chunk_size=100000,
+        line_filter_enabled=True
+    )
+    input_before = REGISTRY.get_sample_value(
+        "document_line_filter_tokens_total", {"document_type": "bank_statement", "stage": "input"}
+    ) or 0
+
+    await processor.process(sample_document)
+
+    [text] = received
+    assert "PAGAMENTO BOLETO" in text and "Ouvidoria" not in text
+    input_tokens = REGISTRY.get_sample_value(
+        "document_line_filter_tokens_total", {"document_type": "bank_statement", "stage": "input"}
+    ) - input_before
+    assert input_tokens == sum(processor.tokenizer.count(page) for page in PAGES)
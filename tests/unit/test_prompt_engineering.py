@@ -1,6 +1,7 @@
 """
 Testes unitários para o serviço de engenharia de prompts.
 """
+import json
 import pytest
 from datetime import date
 from decimal import Decimal
@@ -8,6 +9,7 @@ from uuid import uuid4
 
 from financial_document_processor.domain.transaction import Transaction, TransactionType, TransactionMethod
 from financial_document_processor.services.prompt_engineering import PromptEngineering
+from financial_document_processor.utils.tokenizer import get_tokenizer_service
 
 
 @pytest.fixture
@@ -157,8 +159,8 @@ def test_create_categorization_prompt_openai(prompt_engineering, sample_transact
     assert "TRANSFERÊNCIA RECEBIDA - SALÁRIO" in prompt
     assert "PAGAMENTO - CONTA DE LUZ" in prompt
     assert "PAGAMENTO - SUPERMERCADO" in prompt
-    assert "categories" in prompt
-    assert "confidence_score" in prompt
+    assert "i|valor|método|descrição" in prompt
+    assert '{"r":[' in prompt
 
 
 def test_create_categorization_prompt_gemini(prompt_engineering, sample_transactions):
@@ -174,8 +176,8 @@ def test_create_categorization_prompt_gemini(prompt_engineering, sample_transact
     assert "PAGAMENTO - CONTA DE LUZ" in prompt
     assert "PAGAMENTO - SUPERMERCADO" in prompt
     assert "DIRETRIZES DE CATEGORIZAÇÃO" in prompt
-    assert "categories" in prompt
-    assert "confidence_score" in prompt
+    assert "i|valor|método|descrição" in prompt
+    assert '{"r":[' in prompt
 
 
 def test_create_categorization_prompt_claude(prompt_engineering, sample_transactions):
@@ -191,9 +193,9 @@ def test_create_categorization_prompt_claude(prompt_engineering, sample_transact
     assert "TRANSFERÊNCIA RECEBIDA - SALÁRIO" in prompt
     assert "PAGAMENTO - CONTA DE LUZ" in prompt
     assert "PAGAMENTO - SUPERMERCADO" in prompt
-    assert "Categorize cada transação financeira acima" in prompt
-    assert "categories" in prompt
-    assert "confidence_score" in prompt
+    assert "Categorize cada transação financeira em <transações>" in prompt
+    assert "i|valor|método|descrição" in prompt
+    assert '{"r":[' in prompt
 
 
 def test_create_categorization_prompt_with_predefined_categories(prompt_engineering, sample_transactions):
@@ -214,8 +216,8 @@ def test_create_categorization_prompt_with_predefined_categories(prompt_engineer
     assert "Você deve usar APENAS as seguintes categorias" in prompt
 
 
-def test_text_content_length_limit(prompt_engineering):
-    """Testa o limite de comprimento do texto para evitar exceder limites de tokens."""
+def test_text_content_is_not_truncated(prompt_engineering):
+    """Testa que textos longos não são truncados (a divisão em trechos acontece antes)."""
     # Cria um texto muito longo
     long_text = "Lorem ipsum dolor sit amet. " * 1000  # Texto com mais de 15.000 caracteres
 
@@ -225,9 +227,8 @@ def test_text_content_length_limit(prompt_engineering):
         provider="gemini"
     )
 
-    # Verifica se o texto foi truncado
-    assert "..." in prompt
-    assert len(prompt) < len(long_text) + 1000  # Verifica se foi significativamente reduzido
+    # Verifica se o texto foi mantido integralmente
+    assert long_text in prompt
 
 
 def test_provider_fallback(prompt_engineering, sample_text_content):
@@ -249,4 +250,212 @@ def test_create_categorization_prompt_empty_transactions(prompt_engineering):
         provider="gemini"
     )
 
-    assert "transactions" in prompt
\ No newline at end of file
+    assert "i|valor|método|descrição" in prompt
+
+@pytest.mark.parametrize("provider", ["openai", "gemini", "claude"])
+def test_extraction_prompt_prefix_is_static(prompt_engineering, sample_text_content, provider):
+    """Testa que o prefixo cacheável não depende do texto do documento."""
+    categories = ["salário", "luz"]
+
+    first = prompt_engineering.create_extraction_prompt_parts(
+        text_content=sample_text_content,
+        document_type="bank_statement",
+        predefined_categories=categories,
+        provider=provider
+    )
+    second = prompt_engineering.create_extraction_prompt_parts(
+        text_content="outro trecho do extrato",
+        document_type="bank_statement",
+        predefined_categories=categories,
+        provider=provider
+    )
+
+    assert first.prefix == second.prefix
+    assert sample_text_content not in first.prefix
+    assert sample_text_content in first.suffix
+    # A lista de categorias muda a cada trecho e fica no sufixo
+    assert "0=salário;1=luz" in first.suffix
+    assert "0=salário" not in first.prefix
+
+    shortlisted = prompt_engineering.create_extraction_prompt_parts(
+        text_content=sample_text_content,
+        document_type="bank_statement",
+        predefined_categories=["aluguel"],
+        provider=provider
+    )
+    assert shortlisted.prefix == first.prefix
+
+
+@pytest.mark.parametrize("provider", ["openai", "gemini", "claude"])
+def test_categorization_prompt_prefix_is_static(prompt_engineering, sample_transactions, provider):
+    """Testa que as transações ficam apenas no sufixo do prompt de categorização."""
+    first = prompt_engineering.create_categorization_prompt_parts(
+        transactions=sample_transactions[:1],
+        provider=provider
+    )
+    second = prompt_engineering.create_categorization_prompt_parts(
+        transactions=sample_transactions[1:],
+        provider=provider
+    )
+
+    assert first.prefix == second.prefix
+    assert "TRANSFERÊNCIA RECEBIDA - SALÁRIO" in first.suffix
+    assert "TRANSFERÊNCIA RECEBIDA - SALÁRIO" not in first.prefix
+
+    # Lotes com categorias diferentes compartilham o prefixo; a lista vai no sufixo
+    with_categories = prompt_engineering.create_categorization_prompt_parts(
+        transactions=sample_transactions[:1],
+        predefined_categories=["salário", "luz"],
+        provider=provider
+    )
+    other_categories = prompt_engineering.create_categorization_prompt_parts(
+        transactions=sample_transactions[:1],
+        predefined_categories=["aluguel"],
+        provider=provider
+    )
+    assert with_categories.prefix == other_categories.prefix
+    assert "0=salário;1=luz" in with_categories.suffix
+
+
+@pytest.fixture
+def batch_of_ten():
+    """Cria um lote de 10 transações, o tamanho de lote usado na categorização."""
+    return [
+        Transaction(
+            id=uuid4(),
+            document_id=1,
+            user_id=123,
+            date=date(2023, 5, i + 1),
+            description=f"PAGAMENTO PIX - ESTABELECIMENTO COMERCIAL {i}",
+            amount=Decimal("123.45") + i,
+            type=TransactionType.DEBIT,
+            method=TransactionMethod.PIX,
+            categories=[]
+        )
+        for i in range(10)
+    ]
+
+
+@pytest.mark.parametrize("provider", ["openai", "gemini", "claude"])
+def test_compact_categorization_payload_saves_tokens(prompt_engineering, batch_of_ten, provider):
+    """Regressão de tokens: a tabela compacta custa menos de 35% do JSON indentado anterior."""
+    tokenizer = get_tokenizer_service()
+
+    legacy_payload = json.dumps([
+        {
+            "id": str(tx.id),
+            "date": tx.date.isoformat(),
+            "description": tx.description,
+            "amount": str(tx.amount),
+            "type": tx.type,
+            "method": tx.method,
+            "categories": tx.categories
+        }
+        for tx in batch_of_ten
+    ], ensure_ascii=False, indent=2)
+    legacy_answer = json.dumps({"transactions": [
+        {
+            "id": str(tx.id),
+            "date": tx.date.isoformat(),
+            "description": tx.description,
+            "amount": str(tx.amount),
+            "type": "DEBIT",
+            "method": "PIX",
+            "categories": ["alimentação"],
+            "confidence_score": 0.9
+        }
+        for tx in batch_of_ten
+    ]}, ensure_ascii=False, indent=2)
+    compact_answer = json.dumps(
+        {"r": [{"i": i, "c": [0], "p": 0.9} for i in range(10)]}, separators=(",", ":")
+    )
+
+    parts = prompt_engineering.create_categorization_prompt_parts(
+        transactions=batch_of_ten,
+        predefined_categories=["alimentação", "transporte"],
+        provider=provider
+    )
+
+    payload_tokens = tokenizer.count_tokens(parts.suffix, provider)
+    legacy_payload_tokens = tokenizer.count_tokens(legacy_payload, provider)
+    answer_tokens = tokenizer.count_tokens(compact_answer, provider)
+    legacy_answer_tokens = tokenizer.count_tokens(legacy_answer, provider)
+
+    assert payload_tokens < legacy_payload_tokens * 0.35
+    assert answer_tokens < legacy_answer_tokens * 0.25
+
+
+def test_encode_transactions_is_positional(prompt_engineering, sample_transactions):
+    """Testa a codificação tabular: índice posicional, valor com sinal e sem UUIDs."""
+    encoded = prompt_engineering.encode_transactions(sample_transactions)
+
+    assert encoded.splitlines() == [
+        "i|valor|método|descrição",
+        "0|3500.00|ted|TRANSFERÊNCIA RECEBIDA - SALÁRIO",
+        "1|-150.25|boleto|PAGAMENTO - CONTA DE LUZ",
+        "2|-350.75|payment|PAGAMENTO - SUPERMERCADO",
+    ]
+    assert str(sample_transactions[0].id) not in encoded
+
+
+@pytest.mark.parametrize("provider", ["openai", "gemini", "claude"])
+def test_extraction_example_matches_category_format(prompt_engineering, sample_text_content, provider):
+    """Testa que o exemplo da extração usa números com lista de categorias e nomes sem ela."""
+    with_list = prompt_engineering.create_extraction_prompt_parts(
+        sample_text_content, "bank_statement", ["salário", "luz"], provider
+    )
+    without_list = prompt_engineering.create_extraction_prompt_parts(
+        sample_text_content, "bank_statement", None, provider
+    )
+
+    assert '"categories": ["2"]' in with_list.prefix and '"categories": ["salário"]' not in with_list.prefix
+    assert '"categories": ["salário"]' in without_list.prefix
+
+
+def test_decode_categories(prompt_engineering):
+    """Testa a conversão de IDs de categoria da resposta compacta em nomes."""
+    predefined = ["salário", "luz", "supermercado"]
+
+    assert prompt_engineering.decode_categories([2, 0], predefined) == ["supermercado", "salário"]
+    assert prompt_engineering.decode_categories([7, "luz"], predefined) == ["luz"]
+    assert prompt_engineering.decode_categories(["lazer"]) == ["lazer"]
+    assert prompt_engineering.decode_categories([1]) == []
+    # Na extração os IDs chegam como texto
+    # Com lista, nomes fora dela são descartados
+    assert prompt_engineering.decode_categories(["2", "lazer"], predefined) == ["supermercado"]
+
+
+@pytest.mark.parametrize("provider", ["openai", "gemini", "claude"])
+def test_line_reference_answer_halves_output_tokens(prompt_engineering, batch_of_ten, provider):
+    """Regressão de tokens: a resposta por referência de linha custa menos de 65% da resposta completa."""
+    tokenizer = get_tokenizer_service()
+
+    full_answer = json.dumps({"transactions": [
+        {
+            "date": tx.date.isoformat(),
+            "description": tx.description,
+            "amount": str(tx.amount),
+            "type": "debit",
+            "method": "pix",
+            "categories": ["compras"],
+            "confidence_score": 0.9
+        }
+        for tx in batch_of_ten
+    ]}, ensure_ascii=False, separators=(",", ":"))
+    line_reference_answer = json.dumps({"r": [
+        {"l": i, "n": 1, "d": tx.date.isoformat(), "v": str(tx.amount), "t": "debit", "m": "pix"}
+        for i, tx in enumerate(batch_of_ten)
+    ]}, separators=(",", ":"))
+
+    parts = prompt_engineering.create_extraction_prompt_parts(
+        text_content="0|01/05/2023 PAGAMENTO PIX - ESTABELECIMENTO COMERCIAL 0 -123,45",
+        document_type="bank_statement",
+        provider=provider,
+        line_references=True
+    )
+
+    assert '"l"' in parts.prefix and "0|01/05/2023" in parts.suffix
+    assert (
+        tokenizer.count_tokens(line_reference_answer, provider)
+        < tokenizer.count_tokens(full_answer, provider) * 0.65
+    )
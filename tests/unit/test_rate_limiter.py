@@ -0,0 +1,171 @@
+"""
+Testes unitários para o limitador de requisições e tokens dos provedores de IA.
+"""
+import asyncio
+
+import pytest
+
+from financial_document_processor.adapters.ai import create_ai_provider
+from financial_document_processor.adapters.ai.rate_limiter import (
+    RateLimiter,
+    get_rate_limiter,
+    retry_after_seconds,
+    wait_rate_limit_aware,
+)
+from financial_document_processor.config import get_settings
+
+
+class FakeClock:
+    """Relógio controlado pelo teste; sleep avança o tempo sem esperar."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class FakeResponse:
+    def __init__(self, headers):
+        self.headers = headers
+
+
+class FakeRateLimitError(Exception):
+    """Erro no formato dos SDKs: status_code 429 e resposta com cabeçalhos."""
+
+    status_code = 429
+
+    def __init__(self, headers):
+        super().__init__("rate limited")
+        self.response = FakeResponse(headers)
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def limiter(clock):
+    return RateLimiter(requests_per_minute=60, tokens_per_minute=600, name="test", clock=clock, sleep=clock.sleep)
+
+
+@pytest.mark.asyncio
+async def test_acquire_waits_for_token_quota(limiter, clock):
+    """Testa que a reserva espera a reposição quando a cota de tokens do minuto acabou."""
+    assert await limiter.acquire(600) == 0
+
+    waited = await limiter.acquire(300)
+
+    # 600 tokens/min = 10 tokens/s: 300 tokens levam 30s
+    assert waited == pytest.approx(30.0)
+    assert clock.now == pytest.approx(30.0)
+
+
+@pytest.mark.asyncio
+async def test_acquire_respects_requests_per_minute(limiter, clock):
+    """Testa que chamadas concorrentes não ultrapassam a cota de requisições."""
+    await asyncio.gather(*[limiter.acquire(1) for _ in range(70)])
+
+    # 60 saem imediatamente; as 10 restantes esperam 1s cada (60 req/min)
+    assert clock.now == pytest.approx(10.0)
+
+
+@pytest.mark.asyncio
+async def test_reserve_refunds_unused_tokens(limiter, clock):
+    """Testa que a diferença entre tokens estimados e reais é devolvida."""
+    async with limiter.reserve(500) as reservation:
+        reservation.actual_tokens = 100
+
+    assert limiter.tokens.level == pytest.approx(500)
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_error_pauses_with_retry_after(limiter, clock):
+    """Testa que um 429 pausa as próximas chamadas pelo retry-after e devolve a reserva."""
+    with pytest.raises(FakeRateLimitError):
+        async with limiter.reserve(200):
+            raise FakeRateLimitError({"retry-after": "5"})
+
+    assert limiter.tokens.level == pytest.approx(600)
+
+    waited = await limiter.acquire(1)
+    assert waited == pytest.approx(5.0)
+
+
+@pytest.mark.asyncio
+async def test_headers_adjust_quota_and_remaining(limiter):
+    """Testa que os cabeçalhos de rate limit corrigem a cota e o saldo."""
+    async with limiter.reserve(10) as reservation:
+        reservation.headers = {
+            "x-ratelimit-limit-tokens": "30000",
+            "x-ratelimit-remaining-tokens": "120",
+            "x-ratelimit-limit-requests": "500",
+            "x-ratelimit-remaining-requests": "499",
+        }
+
+    assert limiter.tokens.capacity == 30000
+    assert limiter.tokens.level == pytest.approx(120)
+    assert limiter.requests.capacity == 500
+
+
+def test_retry_after_seconds():
+    """Testa a leitura do retry-after em segundos e milissegundos."""
+    assert retry_after_seconds(FakeRateLimitError({"retry-after": "2"})) == 2.0
+    assert retry_after_seconds(FakeRateLimitError({"retry-after-ms": "1500"})) == 1.5
+    assert retry_after_seconds(FakeRateLimitError({})) is None
+
+
+def test_wait_skips_backoff_for_rate_limit_errors():
+    """Testa que a espera do tenacity é zero em 429 e usa o fallback nos demais erros."""
+
+    class Outcome:
+        failed = True
+
+        def __init__(self, error):
+            self.error = error
+
+        def exception(self):
+            return self.error
+
+    class RetryState:
+        def __init__(self, error):
+            self.outcome = Outcome(error)
+
+    wait = wait_rate_limit_aware(lambda retry_state: 7.0)
+
+    assert wait(RetryState(FakeRateLimitError({}))) == 0.0
+    assert wait(RetryState(RuntimeError("falha"))) == 7.0
+
+
+def test_get_rate_limiter_applies_overrides_to_existing_limiter():
+    """Testa que cotas informadas para um limitador já criado substituem as da tabela."""
+    limiter = get_rate_limiter("openai", "modelo-override")
+    shared = get_rate_limiter("openai", "modelo-override", requests_per_minute=30, tokens_per_minute=9000)
+
+    assert shared is limiter
+    assert (limiter.requests.capacity, limiter.tokens.capacity) == (30, 9000)
+
+
+def test_factory_applies_rate_limits_per_provider(monkeypatch):
+    """Testa que as cotas configuradas valem só para o modelo principal do próprio provedor."""
+    monkeypatch.setenv("OPENAI_MODEL", "modelo-principal")
+    monkeypatch.setenv("OPENAI_RATE_LIMIT_RPM", "42")
+    monkeypatch.setenv("OPENAI_RATE_LIMIT_TPM", "4200")
+    get_settings.cache_clear()
+
+    try:
+        main = create_ai_provider("openai", "sk-main", model="modelo-principal")
+        cascade = create_ai_provider("openai", "sk-main", model="modelo-cascata")
+        failover = create_ai_provider("gemini", "sk-gemini", model="modelo-principal")
+    finally:
+        get_settings.cache_clear()
+
+    assert (main.rate_limiter.requests.capacity, main.rate_limiter.tokens.capacity) == (42, 4200)
+    assert cascade.rate_limiter.requests.capacity != 42
+    assert failover.rate_limiter.requests.capacity != 42
@@ -0,0 +1,103 @@
+"""
+Testes unitários para a gravação e a reprodução de respostas de IA.
+"""
+import time
+
+import pytest
+
+from financial_document_processor.adapters.ai import create_ai_provider
+from financial_document_processor.adapters.ai.ai_provider import AIRequest, track_usage
+from financial_document_processor.adapters.ai.replay import (
+    Cassette,
+    CassetteMissError,
+    InjectedAIError,
+    RecordingAIProvider,
+    ReplayAIProvider,
+)
+from financial_document_processor.config import get_settings
+from tests.conftest import ScriptedAIProvider
+
+
+def replay_provider(cassette: Cassette, **kwargs) -> ReplayAIProvider:
+    kwargs.setdefault("latency_distribution", "none")
+    return ReplayAIProvider(cassette, "openai", model="gpt-4o", **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_recorded_responses_are_replayed_without_the_provider(tmp_path):
+    """Testa que as respostas gravadas são servidas pela reprodução, com o mesmo uso."""
+    live = ScriptedAIProvider("gpt-4o", name="OpenAI")
+    recorder = RecordingAIProvider(live, Cassette(str(tmp_path / "cassette.jsonl")))
+    recorded = await recorder.extract_transactions("extrato", "bank_statement")
+
+    # Uma cassete nova lê as gravações do arquivo
+    replay = replay_provider(Cassette(str(tmp_path / "cassette.jsonl")))
+    with track_usage() as usage:
+        replayed = await replay.extract_transactions("extrato", "bank_statement")
+
+    assert [tx.description for tx in replayed] == [tx.description for tx in recorded]
+    assert live.calls == 1
+    assert (usage.tokens, usage.cost) == (100, 0.001)
+
+
+@pytest.mark.asyncio
+async def test_stream_is_recorded_with_chunks_and_usage(tmp_path):
+    """Testa que o streaming é gravado em pedaços, com o uso repassado ao acumulador externo."""
+    cassette = Cassette(str(tmp_path / "cassette.jsonl"))
+    recorder = RecordingAIProvider(ScriptedAIProvider("gpt-4o", name="OpenAI"), cassette)
+    request = AIRequest(prompt="extrato")
+
+    with track_usage() as usage:
+        recorded = [delta async for delta in recorder.stream_completion(request)]
+
+    [entry] = cassette.entries.values()
+    assert entry.chunks == recorded
+    assert entry.tokens_used == usage.tokens == 100
+
+    replayed = [delta async for delta in replay_provider(cassette).stream_completion(request)]
+    assert replayed == recorded
+
+
+@pytest.mark.asyncio
+async def test_replay_applies_recorded_latency_and_injected_errors(tmp_path):
+    """Testa a latência gravada multiplicada pela escala, os erros injetados e as requisições sem gravação."""
+    cassette = Cassette(str(tmp_path / "cassette.jsonl"))
+    await RecordingAIProvider(ScriptedAIProvider("gpt-4o", name="OpenAI"), cassette).generate_completion(AIRequest(prompt="oi"))
+    next(iter(cassette.entries.values())).latency = 0.05
+
+    started = time.monotonic()
+    await replay_provider(cassette, latency_distribution="recorded", latency_scale=2).generate_completion(
+        AIRequest(prompt="oi")
+    )
+    assert time.monotonic() - started >= 0.1
+
+    with pytest.raises(InjectedAIError):
+        await replay_provider(cassette, error_rate=1.0).generate_completion(AIRequest(prompt="oi"))
+
+    with pytest.raises(CassetteMissError):
+        await replay_provider(cassette).generate_completion(AIRequest(prompt="outro prompt"))
+
+
+def test_sampled_latency_keeps_recorded_mean(tmp_path):
+    """Testa que as distribuições sorteadas mantêm a latência gravada como média."""
+    for distribution in ("exponential", "lognormal"):
+        replay = replay_provider(Cassette(str(tmp_path / "cassette.jsonl")), latency_distribution=distribution, seed=7)
+        samples = [replay._sample_latency(2.0) for _ in range(5000)]
+
+        assert sum(samples) / len(samples) == pytest.approx(2.0, rel=0.1)
+
+
+def test_factory_creates_replay_provider_in_replay_mode(monkeypatch, tmp_path):
+    """Testa que a factory devolve o provedor de reprodução com o estilo de prompt do provedor gravado."""
+    monkeypatch.setenv("AI_REPLAY_MODE", "replay")
+    monkeypatch.setenv("AI_REPLAY_CASSETTE_PATH", str(tmp_path / "cassette.jsonl"))
+    get_settings.cache_clear()
+
+    try:
+        provider = create_ai_provider("claude", "", model="claude-3-haiku-20240307")
+    finally:
+        get_settings.cache_clear()
+
+    assert isinstance(provider, ReplayAIProvider)
+    assert provider.prompt_style == "claude"
+    assert provider.model == "claude-3-haiku-20240307"
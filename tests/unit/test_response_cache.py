@@ -0,0 +1,148 @@
+"""
+Testes unitários para o cache de respostas de IA.
+"""
+import pytest
+
+from financial_document_processor.adapters.ai.ai_provider import AIProvider, AIRequest, AIResponse
+from financial_document_processor.adapters.ai.response_cache import CachingAIProvider, SQLiteResponseCache
+
+
+class CountingProvider(AIProvider):
+    """Provedor de teste que conta as chamadas e ecoa o prompt."""
+
+    prompt_style = "claude"
+
+    def __init__(self):
+        self.model = "counting-model"
+        self.calls = 0
+
+    @property
+    def name(self) -> str:
+        return "Counting"
+
+    def get_cost_per_1k_tokens(self) -> float:
+        return 0.01
+
+    async def generate_completion(self, request: AIRequest) -> AIResponse:
+        self.calls += 1
+        return AIResponse(content=f"resposta: {request.prompt}", model=self.model, tokens_used=120, cost=0.0012)
+
+
+@pytest.fixture
+def provider():
+    return CountingProvider()
+
+
+@pytest.fixture
+def cached_provider(provider):
+    return CachingAIProvider(provider, SQLiteResponseCache(":memory:"))
+
+
+@pytest.mark.asyncio
+async def test_identical_requests_hit_cache(cached_provider, provider):
+    """Testa que a segunda requisição idêntica é servida pelo cache, sem custo."""
+    request = AIRequest(prompt="extrato", system_message="sistema", cacheable_prefix="instruções")
+
+    first = await cached_provider.generate_completion(request)
+    second = await cached_provider.generate_completion(request)
+
+    assert provider.calls == 1
+    assert second.content == first.content
+    assert second.cost == 0.0
+    assert second.tokens_used == 0
+
+
+@pytest.mark.asyncio
+async def test_different_prompts_miss_cache(cached_provider, provider):
+    """Testa que prompts diferentes geram chaves diferentes."""
+    await cached_provider.generate_completion(AIRequest(prompt="trecho 1"))
+    await cached_provider.generate_completion(AIRequest(prompt="trecho 2"))
+    await cached_provider.generate_completion(AIRequest(prompt="trecho 1", model="outro-modelo"))
+
+    assert provider.calls == 3
+
+
+@pytest.mark.asyncio
+async def test_non_zero_temperature_bypasses_cache(cached_provider, provider):
+    """Testa que requisições não determinísticas não são cacheadas."""
+    request = AIRequest(prompt="extrato", temperature=0.7)
+
+    await cached_provider.generate_completion(request)
+    await cached_provider.generate_completion(request)
+
+    assert provider.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_sqlite_cache_expires_entries():
+    """Testa que entradas expiradas não são retornadas."""
+    cache = SQLiteResponseCache(":memory:", ttl_seconds=0)
+
+    await cache.set("chave", "valor")
+
+    assert await cache.get("chave") is None
+
+
+@pytest.mark.asyncio
+async def test_sqlite_cache_evicts_least_recently_used():
+    """Testa a remoção das entradas menos usadas quando o limite é excedido."""
+    cache = SQLiteResponseCache(":memory:", max_entries=2)
+
+    await cache.set("a", "1")
+    await cache.set("b", "2")
+    assert await cache.get("a") == "1"  # "a" passa a ser a mais recente
+    await cache.set("c", "3")
+
+    assert await cache.get("a") == "1"
+    assert await cache.get("b") is None
+    assert await cache.get("c") == "3"
+
+
+def test_wrapper_delegates_provider_attributes(cached_provider):
+    """Testa que o wrapper expõe nome, modelo e estilo de prompt do provedor envolvido."""
+    assert cached_provider.name == "Counting"
+    assert cached_provider.model == "counting-model"
+    assert cached_provider.prompt_style == "claude"
+    assert cached_provider.get_cost_per_1k_tokens() == 0.01
+
+
+@pytest.mark.asyncio
+async def test_truncated_and_invalid_responses_are_not_cached(cached_provider, provider):
+    """Testa que respostas cortadas ou sem o JSON do schema não são gravadas."""
+    schema = {"type": "object", "properties": {"r": {"type": "array"}}, "required": ["r"]}
+    responses = iter([
+        AIResponse(content='{"r": [{"i": 0', model="m", tokens_used=10, cost=0.0, truncated=True),
+        AIResponse(content='{"erro": "sem categorias"}', model="m", tokens_used=10, cost=0.0),
+        AIResponse(content='Resultado: {"r": []}', model="m", tokens_used=10, cost=0.0),
+        # Streaming cortado: o wrapper só vê o texto, que não fecha o JSON
+        AIResponse(content='{"r": [{"i": 0, "c": [', model="m", tokens_used=10, cost=0.0),
+    ])
+
+    async def generate_completion(request):
+        provider.calls += 1
+        return next(responses)
+
+    provider.generate_completion = generate_completion
+    request = AIRequest(prompt="lote", response_schema=schema)
+
+    for _ in range(4):
+        await cached_provider.generate_completion(request)
+
+    assert provider.calls == 3
+
+    stream_request = AIRequest(prompt="trecho", response_schema=schema)
+    async for _ in cached_provider.stream_completion(stream_request):
+        pass
+    assert await cached_provider.backend.get(cached_provider.cache_key(stream_request)) is None
+
+
+@pytest.mark.asyncio
+async def test_corrupt_entry_counts_as_miss(cached_provider, provider):
+    """Testa que uma entrada corrompida no armazenamento é tratada como ausente."""
+    request = AIRequest(prompt="extrato")
+    await cached_provider.backend.set(cached_provider.cache_key(request), "{não é json")
+
+    response = await cached_provider.generate_completion(request)
+
+    assert provider.calls == 1
+    assert response.content == "resposta: extrato"
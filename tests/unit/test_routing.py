@@ -0,0 +1,88 @@
+"""
+Testes unitários para o roteamento de modelos.
+"""
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from pydantic import ValidationError
+
+from financial_document_processor.adapters.ai.routing import ModelRouter, Route, RoutingTable
+from financial_document_processor.services.document_processor import DocumentProcessor
+from financial_document_processor.services.file_decoder import FileDecoder
+
+
+@pytest.fixture
+def routing_table():
+    return RoutingTable([
+        Route(name="recibo", provider="openai", model="gpt-4o-mini", content_types=["image/"]),
+        Route(name="curto", provider="openai", model="gpt-4o-mini", max_input_tokens=3000),
+        Route(name="padrao", provider="openai", model="gpt-4o", max_input_tokens=60000,
+              document_types=["bank_statement"]),
+        Route(name="longo", provider="gemini", model="gemini-1.5-pro", content_types=["application/pdf"]),
+    ])
+
+
+def test_select_first_matching_route(routing_table):
+    """Testa que a primeira rota compatível é escolhida."""
+    assert routing_table.select(50000, "bank_statement", "image/png").name == "recibo"
+    assert routing_table.select(800, "bank_statement", "application/pdf").name == "curto"
+    assert routing_table.select(20000, "bank_statement", "application/pdf").name == "padrao"
+    assert routing_table.select(400000, "bank_statement", "application/pdf").name == "longo"
+    assert routing_table.select(20000, "invoice", "text/plain") is None
+
+
+def test_routing_table_from_json():
+    """Testa a leitura da tabela em JSON e a validação das rotas."""
+    table = RoutingTable.from_json('[{"name": "curto", "provider": "claude", "model": "claude-3-haiku-20240307"}]')
+    assert table.select(10, "bank_statement", "text/plain").model == "claude-3-haiku-20240307"
+
+    with pytest.raises(ValidationError):
+        RoutingTable.from_json('[{"name": "sem modelo"}]')
+
+
+def test_router_reuses_route_providers(routing_table):
+    """Testa que o provedor de cada rota é criado uma única vez e o padrão cobre o resto."""
+    default_provider = MagicMock()
+    factory = MagicMock(side_effect=lambda route: MagicMock(model=route.model))
+    router = ModelRouter(routing_table, factory, default_provider)
+
+    first = router.route(800, "bank_statement", "text/plain")
+    second = router.route(1000, "bank_statement", "text/plain")
+
+    assert first[0] == "curto"
+    assert first[1] is second[1]
+    assert factory.call_count == 1
+    assert router.route(20000, "invoice", "text/plain") == (ModelRouter.DEFAULT_ROUTE, default_provider)
+
+
+@pytest.mark.asyncio
+async def test_document_processor_uses_routed_provider(sample_document, mock_ai_provider):
+    """Testa que o processador extrai com o provedor da rota escolhida para o documento."""
+    file_decoder = MagicMock(spec=FileDecoder)
+    file_decoder.estimate_tokens.return_value = 500
+
+    async def iter_pages(file_content, content_type):
+        yield "Conteúdo de texto extraído para teste"
+
+    file_decoder.iter_pages = MagicMock(side_effect=iter_pages)
+
+    default_provider = MagicMock(name="default", model="gpt-4o")
+    default_provider.name = "OpenAI"
+    router = ModelRouter(
+        RoutingTable([Route(name="curto", provider="openai", model="gpt-4o-mini", max_input_tokens=3000)]),
+        lambda route: mock_ai_provider,
+        default_provider
+    )
+    processor = DocumentProcessor(
+        file_decoder=file_decoder,
+        ai_provider=default_provider,
+        parsers={"bank_statement": AsyncMock()},
+        router=router
+    )
+
+    transactions = await processor.process(sample_document)
+
+    file_decoder.estimate_tokens.assert_called_once_with(sample_document.file_content, sample_document.content_type)
+    assert mock_ai_provider.call_count == 1
+    assert not default_provider.stream_transactions.called
+    assert len(transactions) == len(mock_ai_provider.transactions)
@@ -0,0 +1,82 @@
+"""
+Testes unitários para o agrupamento de requisições de IA idênticas em andamento.
+"""
+import asyncio
+
+import pytest
+from prometheus_client import REGISTRY
+
+from financial_document_processor.adapters.ai.ai_provider import AIRequest, track_usage
+from financial_document_processor.adapters.ai.single_flight import SingleFlightAIProvider
+from tests.conftest import EXTRACTION_RESPONSE, ScriptedAIProvider
+
+
+def coalesced(operation: str) -> float:
+    return REGISTRY.get_sample_value(
+        "ai_single_flight_coalesced_total", {"provider": "Slow", "operation": operation}
+    ) or 0
+
+
+@pytest.mark.asyncio
+async def test_identical_concurrent_requests_share_one_call():
+    """Testa que extrações idênticas simultâneas fazem uma única chamada, cobrada uma única vez."""
+    inner = ScriptedAIProvider("gpt-4o", delay=0.05, name="Slow")
+    provider = SingleFlightAIProvider(inner)
+    before = coalesced("extraction")
+
+    async def extract():
+        with track_usage() as usage:
+            transactions = await provider.extract_transactions("extrato", "bank_statement")
+        return transactions, usage
+
+    results = await asyncio.gather(*[extract() for _ in range(5)])
+
+    assert inner.calls == 1
+    assert all(len(transactions) == 1 for transactions, _ in results)
+    assert sorted(usage.tokens for _, usage in results) == [0, 0, 0, 0, 100]
+    assert coalesced("extraction") - before == 4
+
+    # Terminada a chamada, uma nova requisição vai ao provedor
+    await provider.generate_completion(AIRequest(prompt="outra"))
+    await provider.generate_completion(AIRequest(prompt="outra"))
+    assert inner.calls == 3
+
+
+@pytest.mark.asyncio
+async def test_errors_and_cancellation_of_shared_call():
+    """Testa que o erro chega a todos e que cancelar uma requisição não cancela a chamada das demais."""
+    provider = SingleFlightAIProvider(ScriptedAIProvider("gpt-4o", delay=0.05, name="Slow", error=RuntimeError("falhou")))
+    results = await asyncio.gather(
+        *[provider.generate_completion(AIRequest(prompt="oi")) for _ in range(3)], return_exceptions=True
+    )
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+    inner = ScriptedAIProvider("gpt-4o", delay=0.05, name="Slow")
+    provider = SingleFlightAIProvider(inner)
+    first = asyncio.create_task(provider.generate_completion(AIRequest(prompt="oi")))
+    second = asyncio.create_task(provider.generate_completion(AIRequest(prompt="oi")))
+    await asyncio.sleep(0.01)
+    first.cancel()
+
+    response = await second
+    assert response.content == EXTRACTION_RESPONSE
+    assert first.cancelled()
+    assert inner.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_stream_readers_receive_all_chunks_from_one_stream():
+    """Testa que streams idênticos leem um único streaming, inclusive quem entra depois do início."""
+    inner = ScriptedAIProvider("gpt-4o", delay=0.05, name="Slow")
+    provider = SingleFlightAIProvider(inner)
+    request = AIRequest(prompt="extrato")
+
+    async def read(delay: float):
+        await asyncio.sleep(delay)
+        return "".join([delta async for delta in provider.stream_completion(request)])
+
+    contents = await asyncio.gather(read(0), read(0.02), read(0.03))
+
+    assert contents == [EXTRACTION_RESPONSE] * 3
+    assert inner.calls == 1
+    assert not provider._stream_flights
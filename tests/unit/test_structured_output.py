@@ -0,0 +1,60 @@
+"""
+Testes unitários para os schemas de saída estruturada.
+"""
+import pytest
+from pydantic import ValidationError
+
+from financial_document_processor.services.structured_output import (
+    CATEGORIZATION_ADAPTER,
+    EXTRACTED_TRANSACTION_ADAPTER,
+    categorization_schema,
+    extraction_schema,
+)
+
+
+def test_extraction_schema_is_strict_for_openai():
+    """Testa que o schema da OpenAI exige todos os campos e usa tipos anuláveis."""
+    schema = extraction_schema("openai")
+    item = schema["properties"]["transactions"]["items"]
+
+    assert item["additionalProperties"] is False
+    assert set(item["required"]) == set(item["properties"])
+    assert item["properties"]["type"]["enum"] == ["credit", "debit"]
+    assert item["properties"]["method"]["type"] == ["string", "null"]
+    assert None in item["properties"]["method"]["enum"]
+    assert "$ref" not in str(schema)
+
+
+def test_extraction_schema_for_gemini_uses_nullable():
+    """Testa que o schema do Gemini usa nullable e mantém apenas os campos obrigatórios."""
+    item = extraction_schema("gemini")["properties"]["transactions"]["items"]
+
+    assert item["required"] == ["date", "description", "amount", "type"]
+    assert item["properties"]["method"]["nullable"] is True
+    assert item["properties"]["method"]["type"] == "string"
+    assert "format" not in item["properties"]["date"]
+    assert "additionalProperties" not in item
+
+
+def test_categorization_schema_depends_on_predefined_categories():
+    """Testa que "c" contém números com categorias predefinidas e nomes sem elas."""
+    with_ids = categorization_schema(True, "claude")["properties"]["r"]["items"]["properties"]["c"]
+    with_names = categorization_schema(False, "claude")["properties"]["r"]["items"]["properties"]["c"]
+
+    assert with_ids["items"]["type"] == "integer"
+    assert with_names["items"]["type"] == "string"
+
+
+def test_adapters_validate_responses():
+    """Testa a validação das respostas com os TypeAdapters."""
+    extracted = EXTRACTED_TRANSACTION_ADAPTER.validate_python({
+        "date": "2023-01-15", "description": "PIX", "amount": "10.50", "type": "debit"
+    })
+    assert str(extracted.amount) == "10.50"
+    assert extracted.categories is None
+
+    result = CATEGORIZATION_ADAPTER.validate_json('{"r":[{"i":0,"c":[1,"lazer"],"p":0.9}]}')
+    assert result.r[0].c == [1, "lazer"]
+
+    with pytest.raises(ValidationError):
+        EXTRACTED_TRANSACTION_ADAPTER.validate_python({"date": "2023-01-15", "type": "CREDIT"})
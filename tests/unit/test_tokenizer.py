@@ -0,0 +1,84 @@
+"""
+Testes unitários para o serviço de tokenização.
+"""
+import pytest
+
+from financial_document_processor.utils.tokenizer import (
+    ApproximateTokenizer,
+    DEFAULT_MODEL_LIMITS,
+    TokenizerService,
+)
+
+
+@pytest.fixture
+def tokenizer_service():
+    """Cria uma instância isolada do serviço de tokenização."""
+    return TokenizerService(safety_margin=0)
+
+
+def test_approximate_tokenizer_penalizes_uppercase_accents_and_numbers():
+    """Testa que texto de extrato (maiúsculas, acentos, números) custa mais que len/4."""
+    tokenizer = ApproximateTokenizer()
+    statement_line = "03/05/2023 TRANSFERÊNCIA RECEBIDA - SALÁRIO 3.500,00 C"
+    prose = "the quick brown fox jumps over the lazy dog again and again"
+
+    assert tokenizer.count(statement_line) > len(statement_line) // 4
+    assert tokenizer.count(statement_line) > tokenizer.count(prose)
+
+
+def test_get_tokenizer_is_cached_per_provider_and_model(tokenizer_service):
+    """Testa que as instâncias de tokenizador são reutilizadas."""
+    first = tokenizer_service.get_tokenizer("claude", "claude-3-haiku-20240307")
+    second = tokenizer_service.get_tokenizer("Claude", "claude-3-haiku-20240307")
+    other = tokenizer_service.get_tokenizer("gemini", "gemini-1.5-pro")
+
+    assert first is second
+    assert first is not other
+
+
+def test_openai_falls_back_to_approximation_without_tiktoken(tokenizer_service, monkeypatch):
+    """Testa o fallback quando o tiktoken não consegue carregar o vocabulário."""
+    import tiktoken
+
+    def unavailable(model_name):
+        raise ConnectionError("sem acesso ao vocabulário")
+
+    monkeypatch.setattr(tiktoken, "encoding_for_model", unavailable)
+
+    tokenizer = tokenizer_service.get_tokenizer("openai", "gpt-4o")
+
+    assert isinstance(tokenizer, ApproximateTokenizer)
+    assert tokenizer_service.count_tokens("PAGAMENTO CONTA DE LUZ", "openai", "gpt-4o") > 0
+
+
+def test_select_max_tokens_respects_model_limits(tokenizer_service):
+    """Testa a escolha de max_tokens a partir dos limites do modelo."""
+    # Entrada pequena: usa o máximo de saída do modelo
+    assert tokenizer_service.select_max_tokens(1000, "claude-3-opus-20240229") == 4096
+
+    # Entrada grande: limitado ao espaço restante no contexto
+    assert tokenizer_service.select_max_tokens(6000, "gpt-4") == 8192 - 6000
+
+    # Modelo desconhecido usa os limites padrão
+    assert tokenizer_service.select_max_tokens(10, "modelo-novo") == DEFAULT_MODEL_LIMITS.max_output_tokens
+
+
+def test_select_max_tokens_rejects_context_overflow(tokenizer_service):
+    """Testa que entradas maiores que a janela de contexto falham antes da chamada."""
+    with pytest.raises(ValueError, match="excede a janela de contexto"):
+        tokenizer_service.select_max_tokens(9000, "gpt-4")
+
+
+def test_estimate_cost(tokenizer_service):
+    """Testa a estimativa de custo antes da chamada."""
+    estimate = tokenizer_service.estimate(
+        prompt="PAGAMENTO CONTA DE LUZ 150,25",
+        provider="gemini",
+        model="gemini-1.5-flash",
+        cost_per_1k_tokens=1.0,
+        max_tokens=100,
+    )
+
+    assert estimate.max_tokens == 100
+    expected_output = min(100, estimate.prompt_tokens)
+    assert estimate.estimated_cost == pytest.approx((estimate.prompt_tokens + expected_output) / 1000)
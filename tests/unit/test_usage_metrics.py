@@ -0,0 +1,101 @@
+"""
+Testes unitários para a contabilidade de tokens e custo das chamadas de IA.
+"""
+import json
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from prometheus_client import REGISTRY
+
+from financial_document_processor.adapters.ai.ai_provider import AIProvider, AIRequest, AIResponse, track_usage
+from financial_document_processor.adapters.ai.gemini_provider import GeminiProvider
+from financial_document_processor.adapters.ai.pricing import MODEL_PRICES, ModelPrice
+from financial_document_processor.services.prompt_engineering import PromptEngineering
+from financial_document_processor.utils.metrics import current_ai_usage_labels
+
+EXTRACTION = json.dumps({"transactions": [
+    {"date": "2023-01-15", "description": "SUPERMERCADO EXTRA", "amount": "150.00", "type": "debit"}
+]})
+
+
+class MeteredProvider(AIProvider):
+    """Provedor de teste que registra o uso de cada chamada com tokens de entrada e saída."""
+
+    prompt_style = "openai"
+
+    def __init__(self):
+        self.model = "metered-model"
+        self.prompt_engineering = PromptEngineering()
+        self.labels = []
+
+    @property
+    def name(self) -> str:
+        return "Metered"
+
+    def get_cost_per_1k_tokens(self) -> float:
+        return 0.01
+
+    def get_model_price(self, model=None) -> ModelPrice:
+        return ModelPrice(input=0.001, output=0.004)
+
+    async def generate_completion(self, request: AIRequest) -> AIResponse:
+        self.labels.append(current_ai_usage_labels())
+        cost = self.calculate_cost(self.model, 1000, 500)
+        self.record_usage(self.model, 1500, cost, 0, 1000, 500)
+        return AIResponse(content=EXTRACTION, model=self.model, tokens_used=1500, cost=cost)
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_model_price_separates_input_output_and_cache():
+    """Testa o custo com preços distintos para entrada, saída, leitura e gravação de cache."""
+    price = ModelPrice(input=0.003, output=0.015, cached_input=0.0003, cache_write=0.00375)
+
+    cost = price.cost(input_tokens=3000, output_tokens=1000, cached_tokens=1000, cache_write_tokens=1000)
+
+    assert cost == pytest.approx((1000 * 0.003 + 1000 * 0.0003 + 1000 * 0.00375 + 1000 * 0.015) / 1000)
+    assert MODEL_PRICES["gpt-4o"].output > MODEL_PRICES["gpt-4o"].input
+
+
+@pytest.mark.asyncio
+async def test_usage_is_labeled_by_operation_and_document_type():
+    """Testa que tokens e custo são registrados com a operação e o tipo de documento da chamada."""
+    provider = MeteredProvider()
+    labels = {"provider": "Metered", "operation": "extraction", "document_type": "bank_statement"}
+    input_before = sample("ai_token_usage_total", token_type="input", **labels)
+    output_before = sample("ai_token_usage_total", token_type="output", **labels)
+    cost_before = sample("ai_cost_usd_total", **labels)
+
+    with track_usage() as usage:
+        await provider.extract_transactions("extrato", "bank_statement")
+
+    assert provider.labels == [{"operation": "extraction", "document_type": "bank_statement"}]
+    assert sample("ai_token_usage_total", token_type="input", **labels) - input_before == 1000
+    assert sample("ai_token_usage_total", token_type="output", **labels) - output_before == 500
+    assert sample("ai_cost_usd_total", **labels) - cost_before == pytest.approx(0.003)
+    assert (usage.input_tokens, usage.output_tokens) == (1000, 500)
+
+    # Os labels valem apenas dentro da operação
+    assert current_ai_usage_labels() == {"operation": "completion", "document_type": "unknown"}
+
+
+@pytest.mark.asyncio
+async def test_gemini_counts_tokens_from_usage_metadata_or_count_tokens():
+    """Testa que o Gemini usa o usage_metadata da resposta e, na falta dele, o count_tokens da API."""
+    provider = GeminiProvider(api_key="fake_api_key", model="gemini-1.5-flash")
+    request = AIRequest(prompt="extrato", system_message="Sistema")
+    estimate = provider.estimate_request(request)
+
+    response = SimpleNamespace(usage_metadata=SimpleNamespace(
+        prompt_token_count=1200, candidates_token_count=300, cached_content_token_count=1000
+    ))
+    assert await provider._token_counts(request, estimate, response, "texto") == (1200, 300, 1000)
+
+    model = MagicMock()
+    model.count_tokens_async = AsyncMock(side_effect=[SimpleNamespace(total_tokens=40), SimpleNamespace(total_tokens=7)])
+    provider._generative_model = MagicMock(return_value=model)
+
+    assert await provider._token_counts(request, estimate, SimpleNamespace(), "texto") == (40, 7, 0)